@@ -154,6 +154,9 @@ try:
     if not os.path.exists(bindir + 'stonix_resources'):
         shutil.copytree(sourcedir + 'stonix_resources',
                         bindir + 'stonix_resources')
+        # Generate the rule manifest used for applicability checks
+        os.system('python ' + bindir + 'stonix_resources/rulemanifest.py ' +
+                  bindir + 'stonix_resources/rules')
 
     if not os.path.exists(builddir + 'usr/share/man/man8/stonix.8'):
         shutil.copytree(sourcedir + 'usr/share', builddir + '/usr/share')
@@ -0,0 +1,635 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+'''
+Created on Oct 18, 2016
+
+Long running version of stonixImporter. Reports are loaded as they are
+uploaded instead of on the next cron run. New files in the results directory
+are noticed through inotify where it is available and by scanning the
+directory every few seconds elsewhere. One database connection is kept for
+the life of the daemon and runs are committed in batches.
+
+Every committed report is recorded in a checkpoint file before it is moved
+out of the results directory. A report is only loaded if no run of that file
+name is in the database yet, which covers a crash between the commit and the
+checkpoint as well as runs a MyISAM database kept from a rolled back batch.
+So a daemon restarted after a crash neither loses reports nor loads any of
+them twice. A database error other than a refused run, including one on
+commit, keeps every report queued until the database is usable again.
+Ingestion rate and backlog are written to a metrics file in JSON.
+
+Events lost when the inotify queue overflows are made up for by scanning
+the directory, and scanning it again once the files that were still being
+written then have settled.
+
+@author: dkennel
+'''
+import collections
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import shutil
+import signal
+import struct
+import sys
+import time
+import traceback
+from optparse import OptionParser
+from stonixImporter import DBhandler, ReportParser, addupload, getdestdir
+
+REPORTDIR = '/var/www/html/stonix/results'
+DESTROOT = '/var/local/stonix-server/'
+CHECKPOINT = '/var/local/stonix-server/importd.checkpoint'
+METRICS = '/var/local/stonix-server/importd.metrics'
+# Files written to more recently than this are not picked up by a scan,
+# they may still be being uploaded
+SETTLE = 2
+# Checkpoint entries kept before the checkpoint file is rewritten
+COMPACTAT = 10000
+# Seconds the ingestion rate is averaged over
+RATEWINDOW = 60
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+EVENTHEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher(object):
+    '''
+    Reports the names of files written or moved into a directory, through
+    the Linux inotify interface called with ctypes.
+
+    @author: dkennel
+    '''
+    def __init__(self, path):
+        '''
+        @param path: string - directory to watch
+        @raise OSError: if inotify is not available
+        '''
+        libname = ctypes.util.find_library('c')
+        if libname is None:
+            raise OSError(errno.ENOSYS, 'C library not found')
+        libc = ctypes.CDLL(libname, use_errno=True)
+        if not hasattr(libc, 'inotify_init'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+        if libc.inotify_add_watch(self.fd, path,
+                                  IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, 'inotify_add_watch failed for ' + path)
+
+    def wait(self, timeout):
+        '''
+        Wait up to timeout seconds for files to arrive.
+
+        @param timeout: float - seconds
+        @return: list of file names, or None if events were lost and the
+            directory has to be scanned
+        @author: dkennel
+        '''
+        try:
+            ready = select.select([self.fd], [], [], timeout)[0]
+        except select.error, err:
+            if err.args[0] == errno.EINTR:
+                return []
+            raise
+        if not ready:
+            return []
+        data = os.read(self.fd, 65536)
+        names = []
+        offset = 0
+        while offset + EVENTHEADER.size <= len(data):
+            _, mask, _, length = EVENTHEADER.unpack_from(data, offset)
+            offset = offset + EVENTHEADER.size
+            name = data[offset:offset + length].rstrip('\0')
+            offset = offset + length
+            if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                return None
+            if name:
+                names.append(name)
+        return names
+
+    def close(self):
+        '''
+        Stop watching.
+
+        @author: dkennel
+        '''
+        os.close(self.fd)
+
+
+class PollWatcher(object):
+    '''
+    Stand in for InotifyWatcher that asks for a scan of the directory every
+    interval seconds.
+
+    @author: dkennel
+    '''
+    def __init__(self, interval):
+        '''
+        @param interval: float - seconds between scans
+        '''
+        self.interval = interval
+        self.lastscan = 0
+
+    def wait(self, timeout):
+        '''
+        Wait up to timeout seconds for the next scan to be due.
+
+        @param timeout: float - seconds
+        @return: None when a scan is due, otherwise an empty list
+        @author: dkennel
+        '''
+        due = self.lastscan + self.interval - time.time()
+        if due > timeout:
+            time.sleep(timeout)
+            return []
+        if due > 0:
+            time.sleep(due)
+        self.lastscan = time.time()
+        return None
+
+    def close(self):
+        pass
+
+
+class Checkpoint(object):
+    '''
+    Append only record of the reports whose runs are committed. A report is
+    recorded before it is moved out of the results directory; a recorded
+    report still found there after a crash only needs moving.
+
+    @author: dkennel
+    '''
+    def __init__(self, path):
+        '''
+        @param path: string - checkpoint file
+        '''
+        self.path = path
+        self.names = set()
+        try:
+            rhandle = open(path, 'r')
+            try:
+                for line in rhandle:
+                    if line.endswith('\n'):
+                        self.names.add(line[:-1])
+            finally:
+                rhandle.close()
+        except IOError:
+            pass
+        self.handle = None
+
+    def compact(self, present):
+        '''
+        Rewrite the checkpoint keeping only reports still in the results
+        directory.
+
+        @param present: set of strings - file names in the results directory
+        @author: dkennel
+        '''
+        self.names = self.names & present
+        if self.handle is not None:
+            self.handle.close()
+        tmppath = self.path + '.tmp'
+        whandle = open(tmppath, 'w')
+        try:
+            for name in sorted(self.names):
+                whandle.write(name + '\n')
+            whandle.flush()
+            os.fsync(whandle.fileno())
+        finally:
+            whandle.close()
+        os.rename(tmppath, self.path)
+        self.handle = open(self.path, 'a')
+
+    def record(self, names):
+        '''
+        Durably record that these reports were committed.
+
+        @param names: list of strings - file names
+        @author: dkennel
+        '''
+        if self.handle is None:
+            self.handle = open(self.path, 'a')
+        for name in names:
+            self.handle.write(name + '\n')
+            self.names.add(name)
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+class ImportDaemon(object):
+    '''
+    Loads reports into the database as they arrive in the results directory.
+
+    @author: dkennel
+    '''
+    def __init__(self, connect, reportdir=REPORTDIR, destroot=DESTROOT,
+                 checkpoint=CHECKPOINT, metrics=METRICS, batchsize=100,
+                 interval=5, watcher=None):
+        '''
+        @param connect: callable returning a DBhandler, called again to
+            reconnect after the database connection was lost
+        @param reportdir: string - directory results.php stores uploads in
+        @param destroot: string - processed reports go to dated directories
+            under this one
+        @param checkpoint: string - checkpoint file
+        @param metrics: string - metrics file, None for none
+        @param batchsize: int - most runs per transaction. A batch is also
+            committed whenever no more reports are waiting.
+        @param interval: float - seconds between scans without inotify, and
+            between metrics updates
+        @param watcher: InotifyWatcher or PollWatcher, default inotify if
+            available
+        '''
+        self.connect = connect
+        self.reportdir = reportdir
+        self.destroot = destroot
+        self.metricspath = metrics
+        self.batchsize = batchsize
+        self.interval = interval
+        self.checkpoint = Checkpoint(checkpoint)
+        self.watcher = watcher
+        self.stonixdb = None
+        self.parser = ReportParser()
+        self.queue = collections.OrderedDict()
+        self.uncommitted = []
+        self.commits = collections.deque()
+        self.loaded = 0
+        self.failed = 0
+        self.started = time.time()
+        self.lastcommit = None
+        self.rescanat = None
+        self.running = False
+
+    def getwatcher(self):
+        '''
+        Return an InotifyWatcher for the results directory, or a PollWatcher
+        if inotify can not be used.
+
+        @return: InotifyWatcher or PollWatcher
+        @author: dkennel
+        '''
+        try:
+            return InotifyWatcher(self.reportdir)
+        except (OSError, AttributeError), err:
+            print 'inotify not available (' + str(err) + '), scanning ' + \
+                'every %g seconds' % self.interval
+            return PollWatcher(self.interval)
+
+    def scan(self, settle=SETTLE):
+        '''
+        Queue every report in the results directory that is not queued yet.
+
+        @param settle: float - skip files modified this recently
+        @return: set of strings - every file name found
+        @author: dkennel
+        '''
+        present = set(os.listdir(self.reportdir))
+        cutoff = time.time() - settle
+        for name in sorted(present):
+            if name in self.queue or name.startswith('.'):
+                continue
+            try:
+                if settle and os.stat(os.path.join(self.reportdir,
+                                                   name)).st_mtime > cutoff:
+                    continue
+            except OSError:
+                continue
+            self.queue[name] = True
+        return present
+
+    def recover(self):
+        '''
+        Move reports committed before a crash but still in the results
+        directory, and forget about the ones already moved.
+
+        @author: dkennel
+        '''
+        present = set(os.listdir(self.reportdir))
+        finished = sorted(self.checkpoint.names & present)
+        if finished:
+            destdir = getdestdir(self.destroot)
+            for name in finished:
+                shutil.move(os.path.join(self.reportdir, name), destdir)
+            print 'Moved %d reports loaded before the last shutdown' % \
+                len(finished)
+        self.checkpoint.compact(present - set(finished))
+
+    def processone(self, name):
+        '''
+        Parse and load one queued report.
+
+        @param name: string - file name in the results directory
+        @author: dkennel
+        '''
+        path = os.path.join(self.reportdir, name)
+        if name in self.checkpoint.names or not os.path.exists(path):
+            return
+        if self.stonixdb is None:
+            self.stonixdb = self.connect()
+        dbmodule = self.stonixdb.dbmodule
+        try:
+            if self.stonixdb.isloaded(name):
+                # Committed before a crash cut the checkpoint short
+                print path + ': already loaded'
+                self.checkpoint.record([name])
+                shutil.move(path, getdestdir(self.destroot))
+                return
+            metadata, findings = self.parser.iterparsereport(path)
+            addupload(metadata, name)
+            self.stonixdb.loaddata(metadata, findings)
+        except (dbmodule.IntegrityError, dbmodule.DataError), err:
+            # The database refused this run. The rolled back runs go round
+            # again, this one is given up on.
+            print path + ': ' + str(err)
+            self.requeue(self.uncommitted)
+            self.failed = self.failed + 1
+            shutil.move(path, getdestdir(self.destroot))
+            return
+        except dbmodule.Error, err:
+            # The connection is gone or the schema is broken. The rolled
+            # back runs and this one are loaded again over a new connection.
+            self.dbfailed(err, self.uncommitted + [name])
+            return
+        except Exception, err:
+            print path + ': ' + str(err)
+            print traceback.format_exc()
+            self.failed = self.failed + 1
+            shutil.move(path, getdestdir(self.destroot))
+            return
+        self.uncommitted.append(name)
+        if self.stonixdb.pending == 0:
+            # loaddata committed a full batch
+            self.finishbatch()
+
+    def requeue(self, names):
+        '''
+        Put reports back at the head of the queue, after their batch was
+        rolled back.
+
+        @param names: list of strings - file names
+        @author: dkennel
+        '''
+        waiting = self.queue
+        self.queue = collections.OrderedDict([(name, True)
+                                              for name in names])
+        self.queue.update(waiting)
+        self.uncommitted = []
+
+    def dbfailed(self, err, names, backoff=True):
+        '''
+        Give up on the database connection after an error and queue the
+        reports of the rolled back batch again.
+
+        @param err: the database error
+        @param names: list of strings - file names to load again
+        @param backoff: bool - wait before the next connection attempt
+        @author: dkennel
+        '''
+        print 'Database error, reconnecting: ' + str(err)
+        self.requeue(names)
+        self.disconnect()
+        if backoff:
+            time.sleep(min(self.interval, 5))
+
+    def commit(self, backoff=True):
+        '''
+        Commit the current batch and move its reports. If the commit fails
+        the reports stay queued for the next connection.
+
+        @param backoff: bool - wait before reconnecting if the commit fails
+        @author: dkennel
+        '''
+        if self.stonixdb is not None and self.stonixdb.pending:
+            try:
+                self.stonixdb.commit()
+            except self.stonixdb.dbmodule.Error, err:
+                self.dbfailed(err, self.uncommitted, backoff)
+                return
+        self.finishbatch()
+
+    def finishbatch(self):
+        '''
+        Record and move the reports of a committed batch.
+
+        @author: dkennel
+        '''
+        if not self.uncommitted:
+            return
+        self.checkpoint.record(self.uncommitted)
+        destdir = getdestdir(self.destroot)
+        for name in self.uncommitted:
+            try:
+                shutil.move(os.path.join(self.reportdir, name), destdir)
+            except (IOError, OSError), err:
+                print 'Unable to move ' + name + ': ' + str(err)
+        now = time.time()
+        self.commits.append((now, len(self.uncommitted)))
+        self.loaded = self.loaded + len(self.uncommitted)
+        self.lastcommit = now
+        self.uncommitted = []
+        if len(self.checkpoint.names) >= COMPACTAT:
+            self.checkpoint.compact(set([name for name in
+                                         self.checkpoint.names if
+                                         os.path.exists(os.path.join(
+                                             self.reportdir, name))]))
+
+    def disconnect(self):
+        '''
+        Drop the database connection; the next report opens a new one.
+
+        @author: dkennel
+        '''
+        if self.stonixdb is not None:
+            self.stonixdb.pending = 0
+            try:
+                self.stonixdb.con.close()
+            except Exception:
+                pass
+            self.stonixdb = None
+
+    def getmetrics(self):
+        '''
+        Return the ingestion metrics.
+
+        @return: dict
+        @author: dkennel
+        '''
+        now = time.time()
+        while self.commits and self.commits[0][0] < now - RATEWINDOW:
+            self.commits.popleft()
+        window = min(RATEWINDOW, max(now - self.started, 1))
+        return {'time': now,
+                'uptime': now - self.started,
+                'loaded': self.loaded,
+                'failed': self.failed,
+                'backlog': len(self.queue) + len(self.uncommitted),
+                'rate': sum([count for _, count in self.commits]) / window,
+                'lastcommit': self.lastcommit}
+
+    def writemetrics(self):
+        '''
+        Replace the metrics file with the current metrics.
+
+        @author: dkennel
+        '''
+        if self.metricspath is None:
+            return
+        tmppath = self.metricspath + '.tmp'
+        try:
+            whandle = open(tmppath, 'w')
+            try:
+                json.dump(self.getmetrics(), whandle)
+            finally:
+                whandle.close()
+            os.rename(tmppath, self.metricspath)
+        except (IOError, OSError), err:
+            print 'Unable to write metrics: ' + str(err)
+
+    def runonce(self, timeout):
+        '''
+        Wait up to timeout seconds for reports and load everything queued.
+
+        @param timeout: float - seconds
+        @author: dkennel
+        '''
+        if self.rescanat is not None and time.time() >= self.rescanat:
+            # Files still being written at the last overflow
+            self.rescanat = None
+            self.scan()
+        if not self.queue:
+            if self.rescanat is not None:
+                timeout = max(0, min(timeout, self.rescanat - time.time()))
+            names = self.watcher.wait(timeout)
+            if names is None:
+                self.scan()
+                if isinstance(self.watcher, InotifyWatcher):
+                    # Files closed shortly before the overflow lost their
+                    # events and were skipped as unsettled
+                    self.rescanat = time.time() + SETTLE
+            else:
+                for name in names:
+                    self.queue[name] = True
+        while self.queue and self.running:
+            name = self.queue.popitem(last=False)[0]
+            self.processone(name)
+        self.commit()
+
+    def run(self, iterations=None):
+        '''
+        Main loop. Runs until stop is called, or for the given number of
+        iterations.
+
+        @param iterations: int - for testing, None to run until stopped
+        @author: dkennel
+        '''
+        if self.watcher is None:
+            self.watcher = self.getwatcher()
+        self.running = True
+        self.recover()
+        # Whatever arrived while the daemon was not running
+        self.scan(settle=0)
+        lastmetrics = 0
+        try:
+            while self.running:
+                self.runonce(self.interval)
+                if time.time() - lastmetrics >= self.interval:
+                    self.writemetrics()
+                    lastmetrics = time.time()
+                if iterations is not None:
+                    iterations = iterations - 1
+                    if iterations <= 0:
+                        break
+        finally:
+            self.commit(backoff=False)
+            self.writemetrics()
+            self.watcher.close()
+            self.checkpoint.close()
+            if self.stonixdb is not None:
+                self.stonixdb.close()
+                self.stonixdb = None
+
+    def stop(self, *args):
+        '''
+        Finish the report being loaded, commit and leave the main loop.
+        Usable as a signal handler.
+
+        @author: dkennel
+        '''
+        self.running = False
+
+
+def main():
+    '''
+    Run the import daemon in the foreground until SIGTERM or SIGINT.
+
+    @author: dkennel
+    '''
+    optparser = OptionParser(usage='%prog [options]')
+    optparser.add_option('-d', '--reportdir', default=REPORTDIR,
+                         help='directory the reports are uploaded to')
+    optparser.add_option('-o', '--destroot', default=DESTROOT,
+                         help='processed reports are moved under here')
+    optparser.add_option('-c', '--checkpoint', default=CHECKPOINT,
+                         help='checkpoint file')
+    optparser.add_option('-m', '--metrics', default=METRICS,
+                         help='metrics file')
+    optparser.add_option('-s', '--batchsize', type='int', default=100,
+                         help='most runs per transaction')
+    optparser.add_option('-i', '--interval', type='float', default=5,
+                         help='seconds between directory scans when '
+                         'inotify is not available')
+    optparser.add_option('-p', '--poll', action='store_true', default=False,
+                         help='scan the directory instead of using inotify')
+    options, _ = optparser.parse_args()
+    watcher = None
+    if options.poll:
+        watcher = PollWatcher(options.interval)
+    daemon = ImportDaemon(lambda: DBhandler(batchsize=options.batchsize),
+                          options.reportdir, options.destroot,
+                          options.checkpoint, options.metrics,
+                          options.batchsize, options.interval, watcher)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+    print 'Loaded %d runs, %d reports failed' % (daemon.loaded,
+                                                 daemon.failed)
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -31,14 +31,24 @@ STONIX reports. It processes the XML and inserts the results into a database.
 '''
 
 # from xml.dom.minidom import parseString
-import xml.etree.ElementTree as ET
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 import os
 import errno
 import sys
-import MySQLdb as mdb
 import traceback
 import time
 import shutil
+import gzip
+import multiprocessing
+from optparse import OptionParser
+try:
+    import MySQLdb as mdb
+except ImportError:
+    # Only needed for the default database, see DBhandler
+    mdb = None
 
 
 class ReportParser(object):
@@ -57,7 +67,22 @@ class ReportParser(object):
         self.path = path
         self.tree = ''
         if self.path is not None:
-            self.tree = ET.parse(self.path)
+            self.tree = ET.parse(self.__open(self.path))
+
+    def __open(self, path):
+        '''Private method returning a file object for the report. Clients
+        upload their reports gzip compressed, older clients uploaded plain
+        XML.
+
+        @param path: path to the report file
+        @author: dkennel
+        '''
+        rhandle = open(path, 'rb')
+        if rhandle.read(2) == '\x1f\x8b':
+            rhandle.close()
+            return gzip.open(path, 'rb')
+        rhandle.seek(0)
+        return rhandle
 
     def openreport(self, path):
         '''ReportParser.openReport will open a report file and load the data
@@ -67,7 +92,11 @@ class ReportParser(object):
         @author: dkennel
         '''
         if os.path.exists(path):
-            self.tree = ET.parse(path)
+            rhandle = self.__open(path)
+            try:
+                self.tree = ET.parse(rhandle)
+            finally:
+                rhandle.close()
 
     def parsereport(self):
         '''ReportParser.parseReport() will parse the xml report and return a
@@ -90,141 +119,252 @@ class ReportParser(object):
 
         return [repdict, findings]
 
+    def iterparsereport(self, path):
+        '''ReportParser.iterparsereport() returns the same as parsereport
+        for the report at path, but reads the report incrementally and frees
+        every element once it was read so that large reports are parsed in
+        little memory. The report is not kept in the parser.
+
+        @param path: path to the report file
+        @return: list - [metadata dict, findings dict]
+        @author: dkennel
+        '''
+        repdict = {}
+        findings = {}
+        sections = {'metadata': repdict, 'findings': findings}
+        rhandle = self.__open(path)
+        try:
+            depth = 0
+            current = None
+            root = None
+            section = None
+            for event, elem in ET.iterparse(rhandle, ('start', 'end')):
+                if event == 'start':
+                    depth = depth + 1
+                    if depth == 1:
+                        root = elem
+                    elif depth == 2:
+                        section = elem
+                        current = sections.get(elem.tag)
+                    continue
+                depth = depth - 1
+                if depth == 2:
+                    if current is not None:
+                        current[elem.tag] = elem.attrib['val']
+                    section.clear()
+                elif depth == 1:
+                    root.clear()
+        finally:
+            rhandle.close()
+        return [repdict, findings]
+
+
+METADATAFIELDS = ['RunTime', 'Hostname', 'UploadAddress', 'IPAddress', 'OS',
+                  'PropertyNumber', 'SystemSerialNo', 'ChassisSerialNo',
+                  'SystemManufacturer', 'ChassisManufacturer', 'UUID',
+                  'MACAddress', 'xmlFileName', 'STONIXversion', 'RuleCount']
+# Stored for reports from clients too old to log their rule count
+NORULECOUNT = '999999'
+METADATAINSERT = """INSERT INTO RunMetaData(RunTime, HostName,
+                UploadAddress, IPAddress, OS, PropertyNumber,
+                SystemSerialNo, ChassisSerialNo, SystemManufacturer,
+                ChassisManufacturer, UUID, MacAddress, xmlFileName, STONIXversion,
+                RuleCount)
+                VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+FINDINGINSERT = """INSERT INTO RunData(MetaDataId, Rule, Finding)
+                VALUES(%s, %s, %s)"""
+# Same tables as stonixdb.sql for SQLite, used for testing and for small
+# installations
+SQLITESCHEMA = ["""CREATE TABLE IF NOT EXISTS RunData (
+                MetaDataId INTEGER NOT NULL,
+                Rule TEXT,
+                Finding TEXT,
+                RowId INTEGER PRIMARY KEY AUTOINCREMENT)""",
+                """CREATE TABLE IF NOT EXISTS RunMetaData (
+                RowId INTEGER PRIMARY KEY AUTOINCREMENT,
+                RunTime TEXT NOT NULL,
+                Hostname TEXT, UploadAddress TEXT, IPAddress TEXT, OS TEXT,
+                PropertyNumber TEXT, SystemSerialNo TEXT,
+                ChassisSerialNo TEXT, SystemManufacturer TEXT,
+                ChassisManufacturer TEXT, UUID TEXT, MACAddress TEXT,
+                xmlFileName TEXT, STONIXversion TEXT, RuleCount TEXT)""",
+                """CREATE INDEX IF NOT EXISTS RunTime
+                ON RunMetaData(RunTime, Hostname, IPAddress)""",
+                """CREATE INDEX IF NOT EXISTS xmlFileName
+                ON RunMetaData(xmlFileName)"""]
+
+
+def parsereportfile(path):
+    '''Parse one report file for the batch importer. Module level so that
+    it can run in a multiprocessing worker.
+
+    @param path: path to the report file
+    @return: tuple - (path, metadata, findings, error). error is None when
+        the report was parsed, otherwise metadata and findings are None.
+    @author: dkennel
+    '''
+    try:
+        metadata, findings = ReportParser().iterparsereport(path)
+    except Exception:
+        return (path, None, None, traceback.format_exc())
+    return (path, metadata, findings, None)
+
 
 class DBhandler(object):
     '''
     The dbhandler class handles the work of managing the db connection and
-    performing the insert
+    performing the insert. Any DB-API 2.0 connection may be handed in; by
+    default the stonix MySQL database is used.
 
     @author: dkennel
+    @change: 2016/10/18 dkennel - bulk finding inserts, lastrowid instead of
+        a lookup by file name, batched commits, any DB-API connection
     '''
-    def __init__(self):
+    def __init__(self, con=None, dbmodule=None, batchsize=1):
         '''
         dbhandler constructor
 
+        @param con: DB-API connection, None to connect to MySQL
+        @param dbmodule: DB-API module con comes from
+        @param batchsize: int - number of runs per transaction
         @author: dkennel
         '''
-        self.con = None
-        try:
-            self.con = mdb.Connect('localhost', 'stonixdb',
-                                   '********', 'stonix')
-        except mdb.Error, err:
-            print "Error %d: %s" % (err.args[0], err.args[1])
-            sys.exit(1)
+        self.con = con
+        self.dbmodule = dbmodule
+        self.batchsize = batchsize
+        self.pending = 0
+        self.loaded = 0
+        if self.con is None:
+            if mdb is None:
+                print "Error: MySQLdb is not installed"
+                sys.exit(1)
+            self.dbmodule = mdb
+            try:
+                self.con = mdb.Connect('localhost', 'stonixdb',
+                                       '********', 'stonix')
+            except mdb.Error, err:
+                print "Error %d: %s" % (err.args[0], err.args[1])
+                sys.exit(1)
+        # The statements are written with MySQLdb's %s placeholders
+        self.placeholder = {'qmark': '?', 'numeric': '?',
+                            'format': '%s'}.get(self.dbmodule.paramstyle,
+                                                '%s')
+
+    def sql(self, statement):
+        '''Return statement with the placeholders of the DB-API module in
+        use.
+
+        @param statement: string - statement using %s placeholders
+        @return: string
+        @author: dkennel
+        '''
+        if self.placeholder == '%s':
+            return statement
+        return statement.replace('%s', self.placeholder)
+
+    def createschema(self, statements=SQLITESCHEMA):
+        '''Create the tables if they do not exist. Only needed for databases
+        that were not set up from stonixdb.sql.
+
+        @param statements: list of strings - DDL statements
+        @author: dkennel
+        '''
+        cur = self.con.cursor()
+        for statement in statements:
+            cur.execute(statement)
+        self.con.commit()
+
+    def isloaded(self, xmlfilename):
+        '''Return True if a report with this file name was already loaded.
+
+        @param xmlfilename: string - report file name
+        @return: bool
+        @author: dkennel
+        '''
+        cur = self.con.cursor()
+        cur.execute(self.sql("SELECT RowId FROM RunMetaData "
+                             "WHERE xmlFileName = %s"), (xmlfilename,))
+        return cur.fetchone() is not None
 
     def loaddata(self, metadata, findings):
         '''
         This is the main worker of the dbhandler. It requires the metadata
-        dictonary and the findings list of tuples.
+        dictonary and the findings dictionary. The run is committed together
+        with the batch it belongs to, see commit. On a database error the
+        uncommitted runs of the batch are rolled back and the error raised.
 
         @param metadata: dict dictionary of metadata elements for the run
-        @param findings: list of tuples containing findings for the run
+        @param findings: dict of findings for the run keyed by rule
+        @return: int - id of the run
         @author: dkennel
         '''
-        try:
-            if 'RuleCount' in metadata:
-                cur = self.con.cursor()
-                cur.execute("""INSERT INTO RunMetaData(RunTime, HostName,
-                UploadAddress, IPAddress, OS, PropertyNumber,
-                SystemSerialNo, ChassisSerialNo, SystemManufacturer,
-                ChassisManufacturer, UUID, MacAddress, xmlFileName, STONIXversion,
-                RuleCount)
-                VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (metadata['RunTime'],
-                 metadata['Hostname'],
-                 metadata['UploadAddress'],
-                 metadata['IPAddress'],
-                 metadata['OS'],
-                 metadata['PropertyNumber'],
-                 metadata['SystemSerialNo'],
-                 metadata['ChassisSerialNo'],
-                 metadata['SystemManufacturer'],
-                 metadata['ChassisManufacturer'],
-                 metadata['UUID'],
-                 metadata['MACAddress'],
-                 metadata['xmlFileName'],
-                 metadata['STONIXversion'],
-                 metadata['RuleCount']))
-    
-                cur.execute("SELECT RowId from RunMetaData WHERE xmlFileName = %s",
-                            metadata['xmlFileName'])
-                row = cur.fetchone()
-                runid = row[0]
-    
-                for key in findings:
-                    # print key
-                    # print findings[key]
-                    cur.execute("""INSERT INTO RunData(MetaDataId, Rule, Finding)
-                    VALUES(%s, %s, %s)""",
-                    (runid,
-                     key,
-                     findings[key]))
+        values = []
+        for field in METADATAFIELDS:
+            if field == 'RuleCount':
+                values.append(metadata.get(field, NORULECOUNT))
             else:
-                cur = self.con.cursor()
-                cur.execute("""INSERT INTO RunMetaData(RunTime, HostName,
-                UploadAddress, IPAddress, OS, PropertyNumber,
-                SystemSerialNo, ChassisSerialNo, SystemManufacturer,
-                ChassisManufacturer, UUID, MacAddress, xmlFileName, STONIXversion,
-                RuleCount)
-                VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (metadata['RunTime'],
-                 metadata['Hostname'],
-                 metadata['UploadAddress'],
-                 metadata['IPAddress'],
-                 metadata['OS'],
-                 metadata['PropertyNumber'],
-                 metadata['SystemSerialNo'],
-                 metadata['ChassisSerialNo'],
-                 metadata['SystemManufacturer'],
-                 metadata['ChassisManufacturer'],
-                 metadata['UUID'],
-                 metadata['MACAddress'],
-                 metadata['xmlFileName'],
-                 metadata['STONIXversion'],
-                 '999999'))
-    
-                cur.execute("SELECT RowId from RunMetaData WHERE xmlFileName = %s",
-                            metadata['xmlFileName'])
-                row = cur.fetchone()
-                runid = row[0]
-    
-                for key in findings:
-                    # print key
-                    # print findings[key]
-                    cur.execute("""INSERT INTO RunData(MetaDataId, Rule, Finding)
-                    VALUES(%s, %s, %s)""",
-                    (runid,
-                     key,
-                     findings[key]))
-
-        except mdb.Error, err:
-            # print "Error %d: %s" % (err.args[0], err.args[1])
-            if self.con:
-                self.con.close()
-            sys.exit(1)
+                values.append(metadata[field])
+        try:
+            cur = self.con.cursor()
+            cur.execute(self.sql(METADATAINSERT), values)
+            runid = cur.lastrowid
+            cur.executemany(self.sql(FINDINGINSERT),
+                            [(runid, rule, finding) for rule, finding in
+                             findings.iteritems()])
+        except self.dbmodule.Error:
+            self.rollback()
+            raise
+        self.loaded = self.loaded + 1
+        self.pending = self.pending + 1
+        if self.pending >= self.batchsize:
+            self.commit()
+        return runid
+
+    def commit(self):
+        '''Commit the runs loaded since the last commit.
+
+        @return: int - number of runs committed
+        @author: dkennel
+        '''
+        self.con.commit()
+        committed = self.pending
+        self.pending = 0
+        return committed
+
+    def rollback(self):
+        '''Discard the runs loaded since the last commit.
+
+        @author: dkennel
+        '''
+        try:
+            self.con.rollback()
+        except self.dbmodule.Error:
+            pass
+        self.pending = 0
 
     def close(self):
         '''Instruct the DBhandler to close the database connection. Attempts
-        to use the DBhandler object after this is called will fail.
+        to use the DBhandler object after this is called will fail. Pending
+        runs are committed first.
 
         @author: dkennel
         '''
         if self.con:
+            if self.pending:
+                self.commit()
             self.con.close()
 
 
-def main():
-    '''
-    Main program loop. Flow is as follows: Instantiate objects and variables.
-    List report files uploaded.
+def getdestdir(root='/var/local/stonix-server/'):
+    '''Return the dated directory processed reports are moved to, creating
+    it if needed.
 
+    @param root: string - base directory
+    @return: string
     @author: dkennel
     '''
-    parser = ReportParser()
-    stonixdb = DBhandler()
     now = time.localtime()
-    destdir = os.path.join('/var/local/stonix-server/', str(now[0]),
-                           str(now[1]), str(now[2]))
+    destdir = os.path.join(root, str(now[0]), str(now[1]), str(now[2]))
     if not os.path.exists(destdir):
         try:
             os.makedirs(destdir)
@@ -233,7 +373,118 @@ def main():
                 pass
             else:
                 raise
+    return destdir
+
+
+def addupload(metadata, reportfile):
+    '''Add the metadata the server knows from the upload itself.
+    results.php names each file after the address it came from.
+
+    @param metadata: dict - metadata of the run
+    @param reportfile: string - report file name
+    @author: dkennel
+    '''
+    metadata['UploadAddress'] = reportfile.split('-')[0]
+    metadata['xmlFileName'] = reportfile
+
+
+def batchimport(reportdir, destdir, stonixdb, workers=None):
+    '''Batch ingestion mode. Reports are parsed by a pool of worker
+    processes and loaded in transactions of stonixdb.batchsize runs. A
+    report is only moved out of reportdir once the transaction holding its
+    run was committed. Reports that can not be parsed or lack metadata are
+    moved aside unloaded. A database error stops the import and leaves the
+    uncommitted reports in reportdir for the next import; reports whose run
+    is already in the database (a MyISAM database keeps the runs of a
+    rolled back batch) are moved without loading them again.
+
+    @param reportdir: string - directory holding the uploaded reports
+    @param destdir: string - directory processed reports are moved to
+    @param stonixdb: DBhandler
+    @param workers: int - parser processes, default one per cpu
+    @return: tuple - (runs loaded, reports that failed)
+    @raise stonixdb.dbmodule.Error: the database failed, nothing was moved
+        for the uncommitted runs
+    @author: dkennel
+    '''
+    paths = [os.path.join(reportdir, reportfile) for reportfile in
+             sorted(os.listdir(reportdir))]
+    pool = multiprocessing.Pool(workers)
+    uncommitted = []
+    loaded = 0
+    failed = 0
+    try:
+        for path, metadata, findings, error in \
+                pool.imap_unordered(parsereportfile, paths, 16):
+            if error is None:
+                addupload(metadata, os.path.basename(path))
+                try:
+                    if stonixdb.isloaded(metadata['xmlFileName']):
+                        print path + ': already loaded'
+                    else:
+                        stonixdb.loaddata(metadata, findings)
+                        loaded = loaded + 1
+                except KeyError, err:
+                    error = 'Missing metadata ' + str(err)
+            if error is not None:
+                print path + ': ' + error
+                failed = failed + 1
+                shutil.move(path, destdir)
+                continue
+            uncommitted.append(path)
+            if stonixdb.pending == 0:
+                for done in uncommitted:
+                    shutil.move(done, destdir)
+                uncommitted = []
+        stonixdb.commit()
+        for done in uncommitted:
+            shutil.move(done, destdir)
+    except stonixdb.dbmodule.Error:
+        # Nothing of the batch may be committed by a later close()
+        stonixdb.rollback()
+        raise
+    finally:
+        pool.terminate()
+        pool.join()
+    return (loaded, failed)
+
+
+def main():
+    '''
+    Main program loop. Flow is as follows: Instantiate objects and variables.
+    List report files uploaded.
+
+    @author: dkennel
+    @change: 2016/10/18 dkennel - added the batch ingestion mode
+    @change: 2016/10/18 dkennel - a database error stops the import and
+        leaves the reports queued, runs already loaded are skipped
+    '''
+    optparser = OptionParser(usage='%prog [options]')
+    optparser.add_option('-b', '--batch', action='store_true', default=False,
+                         help='parse reports in parallel and load them in '
+                         'batches')
+    optparser.add_option('-w', '--workers', type='int', default=None,
+                         help='number of parser processes in batch mode')
+    optparser.add_option('-s', '--batchsize', type='int', default=500,
+                         help='number of runs per transaction in batch mode')
+    options, _ = optparser.parse_args()
     reportdir = '/var/www/html/stonix/results'
+    destdir = getdestdir()
+    if options.batch:
+        stonixdb = DBhandler(batchsize=options.batchsize)
+        start = time.time()
+        try:
+            loaded, failed = batchimport(reportdir, destdir, stonixdb,
+                                         options.workers)
+        except stonixdb.dbmodule.Error, err:
+            print "Error: " + str(err)
+            sys.exit(1)
+        stonixdb.close()
+        print 'Loaded %d runs in %.1fs, %d reports failed' % \
+            (loaded, time.time() - start, failed)
+        return
+    parser = ReportParser()
+    stonixdb = DBhandler()
     reportfiles = os.listdir(reportdir)
     for reportfile in reportfiles:
         repfile = os.path.join(reportdir, reportfile)
@@ -248,13 +499,15 @@ def main():
             print detailedresults
             shutil.move(repfile, destdir)
             continue
-        uploadip = reportfile.split('-')
-        uploadip = uploadip[0]
-        metadata['UploadAddress'] = uploadip
-        metadata['xmlFileName'] = reportfile
+        addupload(metadata, reportfile)
         # print metadata
         try:
-            stonixdb.loaddata(metadata, findings)
+            if not stonixdb.isloaded(reportfile):
+                stonixdb.loaddata(metadata, findings)
+        except stonixdb.dbmodule.Error, err:
+            # Leave the reports queued until the database is fixed
+            print "Error: " + str(err)
+            sys.exit(1)
         except Exception, err:
             print err
             print metadata
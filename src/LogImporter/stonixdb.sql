@@ -34,7 +34,7 @@ CREATE TABLE IF NOT EXISTS `RunData` (
   `Finding` mediumtext COLLATE utf8_unicode_ci,
   `RowId` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
   UNIQUE KEY `RowId` (`RowId`)
-) ENGINE=MyISAM  DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci AUTO_INCREMENT=97 ;
+) ENGINE=InnoDB  DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci AUTO_INCREMENT=97 ;
 
 -- --------------------------------------------------------
 
@@ -61,8 +61,21 @@ CREATE TABLE IF NOT EXISTS `RunMetaData` (
   `RuleCount` varchar(10) DEFAULT NULL,
   PRIMARY KEY (`RowId`),
   UNIQUE KEY `RowId` (`RowId`),
-  KEY `RunTime` (`RunTime`,`Hostname`,`IPAddress`)
-) ENGINE=MyISAM  DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci AUTO_INCREMENT=6 ;
+  KEY `RunTime` (`RunTime`,`Hostname`,`IPAddress`),
+  KEY `xmlFileName` (`xmlFileName`)
+) ENGINE=InnoDB  DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci AUTO_INCREMENT=6 ;
+
+--
+-- Databases created before the xmlFileName index was added are upgraded with
+-- ALTER TABLE `RunMetaData` ADD INDEX `xmlFileName` (`xmlFileName`);
+--
+-- The importers commit the runs in batches and roll a batch back when the
+-- database fails. MyISAM tables ignore the rollback, so databases created
+-- with MyISAM tables are converted to InnoDB with
+-- ALTER TABLE `RunData` ENGINE=InnoDB;
+-- ALTER TABLE `RunMetaData` ENGINE=InnoDB;
+-- Until then the importers skip reports whose run is already loaded.
+--
 
 /*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
 /*!40101 SET CHARACTER_SET_RESULTS=@OLD_CHARACTER_SET_RESULTS */;
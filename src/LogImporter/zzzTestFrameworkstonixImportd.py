@@ -0,0 +1,358 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+Tests for the import daemon. SQLite stands in for the MySQL database.
+
+@author: dkennel
+'''
+import unittest
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from stonixImporter import DBhandler
+from stonixImportd import Checkpoint, ImportDaemon, InotifyWatcher, \
+    PollWatcher
+from zzzTestFrameworkstonixImporter import METADATA, writereport
+
+
+class OverflowWatcher(InotifyWatcher):
+    '''
+    InotifyWatcher whose queue overflows on the first wait.
+    '''
+
+    def __init__(self):
+        self.overflowed = False
+
+    def wait(self, timeout):
+        if not self.overflowed:
+            self.overflowed = True
+            return None
+        time.sleep(timeout)
+        return []
+
+    def close(self):
+        pass
+
+
+class zzzTestFrameworkstonixImportd(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.reportdir = os.path.join(self.tmpdir, 'results')
+        self.destroot = os.path.join(self.tmpdir, 'done')
+        self.incoming = os.path.join(self.tmpdir, 'incoming')
+        for path in [self.reportdir, self.destroot, self.incoming]:
+            os.mkdir(path)
+        self.dbpath = os.path.join(self.tmpdir, 'stonix.db')
+        self.checkpoint = os.path.join(self.tmpdir, 'checkpoint')
+        self.metrics = os.path.join(self.tmpdir, 'metrics')
+        self.connects = 0
+        self.thread = None
+        self.daemon = None
+
+    def tearDown(self):
+        if self.thread is not None:
+            self.daemon.stop()
+            self.thread.join(10)
+        shutil.rmtree(self.tmpdir)
+
+    def connect(self):
+        self.connects = self.connects + 1
+        stonixdb = DBhandler(sqlite3.connect(self.dbpath), sqlite3, 10)
+        stonixdb.createschema()
+        return stonixdb
+
+    def getdaemon(self, watcher=None):
+        return ImportDaemon(self.connect, self.reportdir, self.destroot,
+                            self.checkpoint, self.metrics, batchsize=10,
+                            interval=0.1, watcher=watcher)
+
+    def upload(self, num, settled=True):
+        '''
+        Store a report the way results.php does, by moving it in.
+        '''
+        name = '10.0.0.%d-%d.xml' % (num % 250, num)
+        path = os.path.join(self.incoming, name)
+        metadata = dict(METADATA)
+        metadata['Hostname'] = 'host%d' % num
+        writereport(path, metadata, {'Rule': 'finding %d' % num})
+        if settled:
+            os.utime(path, (time.time() - 60, time.time() - 60))
+        os.rename(path, os.path.join(self.reportdir, name))
+        return name
+
+    def count(self):
+        if not os.path.exists(self.dbpath):
+            return 0
+        con = sqlite3.connect(self.dbpath)
+        try:
+            return con.execute('SELECT COUNT(*) FROM '
+                               'RunMetaData').fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+        finally:
+            con.close()
+
+    def start(self, daemon):
+        self.daemon = daemon
+        self.thread = threading.Thread(target=daemon.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def waitfor(self, count, timeout=10):
+        end = time.time() + timeout
+        while time.time() < end:
+            if self.daemon.loaded >= count:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def testInotify(self):
+        try:
+            watcher = InotifyWatcher(self.reportdir)
+        except OSError:
+            self.skipTest('inotify is not available')
+        self.start(self.getdaemon(watcher))
+        time.sleep(0.2)
+        names = [self.upload(num, settled=False) for num in range(3)]
+        self.failUnless(self.waitfor(3), self.daemon.getmetrics())
+        self.failUnlessEqual(self.count(), 3)
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+        moved = []
+        for dirpath, _, filenames in os.walk(self.destroot):
+            moved.extend(filenames)
+        self.failUnlessEqual(sorted(moved), sorted(names))
+        self.failUnlessEqual(self.connects, 1)
+
+    def testPolling(self):
+        self.start(self.getdaemon(PollWatcher(0.1)))
+        for num in range(25):
+            self.upload(num)
+        self.failUnless(self.waitfor(25), self.daemon.getmetrics())
+        self.failUnlessEqual(self.count(), 25)
+        self.failUnlessEqual(self.connects, 1)
+
+    def testUnsettledSkipped(self):
+        daemon = self.getdaemon(PollWatcher(0.1))
+        self.upload(1, settled=False)
+        daemon.scan()
+        self.failUnlessEqual(len(daemon.queue), 0)
+        daemon.scan(settle=0)
+        self.failUnlessEqual(len(daemon.queue), 1)
+
+    def testBacklogAndMetrics(self):
+        for num in range(30):
+            self.upload(num)
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=1)
+        self.failUnlessEqual(self.count(), 30)
+        metrics = json.load(open(self.metrics))
+        self.failUnlessEqual(metrics['loaded'], 30)
+        self.failUnlessEqual(metrics['backlog'], 0)
+        self.failUnless(metrics['rate'] > 0)
+
+    def testResumeAfterCrash(self):
+        # A crash after committing but before the reports were moved
+        names = [self.upload(num) for num in range(3)]
+        stonixdb = self.connect()
+        for name in names[:2]:
+            metadata = dict(METADATA)
+            metadata['UploadAddress'] = '10.0.0.1'
+            metadata['xmlFileName'] = name
+            stonixdb.loaddata(metadata, {})
+        stonixdb.close()
+        checkpoint = Checkpoint(self.checkpoint)
+        checkpoint.record(names[:2])
+        checkpoint.close()
+        # The last record was cut short by the crash
+        open(self.checkpoint, 'a').write(names[2][:5])
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=1)
+        self.failUnlessEqual(self.count(), 3)
+        self.failUnlessEqual(daemon.loaded, 1)
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+        # Only reports still in the results directory are remembered
+        self.failUnlessEqual(Checkpoint(self.checkpoint).names,
+                             set([names[2]]))
+
+    def testCrashBeforeCheckpoint(self):
+        # A crash after the commit but before the checkpoint was written
+        names = [self.upload(num) for num in range(3)]
+        stonixdb = self.connect()
+        for name in names[:2]:
+            metadata = dict(METADATA)
+            metadata['UploadAddress'] = '10.0.0.1'
+            metadata['xmlFileName'] = name
+            stonixdb.loaddata(metadata, {})
+        stonixdb.close()
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=1)
+        self.failUnlessEqual(self.count(), 3)
+        self.failUnlessEqual((daemon.loaded, daemon.failed), (1, 0))
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+
+    def testSchemaErrorKeepsReports(self):
+        names = [self.upload(num) for num in range(3)]
+        original = self.connect
+
+        def connect():
+            stonixdb = original()
+            stonixdb.con.execute('DROP TABLE RunData')
+            return stonixdb
+        self.connect = connect
+        self.start(self.getdaemon(PollWatcher(0.1)))
+        time.sleep(1)
+        self.daemon.stop()
+        self.thread.join(10)
+        self.thread = None
+        self.failUnless(self.connects > 1)
+        self.failUnlessEqual((self.daemon.loaded, self.daemon.failed),
+                             (0, 0))
+        self.failUnlessEqual(sorted(os.listdir(self.reportdir)),
+                             sorted(names))
+        self.failUnlessEqual(self.count(), 0)
+        # Once the schema is repaired the reports are loaded
+        self.connect = original
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=1)
+        self.failUnlessEqual(daemon.loaded, 3)
+        self.failUnlessEqual(self.count(), 3)
+
+    def testReconnect(self):
+        for num in range(5):
+            self.upload(num)
+        original = self.connect
+
+        def connect():
+            stonixdb = original()
+            if self.connects == 1:
+                loaddata = stonixdb.loaddata
+
+                def failing(metadata, findings):
+                    if stonixdb.loaded == 2:
+                        stonixdb.rollback()
+                        raise sqlite3.OperationalError('server has gone away')
+                    return loaddata(metadata, findings)
+                stonixdb.loaddata = failing
+            return stonixdb
+        self.connect = connect
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=1)
+        self.failUnlessEqual(self.connects, 2)
+        self.failUnlessEqual(self.count(), 5)
+        self.failUnlessEqual(daemon.loaded, 5)
+
+    def failcommits(self, count):
+        '''
+        Make the first count commits fail as if the connection was lost.
+        '''
+        original = self.connect
+        failures = [count]
+
+        def connect():
+            stonixdb = original()
+            commit = stonixdb.commit
+
+            def failing():
+                if failures[0] > 0:
+                    failures[0] = failures[0] - 1
+                    raise sqlite3.OperationalError('server has gone away')
+                return commit()
+            stonixdb.commit = failing
+            return stonixdb
+        self.connect = connect
+
+    def testCommitFails(self):
+        names = [self.upload(num) for num in range(5)]
+        self.failcommits(1)
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=2)
+        self.failUnlessEqual(self.connects, 2)
+        self.failUnlessEqual(self.count(), 5)
+        self.failUnlessEqual((daemon.loaded, daemon.failed), (5, 0))
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+        self.failUnlessEqual(Checkpoint(self.checkpoint).names, set(names))
+
+    def testCommitFailsOnShutdown(self):
+        names = [self.upload(num) for num in range(3)]
+        self.failcommits(1)
+        original = self.connect
+
+        def connect():
+            stonixdb = original()
+            loaddata = stonixdb.loaddata
+
+            def interrupted(metadata, findings):
+                if stonixdb.loaded == 2:
+                    raise KeyboardInterrupt()
+                return loaddata(metadata, findings)
+            stonixdb.loaddata = interrupted
+            return stonixdb
+        self.connect = connect
+        daemon = self.getdaemon(PollWatcher(0.1))
+        self.failUnlessRaises(KeyboardInterrupt, daemon.run, 1)
+        self.failUnless(daemon.checkpoint.handle is None)
+        self.failUnlessEqual(daemon.loaded, 0)
+        self.failUnlessEqual(self.count(), 0)
+        self.failUnlessEqual(sorted(os.listdir(self.reportdir)),
+                             sorted(names))
+
+    def testOverflowRescan(self):
+        # Closed just before the queue overflowed, so its event was lost
+        # and it is too recent for the scan made for the overflow
+        name = self.upload(1, settled=False)
+        path = os.path.join(self.reportdir, name)
+        os.utime(path, (time.time() - 1.5, time.time() - 1.5))
+        daemon = self.getdaemon(OverflowWatcher())
+        daemon.running = True
+        daemon.runonce(0.1)
+        self.failUnlessEqual(daemon.loaded, 0)
+        end = time.time() + 10
+        while daemon.loaded == 0 and time.time() < end:
+            daemon.runonce(0.1)
+        self.failUnlessEqual(daemon.loaded, 1)
+        self.failUnless(daemon.rescanat is None)
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+
+    def testBadReport(self):
+        self.upload(1)
+        whandle = open(os.path.join(self.reportdir, '10.0.0.2-2.xml'), 'w')
+        whandle.write('<run>')
+        whandle.close()
+        os.utime(os.path.join(self.reportdir, '10.0.0.2-2.xml'),
+                 (time.time() - 60, time.time() - 60))
+        daemon = self.getdaemon(PollWatcher(0.1))
+        daemon.run(iterations=1)
+        self.failUnlessEqual((daemon.loaded, daemon.failed), (1, 1))
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+
+if __name__ == "__main__":
+    unittest.main()
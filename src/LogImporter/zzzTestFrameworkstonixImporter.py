@@ -0,0 +1,217 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+Tests for the report importer. SQLite stands in for the MySQL database.
+
+@author: dkennel
+'''
+import unittest
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import xml.etree.ElementTree as ET
+from stonixImporter import DBhandler, ReportParser, NORULECOUNT, \
+    addupload, batchimport
+
+METADATA = {'RunTime': '2016-10-18 10:00:00', 'Hostname': 'host.example.com',
+            'IPAddress': '10.0.0.1', 'OS': 'Red Hat Enterprise Linux 7.2',
+            'PropertyNumber': '123456', 'SystemSerialNo': 'ABC',
+            'ChassisSerialNo': 'DEF', 'SystemManufacturer': 'Dell',
+            'ChassisManufacturer': 'Dell', 'UUID': 'abcd-ef',
+            'MACAddress': '00:11:22:33:44:55', 'STONIXversion': '0.9.4',
+            'RuleCount': '2'}
+
+
+def writereport(path, metadata, findings, compress=False):
+    root = ET.Element('run')
+    meta = ET.SubElement(root, 'metadata')
+    for tag, value in sorted(metadata.items()):
+        ET.SubElement(meta, tag, val=value)
+    section = ET.SubElement(root, 'findings')
+    for tag, value in sorted(findings.items()):
+        ET.SubElement(section, tag, val=value)
+    if compress:
+        whandle = gzip.open(path, 'wb')
+    else:
+        whandle = open(path, 'wb')
+    ET.ElementTree(root).write(whandle)
+    whandle.close()
+
+
+class zzzTestFrameworkstonixImporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.reportdir = os.path.join(self.tmpdir, 'results')
+        self.destdir = os.path.join(self.tmpdir, 'done')
+        os.mkdir(self.reportdir)
+        os.mkdir(self.destdir)
+        self.dbpath = os.path.join(self.tmpdir, 'stonix.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def getdb(self, batchsize=1):
+        stonixdb = DBhandler(sqlite3.connect(self.dbpath), sqlite3,
+                             batchsize)
+        stonixdb.createschema()
+        return stonixdb
+
+    def count(self, table):
+        con = sqlite3.connect(self.dbpath)
+        try:
+            return con.execute('SELECT COUNT(*) FROM ' + table).fetchone()[0]
+        finally:
+            con.close()
+
+    def makereports(self, count, findings=5, start=0):
+        names = []
+        for num in range(start, start + count):
+            name = '10.0.%d.%d-%d.xml' % (num / 250, num % 250, num)
+            metadata = dict(METADATA)
+            metadata['Hostname'] = 'host%d.example.com' % num
+            writereport(os.path.join(self.reportdir, name), metadata,
+                        dict([('Rule%d' % rule, 'Finding %d for %d' %
+                               (rule, num)) for rule in range(findings)]),
+                        compress=num % 2 == 1)
+            names.append(name)
+        return names
+
+    def testLoadData(self):
+        stonixdb = self.getdb()
+        metadata = dict(METADATA)
+        addupload(metadata, '10.0.0.9-1234.xml')
+        self.failUnlessEqual(metadata['UploadAddress'], '10.0.0.9')
+        runid = stonixdb.loaddata(metadata, {'SecureSSH': 'compliant',
+                                             'MinimizeServices': 'not'})
+        rows = stonixdb.con.execute('SELECT MetaDataId, Rule, Finding FROM '
+                                    'RunData ORDER BY Rule').fetchall()
+        self.failUnlessEqual(rows, [(runid, 'MinimizeServices', 'not'),
+                                    (runid, 'SecureSSH', 'compliant')])
+        self.failUnless(stonixdb.isloaded('10.0.0.9-1234.xml'))
+        self.failIf(stonixdb.isloaded('10.0.0.9-1235.xml'))
+        stonixdb.close()
+
+    def testNoRuleCount(self):
+        stonixdb = self.getdb()
+        metadata = dict(METADATA)
+        del metadata['RuleCount']
+        addupload(metadata, '10.0.0.9-1234.xml')
+        stonixdb.loaddata(metadata, {})
+        row = stonixdb.con.execute('SELECT RuleCount FROM '
+                                   'RunMetaData').fetchone()
+        self.failUnlessEqual(row[0], NORULECOUNT)
+        stonixdb.close()
+
+    def testBatchedCommits(self):
+        stonixdb = self.getdb(batchsize=3)
+        for num in range(4):
+            metadata = dict(METADATA)
+            addupload(metadata, '10.0.0.9-%d.xml' % num)
+            stonixdb.loaddata(metadata, {'Rule': 'finding'})
+        # Another connection only sees the committed batch
+        self.failUnlessEqual(self.count('RunMetaData'), 3)
+        stonixdb.close()
+        self.failUnlessEqual(self.count('RunMetaData'), 4)
+
+    def testIterparse(self):
+        for compress in [False, True]:
+            path = os.path.join(self.tmpdir, 'report.xml')
+            writereport(path, METADATA, {'Rule1': 'a & b', 'Rule2': 'c'},
+                        compress)
+            parser = ReportParser()
+            parser.openreport(path)
+            self.failUnlessEqual(ReportParser().iterparsereport(path),
+                                 parser.parsereport())
+            self.failUnlessEqual(parser.parsereport(),
+                                 [METADATA, {'Rule1': 'a & b',
+                                             'Rule2': 'c'}])
+
+    def testBatchImport(self):
+        names = self.makereports(120)
+        whandle = open(os.path.join(self.reportdir, '10.0.9.9-1.xml'), 'w')
+        whandle.write('<run><metadata>')
+        whandle.close()
+        stonixdb = self.getdb(batchsize=50)
+        loaded, failed = batchimport(self.reportdir, self.destdir, stonixdb,
+                                     2)
+        stonixdb.close()
+        self.failUnlessEqual((loaded, failed), (120, 1))
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+        self.failUnlessEqual(len(os.listdir(self.destdir)), 121)
+        self.failUnlessEqual(self.count('RunMetaData'), 120)
+        self.failUnlessEqual(self.count('RunData'), 600)
+        stonixdb = self.getdb()
+        for name in names:
+            self.failUnless(stonixdb.isloaded(name))
+        stonixdb.close()
+
+    def testDatabaseErrorStopsImport(self):
+        names = self.makereports(3)
+        # A report missing metadata, sorted after the others
+        writereport(os.path.join(self.reportdir, '10.0.9.9-9.xml'), {}, {})
+        stonixdb = self.getdb(batchsize=10)
+        stonixdb.con.execute('DROP TABLE RunData')
+        self.failUnlessRaises(sqlite3.Error, batchimport, self.reportdir,
+                              self.destdir, stonixdb, 1)
+        self.failUnlessEqual(stonixdb.pending, 0)
+        stonixdb.close()
+        self.failUnlessEqual(self.count('RunMetaData'), 0)
+        # Every report waits for the next import
+        self.failUnlessEqual(sorted(os.listdir(self.reportdir)),
+                             names + ['10.0.9.9-9.xml'])
+        self.failUnlessEqual(os.listdir(self.destdir), [])
+        stonixdb = self.getdb(batchsize=10)
+        loaded, failed = batchimport(self.reportdir, self.destdir, stonixdb,
+                                     1)
+        stonixdb.close()
+        self.failUnlessEqual((loaded, failed), (3, 1))
+        self.failUnlessEqual(self.count('RunMetaData'), 3)
+        self.failUnlessEqual(os.listdir(self.destdir).count('10.0.9.9-9.xml'),
+                             1)
+
+    def testAlreadyLoadedSkipped(self):
+        names = self.makereports(4)
+        # As a MyISAM database keeps the runs of a rolled back batch
+        stonixdb = self.getdb()
+        parser = ReportParser()
+        for name in names[:2]:
+            metadata, findings = parser.iterparsereport(
+                os.path.join(self.reportdir, name))
+            addupload(metadata, name)
+            stonixdb.loaddata(metadata, findings)
+        loaded, failed = batchimport(self.reportdir, self.destdir, stonixdb,
+                                     1)
+        stonixdb.close()
+        self.failUnlessEqual((loaded, failed), (2, 0))
+        self.failUnlessEqual(self.count('RunMetaData'), 4)
+        self.failUnlessEqual(os.listdir(self.reportdir), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -90,6 +90,7 @@ The following options control the running of the script:
  -h  --help  or no arguments will display this help message and exit.
  -v  --verbose print verbose information about what stor is doing.
  -R  --rule run a single stonix rule. Requires -f, -X or -r.
+ -j  --jobs  Number of parallel safe rules to run at the same time.
 
 WARNING! If run with the -f flag THIS PROGAM WILL MODIFY
 SYSTEM SETTINGS!
@@ -133,6 +134,9 @@ from stonix_resources.StateChgLogger import StateChgLogger
 from stonix_resources.logdispatcher import LogPriority, LogDispatcher
 from stonix_resources.program_arguments import ProgramArguments
 from stonix_resources.cli import Cli
+from stonix_resources.ruleexecutor import RuleExecutor
+from stonix_resources.rulemanifest import RuleManifest
+from stonix_resources.CommandHelper import getcommandcache
 try:
     from stonix_resources.gui import GUI
     from PyQt4 import QtCore, QtGui
@@ -155,6 +159,10 @@ class Controller(Observable):
         self.pcf = False
         self.pcs = False
         self.list = False
+        self.jobs = 1
+        self.executor = None
+        self.manifest = None
+        self.commandcache = getcommandcache()
         if not self.safetycheck():
             self.logger.log(LogPriority.CRITICAL,
                             ['SafetyCheck',
@@ -233,6 +241,7 @@ class Controller(Observable):
         self.logger.log(LogPriority.DEBUG,
                         'Rules Processed in ' + str(etime))
         self.installedrules = self.findapplicable(allrules)
+        self.manifest.savecache()
         etime = time.time() - starttime
         self.logger.log(LogPriority.DEBUG,
                         'Rules Applicable in ' + str(etime))
@@ -265,14 +274,15 @@ class Controller(Observable):
     def getrules(self, config, environ):
         """
         Private method to process the stonix rules file to populate the rules.
-        @return: List of instantiated rule objects
+        Applicability is decided from the rule manifest before any rule module
+        is imported so that only the rules that can run on this platform are
+        imported and instantiated. When a single rule has been requested with
+        -m only that rule is imported.
 
         @return: list : a list of instantiated rule classes
         @author: D. Kennel
         """
         instruleclasses = []
-        validrulefiles = []
-        initlist = ['__init__.py', '__init__.pyc', '__init__.pyo']
 
         stonixPath = self.environ.get_resources_path()
         self.logger.log(LogPriority.DEBUG,
@@ -288,33 +298,24 @@ class Controller(Observable):
             self.logger.log(LogPriority.DEBUG,
                             ['Sys Path Element:', str(path)])
 
-        rulefiles = os.listdir(str(rulesPath))
-        # print str(rulefiles)
-
-        for rfile in rulefiles:
-            if rfile in initlist:
-                continue
-            else:
-                validrulefiles.append(rfile)
-        self.logger.log(LogPriority.DEBUG,
-                        ['validrulefiles:', str(validrulefiles)])
-
-        # This is a list comprehension to build a list of module names to
-        # import based on the names of valid rule files from stonix/rules
-        # destination list = [ *transform* *source* *filter* ]
-        modulenames = [mod.replace('.py', '') for mod in validrulefiles
-                        if re.search("\.py$", mod)]
-        self.logger.log(LogPriority.DEBUG,
-                        ['Module names:', str(modulenames)])
+        self.manifest = RuleManifest(str(rulesPath), self.logger)
 
         # The output of this section is a list of valid, fully qualified,
-        # rule class names.
+        # rule class names for the rules that may apply to this host.
         classnames = []
-        for module in modulenames:
-            module = module.split("/")[-1]
-            # print module
+        for entry in self.manifest.getentries():
+            module = str(entry['module'])
+            if self.runrule and \
+               not self.manifest.matchesname(entry, self.runrule):
+                continue
+            if not self.manifest.isapplicable(entry, environ):
+                self.logger.log(LogPriority.DEBUG,
+                                'Manifest: skipping ' + module)
+                continue
             classname = 'stonix_resources.rules.' + module + '.' + module
             classnames.append(classname)
+        self.logger.log(LogPriority.DEBUG,
+                        ['Class names:', str(classnames)])
 
         # This is odd and requires detailed comments. This block imports the
         # modules then recurses down, instantiates the main rule class and
@@ -448,103 +449,216 @@ class Controller(Observable):
                 rulename = rule.getrulename()
         return rulename
 
-    def hardensystem(self):
+    def hardensystem(self, callback=None):
         """
-        Call all rules in fix(harden) mode
+        Call all rules in fix(harden) mode. When more than one job has been
+        requested the rules are handed to a RuleExecutor; completion is still
+        reported to observers in rule order.
 
+        @param callback: optional callable taking the rule object, called in
+            rule order after each rule completes.
         @return void :
         @author D. Kennel
         """
         self.numrulesrunning = self.numexecutingrules
         self.numrulescomplete = 0
+        if self.jobs > 1:
+            self.__runparallel(self.__hardenrule, self.__rulecomplete,
+                               callback)
+            return
         for rule in self.installedrules:
             self.currulenum = rule.getrulenum()
             self.currulename = rule.getrulename()
-            try:
-                starttime = time.time()
-                rule.report()
-                if not rule.getrulesuccess():
-                    self.logger.log(LogPriority.ERROR,
-                                    [rule.getrulename(),
-                                     rule.getdetailedresults()])
-                elif not rule.iscompliant():
-                    rule.fix()
-                    if rule.getrulesuccess():
-                        rule.report()
-                        if not rule.getrulesuccess():
-                            self.logger.log(LogPriority.ERROR,
-                                            [rule.getrulename(),
-                                             rule.getdetailedresults()])
-                        elif not rule.iscompliant():
-                            self.logger.log(LogPriority.WARNING,
-                                            [rule.getrulename(),
-                                            rule.getdetailedresults()])
-                        else:
-                            self.logger.log(LogPriority.INFO,
-                                            [rule.getrulename(),
-                                            rule.getdetailedresults()])
-                else:
-                    self.logger.log(LogPriority.INFO,
-                                    [rule.getrulename(),
-                                    rule.getdetailedresults()])
-                etime = time.time() - starttime
-                self.logger.log(LogPriority.DEBUG,
-                                [rule.getrulename(),
-                                'Elapsed Time: ' + str(etime)])
-            except (KeyboardInterrupt, SystemExit):
-            # User initiated exit
-                raise
-            except Exception:
-                trace = traceback.format_exc()
-                self.logger.log(LogPriority.ERROR, [rule.getrulename(),
-                                "Controller caught rule death: "
-                                + trace])
-            self.numrulescomplete = self.numrulescomplete + 1
-            self.set_dirty()
-            self.notify_check()
+            self.__hardenrule(rule)
+            self.__rulecomplete(rule)
+            if callback is not None:
+                callback(rule)
 
-    def auditsystem(self):
+    def __hardenrule(self, rule):
         """
-        Call all rules in audit(report) mode
+        Private method to run a single rule's report, fix and confirming
+        report as part of a full system harden.
 
+        @param rule: rule object
         @return void :
         @author D. Kennel
         """
-        self.numrulesrunning = self.numexecutingrules
-        self.numrulescomplete = 0
-        for rule in self.installedrules:
-            self.currulenum = rule.getrulenum()
-            self.currulename = rule.getrulename()
-            try:
-                starttime = time.time()
-                rule.report()
-                etime = time.time() - starttime
-                self.logger.log(LogPriority.DEBUG,
-                                [rule.getrulename(),
-                                'Elapsed Time: ' + str(etime)])
-            except (KeyboardInterrupt, SystemExit):
-                # User initiated exit
-                raise
-            except Exception:
-                trace = traceback.format_exc()
-                self.logger.log(LogPriority.ERROR, [rule.getrulename(),
-                                "Controller caught rule death: "
-                                + trace])
-            self.numrulescomplete = self.numrulescomplete + 1
+        try:
+            starttime = time.time()
+            rule.report()
             if not rule.getrulesuccess():
                 self.logger.log(LogPriority.ERROR,
                                 [rule.getrulename(),
-                                rule.getdetailedresults()])
-            if not rule.iscompliant():
-                self.logger.log(LogPriority.WARNING,
-                                [rule.getrulename(),
-                                rule.getdetailedresults()])
+                                 rule.getdetailedresults()])
+            elif not rule.iscompliant():
+                with self.commandcache.fixing(), self.statechglogger.batch():
+                    rule.fix()
+                if rule.getrulesuccess():
+                    rule.report()
+                    if not rule.getrulesuccess():
+                        self.logger.log(LogPriority.ERROR,
+                                        [rule.getrulename(),
+                                         rule.getdetailedresults()])
+                    elif not rule.iscompliant():
+                        self.logger.log(LogPriority.WARNING,
+                                        [rule.getrulename(),
+                                        rule.getdetailedresults()])
+                    else:
+                        self.logger.log(LogPriority.INFO,
+                                        [rule.getrulename(),
+                                        rule.getdetailedresults()])
             else:
                 self.logger.log(LogPriority.INFO,
                                 [rule.getrulename(),
                                 rule.getdetailedresults()])
-            self.set_dirty()
-            self.notify_check()
+            etime = time.time() - starttime
+            self.logger.log(LogPriority.DEBUG,
+                            [rule.getrulename(),
+                            'Elapsed Time: ' + str(etime)])
+        except (KeyboardInterrupt, SystemExit):
+        # User initiated exit
+            raise
+        except Exception:
+            trace = traceback.format_exc()
+            self.logger.log(LogPriority.ERROR, [rule.getrulename(),
+                            "Controller caught rule death: "
+                            + trace])
+
+    def __rulecomplete(self, rule):
+        """
+        Private method to record the completion of a rule during a full
+        system run and notify the observers.
+
+        @param rule: rule object
+        @return void :
+        @author D. Kennel
+        """
+        self.currulenum = rule.getrulenum()
+        self.currulename = rule.getrulename()
+        self.numrulescomplete = self.numrulescomplete + 1
+        self.set_dirty()
+        self.notify_check()
+
+    def auditsystem(self, callback=None):
+        """
+        Call all rules in audit(report) mode. When more than one job has been
+        requested the rules are handed to a RuleExecutor; results are still
+        logged and reported to observers in rule order.
+
+        @param callback: optional callable taking the rule object, called in
+            rule order after each rule completes.
+        @return void :
+        @author D. Kennel
+        """
+        self.numrulesrunning = self.numexecutingrules
+        self.numrulescomplete = 0
+        if self.jobs > 1:
+            self.__runparallel(self.__auditrule, self.__auditcomplete,
+                               callback, reportonly=True)
+            return
+        for rule in self.installedrules:
+            self.currulenum = rule.getrulenum()
+            self.currulename = rule.getrulename()
+            self.__auditrule(rule)
+            self.__auditcomplete(rule)
+            if callback is not None:
+                callback(rule)
+
+    def __auditrule(self, rule):
+        """
+        Private method to run a single rule's report as part of a full system
+        audit.
+
+        @param rule: rule object
+        @return void :
+        @author D. Kennel
+        """
+        try:
+            starttime = time.time()
+            rule.report()
+            etime = time.time() - starttime
+            self.logger.log(LogPriority.DEBUG,
+                            [rule.getrulename(),
+                            'Elapsed Time: ' + str(etime)])
+        except (KeyboardInterrupt, SystemExit):
+            # User initiated exit
+            raise
+        except Exception:
+            trace = traceback.format_exc()
+            self.logger.log(LogPriority.ERROR, [rule.getrulename(),
+                            "Controller caught rule death: "
+                            + trace])
+
+    def __auditcomplete(self, rule):
+        """
+        Private method to log the results of a rule run during a full system
+        audit and notify the observers.
+
+        @param rule: rule object
+        @return void :
+        @author D. Kennel
+        """
+        if not rule.getrulesuccess():
+            self.logger.log(LogPriority.ERROR,
+                            [rule.getrulename(),
+                            rule.getdetailedresults()])
+        if not rule.iscompliant():
+            self.logger.log(LogPriority.WARNING,
+                            [rule.getrulename(),
+                            rule.getdetailedresults()])
+        else:
+            self.logger.log(LogPriority.INFO,
+                            [rule.getrulename(),
+                            rule.getdetailedresults()])
+        self.__rulecomplete(rule)
+
+    def __runparallel(self, action, complete, callback, reportonly=False):
+        """
+        Private method to run every installed rule through the RuleExecutor.
+        The action is run on the worker threads while the completion handling
+        runs on this thread in rule order.
+
+        @param action: callable taking a rule, run concurrently
+        @param complete: callable taking a rule, run in rule order
+        @param callback: optional callable taking a rule, run after complete
+        @param reportonly: bool - the action only runs reports
+        @return void :
+        @author D. Kennel
+        """
+        def completed(rule):
+            complete(rule)
+            if callback is not None:
+                callback(rule)
+
+        self.logger.log(LogPriority.DEBUG,
+                        'Running rules with ' + str(self.jobs) + ' jobs')
+        self.executor = RuleExecutor(self.logger, self.jobs)
+        try:
+            self.executor.run(self.installedrules, action, completed,
+                              reportonly)
+        finally:
+            self.executor = None
+
+    def stoprun(self):
+        """
+        Stop dispatching further rules during a parallel full system run.
+        Rules that are already running are allowed to finish.
+
+        @return void :
+        @author D. Kennel
+        """
+        if self.executor is not None:
+            self.executor.stop()
+
+    def getjobs(self):
+        """
+        Return the number of rules that may run at the same time during a
+        full system run.
+
+        @return int :
+        @author D. Kennel
+        """
+        return self.jobs
 
     def runruleharden(self, ruleid):
         """
@@ -588,7 +702,9 @@ class Controller(Observable):
                         self.numrulescomplete = self.numrulescomplete + 1
                     elif not rule.iscompliant():
                         try:
-                            rule.fix()
+                            with self.commandcache.fixing(), \
+                                    self.statechglogger.batch():
+                                rule.fix()
                         except (KeyboardInterrupt, SystemExit):
                             # User initiated exit
                             raise
@@ -702,7 +818,8 @@ class Controller(Observable):
             self.currulenum = rule.getrulenum()
             self.currulename = rule.getrulename()
             try:
-                rule.undo()
+                with self.commandcache.fixing(), self.statechglogger.batch():
+                    rule.undo()
             except (KeyboardInterrupt, SystemExit):
                 # User initiated exit
                 raise
@@ -744,7 +861,9 @@ class Controller(Observable):
                                     [rule.getrulename(), message])
                 else:
                     try:
-                        rule.undo()
+                        with self.commandcache.fixing(), \
+                                self.statechglogger.batch():
+                            rule.undo()
                     except (KeyboardInterrupt, SystemExit):
                         # User initiated exit
                         raise
@@ -798,7 +917,9 @@ class Controller(Observable):
                 self.currulenum = rule.getrulenum()
                 self.currulename = rule.getrulename()
                 try:
-                    rule.fix()
+                    with self.commandcache.fixing(), \
+                            self.statechglogger.batch():
+                        rule.fix()
                 except (KeyboardInterrupt, SystemExit):
                     # User initiated exit
                     raise
@@ -1076,12 +1197,15 @@ ABORTING EXECUTION!"""
         """
         self.environ.setverbosemode(self.prog_args.get_verbose())
         self.environ.setdebugmode(self.prog_args.get_debug())
+        if self.prog_args.get_refreshfacts():
+            self.environ.refreshfacts()
         self.fix = self.prog_args.get_fix()
         self.report = self.prog_args.get_report()
         self.undo = self.prog_args.get_rollback()
         self.environ.setinstallmode(self.prog_args.get_install())
         self.pcf = self.prog_args.getPrintConfigFull()
         self.pcs = self.prog_args.getPrintConfigSimple()
+        self.jobs = self.prog_args.get_jobs()
 
         if self.prog_args.get_update():
             # update(debug)
@@ -1115,6 +1239,7 @@ ABORTING EXECUTION!"""
         self.fix = False
         self.report = False
         self.undo = False
+        self.jobs = 1
         self.environ.setinstallmode(False)
         self.runrule = ""
         self.mode = 'test'
@@ -1217,6 +1342,12 @@ ABORTING EXECUTION!"""
                 self.logger.log(LogPriority.INFO,
                                 'No action specified. Please pass the -r, -f, or -u flag')
                 self.logger.closereports()
+        hits, misses, invalidations = self.commandcache.getstats()
+        self.logger.log(LogPriority.DEBUG,
+                        ['Controller.__clirun',
+                         'Command cache hits: ' + str(hits) + ' misses: ' +
+                         str(misses) + ' invalidations: ' +
+                         str(invalidations)])
         self.releaselock()
 
 if __name__ == '__main__':
@@ -38,6 +38,7 @@ STONIX: The Security Tool for *NIX. STONIX is designed to harden and configure U
 %prep
 %setup -q
 %build
+python stonix_resources/rulemanifest.py stonix_resources/rules
 %install
 mkdir -p $RPM_BUILD_ROOT/etc
 mkdir -p $RPM_BUILD_ROOT/usr/bin
@@ -49,6 +50,7 @@ mkdir -p $RPM_BUILD_ROOT/usr/share/man/man8
 
 /usr/bin/install $RPM_BUILD_DIR/%{name}-%{version}/stonix_resources/*.py $RPM_BUILD_ROOT/usr/bin/stonix_resources/
 /usr/bin/install $RPM_BUILD_DIR/%{name}-%{version}/stonix_resources/rules/*.py $RPM_BUILD_ROOT/usr/bin/stonix_resources/rules/
+/usr/bin/install -m 0644 $RPM_BUILD_DIR/%{name}-%{version}/stonix_resources/rules/rulemanifest.json $RPM_BUILD_ROOT/usr/bin/stonix_resources/rules/
 /usr/bin/install $RPM_BUILD_DIR/%{name}-%{version}/stonix_resources/gfx/* $RPM_BUILD_ROOT/usr/bin/stonix_resources/gfx/
 /usr/bin/install $RPM_BUILD_DIR/%{name}-%{version}/stonix_resources/files/* $RPM_BUILD_ROOT/usr/bin/stonix_resources/files/
 /usr/bin/install $RPM_BUILD_DIR/%{name}-%{version}/usr/share/man/man8/stonix.8 $RPM_BUILD_ROOT/usr/share/man/man8/
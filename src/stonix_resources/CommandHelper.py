@@ -31,14 +31,173 @@
 @change: 04/15/2014 ekkehard enhance documentation & pep8 compliance
 @change: 04/15/2014 ekkehard made logging more intelligent
 @change: 10/20/2014 ekkehard fix pep8 viloation
+@change: 2016/10/18 dkennel added the per run CommandCache for read only
+commands
 '''
+import os
 import re
 import subprocess
+import threading
 import traceback
 import types
+from contextlib import contextmanager
 from logdispatcher import LogPriority
 
 
+class CommandCache(object):
+    '''
+    Per run memo of the results of read only commands. Many rules run the
+    same queries (rpm -q, systemctl is-enabled, defaults read, ...); a
+    command executed with executeCommand(cmd, readonly=True) is only run
+    once until something may have changed the system.
+
+    The cache is emptied whenever a rule's fix or undo runs (see fixing()),
+    a command that is not flagged read only runs while a fix is in progress
+    or a file is written through stonixutilityfunctions.writeFile. While a
+    fix is in progress read only commands are neither served from nor
+    stored in the cache.
+
+    @author: dkennel
+    '''
+
+    def __init__(self):
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0
+        self.fixdepth = 0
+        self.lock = threading.Lock()
+
+    def makekey(self, command, shell):
+        '''
+        Return the cache key for a command run with the current environment.
+
+        @param command: string or list - the command
+        @param shell: bool - whether the command runs through the shell
+        @return: tuple
+        @author: dkennel
+        '''
+        if isinstance(command, list):
+            command = tuple(command)
+        return (command, shell, tuple(sorted(os.environ.items())))
+
+    def get(self, key):
+        '''
+        Return the cached (returncode, stdout, stderr) for key or None.
+
+        @param key: tuple from makekey
+        @return: tuple or None
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.fixdepth > 0:
+                return None
+            result = self.results.get(key)
+            if result is None:
+                self.misses = self.misses + 1
+            else:
+                self.hits = self.hits + 1
+            return result
+
+    def put(self, key, returncode, stdout, stderr):
+        '''
+        Remember the result of a read only command.
+
+        @param key: tuple from makekey
+        @param returncode: int
+        @param stdout: list of lines
+        @param stderr: list of lines
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.fixdepth > 0:
+                return
+            self.results[key] = (returncode, list(stdout), list(stderr))
+
+    def invalidate(self):
+        '''
+        Forget all cached results.
+
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.results:
+                self.invalidations = self.invalidations + 1
+            self.generation = self.generation + 1
+            self.results = {}
+
+    def commandran(self, readonly):
+        '''
+        Note that a command ran. Commands that are not read only invalidate
+        the cache while a fix is in progress.
+
+        @param readonly: bool - whether the command was flagged read only
+        @author: dkennel
+        '''
+        if not readonly and self.fixdepth > 0:
+            self.invalidate()
+
+    @contextmanager
+    def fixing(self):
+        '''
+        Context manager wrapped around rule fix and undo calls.
+
+        @author: dkennel
+        '''
+        with self.lock:
+            self.fixdepth = self.fixdepth + 1
+        self.invalidate()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.fixdepth = self.fixdepth - 1
+            self.invalidate()
+
+    def getgeneration(self):
+        '''
+        Return a counter that changes every time the cache is invalidated.
+        Other per run caches (e.g. the ServiceHelper snapshots) compare it
+        to decide whether they are still current.
+
+        @return: int
+        @author: dkennel
+        '''
+        return self.generation
+
+    def isfixing(self):
+        '''
+        Return True while a rule's fix or undo is running.
+
+        @return: bool
+        @author: dkennel
+        '''
+        return self.fixdepth > 0
+
+    def getstats(self):
+        '''
+        Return the cache counters.
+
+        @return: tuple - (hits, misses, invalidations)
+        @author: dkennel
+        '''
+        return (self.hits, self.misses, self.invalidations)
+
+
+COMMANDCACHE = CommandCache()
+
+
+def getcommandcache():
+    '''
+    Return the process wide CommandCache.
+
+    @return: CommandCache
+    @author: dkennel
+    '''
+    return COMMANDCACHE
+
+
 class CommandHelper(object):
     '''
     CommandHelper is class that helps with execution of subprocess Popen based
@@ -351,17 +510,21 @@ class CommandHelper(object):
 
 ###############################################################################
 
-    def executeCommand(self, command=None):
+    def executeCommand(self, command=None, readonly=False):
         '''
         executeCommand (command) excecute the command for the CommandHelper
         @param self:essential if you override this definition
         @param command string or list: command to set the command property to
+        @param readonly bool: the command only queries the system. Its result
+            may be served from and stored in the per run CommandCache.
         @return: bool indicating success or failure
         @author: ekkehard j. koch
+        @change: 2016/10/18 dkennel added readonly
         '''
         try:
             commandobj = None
             success = True
+            cachekey = None
             if (type(command) is not None):
                 success = self.setCommand(command)
 
@@ -371,7 +534,21 @@ class CommandHelper(object):
                     raise ValueError("Cannot Execute a blank command (" + \
                                            "".join(self.command) + ")")
 
+            if (success) and readonly and self.wait:
+                cachekey = COMMANDCACHE.makekey(self.command, self.shell)
+                cached = COMMANDCACHE.get(cachekey)
+                if cached is not None:
+                    self.returncode = cached[0]
+                    self.stdout = list(cached[1])
+                    self.stderr = list(cached[2])
+                    self.output = self.stderr + self.stdout
+                    self.logdispatcher.log(self.logpriority,
+                                           "returncode: " +
+                                           str(self.returncode) + " (cached)")
+                    return True
+
             if (success):
+                COMMANDCACHE.commandran(readonly)
                 commandobj = subprocess.Popen(self.command,
                                stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE,
@@ -391,6 +568,9 @@ class CommandHelper(object):
                     self.logdispatcher.log(self.logpriority,
                                            "returncode: " +
                                             str(self.returncode))
+                    if cachekey is not None:
+                        COMMANDCACHE.put(cachekey, self.returncode,
+                                         self.stdout, self.stderr)
         except (KeyboardInterrupt, SystemExit):
             raise
         except Exception, err:
@@ -24,11 +24,45 @@
 Created on May 6, 2013
 
 @author: dwalker
+@change: 2016/10/18 dkennel - parse the file once into an ordered index of
+    keys to line numbers and values used by validate, update and commit
 '''
+from collections import OrderedDict
+from filecache import getfilecache, getstamp
 from logdispatcher import LogPriority
 from stonixutilityfunctions import writeFile
 import traceback
-import re
+
+
+def buildindex(contents, configType):
+    '''
+    Parse the lines of a key value file once into an ordered dictionary of
+    each key set in the file to a list of (line number, value) tuples, one
+    per line setting it, in file order. Comments and blank lines are not
+    indexed. For space separated files the value is the list of fields after
+    the key.
+    @author: dkennel
+    @param contents: list of lines
+    @param configType: openeq, closedeq or space
+    @return: OrderedDict
+    '''
+    index = OrderedDict()
+    for lineno, line in enumerate(contents):
+        if line.startswith("#") or not line.strip():  # ignore if comment or blank line
+            continue
+        if configType == "space":
+            fields = line.split()
+            key = fields[0]
+            value = fields[1:]
+        elif "=" in line:
+            temp = line.split("=")  # split line into key val list [key, val]
+            key = temp[0].strip()
+            value = temp[1].strip()
+        else:
+            continue
+        index.setdefault(key, []).append((lineno, value))
+    return index
+
 
 class KVAConf():
     '''This class checks files for correctness that consist of key:value pairs
@@ -60,8 +94,10 @@ class KVAConf():
         self.logger = logger
         self.path = path
         self.tmpPath = tmpPath
-        self.storeContents(self.path)
         self.configType = configType
+        self.index = OrderedDict()
+        self.stamp = None
+        self.storeContents(self.path)
         self.universal = "#The following lines were added by stonix\n"
         self.tempstring = ""
         self.intent = intent
@@ -154,37 +190,21 @@ class KVAConf():
         @param key: key in a dictionary passed from calling class
         @param val: value part in dictionary passed from calling class
         @return: Bool
+        @change: 2016/10/18 dkennel - answer from self.index instead of
+            scanning every line for every key
         '''
         if self.contents:
+            entries = self.index.get(key, [])
             if self.intent == "present":  # self.data contains key val pairs we want in the file
-                found = False
-                for line in self.contents:
-                    if re.match('^#', line) or re.match(r'^\s*$', line):  # ignore if comment or blank line
-                        continue
-                    elif re.search("=", line):  # examine line if there is an = sign
-                        temp = line.split("=")  # split line into key val list [key, val]
-                        if re.match("^" + key + "$", temp[0].strip()):  # it contains the current key we're looking for
-                            if temp[1].strip() == value:  # and the value is correct
-                                found = True  # however we continue to make sure the key doesn't appear later in the file and have the wrong value
-                                continue
-                            else:  # the value is wrong so we break out of the loop.  Unecessary to continue, it will be fixed in the update
-                                found = False
-                                break
-                if found:  # return True or False value
-                    return True
-                else:
+                # every occurrence of the key must have the correct value
+                if not entries:
                     return False
+                for _, val in entries:
+                    if val != value:
+                        return False
+                return True
             elif self.intent == "notpresent":  # self.data contains key val pairs we don't want in the file
-                found = True
-                for line in self.contents:
-                    if re.match("^#", line) or re.match(r'^\s*$', line):  # ignore if comment or blank line
-                        continue
-                    elif re.search("=", line):  # examine line if there is an = sign
-                        temp = line.split("=")  # split line into key val list [key, val]
-                        if re.match("^" + key + "$", temp[0].strip()):  # it contains the current key we're looking for
-                            found = True  # no need to check value, it's irrelevant
-                            break
-                return found
+                return bool(entries)
 ###############################################################################
     def getSpaceValue(self, key, value):
         '''
@@ -200,103 +220,41 @@ class KVAConf():
         @param key: key in a dictionary passed from calling class
         @param val: value part in dictionary passed from calling class
         @return: Bool
+        @change: 2016/10/18 dkennel - answer from self.index instead of
+            scanning every line for every key and value
         '''
-        fixables = []  # this fixables variable will be used for both desired and non desired keys
-        removeables = []
         if self.contents:
+            entries = self.index.get(key, [])
+            # lines with more than one value may indicate the file's format
+            # is corrupted but that's not our issue, they are left alone
+            values = set([fields[0] for _, fields in entries
+                          if len(fields) == 1])
             if self.intent == "present":  # self.data contains key val pairs we want in the file
                 if isinstance(value, list):  # value can be a list in cases, see init pydoc
-                    for item in value:
-                        foundalready = False
-                        for line in self.contents:
-                            if re.match('^#', line) or re.match(r'^\s*$', line):  # ignore if comment or blank line
-                                continue
-                            elif re.search(key, line):  # we found the key, which in this case can be repeatable
-                                temp = line.strip()  # strip off all trailing and leading whitespace
-                                temp = re.sub("\s+", " ", temp)  # replace all whitespace with just one whitespace character
-                                temp = temp.split()  # separate contents into list separated by spaces
-                                if len(temp) > 0 and temp[0] == key:  # check to make sure key appears in beginning and has more than one item in the list
-                                    try:
-                                        if len(temp) > 2:  # this could indicate the file's format may be corrupted but that's not our issue
-                                            continue
-                                        elif temp[1] == item:  # value is correct
-                                            foundalready = True
-                                    except IndexError:
-                                        self.detailedresults += "Index error\n"
-                                        raise(self.detailedresults)
-                        if not foundalready:
-                            fixables.append(item)
+                    fixables = [item for item in value if item not in values]
                     if fixables:
                         return fixables
                     else:
                         return True
                 else:  # value must be a string, normal case
                     found = False
-                    for line in self.contents:
-                        if re.match('^#', line) or re.match(r'^\s*$', line):  # ignore if comment or blank line
+                    for _, fields in entries:
+                        if len(fields) > 1:
                             continue
-                        elif re.search(key, line):  # the key is in this line
-                            temp = line.strip()  # strip off all trailing and leading whitespace
-                            temp = re.sub("\s+", " ", temp)  # replace all whitespace with just one whitespace character
-                            temp = temp.split()  # separate contents into list separated by spaces
-                            if len(temp) > 0 and temp[0] == key:  # check to make sure key appears in beginning and has more than one item in the list
-                                try:
-                                    if len(temp) > 2:
-                                        continue  # this could indicate the file's format may be corrupted but that's not our issue
-                                    elif temp[1] == value:  # the value is correct
-                                        found = True  # however we continue to make sure the key doesn't appear later in the file and have the wrong value
-                                        continue
-                                    else:  # the value is wrong so we break out of the loop.  Unecessary to continue, it will be fixed in the update
-                                        found = False
-                                        break
-                                except IndexError:
-                                    self.detailedresults += "Index error\n"
-                                    raise(self.detailedresults)
+                        elif fields and fields[0] == value:
+                            found = True
+                        else:  # the value is wrong or missing
+                            return False
                     return found
             elif self.intent == "notpresent":  # self.data contains key val pairs we don't want in the file
-                print "inside getspacevalue"
                 if isinstance(value, list):  # value can be a list in cases, see init pydoc
-                    print "it's a list"
-                    for item in value:
-                        foundalready = False
-                        for line in self.contents:
-                            if re.match('^#', line) or re.match(r'^\s*$', line):  # ignore if comment or blank line
-                                continue
-                            elif re.search(key, line):  # we found the key, which in this case can be repeatable
-                                temp = line.strip()  # strip off all trailing and leading whitespace
-                                temp = re.sub("\s+", " ", temp)  # replace all whitespace with just one whitespace character
-                                temp = temp.split()  # separate contents into list separated by spaces
-                                if len(temp) > 0 and temp[0] == key:  # check to make sure key appears in beginning and has more than one item in the list
-                                    try:
-                                        if len(temp) > 2:
-                                            continue  # this could indicate the file's format may be corrupted but that's not our issue
-                                        elif temp[1] == item:  # the value is correct
-                                            foundalready = True
-                                    except IndexError:
-                                        self.detailedresults += "Index error\n"
-                                        raise(self.detailedresults)
-                        if foundalready:
-                            #fixables.append(item)
-                            removeables.append(item)
+                    removeables = [item for item in value if item in values]
                     if removeables:
-                        print "removeables inside getspacevalue: " + str(removeables)
                         return removeables
                     else:
-                        print "returning True"
                         return False
                 else:  # value must be a string, normal case
-                    found = False
-                    for line in self.contents:
-                        if re.match('^#', line) or re.match(r'^\s*$', line):  # ignore is comment or blank line
-                            continue
-                        elif re.match("^" + key, line):  # we found the key
-                            temp = line.strip()  # strip off all trailing and leading whitespace
-                            temp = re.sub("\s+", " ", temp)  # replace all whitespace with just one whitespace character
-                            temp = temp.split()  # separate contents into list separated by spaces
-                            if re.match("^" + key + "$", temp[0]):  # a more specific check of the key in case is shares a similar key name with another key up to a point
-                                found = True
-                                break
-                    return found
+                    return bool(entries)
 ###############################################################################
     def update(self, fixables, removeables):
         '''
@@ -328,46 +286,27 @@ class KVAConf():
         @param fixables: a dictionary of key val paris desired in file
         @param removeables: a dictionary of key val paris not desired in file
         @return: Bool
+        @change: 2016/10/18 dkennel - drop lines by the line numbers in
+            self.index, re-read the file only if it changed
         '''
-        self.storeContents(self.path)  # re-read the contents of the desired file
-        contents = self.contents
-        if removeables:  # we have items that need to be removed from file
-            for key in removeables:
-                i = 0  # variable to keep our place in the list, will be used for removing items
-                for line in contents:
-                    if re.search("^#", line) or re.match("^\s*$", line):  # ignore if comment or blank line
-                        i += 1
-                    elif re.search("=", line.strip()):  # line contains an = sign
-                        temp = line.split("=")
-                        if re.match("^" + key + "$", temp[0].strip()):  # found the key
-                            contents.pop(i)  # not concerned with the value because we don't want the key either way
-                        i += 1
-                    else:
-                        i += 1
+        self.refreshContents()
+        drop = set()
+        # not concerned with the value of removeables because we don't want
+        # the key either way, fixables are added back below
+        for key in list(removeables or {}) + list(fixables or {}):
+            for lineno, _ in self.index.get(key, []):
+                drop.add(lineno)
+        contents = [line for lineno, line in enumerate(self.contents)
+                    if lineno not in drop]
         if fixables:  # we have items that either had the wrong value or don't exist in the file
+            contents.append("\n" + self.universal)  # add our universal line to show line(s) were added by stonix
             for key in fixables:
-                i = 0  # variable to keep our place in the list, will be used for removing items
-                for line in contents:
-                    if re.search("^#", line) or re.match("^\s*$", line):  # ignore if comment or blank line
-                        i += 1
-                    elif re.search("=", line.strip()):  # line contains an = sign
-                        temp = line.split("=")
-                        if re.match("^" + key + "$", temp[0].strip()):  # found the key
-                            contents.pop(i)  # we pop it out but down below we add the correct line unlike above
-                        i += 1
-                    else:
-                        i += 1
-            self.contents = []
-            for line in contents:  # contents should now have a list of items we are ok with having in the file but will still be missing the fixables
-                self.contents.append(line)  # make self.contents contain the correct file contents before fixing
-            self.contents.append("\n" + self.universal)  # add our universal line to show line(s) were added by stonix to self.contents
-            for key in fixables:
-                if self.configType == "openeq":  # construct the appropriate line and add to bottom of self.contents
-                    temp = key + " = " + fixables[key] + "\n"
-                    self.contents.append(temp)
+                if self.configType == "openeq":  # construct the appropriate line and add to bottom
+                    contents.append(key + " = " + fixables[key] + "\n")
                 elif self.configType == "closedeq":
-                    temp = key + "=" + fixables[key] + "\n"
-                    self.contents.append(temp)
+                    contents.append(key + "=" + fixables[key] + "\n")
+        self.contents = contents
+        self.buildIndex()
         return True
 ###############################################################################
     def setSpaceValue(self, fixables, removeables):
@@ -381,74 +320,34 @@ class KVAConf():
         @param fixables: a dictionary of key val paris desired in file
         @param removeables: a dictionary of key val paris not desired in file
         @return: Bool
+        @change: 2016/10/18 dkennel - drop lines by the line numbers in
+            self.index, re-read the file only if it changed
         '''
-        print "inside setSpaceValue\n"
-        self.storeContents(self.path)  # re-read the contents of the desired file
-        contents = self.contents
-        if removeables:  # we have items that need to be removed from file
-            for key, val in removeables.iteritems():
-                i = 0
-                if isinstance(val, list):  # we have a list where the key can repeat itself
-                    for key2 in removeables[key]:
-                        for line in contents:
-                            if re.search("^#", line) or re.match("^\s*$", line):  # ignore comments and blank lines
-                                i += 1
-                            else:
-                                temp = line.strip()
-                                temp = re.sub("\s+", " ", temp)
-                                temp = line.split()
-                                if len(temp) > 2:
-                                    i += 1
-                                    continue
-                                elif re.search("^" + key + "$", temp[0]):
-                                    if re.search("^" + key2 + "$", temp[1]):
-                                        contents.pop(i)
-                                else:
-                                    i += 1
-                else:
-                    for line in contents:
-                        if re.search("^#", line) or re.match("^\s*$", line):  # ignore if comment or blank line
-                            i += 1
-                        elif re.search(key, line.strip()):
-                            temp = line.strip().split(" ")
-                            if re.match("^" + key + "$", temp[0].strip()):
-                                contents.pop(i)
-                        else:
-                            i += 1
-            self.contents = contents
+        self.refreshContents()
+        drop = set()
+        for key, val in (removeables or {}).iteritems():
+            for lineno, fields in self.index.get(key, []):
+                if not isinstance(val, list):
+                    drop.add(lineno)
+                elif len(fields) == 1 and fields[0] in val:  # we have a list where the key can repeat itself
+                    drop.add(lineno)
+        for key, val in (fixables or {}).iteritems():
+            if not isinstance(val, list):  # the key appears once, with the value added below
+                for lineno, _ in self.index.get(key, []):
+                    drop.add(lineno)
+        contents = [line for lineno, line in enumerate(self.contents)
+                    if lineno not in drop]
         if fixables:
-            contents.append(self.universal)
-            listPresent = False
+            contents.append("\n" + self.universal)
             for key, val in fixables.iteritems():
                 if isinstance(val, list):
-                    listPresent = True
-                    for key2 in fixables[key]:
+                    for key2 in val:
                         contents.append(key + " " + key2 + "\n")
                 else:
-                    i = 0
-                    for line in contents:
-                        if re.search("^#", line) or re.match("^\s*$", line):
-                            i += 1
-                        elif re.search(key, line):
-                            temp = line.strip().split()
-                            if re.match("^" + key + "$", temp[0].strip()):
-                                contents.pop(i)
-                            i += 1
-                        else:
-                            i += 1
-            if listPresent:
-                self.contents = contents
-                return True
-            else:
-                self.contents = []
-                for line in contents:  # reconstruct the self.contents list to contain the most updated list
-                    self.contents.append(line)
-                self.contents.append("\n" + self.universal)
-                if fixables:  # if there are fixables, we need to then add those, removeables have already been taken care of above
-                    for key in fixables:
-                        temp = key + " " + fixables[key] + "\n"
-                        self.contents.append(temp)
-                return True
+                    contents.append(key + " " + val + "\n")
+        self.contents = contents
+        self.buildIndex()
+        return True
 ###############################################################################
     def commit(self):
         '''
@@ -458,31 +357,49 @@ class KVAConf():
         methods have been called.
         @author: dwalker
         @return: Bool
+        @change: 2016/10/18 dkennel - do not append to the output of an
+            earlier commit
         '''
-        for line in self.contents:
-            self.tempstring += line
+        self.tempstring = "".join(self.contents)
         success = writeFile(self.tmpPath, self.tempstring, self.logger)
         return success
 ###############################################################################
     def storeContents(self, path):
         '''
         Private method that reads in the self.path variable's contents and 
-        stores in private variable self.contents.
+        stores in private variable self.contents, then indexes them.
         @author: dwalker
         @param path: The path which contents need to be read 
+        @change: 2016/10/18 dkennel - build self.index
+        @change: 2016/10/18 dkennel - read and index through the run's file
+            cache, the index is shared and never altered
         '''
         try:
-            f = open(path, 'r')
+            self.stamp, self.contents, self.index = getfilecache().getparsed(
+                path, 'KVAConf ' + str(self.configType),
+                lambda lines: buildindex(lines, self.configType))
         except IOError:
             self.detailedresults = "KVAConf: unable to open the" \
 "specified file"
             self.detailedresults += traceback.format_exc()
             self.logger.log(LogPriority.DEBUG, self.detailedresults)
             return False
-        self.contents = []
-        for line in f:
-            self.contents.append(line)
-        f.close()
+###############################################################################
+    def refreshContents(self):
+        '''
+        Private method re-reading the file if it changed since it was read,
+        e.g. by a commit.
+        @author: dkennel
+        '''
+        if getstamp(self.path) != self.stamp:
+            self.storeContents(self.path)
+###############################################################################
+    def buildIndex(self):
+        '''
+        Private method indexing self.contents, see buildindex.
+        @author: dkennel
+        '''
+        self.index = buildindex(self.contents, self.configType)
 ###############################################################################
     def getValue(self):
         '''
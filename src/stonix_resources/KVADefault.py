@@ -28,13 +28,26 @@ Created on Apr 10, 2013
 log message
 @change: 03/18/2014 ekkehard changed defaults to /usr/bin/defaults
 @change: 03/18/2014 ekkehard changed print to debug
+@change: 2016/10/18 dkennel - check and write keys through the shared
+    PlistDomains view of each domain, the defaults commands are kept for
+    values it does not handle
 '''
 
 import re
 import CommandHelper
 from logdispatcher import LogPriority
+from plistdomain import DELETE, formatdefaults, getplistdomains, \
+    parsewriteargs, shellcommand, undocommand
 from subprocess import call
 
+# Regular expression flags understood by CommandHelper.findInOutput
+REGEXFLAGS = {"DOTALL": re.DOTALL,
+              "DEBUG": re.DEBUG,
+              "LOCALE": re.LOCALE,
+              "MULTILINE": re.MULTILINE,
+              "UNICODE": re.UNICODE,
+              "VERBOSE": re.VERBOSE}
+
 
 class KVADefault():
 
@@ -83,6 +96,8 @@ class KVADefault():
         self.dc = "/usr/bin/defaults"
         self.output = ""
         self.currentHost = True
+        self.domains = getplistdomains(self.logger)
+        self.changes = None
 ###############################################################################
 
     def validate(self):
@@ -99,13 +114,18 @@ class KVADefault():
         particular command.
         @author: dwalker
         @return: Bool
+        @change: 2016/10/18 dkennel - check every key from memory when the
+            domain can be read natively
         '''
+        native = self.validateNative()
+        if native is not None:
+            return native
         for key in self.data:
             if self.currentHost:
                 cmd = [self.dc, self.host, "read", self.path, key]
             else:
                 cmd = [self.dc, "read", self.path, key]
-            if not self.ch.executeCommand(cmd):
+            if not self.ch.executeCommand(cmd, readonly=True):
                 return False
             '''get output in form of list'''
             output = self.ch.getOutput()
@@ -167,7 +187,12 @@ necessary values for the full function of KVADefault\n"
         Private method to set the write and undo commands associated with
         this object.  Will not run the command until the commit() method
         is run.
-        @return: bool'''
+        @return: bool
+        @change: 2016/10/18 dkennel - stage the changes for PlistDomains when
+            the domain can be read natively and every value is supported'''
+        native = self.updateNative()
+        if native is not None:
+            return native
         outputstr, errorstr, msg = "", "", ""
         templist, templist1, templist2 = [], [], []
         for key in self.data:
@@ -182,7 +207,7 @@ necessary values for the full function of KVADefault\n"
             else:
                 cmd = [self.dc, "read", self.path, key]
                 '''do a defaults read on the current key'''
-            if self.ch.executeCommand(cmd):
+            if self.ch.executeCommand(cmd, readonly=True):
                 '''get output'''
                 output = self.ch.getOutput()
                 '''get output in form of string'''
@@ -274,6 +299,111 @@ necessary values for the full function of KVADefault\n"
         return True
 ###############################################################################
 
+    def getNativeList(self, key):
+        '''
+        Private method returning the checked innerlist of a key for the
+        native methods.
+        @author: dkennel
+        @param key: string
+        @return: list or None if a required value is blank
+        '''
+        innerlist = self.getInnerList(self.data[key])
+        try:
+            if innerlist[0] == "" or innerlist[1] == "":
+                msg = "You have provided no value to be written. Unable " + \
+                    "to create write command."
+                self.logger.log(LogPriority.DEBUG, msg)
+                return None
+        except IndexError:
+            msg = "The innerlist passed in doesn\'t contain all " + \
+                "necessary values for the full function of KVADefault\n"
+            raise IndexError(msg)
+        return innerlist
+###############################################################################
+
+    def isCompliant(self, values, key, innerlist):
+        '''
+        Private method checking one key against the values of its domain the
+        same way validate checks the output of defaults read.
+        @author: dkennel
+        @param values: dict - the keys of the domain
+        @param key: string
+        @param innerlist: list - the innerlist of the key
+        @return: bool
+        '''
+        if key not in values:
+            return innerlist[1] is None
+        output = formatdefaults(values[key])
+        self.output += output
+        flags = 0
+        if len(innerlist) > 2 and innerlist[2]:
+            flags = REGEXFLAGS.get(innerlist[2], 0)
+        return bool(re.search(innerlist[0], output, flags))
+###############################################################################
+
+    def validateNative(self):
+        '''
+        Private method checking every key from the PlistDomains view of the
+        domain.
+        @author: dkennel
+        @return: bool or None if the domain can not be read natively
+        '''
+        values = self.domains.getdomain(self.path, self.currentHost)
+        if values is None:
+            return None
+        for key in self.data:
+            innerlist = self.getNativeList(key)
+            if innerlist is None:
+                return False
+            if not self.isCompliant(values, key, innerlist):
+                return False
+        return True
+###############################################################################
+
+    def updateNative(self):
+        '''
+        Private method working out the changes and undo command for every
+        key that is not compliant. Nothing is written until commit.
+        @author: dkennel
+        @return: bool or None if the domain can not be read natively or a
+            value is not supported, in which case update uses defaults
+        '''
+        self.changes = None
+        values = self.domains.getdomain(self.path, self.currentHost)
+        if values is None:
+            return None
+        changes = {}
+        undo = []
+        for key in self.data:
+            innerlist = self.getNativeList(key)
+            if innerlist is None:
+                return False
+            if self.isCompliant(values, key, innerlist):
+                continue
+            if innerlist[1] is None:
+                changes[key] = DELETE
+            else:
+                try:
+                    changes[key] = parsewriteargs(innerlist[1])
+                except ValueError, err:
+                    self.logger.log(LogPriority.DEBUG,
+                                    "Using defaults write for " + key +
+                                    ": " + str(err))
+                    return None
+            undo.append(undocommand(self.domains, self.path,
+                                    self.currentHost, key, values))
+        if not changes:
+            self.nocmd = True
+            return True
+        self.nocmd = False
+        self.changes = changes
+        if len(undo) == 1:
+            self.setUndoCmd(undo[0])
+        else:
+            self.setUndoCmd(shellcommand(undo))
+        return True
+###############################################################################
+
     def processOutput(self, output, outputstr, innerlist, templist1, key):
         cmdlist = []
         undostr = ""
@@ -471,7 +601,14 @@ necessary values for the full function of KVADefault\n"
         '''
         Private method that commits the defaults write command for this
         object.
-        @return: bool'''
+        @return: bool
+        @change: 2016/10/18 dkennel - changes worked out by updateNative are
+            staged with PlistDomains, which writes each domain once'''
+        if self.changes is not None:
+            changes = self.changes
+            self.changes = None
+            return self.domains.setvalues(self.path, self.currentHost,
+                                          changes)
         writecmd = self.getWriteCmd()
         if not writecmd:
             msg = "Write command was not able to be set due to passed \
@@ -640,7 +777,13 @@ dictionary not containing a write value.  Unable to run write command\n"
         Private method to perform a defaults delete command on the previously
         instantiated path and key
         @author: dwalker
+        @change: 2016/10/18 dkennel - delete through PlistDomains when the
+            domain can be read natively
         '''
+        if self.domains.getdomain(self.path, self.currentHost) is not None:
+            return self.domains.setvalues(self.path, self.currentHost,
+                                          dict([(key, DELETE) for key in
+                                                self.data]))
         for key in self.data:
             if self.currentHost:
                 cmd = ["defaults", "-currentHost", "delete", self.path, key]
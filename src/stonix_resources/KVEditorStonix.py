@@ -26,6 +26,7 @@ Created on Jun 12, 2013
 @author: dwalker
 '''
 from KVEditor import KVEditor
+from filecache import getfilecache
 from logdispatcher import LogPriority
 import os
 
@@ -116,6 +117,9 @@ class KVEditorStonix(KVEditor):
                 self.detailedresults = "couldn't rename file"
                 self.logger.log(LogPriority.DEBUG, self.detailedresults)
                 raise
+            finally:
+                getfilecache().invalidate(self.path)
+                getfilecache().invalidate(self.tmpPath)
             return True
         else:
             return False
@@ -183,6 +183,36 @@ class SHchkconfig(object):
             else:
                 return True
 
+    def snapshot(self):
+        '''
+        Return the boot configuration of every service from a single
+        chkconfig --list call. Run state is not collected; the status output
+        of the init scripts is too irregular to be read in bulk.
+
+        @return: tuple - (dict of name: (enabled, running), default state
+            for names not in the dict). None means not known.
+        @author: dkennel
+        '''
+        states = {}
+        chk = subprocess.Popen(self.cmd + '--list', stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, shell=True,
+                               close_fds=True)
+        for line in chk.stdout.readlines():
+            # Only the runlevel lines, xinetd services are left to
+            # auditservice
+            if not re.search('0:', line):
+                continue
+            line = line.split()
+            if not line:
+                continue
+            states[line[0]] = (re.search(':on', ' '.join(line[1:])) is not
+                               None, None)
+        chk.wait()
+        self.logdispatcher.log(LogPriority.DEBUG,
+                               'SHchkconfig.snapshot ' + str(len(states)) +
+                               ' services')
+        return (states, (None, None))
+
     def listservices(self):
         '''
         Return a list containing strings that are service names.
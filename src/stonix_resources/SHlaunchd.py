@@ -250,6 +250,25 @@ class SHlaunchd(object):
                                ') = ' + str(servicesuccess))
         return servicesuccess
 
+    def snapshot(self):
+        '''
+        Return the state of every job from a single launchctl list call.
+        Jobs are keyed by label (the short service name); a job that is not
+        listed is neither loaded nor running.
+
+        @return: tuple - (dict of label: (enabled, running), default state
+            for labels not in the dict)
+        @author: dkennel
+        '''
+        states = {}
+        if self.ch.executeCommand([self.launchd, 'list']):
+            for label in self.ch.getOutputGroup("\S+\s+\S+\s+(\S+)", 1):
+                states[label] = (True, True)
+        self.logdispatcher.log(LogPriority.DEBUG,
+                               'SHlaunchd.snapshot ' + str(len(states)) +
+                               ' jobs')
+        return (states, (False, False))
+
     def listservices(self):
         '''
         Return a list containing strings that are service names.
@@ -225,6 +225,41 @@ class SHrcupdate(object):
                                    'SHrcupdate.reload ' + service + str(ret))
             return True
             
+    def snapshot(self):
+        '''
+        Return the state of every service from one rc-update show and one
+        rc-status call. rc-update show lists every service scheduled to run
+        so a service that is not listed is not enabled.
+
+        @return: tuple - (dict of name: (enabled, running), default state
+            for names not in the dict). None means not known.
+        @author: dkennel
+        '''
+        states = {}
+        for line in self.getsvclist():
+            line = line.split('|')
+            if len(line) == 2 and line[0].strip() and line[1].strip():
+                states[line[0].strip()] = (True, None)
+        try:
+            proc = subprocess.Popen('/bin/rc-status --all',
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, shell=True,
+                                    close_fds=True)
+            statuslines = proc.stdout.readlines()
+            proc.wait()
+        except(OSError):
+            statuslines = []
+        for line in statuslines:
+            match = re.search(r'^\s*(\S+)\s+\[\s*(\S+)\s*\]', line)
+            if match:
+                name = match.group(1)
+                enabled = states.get(name, (False, None))[0]
+                states[name] = (enabled, match.group(2) == 'started')
+        self.logdispatcher.log(LogPriority.DEBUG,
+                               'SHrcupdate.snapshot ' + str(len(states)) +
+                               ' services')
+        return (states, (False, None))
+
     def listservices(self):
         '''
         Return a list containing strings that are service names.
@@ -170,6 +170,54 @@ class SHsystemctl(object):
                                'SHsystemctl.reload ' + service + str(ret))
         return True
 
+    def snapshot(self):
+        '''
+        Return the state of every service unit from two systemctl calls
+        instead of one is-enabled and one show per service.
+
+        @return: tuple - (dict of name: (enabled, running), default state
+            for names not in the dict). Units are listed both with and
+            without the .service suffix. Names that are not listed (aliases,
+            template instances) are answered by auditservice and isrunning.
+        @author: dkennel
+        '''
+        states = {}
+        # is-enabled returns 0 for these
+        enabledstates = ['enabled', 'enabled-runtime', 'static', 'indirect',
+                         'generated', 'alias', 'transient']
+        chk = subprocess.Popen(self.cmd + '--no-pager --no-legend ' +
+                               'list-unit-files --type=service',
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, shell=True,
+                               close_fds=True)
+        for line in chk.stdout.readlines():
+            line = line.split()
+            if len(line) < 2 or not line[0].endswith('.service'):
+                continue
+            states[line[0]] = (line[1] in enabledstates, False)
+        chk.wait()
+        chk = subprocess.Popen(self.cmd + '--no-pager --no-legend --full ' +
+                               'list-units --type=service --all',
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, shell=True,
+                               close_fds=True)
+        for line in chk.stdout.readlines():
+            line = line.split()
+            # Failed units are prefixed with a bullet by some versions
+            if line and not line[0].endswith('.service'):
+                line = line[1:]
+            if len(line) < 4 or line[0] not in states:
+                continue
+            states[line[0]] = (states[line[0]][0],
+                               re.search('running', line[3]) is not None)
+        chk.wait()
+        for unit in states.keys():
+            states[unit[:-len('.service')]] = states[unit]
+        self.logdispatcher.log(LogPriority.DEBUG,
+                               'SHsystemctl.snapshot ' + str(len(states) / 2) +
+                               ' units')
+        return (states, (None, None))
+
     def listservices(self):
         '''
         Return a list containing strings that are service names.
@@ -174,6 +174,39 @@ class SHupdaterc(object):
             else:
                 return True
             
+    def snapshot(self):
+        '''
+        Return the state of every service from one listing of the rc
+        directories and a single service --status-all call.
+
+        @return: tuple - (dict of name: (enabled, running), default state
+            for names not in the dict). None means not known.
+        @author: dkennel
+        '''
+        states = {}
+        for rcdir in ['/etc/rc2.d', '/etc/rc3.d', '/etc/rc4.d', '/etc/rc5.d']:
+            for entry in os.listdir(rcdir):
+                match = re.search('^S..(.+)$', entry)
+                if match:
+                    states[match.group(1)] = (True, None)
+        chk = subprocess.Popen(self.svc + '--status-all',
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, shell=True,
+                               close_fds=True)
+        for line in chk.stdout.readlines():
+            # [ + ] running, [ - ] stopped, [ ? ] no status command
+            match = re.search(r'^\s*\[\s*([-+?])\s*\]\s+(\S+)', line)
+            if not match:
+                continue
+            name = match.group(2)
+            running = {'+': True, '-': False}.get(match.group(1))
+            states[name] = (states.get(name, (False, None))[0], running)
+        chk.wait()
+        self.logdispatcher.log(LogPriority.DEBUG,
+                               'SHupdaterc.snapshot ' + str(len(states)) +
+                               ' services')
+        return (states, (False, None))
+
     def listservices(self):
         '''
         Return a list containing strings that are service names.
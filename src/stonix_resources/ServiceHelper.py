@@ -24,9 +24,14 @@
 Created on Aug 9, 2012
 
 @author: dkennel
+@change: 2016/10/18 dkennel added bulk service state snapshots
+@change: 2016/10/18 dkennel detect service managers once, shared thread
+    safe helper per environment (getservicehelper)
 '''
 import os
+import threading
 import types
+from functools import wraps
 import SHchkconfig
 import SHrcupdate
 import SHupdaterc
@@ -35,6 +40,102 @@ import SHsvcadm
 import SHrcconf
 import SHlaunchd
 from logdispatcher import LogPriority
+from CommandHelper import getcommandcache
+
+# Bulk service state per backend class name, see ServiceHelper.getsnapshot
+SNAPSHOTS = {}
+SNAPSHOTLOCK = threading.Lock()
+# Service management programs found, see detectservicemanagers
+DETECTED = None
+# Shared ServiceHelper per environment object, see getservicehelper
+HELPERS = {}
+REGISTRYLOCK = threading.Lock()
+
+
+def invalidatesnapshots():
+    '''
+    Discard the service state snapshots of all backends. Called whenever a
+    service is enabled, disabled or reloaded.
+
+    @author: dkennel
+    '''
+    with SNAPSHOTLOCK:
+        SNAPSHOTS.clear()
+
+
+def detectservicemanagers(logdispatcher):
+    '''
+    Return which service management programs are present. The paths are
+    only probed (and the result logged) the first time this is called in a
+    process.
+
+    @param logdispatcher: STONIX logdispatcher object
+    @return: dict of backend name: bool
+    @author: dkennel
+    '''
+    global DETECTED
+    with REGISTRYLOCK:
+        if DETECTED is not None:
+            return DETECTED
+        found = {}
+        # Red Hat, CentOS, SUSE
+        found['chkconfig'] = os.path.exists('/sbin/chkconfig')
+        # Gentoo
+        found['rcupdate'] = os.path.exists('/sbin/rc-update')
+        # Ubuntu, Debian
+        found['updaterc'] = os.path.exists('/usr/sbin/update-rc.d')
+        # Fedora, RHEL 7
+        found['systemctl'] = os.path.exists('/bin/systemctl')
+        # Solaris
+        found['svcadm'] = os.path.exists('/usr/sbin/svcadm')
+        # FreeBSD
+        found['rcconf'] = os.path.exists('/etc/rc.conf') and \
+            os.path.exists('/etc/rc.d/LOGIN')
+        # OS X
+        found['launchd'] = os.path.exists('/sbin/launchd')
+        logdispatcher.log(LogPriority.DEBUG,
+                          ['ServiceHelper', 'Service managers found: ' +
+                           ', '.join([name for name in sorted(found)
+                                      if found[name]])])
+        DETECTED = found
+        return DETECTED
+
+
+def getservicehelper(environment, logdispatcher):
+    '''
+    Return the ServiceHelper shared by every rule using this environment
+    object, creating it on first use. The returned helper is thread safe.
+
+    @param environment: STONIX environment object
+    @param logdispatcher: STONIX logdispatcher object
+    @return: ServiceHelper
+    @author: dkennel
+    '''
+    key = id(environment)
+    with REGISTRYLOCK:
+        helper = HELPERS.get(key)
+        if helper is not None and helper.environ is environment:
+            return helper
+    helper = ServiceHelper(environment, logdispatcher)
+    with REGISTRYLOCK:
+        # Another thread may have won the race, keep the first one
+        if key in HELPERS and HELPERS[key].environ is environment:
+            return HELPERS[key]
+        HELPERS[key] = helper
+    return helper
+
+
+def synchronized(method):
+    '''
+    Decorator serializing calls to a ServiceHelper method. The helper keeps
+    the service being worked with as state, so a shared helper must only do
+    one thing at a time.
+    '''
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class ServiceHelper(object):
@@ -43,6 +144,9 @@ class ServiceHelper(object):
     need to manipulate services and the actual implementation of changing
     service status on various operating systems.
 
+    Rules should use getservicehelper() instead of creating their own
+    instance.
+
     @author: dkennel
     '''
 
@@ -61,43 +165,17 @@ class ServiceHelper(object):
         self.secondary = None
         self.service = ""
         self.servicename = ""
-        # Red Hat, CentOS, SUSE
-        if os.path.exists('/sbin/chkconfig'):
-            ischkconfig = True
-        else:
-            ischkconfig = False
-        # Gentoo
-        if os.path.exists('/sbin/rc-update'):
-            isrcupdate = True
-        else:
-            isrcupdate = False
-        # Ubuntu, Debian
-        if os.path.exists('/usr/sbin/update-rc.d'):
-            isupdaterc = True
-        else:
-            isupdaterc = False
-        # Fedora, RHEL 7
-        if os.path.exists('/bin/systemctl'):
-            issystemctl = True
-        else:
-            issystemctl = False
-        # Solaris
-        if os.path.exists('/usr/sbin/svcadm'):
-            issvcadm = True
-        else:
-            issvcadm = False
-        # FreeBSD
-        if os.path.exists('/etc/rc.conf') and \
-        os.path.exists('/etc/rc.d/LOGIN'):
-            isrcconf = True
-        else:
-            isrcconf = False
-        # OS X
-        if os.path.exists('/sbin/launchd'):
-            islaunchd = True
+        self.lock = threading.RLock()
+        found = detectservicemanagers(self.logdispatcher)
+        ischkconfig = found['chkconfig']
+        isrcupdate = found['rcupdate']
+        isupdaterc = found['updaterc']
+        issystemctl = found['systemctl']
+        issvcadm = found['svcadm']
+        isrcconf = found['rcconf']
+        islaunchd = found['launchd']
+        if islaunchd:
             self.isdualparameterservice = True
-        else:
-            islaunchd = False
 
         truecount = 0
         for svctype in [ischkconfig, isrcupdate, isupdaterc,
@@ -184,30 +262,13 @@ class ServiceHelper(object):
                                                    self.logdispatcher)
                 count = 1
 
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'ischkconfig:' + str(ischkconfig))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'isrcupdate:' + str(isrcupdate))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'isupdaterc:' + str(isupdaterc))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'issystemctl:' + str(issystemctl))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'issvcadm:' + str(issvcadm))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'isrcconf:' + str(isrcconf))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'ishybrid:' + str(self.ishybrid))
-        self.logdispatcher.log(LogPriority.DEBUG,
-                               'isdualparameterservice:' +
-                               str(self.isdualparameterservice))
-
     def getService(self):
         return self.service
 
     def getServiceName(self):
         return self.servicename
 
+    @synchronized
     def setService(self, service, servicename=""):
         '''
         Update the name of the service being worked with.
@@ -282,6 +343,7 @@ class ServiceHelper(object):
 
         return setservicesuccessall
 
+    @synchronized
     def disableservice(self, service, servicename=""):
         '''
         Disables the service and terminates it if it is running.
@@ -307,6 +369,7 @@ class ServiceHelper(object):
                 if self.ishybrid:
                     chksecond = self.secondary.disableservice(self.getService(),
                                                               self.getServiceName())
+                invalidatesnapshots()
                 if chksingle or chksecond:
                     servicesuccess = True
                 else:
@@ -320,6 +383,7 @@ class ServiceHelper(object):
                     chksingle = self.svchelper.disableservice(self.getService())
                     if self.ishybrid:
                         chksecond = self.secondary.disableservice(self.getService())
+                    invalidatesnapshots()
                     if chksingle or chksecond:
                         servicesuccess = True
                     else:
@@ -334,6 +398,7 @@ class ServiceHelper(object):
                                ') = ' + str(servicesuccess))
         return servicesuccess
 
+    @synchronized
     def enableservice(self, service, servicename=""):
         '''
         Enables a service and starts it if it is not running as long as we are
@@ -359,6 +424,7 @@ class ServiceHelper(object):
                 if self.ishybrid:
                     chksecond = self.secondary.enableservice(self.getService(),
                                                              self.getServiceName())
+                invalidatesnapshots()
                 if chksingle or chksecond:
                     servicesuccess = True
                 else:
@@ -370,6 +436,7 @@ class ServiceHelper(object):
                     chksingle = self.svchelper.enableservice(self.getService())
                     if self.ishybrid:
                         chksecond = self.secondary.enableservice(self.getService())
+                    invalidatesnapshots()
                     if chksingle or chksecond:
                         servicesuccess = True
                     else:
@@ -384,6 +451,7 @@ class ServiceHelper(object):
                                ') = ' + str(servicesuccess))
         return servicesuccess
 
+    @synchronized
     def auditservice(self, service, servicename=""):
         '''
         Checks the status of a service and returns a bool indicating whether or
@@ -403,13 +471,11 @@ class ServiceHelper(object):
                 self.logdispatcher.log(LogPriority.DEBUG,
                                '--auditing dual parameter service ('
                                + service + ', ' + servicename + ')')
-                chksingle = self.svchelper.auditservice(self.getService(),
-                                                        self.getServiceName())
+                chksingle = self.__querystate(self.svchelper, 0)
                 if self.ishybrid:
                     self.logdispatcher.log(LogPriority.DEBUG,
                                '--Service is a hybrid')
-                    chksecond = self.secondary.auditservice(self.getService(),
-                                                            self.getServiceName())
+                    chksecond = self.__querystate(self.secondary, 0)
                 if chksingle or chksecond:
                     servicesuccess = True
                 else:
@@ -421,11 +487,11 @@ class ServiceHelper(object):
                 self.logdispatcher.log(LogPriority.DEBUG,
                                '--auditing single parameter service ('
                                + service + ')')
-                chksingle = self.svchelper.auditservice(self.getService())
+                chksingle = self.__querystate(self.svchelper, 0)
                 if self.ishybrid:
                     self.logdispatcher.log(LogPriority.DEBUG,
                                '--Service is a hybrid')
-                    chksecond = self.secondary.auditservice(self.getService())
+                    chksecond = self.__querystate(self.secondary, 0)
                 if chksingle or chksecond:
                     servicesuccess = True
                 else:
@@ -441,6 +507,7 @@ class ServiceHelper(object):
                                ') = ' + str(servicesuccess))
         return servicesuccess
 
+    @synchronized
     def isrunning(self, service, servicename=""):
         '''
         Check to see if a service is currently running. The enable service uses
@@ -458,19 +525,17 @@ class ServiceHelper(object):
         if (self.setService(service, servicename)):
             runsecond = False
             if self.isdualparameterservice:
-                runpri = self.svchelper.isrunning(self.getService(),
-                                                  self.getServiceName())
+                runpri = self.__querystate(self.svchelper, 1)
                 if self.ishybrid:
-                    runsecond = self.secondary.isrunning(self.getService(),
-                                                         self.getServiceName())
+                    runsecond = self.__querystate(self.secondary, 1)
                 if runpri or runsecond:
                     servicesuccess = True
                 else:
                     servicesuccess = False
             else:
-                runpri = self.svchelper.isrunning(self.getService())
+                runpri = self.__querystate(self.svchelper, 1)
                 if self.ishybrid:
-                    runsecond = self.secondary.isrunning(self.getService())
+                    runsecond = self.__querystate(self.secondary, 1)
                 if runpri or runsecond:
                     servicesuccess = True
                 else:
@@ -483,6 +548,7 @@ class ServiceHelper(object):
                                 ') = ' + str(servicesuccess))
         return servicesuccess
 
+    @synchronized
     def reloadservice(self, service, servicename=""):
         '''
         Reload (HUP) a service so that it re-reads it's config files. Called
@@ -512,6 +578,7 @@ class ServiceHelper(object):
                     if self.ishybrid:
                         chksecond = self.secondary.reloadservice(self.getService(),
                                                                   self.getServiceName())
+                    invalidatesnapshots()
                     if chksingle or chksecond:
                         servicesuccess = True
                     else:
@@ -522,6 +589,7 @@ class ServiceHelper(object):
                     chksingle = self.svchelper.reloadservice(self.getService())
                     if self.ishybrid:
                         chksecond = self.secondary.reloadservice(self.getService())
+                    invalidatesnapshots()
                     if chksingle or chksecond:
                         servicesuccess = True
                     else:
@@ -534,6 +602,102 @@ class ServiceHelper(object):
                                ') = ' + str(servicesuccess))
         return servicesuccess
 
+    def getsnapshot(self, helper):
+        '''
+        Return the bulk service state snapshot of a backend, taking it if
+        there is no current one. Snapshots are shared by every ServiceHelper
+        in the process and are dropped when a service is enabled, disabled
+        or reloaded and whenever the per run CommandCache is invalidated
+        (i.e. around every rule's fix and undo). While a fix is running no
+        snapshot is used at all.
+
+        @param helper: backend service helper object
+        @return: tuple - (dict of name: (enabled, running), default state
+            for names not in the dict) or None if the backend can not take
+            snapshots
+        @author: dkennel
+        '''
+        cache = getcommandcache()
+        if cache.isfixing() or not hasattr(helper, 'snapshot'):
+            return None
+        name = helper.__class__.__name__
+        generation = cache.getgeneration()
+        with SNAPSHOTLOCK:
+            entry = SNAPSHOTS.get(name)
+            if entry is not None and entry[0] == generation:
+                return entry[1]
+        try:
+            snapshot = helper.snapshot()
+        except (OSError, IOError), err:
+            self.logdispatcher.log(LogPriority.DEBUG,
+                                   ['ServiceHelper.getsnapshot',
+                                    name + ' snapshot failed: ' + str(err)])
+            snapshot = None
+        with SNAPSHOTLOCK:
+            SNAPSHOTS[name] = (generation, snapshot)
+        return snapshot
+
+    @synchronized
+    def getservicestates(self):
+        '''
+        Return the boot and run state of every service known to the
+        snapshots of the backends in use. For hybrid systems a service is
+        enabled or running if either backend says so.
+
+        @return: dict of name: (enabled, running). Either value may be None
+            if the backend can not tell in bulk.
+        @author: dkennel
+        '''
+        states = {}
+        helpers = [self.svchelper]
+        if self.ishybrid:
+            helpers.append(self.secondary)
+        for helper in helpers:
+            snapshot = self.getsnapshot(helper)
+            if snapshot is None:
+                continue
+            for name, state in snapshot[0].iteritems():
+                if name in states:
+                    merged = []
+                    for mine, theirs in zip(states[name], state):
+                        if mine or theirs:
+                            merged.append(True)
+                        elif mine is None or theirs is None:
+                            merged.append(None)
+                        else:
+                            merged.append(False)
+                    state = tuple(merged)
+                states[name] = state
+        return states
+
+    def __querystate(self, helper, field):
+        '''
+        Private method answering auditservice (field 0) or isrunning
+        (field 1) for the current service from the backend's snapshot,
+        asking the backend directly when the snapshot can not tell.
+
+        @param helper: backend service helper object
+        @param field: int - 0 for enabled, 1 for running
+        @return: bool
+        @author: dkennel
+        '''
+        if self.isdualparameterservice:
+            args = [self.getService(), self.getServiceName()]
+            key = self.getServiceName()
+        else:
+            args = [self.getService()]
+            key = self.getService()
+        snapshot = self.getsnapshot(helper)
+        if snapshot is not None:
+            states, default = snapshot
+            state = states.get(key, default)[field]
+            if state is not None:
+                return state
+        if field == 0:
+            return helper.auditservice(*args)
+        return helper.isrunning(*args)
+
+    @synchronized
     def listservices(self):
         '''
         List the services installed on the system.
@@ -27,17 +27,24 @@ Created on Aug 22, 2012
 
 @change: 2014/07/22 dkennel - Added -f flag to patch command call to eliminate
 prompt and wait issues during undo.
+@change: 2016/10/18 dkennel - Moved the event log from shelve to the SQLite
+based EventStore.
+@change: 2016/10/18 dkennel - Archive copies in the deduplicating FileArchive.
+@change: 2016/10/18 dkennel - Revert file changes with the in process
+patchengine instead of /usr/bin/patch.
+@change: 2016/10/18 dkennel - Drop recorded files from the run's file cache.
 '''
-import shelve
-import shutil
 import os
 import re
+import tempfile
 import traceback
-import filecmp
-import time
-import difflib
 import weakref
-import subprocess
+from contextlib import contextmanager
+from eventstore import EventStore
+from filearchive import FileArchive
+from filecache import getfilecache
+from patchengine import PatchConflict, PatchError, applypatch, makepatch, \
+    parsepatch
 from logdispatcher import LogPriority
 
 
@@ -82,18 +89,24 @@ class StateChgLogger(object):
         self.verbose = self.environment.getverbosemode()
         self.debug = self.environment.getdebugmode()
         self.diffdir = '/usr/share/stonix/diffdir'
+        # Copies made by earlier versions, still used for restores
         self.archive = '/usr/share/stonix/archive'
+        self.filearchivedir = '/usr/share/stonix/filearchive'
         self.privmode = True
+        self.eventdb = '/usr/share/stonix/eventlog.sqlite'
+        # Where events were kept before, migrated on first use
+        self.oldeventlog = '/usr/share/stonix/eventlog'
         try:
             if not os.path.exists('/usr/share/stonix') and \
             self.environment.geteuid() == 0:
                 os.makedirs('/usr/share/stonix', 448)
             if self.environment.geteuid() == 0:
-                self.eventlog = shelve.open('/usr/share/stonix/eventlog', 'c',
-                                            None, True)
+                self.eventlog = EventStore(self.eventdb, self.oldeventlog)
+                self.filearchive = FileArchive(self.filearchivedir, True,
+                                               legacy=self.archive)
             else:
                 self.privmode = False
-            for node in [self.diffdir, self.archive]:
+            for node in [self.diffdir]:
                 if not os.path.exists(node) and self.environment.geteuid() == 0:
                     os.makedirs(node, 448)
         except(OSError):
@@ -153,6 +166,9 @@ are an end user please report a bug.''')
                         ['StateChgLogger',
                          "Recording changes in %s" % oldfile])
         self.archivefile(oldfile)
+        # oldfile is about to be replaced by newfile
+        getfilecache().invalidate(oldfile)
+        getfilecache().invalidate(newfile)
         oldfilehandle = open(oldfile, 'r')
         newfilehandle = open(newfile, 'r')
         oldfiledata = oldfilehandle.readlines()
@@ -172,19 +188,17 @@ are an end user please report a bug.''')
         if not os.path.exists(patchpath):
             os.makedirs(patchpath, 448)
         patchhandle = open(patchdest, 'w')
-        for line in difflib.unified_diff(newfiledata, oldfiledata,
-                                         fromfile=newfile,
-                                         tofile=oldfile):
-            patchhandle.write(line)
+        patchhandle.write(makepatch(newfiledata, oldfiledata, newfile,
+                                    oldfile))
         patchhandle.close()
         return True
 
     def revertfilechanges(self, filename, eventid):
         """
         revertfilechanges removes changes made to complex configuration files
-        by stonix. It uses the patch utility and a diff file created by
-        recordfilechange to restore the configuration file without altering
-        other customizations.
+        by stonix. It applies the diff file created by recordfilechange to
+        restore the configuration file without altering other
+        customizations. See revertfilechangeset.
 
         @param string file : Path to the configuration file that should have
         changes made by stonix reverted to a pre-alteration state.
@@ -192,48 +206,122 @@ are an end user please report a bug.''')
         to the file being reverted
         @return  : Bool for success
         @author D. Kennel
+        @change: 2016/10/18 dkennel - patch in process instead of running
+            /usr/bin/patch
         """
         if not self.privmode:
             raise RuntimeError('''recordfilechange method called without privilege.
 If you are a rule developer you should guard against this. If you
 are an end user please report a bug.''')
-        fullpath = filename
-        path, filename = os.path.split(filename)
-        if self.debug:
-            self.logger.log(LogPriority.DEBUG,
-                            ['StateChgLogger.revert',
-                             "Finding patch path elements: " + path + ' ' + filename])
-        patchpath = self.diffdir + path
-        patchsource = os.path.join(patchpath, filename)
-        patchsource = patchsource + ".patch-" + eventid
-        if self.debug:
-            self.logger.log(LogPriority.DEBUG,
-                            ['StateChgLogger.revert',
-                             "Complete path to patchfile: %s" % patchsource])
+        return not self.revertfilechangeset([(filename, eventid)])
 
-        patchcmd = '/usr/bin/patch -p0 -u -f ' + fullpath + ' ' + patchsource
-        if self.environment.getosfamily() == 'solaris':
-            patchcmd = '/usr/bin/patch -p0 -u -i ' + patchsource + ' ' + fullpath
-        if not os.path.exists(patchsource):
-            self.logger.log(LogPriority.ERROR,
-                            ['StateChgLogger.revert',
-                             "Patchfile not found, unable to revert: %s" % fullpath])
-            return False
-        if not os.path.exists(fullpath):
-            self.logger.log(LogPriority.ERROR,
-                            ['StateChgLogger.revert',
-                             "Conf file not found, unable to revert: %s" % fullpath])
-        if not os.path.exists('/usr/bin/patch'):
+    def revertfilechangeset(self, changes):
+        """
+        Revert a set of file changes, normally all the conf events of a rule,
+        in one pass. The changes are undone newest first. Each file is read
+        and written once however many of the changes hit it, and only if at
+        least one hunk applied. Hunks that can not be applied are left out and
+        reported, the rest of the file is still reverted.
+
+        @param changes: list of (file path, eventid) tuples in the order the
+            changes were recorded
+        @return: list of patchengine.PatchConflict - empty for success
+        @author: dkennel
+        """
+        if not self.privmode:
+            raise RuntimeError('''revertfilechangeset method called without privilege.
+If you are a rule developer you should guard against this. If you
+are an end user please report a bug.''')
+        byfile = {}
+        order = []
+        for filepath, eventid in reversed(changes):
+            if filepath not in byfile:
+                byfile[filepath] = []
+                order.append(filepath)
+            byfile[filepath].append(eventid)
+        conflicts = []
+        for filepath in order:
+            conflicts.extend(self.__revertfile(filepath, byfile[filepath]))
+        for conflict in conflicts:
             self.logger.log(LogPriority.ERROR,
+                            ['StateChgLogger.revertfilechange',
+                             "Problem patching: %s"], conflict)
+        return conflicts
+
+    def __revertfile(self, filepath, eventids):
+        """
+        Private method applying the diffs of the events, in the order given,
+        to one file.
+
+        @param filepath: string - configuration file
+        @param eventids: list of strings - change event ids
+        @return: list of patchengine.PatchConflict
+        @author: dkennel
+        """
+        path, filename = os.path.split(filepath)
+        if not os.path.exists(filepath):
+            return [PatchConflict(filepath, eventid, 0, 0, 'file not found')
+                    for eventid in eventids]
+        rhandle = open(filepath, 'r')
+        try:
+            lines = rhandle.read().splitlines(True)
+        finally:
+            rhandle.close()
+        conflicts = []
+        applied = 0
+        for eventid in eventids:
+            patchsource = os.path.join(self.diffdir + path,
+                                       filename + ".patch-" + eventid)
+            self.logger.log(LogPriority.DEBUG,
                             ['StateChgLogger.revert',
-                             "Patch utility not found, unable to revert: %s" % fullpath])
-            return False
+                             "Complete path to patchfile: %s"], patchsource)
+            try:
+                phandle = open(patchsource, 'r')
+                try:
+                    hunks = parsepatch(phandle.read())
+                finally:
+                    phandle.close()
+            except IOError:
+                conflicts.append(PatchConflict(filepath, eventid, 0, 0,
+                                               'patch file not found'))
+                continue
+            except PatchError, err:
+                conflicts.append(PatchConflict(filepath, eventid, 0, 0,
+                                               'bad patch file: ' +
+                                               str(err)))
+                continue
+            lines, count, failed = applypatch(lines, hunks, filepath,
+                                              eventid)
+            applied = applied + count
+            conflicts.extend(failed)
+        if applied:
+            self.__replacefile(filepath, ''.join(lines))
+        return conflicts
+
+    def __replacefile(self, filepath, data):
+        """
+        Private method atomically replacing the content of a file, keeping
+        its permissions and ownership.
 
-        patchproc = subprocess.call(patchcmd, shell=True)
-        if patchproc != 0:
-            self.logger.log(LogPriority.ERROR,
-                            ['StateChgLogger.revertfilechange',
-                             "Problem patching: %s" % fullpath])
+        @param filepath: string - file to replace
+        @param data: string - new content
+        @author: dkennel
+        """
+        info = os.stat(filepath)
+        handle, tmppath = tempfile.mkstemp(dir=os.path.dirname(filepath))
+        try:
+            whandle = os.fdopen(handle, 'w')
+            try:
+                whandle.write(data)
+            finally:
+                whandle.close()
+            os.chmod(tmppath, info.st_mode & 07777)
+            os.chown(tmppath, info.st_uid, info.st_gid)
+            os.rename(tmppath, filepath)
+        except:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
 
     def recordfiledelete(self, filename, eventid):
         """
@@ -300,59 +388,18 @@ are an end user please report a bug.''')
             raise RuntimeError('''revertfiledelete method called without privilege.
 If you are a rule developer you should guard against this. If you
 are an end user please report a bug.''')
-        path, filename = os.path.split(filepath)
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger.revertfiledelete',
-                         "Finding path elements: " + path + ' ' +
-                         filename])
-        path = re.sub('^/', '', path)
-        recoverypath = os.path.join(self.archive, path)
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger.revertfiledelete',
-                         "Recovery path: " + str(recoverypath)])
-        recoveryfile = filename + '.ovf'
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger.revertfiledelete',
-                         "Recovery file: " + str(recoveryfile)])
-        possibles1 = os.listdir(recoverypath)
-        possibles2 = []
-        hinum = None
-        tstamps = []
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger.revertfiledelete',
-                         "Possibles: " + str(possibles1)])
-        for fname in possibles1:
-            if re.search(filename, fname):
-                possibles2.append(fname)
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger.revertfiledelete',
-                         "Possibles filtered: " + str(possibles2)])
-        for poss in possibles2:
-            posssplit = poss.split(".ovf")
-            try:
-                timestamp = posssplit[1]
-                tstamps.append(float(timestamp))
-            except(IndexError, TypeError, ValueError):
-                continue
-        if len(tstamps) != 0:
-            tstamps.sort(cmp=None, key=None, reverse=True)
-            hinum = tstamps[0]
-            self.logger.log(LogPriority.DEBUG,
-                            ['StateChgLogger.revertfiledelete',
-                             "HIGH NUM: " + str(hinum)])
-        if hinum:
-            recoveryfile = filename + '.ovf' + str(hinum)
-            self.logger.log(LogPriority.DEBUG,
-                            ['StateChgLogger.revertfiledelete',
-                             "HIGH NUM recovery file: " + str(recoveryfile)])
-        fullrecoverypath = os.path.join(recoverypath, recoveryfile)
         try:
-            shutil.copy(fullrecoverypath, filepath)
-        except IOError:
+            restored = self.filearchive.restore(filepath)
+        except (IOError, OSError):
             self.logger.log(LogPriority.ERROR,
                             ['StateChgLogger.revertfiledelete',
                              "Problem reading file: " + traceback.format_exc()])
             return False
+        if not restored:
+            self.logger.log(LogPriority.ERROR,
+                            ['StateChgLogger.revertfiledelete',
+                             "No archived copy of " + filepath])
+            return False
         return True
 
     def recordchgevent(self, eventcode, eventdict):
@@ -377,8 +424,22 @@ are an end user please report a bug.''')
             raise RuntimeError('''recordfilechange method called without privilege.
 If you are a rule developer you should guard against this. If you
 are an end user please report a bug.''')
-        self.eventlog[eventcode] = eventdict
-        self.eventlog.sync()
+        self.eventlog.put(eventcode, eventdict)
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager under which the change events recorded are committed
+        together when it ends, instead of one by one. The controller runs
+        each rule's fix and undo in a batch.
+
+        @author: dkennel
+        """
+        if not self.privmode:
+            yield
+            return
+        with self.eventlog.batch():
+            yield
 
     def getchgevent(self, eventcode):
         """
@@ -395,8 +456,7 @@ are an end user please report a bug.''')
             raise RuntimeError('''recordfilechange method called without privilege.
 If you are a rule developer you should guard against this. If you
 are an end user please report a bug.''')
-        eventdict = self.eventlog[eventcode]
-        return eventdict
+        return self.eventlog.get(eventcode)
 
     def closelog(self):
         """
@@ -410,6 +470,7 @@ are an end user please report a bug.''')
 If you are a rule developer you should guard against this. If you
 are an end user please report a bug.''')
         self.eventlog.close()
+        self.filearchive.close()
 
     def archivefile(self, oldfile):
         """
@@ -429,36 +490,17 @@ are an end user please report a bug.''')
                             ['StateChgLogger',
                              "archivefile called but no filename received"])
             return False
-        path, filename = os.path.split(oldfile)
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger',
-                         "Finding backup path elements: " + path + ' ' +
-                         filename])
-        backuppath = self.archive + path
-        backupdest = os.path.join(backuppath, filename)
-        backupdest = backupdest + ".ovf"
-        self.logger.log(LogPriority.DEBUG,
-                        ['StateChgLogger',
-                         "Complete backup path: %s" % backuppath])
-        if not os.path.exists(backuppath):
-            os.makedirs(backuppath, 448)
         if not os.path.exists(oldfile):
             self.logger.log(LogPriority.DEBUG,
                             ['StateChgLogger',
                              "Source file doesn't exist skipping backup."])
             return True
-        if not os.path.exists(backupdest):
+        version = self.filearchive.archive(oldfile)
+        if version is not None:
             self.logger.log(LogPriority.DEBUG,
                             ['StateChgLogger',
-                             'Copying ' + oldfile + ' to ' + backupdest])
-            shutil.copy(oldfile, backupdest)
-        else:
-            if not filecmp.cmp(oldfile, backupdest):
-                backupdest = backupdest + str(time.time())
-                self.logger.log(LogPriority.DEBUG,
-                                ['StateChgLogger',
-                                 'Copying ' + oldfile + ' to ' + backupdest])
-                shutil.copy(oldfile, backupdest)
+                             'Archived %s as version %d (%s)'],
+                            oldfile, version[0], version[1])
         return True
 
     def findrulechanges(self, ruleid):
@@ -477,7 +519,6 @@ are an end user please report a bug.''')
 If you are a rule developer you should guard against this. If you
 are an end user please report a bug.''')
         myruleid = ''
-        eventlist = []
         if not ruleid:
             raise TypeError('Null Rule ID')
         if type(ruleid) == int:
@@ -489,18 +530,7 @@ are an end user please report a bug.''')
         self.logger.log(LogPriority.DEBUG,
                         ['StateChgLogger.findrulechanges',
                          "Searching for: %s" % ruleid])
-        for key in self.eventlog:
-            try:
-                keyruleid = key[0:4]
-                self.logger.log(LogPriority.DEBUG,
-                                ['StateChgLogger.findrulechanges',
-                                 "Comparing to keyruleid: %s" % keyruleid])
-                if keyruleid == myruleid:
-                    eventlist.append(key)
-            except(IndexError):
-                self.logger.log(LogPriority.ERROR,
-                                ['StateChgLogger.findrulechanges',
-                                 'Bad key detected in eventlog: ' + key])
+        eventlist = self.eventlog.findrule(myruleid)
         self.logger.log(LogPriority.DEBUG,
                         ['StateChgLogger.findrulechanges',
                          "returning eventlist: %s" % eventlist])
@@ -528,7 +558,7 @@ are an end user please report a bug.''')
         if not eventid or not type(eventid) == str:
             raise TypeError('Null eventid or wrong type')
         try:
-            del self.eventlog[eventid]
+            self.eventlog.delete(eventid)
         except(KeyError):
             # key was not found in the event log
             return True
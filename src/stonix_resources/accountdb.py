@@ -0,0 +1,433 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Snapshot of the local account databases shared by the rules that scan them.
+Each of passwd, group and shadow (or master.passwd), and on Mac OS X the
+users and groups of the local directory service, is parsed once into an
+AccountTable indexed by name and id, with the duplicate names and ids worked
+out on demand. A file is parsed again when it changes, and while a rule's
+fix or undo runs (see CommandCache.fixing), as with the file cache.
+
+Entries keep the fields exactly as they are in the file, so rules can apply
+their own checks to malformed lines; fields missing from a short line read
+as empty strings by name.
+
+@author: dkennel
+'''
+import os
+import threading
+from collections import OrderedDict
+from CommandHelper import CommandHelper, getcommandcache
+from filecache import getfilecache, getstamp
+from logdispatcher import LogPriority
+
+PASSWD = '/etc/passwd'
+GROUP = '/etc/group'
+SHADOW = '/etc/shadow'
+MASTERPASSWD = '/etc/master.passwd'
+DSCL = '/usr/bin/dscl'
+
+
+def entrytype(typename, fields):
+    '''
+    Return a tuple subclass for the entries of one kind of account database
+    with a read only property for each field.
+
+    @param typename: string - class name
+    @param fields: tuple of strings - field names in file order
+    @return: class
+    @author: dkennel
+    '''
+    namespace = {'__slots__': (), 'FIELDS': fields}
+    for num, field in enumerate(fields):
+        namespace[field] = property(lambda self, num=num:
+                                    self[num] if num < len(self) else '')
+    return type(typename, (AccountEntry,), namespace)
+
+
+class AccountEntry(tuple):
+    '''
+    One line of an account database split into its fields.
+
+    @author: dkennel
+    '''
+    __slots__ = ()
+    FIELDS = ()
+
+    def getid(self, field):
+        '''
+        Return a numeric field as an int.
+
+        @param field: string - field name, e.g. uid
+        @return: int or None if the field is not a number
+        @author: dkennel
+        '''
+        value = getattr(self, field).strip()
+        if value.isdigit():
+            return int(value)
+        return None
+
+PasswdEntry = entrytype('PasswdEntry', ('name', 'passwd', 'uid', 'gid',
+                                        'gecos', 'home', 'shell'))
+GroupEntry = entrytype('GroupEntry', ('name', 'passwd', 'gid', 'members'))
+ShadowEntry = entrytype('ShadowEntry', ('name', 'passwd', 'lastchange',
+                                        'minage', 'maxage', 'warn',
+                                        'inactive', 'expire', 'flag'))
+MasterPasswdEntry = entrytype('MasterPasswdEntry',
+                              ('name', 'passwd', 'uid', 'gid', 'class',
+                               'change', 'expire', 'gecos', 'home',
+                               'shell'))
+
+# Entry type and indexed fields of each kind of account database
+KINDS = {'passwd': (PasswdEntry, ('name', 'uid')),
+         'group': (GroupEntry, ('name', 'gid')),
+         'shadow': (ShadowEntry, ('name',)),
+         'master.passwd': (MasterPasswdEntry, ('name', 'uid'))}
+
+
+class AccountTable(object):
+    '''
+    The entries of one account database in file order, indexed by the
+    fields given. Entries too short to have a field are not in its index.
+    Tables are shared between rules and must not be altered.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, entries, keys):
+        '''
+        @param entries: list of AccountEntry
+        @param keys: tuple of strings - fields to index
+        '''
+        self.entries = entries
+        self.indexes = {}
+        for key in keys:
+            index = {}
+            if entries:
+                position = entries[0].FIELDS.index(key)
+            for entry in entries:
+                # Lines too short to have the field are not indexed
+                if len(entry) > position:
+                    index.setdefault(entry[position], []).append(entry)
+            self.indexes[key] = index
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, field, value):
+        '''
+        Return every entry with the value in an indexed field.
+
+        @param field: string - e.g. name or uid
+        @param value: string or int
+        @return: list of AccountEntry
+        @author: dkennel
+        '''
+        return list(self.indexes[field].get(str(value), []))
+
+    def get(self, field, value):
+        '''
+        Return the first entry with the value in an indexed field.
+
+        @param field: string - e.g. name or uid
+        @param value: string or int
+        @return: AccountEntry or None
+        @author: dkennel
+        '''
+        entries = self.indexes[field].get(str(value))
+        if entries:
+            return entries[0]
+        return None
+
+    def getduplicates(self, field):
+        '''
+        Return the values of an indexed field held by more than one entry.
+
+        @param field: string - e.g. name or uid
+        @return: OrderedDict - value to its entries in file order, values
+            in the order they are first repeated
+        @author: dkennel
+        '''
+        index = self.indexes[field]
+        duplicates = OrderedDict()
+        for entry in self.getrepeats(field):
+            value = entry[entry.FIELDS.index(field)]
+            if value not in duplicates:
+                duplicates[value] = list(index[value])
+        return duplicates
+
+    def getrepeats(self, field):
+        '''
+        Return the entries repeating a value of an indexed field already
+        held by an earlier entry, in file order.
+
+        @param field: string - e.g. name or uid
+        @return: list of AccountEntry
+        @author: dkennel
+        '''
+        repeats = set()
+        for entries in self.indexes[field].itervalues():
+            if len(entries) > 1:
+                repeats.update([id(entry) for entry in entries[1:]])
+        if not repeats:
+            return []
+        return [entry for entry in self.entries if id(entry) in repeats]
+
+    def getplusentries(self):
+        '''
+        Return the legacy NIS (+) entries.
+
+        @return: list of AccountEntry
+        @author: dkennel
+        '''
+        return [entry for entry in self.entries
+                if entry.name.strip().startswith('+')]
+
+
+def parseaccounts(lines, kind):
+    '''
+    Turn the lines of an account database into an AccountTable. Blank lines
+    and comments are skipped, every other line is an entry.
+
+    @param lines: list of strings
+    @param kind: string - a key of KINDS
+    @return: AccountTable
+    @author: dkennel
+    '''
+    entryclass, keys = KINDS[kind]
+    entries = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        entries.append(entryclass(line.rstrip('\r\n').split(':')))
+    return AccountTable(entries, keys)
+
+
+def parsedscl(lines):
+    '''
+    Turn the output of dscl . -list <path> <attribute> into (name, value)
+    pairs in output order.
+
+    @param lines: list of strings
+    @return: list of tuples
+    @author: dkennel
+    '''
+    pairs = []
+    for line in lines:
+        fields = line.split(None, 1)
+        if fields:
+            pairs.append((fields[0], ''.join(fields[1:]).strip()))
+    return pairs
+
+
+class AccountDB(object):
+    '''
+    Shared, thread safe source of AccountTables.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, logger=None, dscl=DSCL):
+        '''
+        @param logger: STONIX logdispatcher object
+        @param dscl: string - path of dscl, directory service tables are
+            only used where it exists
+        '''
+        self.logger = logger
+        self.dscl = dscl
+        self.tables = {}
+        self.parses = 0
+        self.lock = threading.Lock()
+
+    def gettable(self, path, kind):
+        '''
+        Return the table of an account database file. A missing or
+        unreadable file gives an empty table.
+
+        @param path: string - file path
+        @param kind: string - a key of KINDS
+        @return: AccountTable
+        @author: dkennel
+        '''
+        key = (os.path.abspath(path), kind)
+        fixing = getcommandcache().isfixing()
+        if not fixing:
+            stamp = getstamp(path)
+            with self.lock:
+                known = self.tables.get(key)
+                if known is not None and known[0] == stamp:
+                    return known[1]
+        try:
+            stamp, lines = getfilecache().read(path)
+        except IOError:
+            stamp, lines = None, []
+        table = parseaccounts(lines, kind)
+        self.parses = self.parses + 1
+        if not fixing:
+            with self.lock:
+                self.tables[key] = (stamp, table)
+        return table
+
+    def getpasswd(self):
+        '''
+        Return the table of /etc/passwd.
+
+        @return: AccountTable
+        @author: dkennel
+        '''
+        return self.gettable(PASSWD, 'passwd')
+
+    def getgroup(self):
+        '''
+        Return the table of /etc/group.
+
+        @return: AccountTable
+        @author: dkennel
+        '''
+        return self.gettable(GROUP, 'group')
+
+    def getshadow(self):
+        '''
+        Return the table of /etc/shadow.
+
+        @return: AccountTable
+        @author: dkennel
+        '''
+        return self.gettable(SHADOW, 'shadow')
+
+    def usesdirectory(self):
+        '''
+        Return True if the users and groups come from the directory service.
+
+        @return: bool
+        @author: dkennel
+        '''
+        return self.logger is not None and os.path.exists(self.dscl)
+
+    def getusers(self):
+        '''
+        Return the local users: the directory service users on Mac OS X and
+        /etc/passwd elsewhere. Directory service entries have the fields of
+        a passwd entry.
+
+        @return: AccountTable
+        @author: dkennel
+        '''
+        if not self.usesdirectory():
+            return self.getpasswd()
+        return self.__getdirectory('/Users')
+
+    def getgroups(self):
+        '''
+        Return the local groups: the directory service groups on Mac OS X
+        and /etc/group elsewhere.
+
+        @return: AccountTable
+        @author: dkennel
+        '''
+        if not self.usesdirectory():
+            return self.getgroup()
+        return self.__getdirectory('/Groups')
+
+    def __listdirectory(self, path, attribute):
+        '''
+        Private method listing one attribute of every record in a directory
+        service path.
+
+        @return: list of (name, value) tuples
+        @author: dkennel
+        '''
+        ch = CommandHelper(self.logger)
+        ch.executeCommand([self.dscl, '.', '-list', path, attribute],
+                          readonly=True)
+        if ch.getReturnCode() != 0:
+            self.logger.log(LogPriority.DEBUG,
+                            ['AccountDB', 'dscl . -list ' + path + ' ' +
+                             attribute + ' failed: ' + ch.getErrorString()])
+        return parsedscl(ch.getOutput())
+
+    def __getdirectory(self, path):
+        '''
+        Private method returning the table of a directory service path,
+        read again when the CommandCache is invalidated.
+
+        @param path: string - /Users or /Groups
+        @return: AccountTable
+        @author: dkennel
+        '''
+        key = ('dscl', path)
+        generation = getcommandcache().getgeneration()
+        with self.lock:
+            known = self.tables.get(key)
+            if known is not None and known[0] == generation:
+                return known[1]
+        if path == '/Users':
+            ids = self.__listdirectory(path, 'UniqueID')
+            attributes = [dict(self.__listdirectory(path, attribute)[::-1])
+                          for attribute in ['PrimaryGroupID',
+                                            'NFSHomeDirectory', 'UserShell']]
+            entries = [PasswdEntry((name, '*', uid,
+                                    attributes[0].get(name, ''), '',
+                                    attributes[1].get(name, ''),
+                                    attributes[2].get(name, '')))
+                       for name, uid in ids]
+            table = AccountTable(entries, KINDS['passwd'][1])
+        else:
+            entries = [GroupEntry((name, '*', gid, '')) for name, gid in
+                       self.__listdirectory(path, 'PrimaryGroupID')]
+            table = AccountTable(entries, KINDS['group'][1])
+        self.parses = self.parses + 1
+        with self.lock:
+            self.tables[key] = (generation, table)
+        return table
+
+    def getparses(self):
+        '''
+        Return the number of tables built.
+
+        @return: int
+        @author: dkennel
+        '''
+        return self.parses
+
+
+ACCOUNTDB = AccountDB()
+
+
+def getaccountdb(logger=None):
+    '''
+    Return the process wide AccountDB.
+
+    @param logger: STONIX logdispatcher object, used if none is set yet
+    @return: AccountDB
+    @author: dkennel
+    '''
+    if logger is not None and ACCOUNTDB.logger is None:
+        ACCOUNTDB.logger = logger
+    return ACCOUNTDB
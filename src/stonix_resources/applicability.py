@@ -0,0 +1,369 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Compiled applicability evaluation. Each distinct applicability dictionary
+(see Rule.isapplicable for the format) is compiled once into a CompiledSpec
+holding pre-compiled regular expressions and pre-built version objects. The
+result of evaluating a spec is memoized per (spec, os type, os version, os
+family) and may be persisted next to the rule manifest so that later runs on
+the same platform do not evaluate anything at all.
+
+rule.checkapplicable remains the reference implementation; the two must
+always agree (see zzzTestFrameworkapplicability).
+
+@author: dkennel
+'''
+import copy
+import json
+import os
+import re
+import threading
+from distutils.version import LooseVersion
+
+CACHENAME = 'applicability.json'
+# Bump when the evaluation semantics change so that persisted results from
+# an older evaluator are discarded.
+EVALUATORVERSION = 1
+DICTMARKER = '{}'
+
+
+def speckey(applicable):
+    '''
+    Return a hashable canonical form of an applicability dictionary. Equal
+    dictionaries produce equal keys regardless of insertion order. This is
+    called for every lookup so it avoids the (much slower) json module.
+
+    @param applicable: dict - applicability dictionary
+    @return: tuple
+    @author: dkennel
+    '''
+    if isinstance(applicable, dict):
+        return (DICTMARKER,) + tuple(sorted([(key, speckey(value)) for
+                                             key, value in
+                                             applicable.iteritems()]))
+    if isinstance(applicable, (list, tuple)):
+        return tuple([speckey(value) for value in applicable])
+    return applicable
+
+
+def thaw(value):
+    '''
+    Turn a key read back from json, where every tuple became a list, into
+    the form returned by speckey.
+
+    @param value: list or scalar
+    @return: tuple or scalar
+    @author: dkennel
+    '''
+    if isinstance(value, list):
+        return tuple([thaw(item) for item in value])
+    return value
+
+
+class CompiledSpec(object):
+    '''
+    An applicability dictionary compiled into a predicate.
+
+    Malformed os entries do not raise at compile time. As with
+    checkapplicable they raise when they are matched by the running os type,
+    so a bad entry for another platform does not break this one.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, applicable):
+        '''
+        @param applicable: dict - applicability dictionary
+        '''
+        self.always = False
+        self.families = None
+        self.oslist = []
+        if 'os' not in applicable and 'family' not in applicable:
+            if applicable.get('default') == 'default':
+                self.always = True
+                return
+        listtype = applicable.get('type', 'black')
+        assert listtype in ['white', 'black'], \
+            'Invalid list type specified: %r' % listtype
+        # Every match sets the same answer so the result is simply whether
+        # anything matched.
+        self.onmatch = listtype == 'white'
+        # Copies are kept, the rule may alter its dictionary later.
+        if 'family' in applicable:
+            self.families = copy.deepcopy(applicable['family'])
+        if 'os' in applicable:
+            for ostype, osverlist in applicable['os'].iteritems():
+                self.oslist.append((re.compile(ostype),
+                                    self.__compileversions(osverlist)))
+
+    def __compileversions(self, osverlist):
+        '''
+        Private method to turn a version list into a (kind, data) tuple.
+
+        @param osverlist: list - versions and +, - or r
+        @return: tuple
+        @author: dkennel
+        '''
+        try:
+            if '+' in osverlist:
+                assert len(osverlist) is 2, "Wrong number of entries for a +"
+                if osverlist[1] == '+':
+                    return ('ge', LooseVersion(osverlist[0]))
+                return ('ge', LooseVersion(osverlist[1]))
+            elif '-' in osverlist:
+                assert len(osverlist) is 2, "Wrong number of entries for a -"
+                if osverlist[1] == '-':
+                    return ('le', LooseVersion(osverlist[0]))
+                return ('le', LooseVersion(osverlist[1]))
+            elif 'r' in osverlist:
+                assert len(osverlist) is 3, \
+                    "Wrong number of entries for a range"
+                vertmp = list(osverlist)
+                vertmp.remove('r')
+                first = LooseVersion(vertmp[0])
+                second = LooseVersion(vertmp[1])
+                if first > second:
+                    return ('range', (second, first))
+                elif first < second:
+                    return ('range', (first, second))
+                raise ValueError('Range versions are the same')
+            return ('in', list(osverlist))
+        except (AssertionError, ValueError), err:
+            return ('error', err)
+
+    def evaluate(self, family, ostype, osversion):
+        '''
+        Return True if the spec applies to the platform described.
+
+        @param family: string - environment.getosfamily()
+        @param ostype: string - environment.getostype()
+        @param osversion: string - environment.getosver()
+        @return: bool
+        @author: dkennel
+        '''
+        if self.always:
+            return True
+        matched = False
+        if self.families is not None and family in self.families:
+            matched = True
+        myversion = None
+        for regex, (kind, data) in self.oslist:
+            if not regex.search(ostype):
+                continue
+            if kind == 'error':
+                raise data
+            if kind == 'in':
+                if osversion in data:
+                    matched = True
+                continue
+            if myversion is None:
+                myversion = LooseVersion(osversion)
+            if kind == 'ge':
+                if myversion >= data:
+                    matched = True
+            elif kind == 'le':
+                if myversion <= data:
+                    matched = True
+            elif data[0] <= myversion <= data[1]:
+                matched = True
+        if matched:
+            return self.onmatch
+        return not self.onmatch
+
+
+class ApplicabilityIndex(object):
+    '''
+    Memoizing front end for CompiledSpec. Thread safe so that rules running
+    under the RuleExecutor may share it.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, cachepath=None):
+        '''
+        @param cachepath: string - optional file used to persist results
+        '''
+        self.cachepath = cachepath
+        self.compiled = {}
+        self.results = {}
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+        self.lock = threading.Lock()
+        if cachepath is not None:
+            self.load()
+
+    def evaluate(self, applicable, environ, key=None):
+        '''
+        Return True if the applicability dictionary applies to the platform
+        described by the environment object.
+
+        @param applicable: dict - applicability dictionary
+        @param environ: STONIX environment object
+        @param key: tuple - speckey(applicable) if the caller already has it
+        @return: bool
+        @author: dkennel
+        '''
+        return self.lookup(applicable, environ.getosfamily(),
+                           environ.getostype(), environ.getosver(), key)
+
+    def lookup(self, applicable, family, ostype, osversion, key=None):
+        '''
+        Return True if the applicability dictionary applies to the platform
+        described by family, ostype and osversion.
+
+        @param applicable: dict - applicability dictionary
+        @param family: string - os family
+        @param ostype: string - os type
+        @param osversion: string - os version
+        @param key: tuple - speckey(applicable) if the caller already has it
+        @return: bool
+        @author: dkennel
+        '''
+        if key is None:
+            key = self.__getkey(applicable)
+        resultkey = (key, ostype, osversion, family)
+        with self.lock:
+            if resultkey in self.results:
+                self.hits = self.hits + 1
+                return self.results[resultkey]
+            self.misses = self.misses + 1
+            spec = self.compiled.get(key)
+        if spec is None:
+            spec = CompiledSpec(applicable)
+        applies = spec.evaluate(family, ostype, osversion)
+        with self.lock:
+            self.compiled[key] = spec
+            self.results[resultkey] = applies
+            self.changed = True
+        return applies
+
+    def __getkey(self, applicable):
+        '''
+        Private method returning speckey(applicable). Keys are remembered by
+        the identity of the dictionary and reused while a snapshot of the
+        dictionary still compares equal, which is much cheaper than
+        rebuilding the key and stays correct if a rule alters its
+        dictionary.
+
+        @param applicable: dict - applicability dictionary
+        @return: tuple
+        @author: dkennel
+        '''
+        known = self.keys.get(id(applicable))
+        if known is not None and known[0] == applicable:
+            return known[1]
+        key = speckey(applicable)
+        self.keys[id(applicable)] = (copy.deepcopy(applicable), key)
+        return key
+
+    def getstats(self):
+        '''
+        Return the number of memoized lookups and of evaluations.
+
+        @return: tuple - (hits, misses)
+        @author: dkennel
+        '''
+        return (self.hits, self.misses)
+
+    def setcachepath(self, cachepath):
+        '''
+        Set the file used to persist results and merge in anything already
+        stored there.
+
+        @param cachepath: string - path of the results file
+        @author: dkennel
+        '''
+        self.cachepath = cachepath
+        self.load()
+
+    def load(self):
+        '''
+        Merge persisted results into the index. A missing, unreadable or
+        outdated file is ignored.
+
+        @return: bool - True if results were loaded
+        @author: dkennel
+        '''
+        try:
+            rhandle = open(self.cachepath, 'r')
+            try:
+                data = json.load(rhandle)
+            finally:
+                rhandle.close()
+            if data['version'] != EVALUATORVERSION:
+                return False
+            loaded = {}
+            for key, ostype, osversion, family, applies in data['results']:
+                loaded[(thaw(key), ostype, osversion, family)] = applies
+        except (IOError, ValueError, KeyError, TypeError):
+            return False
+        with self.lock:
+            for resultkey, applies in loaded.iteritems():
+                self.results.setdefault(resultkey, applies)
+        return True
+
+    def save(self):
+        '''
+        Persist the memoized results if anything new was evaluated. The file
+        is replaced atomically; failure to write (e.g. a read only install
+        location) is not an error, the next run simply evaluates again.
+
+        @return: bool - True if the file was written
+        @author: dkennel
+        '''
+        if self.cachepath is None or not self.changed:
+            return False
+        with self.lock:
+            results = [list(resultkey) + [applies] for resultkey, applies
+                       in sorted(self.results.iteritems())]
+            self.changed = False
+        tmppath = self.cachepath + '.tmp'
+        try:
+            whandle = open(tmppath, 'w')
+            try:
+                json.dump({'version': EVALUATORVERSION, 'results': results},
+                          whandle)
+            finally:
+                whandle.close()
+            os.rename(tmppath, self.cachepath)
+        except (IOError, OSError):
+            return False
+        return True
+
+
+INDEX = ApplicabilityIndex()
+
+
+def getindex():
+    '''
+    Return the process wide ApplicabilityIndex shared by the rule manifest
+    and Rule.isapplicable.
+
+    @return: ApplicabilityIndex
+    @author: dkennel
+    '''
+    return INDEX
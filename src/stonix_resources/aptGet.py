@@ -116,7 +116,8 @@ class AptGet(object):
         
         try:
             stringToMatch = "(.*)" + package + "(.*)"
-            self.ch.executeCommand(["/usr/bin/dpkg","-l",package])
+            self.ch.executeCommand(["/usr/bin/dpkg", "-l", package],
+                                   readonly=True)
             info = self.ch.getOutput()
             match = False
             for line in info:
@@ -29,6 +29,7 @@ Created on Dec 13, 2011
 
 import os
 import re
+from filecache import getfilecache
 from logdispatcher import LogPriority
 
 
@@ -75,9 +76,7 @@ class ConfFile(object):
         self.filedata = []
         if self.present:
             try:
-                rhandle = open(self.filename, 'r')
-                self.filedata = rhandle.readlines()
-                rhandle.close()
+                self.filedata = getfilecache().getlines(self.filename)
             except(IOError, OSError):
                 self.logger.log(LogPriority.INFO,
                                 ['ConfFile',
@@ -162,9 +161,7 @@ class ConfFile(object):
         '''
         if self.present:
             try:
-                rhandle = open(self.filename, 'r')
-                self.filedata = rhandle.readlines()
-                rhandle.close()
+                self.filedata = getfilecache().getlines(self.filename)
             except(IOError, OSError):
                 self.logger.log(LogPriority.INFO,
                                 ['ConfFile',
@@ -215,3 +212,4 @@ class ConfFile(object):
         for line in self.filedata:
             whandle.write(line)
         whandle.close()
+        getfilecache().invalidate(self.tempfile)
@@ -39,6 +39,8 @@ Created on Aug 24, 2010
 
 @author: dkennel
 @change: 2014/05/29 - ekkehard j. koch - pep8 and comment updates
+@change: 2016/10/18 dkennel - os, network and hardware facts come from the
+    persistent, concurrently probed fact cache
 '''
 import os
 import re
@@ -50,6 +52,8 @@ import platform
 import pwd
 import time
 from localize import CORPORATENETWORKSERVERS, STONIXVERSION
+from factcache import FACTFILE, getfactcache, osstamp, parsedmidecode, \
+    parseprofiler
 if os.geteuid() == 0:
     try:
         import dmidecode
@@ -89,6 +93,12 @@ class Environment:
         self.verbosemode = False
         self.debugmode = False
         self.runtime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        self.facts = {}
+        # Only root probes DMI and may write the cache file
+        if self.euid == 0:
+            self.factcache = getfactcache(FACTFILE)
+        else:
+            self.factcache = getfactcache(None)
         self.collectinfo()
 
     def setinstallmode(self, installmode):
@@ -258,21 +268,66 @@ class Environment:
         """
         return self.stonixversion
 
-    def collectinfo(self):
+    def collectinfo(self, refresh=False):
         """
-        Private method to populate data.
+        Private method to populate data. The os, network and hardware facts
+        come from the fact cache, which probes the groups it does not hold
+        fresh copies of concurrently.
 
+        @param refresh: bool - probe everything again whatever the age of
+            the cached facts
         @return: void
         @author D. Kennel
+        @change: 2016/10/18 dkennel - collect through the fact cache
         """
-        # print 'Environment Running discoveros'
-        self.discoveros()
-        # print 'Environment running setosfamily'
         self.setosfamily()
-        # print 'Environment running guessnetwork'
-        self.guessnetwork()
+        probes = {'os': self.__probeos,
+                  'network': self.__probenetwork,
+                  'hardware': self.__probehardware}
+        self.facts = self.factcache.collect(probes, {'os': osstamp()},
+                                            refresh)
+        self.operatingsystem = self.facts['os']['operatingsystem']
+        self.osreportstring = self.facts['os']['osreportstring']
+        self.osversion = self.facts['os']['osversion']
+        self.hostname = self.facts['network']['hostname']
+        self.ipaddress = self.facts['network']['ipaddress']
+        self.macaddress = self.facts['network']['macaddress']
         self.collectpaths()
 
+    def refreshfacts(self):
+        """
+        Probe the os, network and hardware facts again, ignoring and
+        replacing the cached ones.
+
+        @return: void
+        @author: dkennel
+        """
+        self.collectinfo(True)
+
+    def __probeos(self):
+        """
+        Private method, the probe of the os facts.
+
+        @return: dict
+        @author: dkennel
+        """
+        self.discoveros()
+        return {'operatingsystem': self.operatingsystem,
+                'osreportstring': self.osreportstring,
+                'osversion': self.osversion}
+
+    def __probenetwork(self):
+        """
+        Private method, the probe of the network facts.
+
+        @return: dict
+        @author: dkennel
+        """
+        self.guessnetwork()
+        return {'hostname': self.hostname,
+                'ipaddress': self.ipaddress,
+                'macaddress': self.macaddress}
+
     def discoveros(self):
         """
         Discover the operating system type and version
@@ -568,6 +623,7 @@ class Environment:
         @author: scmcleni
         @author: D. Kennel
         @return: int
+        @change: 2016/10/18 dkennel - asset tags from the fact cache
         """
         propnum = 0
         try:
@@ -576,21 +632,10 @@ class Environment:
                 propnum = propertynumberfile.readline()
                 propnum = propnum.strip()
                 propertynumberfile.close()
-            elif DMI and self.euid == 0:
-                chassis = dmidecode.chassis()
-                for key in chassis:
-                    propnum = chassis[key]['data']['Asset Tag']
+            elif self.__gethardware('assettag'):
+                propnum = self.__gethardware('assettag')
             if platform.system() == 'Darwin':
-                pnfetch = '/usr/sbin/nvram asset_id 2>/dev/null'
-                cmd = subprocess.Popen(pnfetch, shell=True,
-                                       stdout=subprocess.PIPE,
-                                       close_fds=True)
-                cmdout = cmd.stdout.readline()
-                cmdout = cmdout.split()
-                try:
-                    propnum = cmdout[1]
-                except(IndexError, KeyError):
-                    propnum = 0
+                propnum = self.__gethardware('nvramassetid', 0)
         except:
             pass
             # Failed to obtain property number
@@ -602,34 +647,9 @@ class Environment:
         Serial number of the local machine
         @author: dkennel
         @return: string
+        @change: 2016/10/18 dkennel - read from the fact cache
         """
-        systemserial = '0'
-        if DMI and self.euid == 0:
-            try:
-                system = dmidecode.system()
-                for key in system:
-                    try:
-                        systemserial = system[key]['data']['Serial Number']
-                    except(IndexError, KeyError):
-                        continue
-            except(IndexError, KeyError):
-                # got unexpected data back from dmidecode
-                pass
-        elif os.path.exists('/usr/sbin/system_profiler'):
-            profilerfetch = '/usr/sbin/system_profiler SPHardwareDataType'
-            cmd3 = subprocess.Popen(profilerfetch, shell=True,
-                                    stdout=subprocess.PIPE,
-                                    close_fds=True)
-            cmd3output = cmd3.stdout.readlines()
-            for line in cmd3output:
-                if re.search('Serial Number (system):', line):
-                    line = line.split(':')
-                    try:
-                        systemserial = line[1]
-                    except(IndexError, KeyError):
-                        pass
-        systemserial = systemserial.strip()
-        return systemserial
+        return self.__gethardware('systemserial', '0')
 
     def get_chassis_serial_number(self):
         """
@@ -637,18 +657,9 @@ class Environment:
         Chassis serial number
         @author: dkennel
         @requires: string
+        @change: 2016/10/18 dkennel - read from the fact cache
         """
-        chassisserial = '0'
-        if DMI and self.euid == 0:
-            try:
-                chassis = dmidecode.chassis()
-                for key in chassis:
-                    chassisserial = chassis[key]['data']['Serial Number']
-            except(IndexError, KeyError):
-                # got unexpected data back from dmidecode
-                pass
-        chassisserial = chassisserial.strip()
-        return chassisserial
+        return self.__gethardware('chassisserial', '0')
 
     def get_system_manufacturer(self):
         """
@@ -656,21 +667,9 @@ class Environment:
         System manufacturer
         @author: D. Kennel
         @return: string
+        @change: 2016/10/18 dkennel - read from the fact cache
         """
-        systemmfr = 'Unk'
-        if DMI and self.euid == 0:
-            try:
-                system = dmidecode.system()
-                for key in system:
-                    try:
-                        systemmfr = system[key]['data']['Manufacturer']
-                    except(IndexError, KeyError):
-                        continue
-            except(IndexError, KeyError):
-                # got unexpected data back from dmidecode
-                pass
-        systemmfr = systemmfr.strip()
-        return systemmfr
+        return self.__gethardware('systemmfr', 'Unk')
 
     def get_chassis_manfacturer(self):
         """
@@ -678,18 +677,9 @@ class Environment:
         Chassis manufacterer
         @author: D. Kennel
         @return: string
+        @change: 2016/10/18 dkennel - read from the fact cache
         """
-        chassismfr = 'Unk'
-        if DMI and self.euid == 0:
-            try:
-                chassis = dmidecode.chassis()
-                for key in chassis:
-                    chassismfr = chassis[key]['data']['Manufacturer']
-            except(IndexError, KeyError):
-                # got unexpected data back from dmidecode
-                pass
-        chassismfr = chassismfr.strip()
-        return chassismfr
+        return self.__gethardware('chassismfr', 'Unk')
 
     def get_sys_uuid(self):
         """
@@ -699,59 +689,9 @@ class Environment:
         UUID numbers.
         @author: D. Kennel
         @return: string
+        @change: 2016/10/18 dkennel - read from the fact cache
         """
-        uuid = '0'
-        if DMI and self.euid == 0:
-            try:
-                system = dmidecode.system()
-                for key in system:
-                    try:
-                        uuid = system[key]['data']['UUID']
-                    except(IndexError, KeyError):
-                        continue
-            except(IndexError, KeyError):
-                # got unexpected data back from dmidecode
-                pass
-        elif os.path.exists('/usr/sbin/dmidecode') and self.euid == 0:
-            uuidfetch = '/usr/sbin/dmidecode -s system-uuid'
-            cmd1 = subprocess.Popen(uuidfetch, shell=True,
-                                    stdout=subprocess.PIPE,
-                                    close_fds=True)
-            uuid = cmd1.stdout.readline()
-        elif os.path.exists('/usr/sbin/smbios'):
-            smbiosfetch = '/usr/sbin/smbios -t SMB_TYPE_SYSTEM 2>/dev/null'
-            cmd2 = subprocess.Popen(smbiosfetch, shell=True,
-                                    stdout=subprocess.PIPE,
-                                    close_fds=True)
-            cmdoutput = cmd2.stdout.readlines()
-            for line in cmdoutput:
-                if re.search('UUID:', line):
-                    line = line.split()
-                    try:
-                        uuid = line[1]
-                    except(IndexError, KeyError):
-                        pass
-        elif os.path.exists('/usr/sbin/system_profiler'):
-            profilerfetch = '/usr/sbin/system_profiler SPHardwareDataType'
-            cmd3 = subprocess.Popen(profilerfetch, shell=True,
-                                    stdout=subprocess.PIPE,
-                                    close_fds=True)
-            cmd3output = cmd3.stdout.readlines()
-            for line in cmd3output:
-                if re.search('UUID:', line):
-                    line = line.split()
-                    try:
-                        uuid = line[2]
-                    except(IndexError, KeyError):
-                        pass
-        elif platform.system() == 'SunOS':
-            fetchhostid = '/usr/bin/hostid'
-            cmd1 = subprocess.Popen(fetchhostid, shell=True,
-                                    stdout=subprocess.PIPE,
-                                    close_fds=True)
-            uuid = cmd1.stdout.readline()
-        uuid = uuid.strip()
-        return uuid
+        return self.__gethardware('uuid', '0')
 
     def ismobile(self):
         '''
@@ -760,31 +700,127 @@ class Environment:
         settings for laptops.
         @author: dkennel
         @regturn: bool - true if system is a laptop
+        @change: 2016/10/18 dkennel - read from the fact cache
         '''
-        ismobile = False
-        dmitypes = ['LapTop', 'Portable', 'Notebook', 'Hand Held',
-                    'Sub Notebook']
-        if DMI and self.euid == 0:
-            try:
-                chassis = dmidecode.chassis()
-                for key in chassis:
-                    chassistype = chassis[key]['data']['Type']
-                if chassistype in dmitypes:
-                    ismobile = True
-            except(IndexError, KeyError):
-                # got unexpected data back from dmidecode
-                pass
-        elif os.path.exists('/usr/sbin/system_profiler'):
-            profilerfetch = '/usr/sbin/system_profiler SPHardwareDataType'
-            cmd3 = subprocess.Popen(profilerfetch, shell=True,
+        return self.__gethardware('mobile', False)
+
+    def __gethardware(self, fact, default=None):
+        """
+        Private method returning a hardware fact.
+
+        @param fact: string - name of the fact, see __probehardware
+        @param default: value returned if the fact is not known
+        @return: the fact
+        @author: dkennel
+        """
+        return self.facts['hardware'].get(fact, default)
+
+    def __runprobe(self, command):
+        """
+        Private method returning the output lines of a probe command.
+
+        @param command: string - shell command
+        @return: list of strings
+        @author: dkennel
+        """
+        try:
+            proc = subprocess.Popen(command, shell=True,
                                     stdout=subprocess.PIPE,
                                     close_fds=True)
-            cmd3output = cmd3.stdout.readlines()
-            for line in cmd3output:
+            output = proc.stdout.readlines()
+            proc.wait()
+        except OSError:
+            return []
+        return output
+
+    def __probedmi(self):
+        """
+        Private method returning the DMI system and chassis information,
+        from the dmidecode module or one run of the dmidecode command, in
+        the format of factcache.parsedmidecode.
+
+        @return: dict
+        @author: dkennel
+        """
+        sections = {}
+        if DMI and self.euid == 0:
+            for name, query in [('System Information', dmidecode.system),
+                                ('Chassis Information', dmidecode.chassis)]:
+                try:
+                    entries = query()
+                    for key in entries:
+                        try:
+                            sections.setdefault(name, {}).update(
+                                entries[key]['data'])
+                        except(IndexError, KeyError, TypeError, ValueError):
+                            continue
+                except(IndexError, KeyError):
+                    # got unexpected data back from dmidecode
+                    pass
+        elif os.path.exists('/usr/sbin/dmidecode') and self.euid == 0:
+            sections = parsedmidecode(self.__runprobe(
+                '/usr/sbin/dmidecode -t system -t chassis 2>/dev/null'))
+        return sections
+
+    def __probehardware(self):
+        """
+        Private method collecting the hardware facts in one pass: a single
+        DMI read or system_profiler run, plus smbios, hostid or nvram where
+        the platform needs them.
+
+        @return: dict - systemserial, chassisserial, systemmfr, chassismfr,
+            uuid, mobile, assettag and nvramassetid
+        @author: dkennel
+        """
+        dmitypes = ['LapTop', 'Portable', 'Notebook', 'Hand Held',
+                    'Sub Notebook']
+        facts = {'systemserial': '0', 'chassisserial': '0',
+                 'systemmfr': 'Unk', 'chassismfr': 'Unk', 'uuid': '0',
+                 'mobile': False, 'assettag': '', 'nvramassetid': 0}
+        sections = self.__probedmi()
+        system = sections.get('System Information', {})
+        chassis = sections.get('Chassis Information', {})
+        for fact, section, field in [('systemserial', system, 'Serial Number'),
+                                     ('systemmfr', system, 'Manufacturer'),
+                                     ('uuid', system, 'UUID'),
+                                     ('chassisserial', chassis,
+                                      'Serial Number'),
+                                     ('chassismfr', chassis, 'Manufacturer'),
+                                     ('assettag', chassis, 'Asset Tag')]:
+            if section.get(field):
+                facts[fact] = str(section[field]).strip()
+        if chassis.get('Type') in dmitypes:
+            facts['mobile'] = True
+        if not sections and os.path.exists('/usr/sbin/smbios'):
+            for line in self.__runprobe('/usr/sbin/smbios -t ' +
+                                        'SMB_TYPE_SYSTEM 2>/dev/null'):
+                if re.search('UUID:', line):
+                    try:
+                        facts['uuid'] = line.split()[1]
+                    except(IndexError):
+                        pass
+        elif not sections and os.path.exists('/usr/sbin/system_profiler'):
+            output = self.__runprobe('/usr/sbin/system_profiler ' +
+                                     'SPHardwareDataType')
+            profile = parseprofiler(output)
+            facts['systemserial'] = profile.get('Serial Number (system)',
+                                                '0')
+            facts['uuid'] = profile.get('Hardware UUID', '0')
+            for line in output:
                 if re.search('Book', line):
-                    ismobile = True
+                    facts['mobile'] = True
                     break
-        return ismobile
+        elif not sections and platform.system() == 'SunOS':
+            hostid = self.__runprobe('/usr/bin/hostid')
+            if hostid:
+                facts['uuid'] = hostid[0].strip()
+        if platform.system() == 'Darwin':
+            try:
+                facts['nvramassetid'] = self.__runprobe(
+                    '/usr/sbin/nvram asset_id 2>/dev/null')[0].split()[1]
+            except(IndexError):
+                pass
+        return facts
 
     def issnitchactive(self):
         """
@@ -0,0 +1,360 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Background error report sender for LogDispatcher.reporterr. Errors are
+handed to a sender thread which collects them into one digest per run,
+counting repeats of the same error instead of mailing them again. The digest
+is kept in a spool file while the run goes on and is mailed when the run
+ends, over a single connection to the mail relay together with any digests
+left in the spool by earlier runs that could not reach the relay.
+
+Error texts are taken as UTF-8, undecodable bytes are replaced, and mailed
+as a UTF-8 text/plain body. A digest the relay will not take is moved
+aside as failed-digest-*.json so that it does not block later digests.
+
+@author: dkennel
+'''
+import atexit
+import json
+import os
+import Queue
+import smtplib
+import socket
+import threading
+import time
+from email.header import Header
+from email.utils import formatdate
+
+SPOOLVERSION = 1
+# Digests kept for later delivery, older ones are dropped first
+MAXSPOOL = 50
+# Longest error text kept in a digest
+MAXERRLEN = 20000
+FAILEDPREFIX = 'failed-'
+
+
+def tounicode(text):
+    '''
+    Return text as unicode. Byte strings are taken as UTF-8 and anything
+    that does not decode is replaced rather than raising.
+
+    @param text: string, unicode or any object
+    @return: unicode
+    @author: dkennel
+    '''
+    if isinstance(text, unicode):
+        return text
+    if not isinstance(text, str):
+        try:
+            text = str(text)
+        except UnicodeError:
+            return unicode(text)
+    return text.decode('utf-8', 'replace')
+
+
+class ErrorReporter(object):
+    '''
+    Queue of error reports delivered as a digest by a background thread.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, sender, recipient, relay, spooldir, hostname,
+                 hostinfo, port=25, timeout=30):
+        '''
+        @param sender: string - From address
+        @param recipient: string - To address
+        @param relay: string - mail relay host name
+        @param spooldir: string - directory for undelivered digests
+        @param hostname: string - name of this system for the subject
+        @param hostinfo: string - line identifying this system in digests
+        @param port: int - mail relay port
+        @param timeout: int - seconds to wait for the relay
+        '''
+        self.sender = sender
+        self.recipient = recipient
+        self.relay = relay
+        self.port = port
+        self.timeout = timeout
+        self.spooldir = spooldir
+        self.hostname = hostname
+        self.hostinfo = hostinfo
+        self.spoolfile = os.path.join(spooldir, 'digest-%d-%d.json' %
+                                      (int(time.time()), os.getpid()))
+        self.queue = Queue.Queue()
+        self.errors = {}
+        self.order = []
+        self.sent = 0
+        self.thread = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def submit(self, prefix, errmsg):
+        '''
+        Queue an error report. Never blocks on the mail relay.
+
+        @param prefix: string - where the error was logged from
+        @param errmsg: string - the error message
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run,
+                                               name='ErrorReporter')
+                self.thread.daemon = True
+                self.thread.start()
+                atexit.register(self.close)
+        self.queue.put((time.time(), tounicode(prefix), tounicode(errmsg)))
+
+    def close(self, timeout=None):
+        '''
+        End the run: deliver the digest and anything spooled earlier. Waits
+        at most a little longer than the relay timeout. Digests spooled by
+        earlier runs are only retried by a run that has errors of its own,
+        so that an unreachable relay does not delay every run.
+
+        @param timeout: int - seconds to wait, default relay timeout + 5
+        @return: bool - True if nothing is left undelivered
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.closed:
+                return not self.getspooled()
+            self.closed = True
+            thread = self.thread
+        if thread is None:
+            return True
+        self.queue.put(None)
+        if timeout is None:
+            timeout = self.timeout + 5
+        thread.join(timeout)
+        return not thread.is_alive() and not self.getspooled()
+
+    def __run(self):
+        '''
+        Private method, body of the sender thread.
+
+        @author: dkennel
+        '''
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            # Take everything already waiting before touching the spool
+            while item is not None:
+                try:
+                    item = self.queue.get_nowait()
+                except Queue.Empty:
+                    break
+                batch.append(item)
+            for entry in batch:
+                if entry is not None:
+                    self.__add(*entry)
+            self.__spool()
+            if None in batch:
+                self.deliver()
+                return
+
+    def __add(self, when, prefix, errmsg):
+        '''
+        Private method counting an error into the digest.
+
+        @author: dkennel
+        '''
+        errmsg = errmsg[:MAXERRLEN]
+        key = (prefix, errmsg)
+        if key in self.errors:
+            self.errors[key][0] += 1
+            self.errors[key][2] = when
+        else:
+            self.errors[key] = [1, when, when]
+            self.order.append(key)
+
+    def __spool(self):
+        '''
+        Private method writing the current digest to the spool so that it
+        survives a crash or an unreachable relay.
+
+        @author: dkennel
+        '''
+        if not self.order:
+            return
+        entries = [[prefix, errmsg] + self.errors[(prefix, errmsg)]
+                   for prefix, errmsg in self.order]
+        data = {'version': SPOOLVERSION,
+                'hostname': self.hostname,
+                'hostinfo': self.hostinfo,
+                'errors': entries}
+        try:
+            if not os.path.isdir(self.spooldir):
+                os.makedirs(self.spooldir, 0700)
+            tmpfile = self.spoolfile + '.tmp'
+            whandle = open(tmpfile, 'w')
+            try:
+                json.dump(data, whandle)
+            finally:
+                whandle.close()
+            os.rename(tmpfile, self.spoolfile)
+        except (IOError, OSError, ValueError, UnicodeError):
+            pass
+
+    def getspooled(self):
+        '''
+        Return the spooled digest files, oldest first.
+
+        @return: list of strings - full paths
+        @author: dkennel
+        '''
+        try:
+            names = sorted([name for name in os.listdir(self.spooldir)
+                            if name.startswith('digest-') and
+                            name.endswith('.json')],
+                           key=lambda name: [int(part) for part in
+                                             name[7:-5].split('-')])
+        except (OSError, ValueError):
+            return []
+        return [os.path.join(self.spooldir, name) for name in names]
+
+    def deliver(self):
+        '''
+        Mail every spooled digest over one connection. Delivered digests are
+        removed from the spool, the rest stay for the next run.
+
+        @return: int - number of digests delivered
+        @author: dkennel
+        '''
+        spooled = self.getspooled()
+        for stale in spooled[:-MAXSPOOL]:
+            self.__remove(stale)
+        spooled = spooled[-MAXSPOOL:]
+        if not spooled:
+            return 0
+        delivered = 0
+        try:
+            server = smtplib.SMTP(self.relay, self.port,
+                                  timeout=self.timeout)
+            try:
+                for path in spooled:
+                    message = self.__readdigest(path)
+                    try:
+                        if message is not None:
+                            server.sendmail(self.sender, [self.recipient],
+                                            message)
+                            delivered = delivered + 1
+                        self.__remove(path)
+                    except smtplib.SMTPServerDisconnected:
+                        # Keep this and the rest for the next run
+                        raise
+                    except (smtplib.SMTPException, UnicodeError,
+                            ValueError, TypeError):
+                        # Refused by the relay, retrying would not help
+                        self.__quarantine(path)
+            finally:
+                try:
+                    server.quit()
+                except (smtplib.SMTPException, socket.error):
+                    pass
+        except (smtplib.SMTPException, socket.error):
+            pass
+        self.sent = self.sent + delivered
+        return delivered
+
+    def __readdigest(self, path):
+        '''
+        Private method turning a spooled digest into a mail message.
+
+        @param path: string - spool file
+        @return: string or None if the file is unusable
+        @author: dkennel
+        '''
+        try:
+            rhandle = open(path, 'r')
+            try:
+                data = json.load(rhandle)
+            finally:
+                rhandle.close()
+            if data['version'] != SPOOLVERSION or not data['errors']:
+                return None
+            errors = data['errors']
+            total = sum([entry[2] for entry in errors])
+            body = [data['hostinfo'],
+                    '%d distinct errors, %d in total' % (len(errors), total),
+                    '']
+            for num, (prefix, errmsg, count, first, last) in \
+                    enumerate(errors):
+                body.append('[%d] %s (%d times, first %s, last %s)' %
+                            (num + 1, prefix, count,
+                             time.strftime('%Y-%m-%d %H:%M:%S',
+                                           time.localtime(first)),
+                             time.strftime('%Y-%m-%d %H:%M:%S',
+                                           time.localtime(last))))
+                body.append(errmsg)
+                body.append('')
+            subject = u'STONIX Error Report: %d errors from %s' % \
+                (total, data['hostname'])
+            body = u'\n'.join(body).encode('utf-8')
+        except (IOError, ValueError, KeyError, TypeError, UnicodeError):
+            return None
+        header = ['From: ' + self.sender,
+                  'To: ' + self.recipient,
+                  'Date: ' + formatdate(localtime=True),
+                  'Subject: ' + Header(subject, 'utf-8').encode(),
+                  'MIME-Version: 1.0',
+                  'Content-Type: text/plain; charset=utf-8',
+                  'Content-Transfer-Encoding: 8bit']
+        return '\r\n'.join(header) + '\r\n\r\n' + body
+
+    def __quarantine(self, path):
+        '''
+        Private method moving a digest the relay refused out of the spool.
+        Only the newest MAXSPOOL refused digests are kept.
+
+        @param path: string - spool file
+        @author: dkennel
+        '''
+        try:
+            os.rename(path, os.path.join(self.spooldir, FAILEDPREFIX +
+                                         os.path.basename(path)))
+            failed = sorted([name for name in os.listdir(self.spooldir)
+                             if name.startswith(FAILEDPREFIX)],
+                            key=lambda name: os.path.getmtime(
+                                os.path.join(self.spooldir, name)))
+        except OSError:
+            self.__remove(path)
+            return
+        for name in failed[:-MAXSPOOL]:
+            self.__remove(os.path.join(self.spooldir, name))
+
+    def __remove(self, path):
+        '''
+        Private method deleting a spool file.
+
+        @author: dkennel
+        '''
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,252 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Transactional store for the StateChgLogger change event journal. Events are
+kept in an SQLite database keyed by (rule number, event id), where the rule
+number is the first four characters of the event code (see
+StateChgLogger.recordchgevent), so finding the events of one rule is an index
+range lookup instead of a scan of every event ever recorded.
+
+Each write is committed on its own unless it is made inside batch(), in which
+case the writes of the batch are committed together when the batch ends.
+Events recorded by earlier versions in the shelve event log are copied over
+the first time the store is opened.
+
+@author: dkennel
+'''
+import cPickle
+import shelve
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SCHEMA = ['''CREATE TABLE IF NOT EXISTS events (
+             ruleid TEXT NOT NULL,
+             eventid TEXT NOT NULL,
+             data BLOB NOT NULL,
+             PRIMARY KEY (ruleid, eventid))''',
+          '''CREATE TABLE IF NOT EXISTS meta (
+             name TEXT PRIMARY KEY,
+             value TEXT)''']
+
+
+def splitcode(eventcode):
+    '''
+    Split an event code into its rule number and event id.
+
+    @param eventcode: string - e.g. 0052001
+    @return: tuple - (ruleid, eventid)
+    @author: dkennel
+    '''
+    return (eventcode[:4], eventcode[4:])
+
+
+class EventStore(object):
+    '''
+    Dictionary like store of change events. Thread safe so that rules run
+    by the RuleExecutor may share it.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, path, shelfpath=None):
+        '''
+        @param path: string - database file
+        @param shelfpath: string - shelve event log to migrate, if any
+        '''
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.con = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self.con.text_factory = str
+        # WAL needs SQLite 3.7; older versions keep their default journal
+        self.con.execute('PRAGMA journal_mode=WAL')
+        self.con.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            self.con.execute(statement)
+        self.migrated = 0
+        if shelfpath is not None:
+            self.migrated = self.migrate(shelfpath)
+
+    def migrate(self, shelfpath):
+        '''
+        Copy the events of a shelve event log into the store. Done once, the
+        shelf is left in place.
+
+        @param shelfpath: string - path given to shelve.open
+        @return: int - number of events copied
+        @author: dkennel
+        '''
+        with self.lock:
+            row = self.con.execute("SELECT value FROM meta WHERE name = "
+                                   "'migrated'").fetchone()
+            if row is not None:
+                return 0
+            copied = 0
+            try:
+                shelf = shelve.open(shelfpath, 'r')
+            except Exception:
+                # Missing or unreadable, there is nothing to bring over
+                shelf = None
+            with self.batch():
+                if shelf is not None:
+                    try:
+                        for eventcode in shelf.keys():
+                            try:
+                                eventdict = shelf[eventcode]
+                            except Exception:
+                                continue
+                            self.put(eventcode, eventdict, replace=False)
+                            copied = copied + 1
+                    finally:
+                        shelf.close()
+                self.con.execute("INSERT INTO meta VALUES ('migrated', ?)",
+                                 (shelfpath,))
+            return copied
+
+    @contextmanager
+    def batch(self):
+        '''
+        Context manager committing every write made inside it in one
+        transaction. Batches may be nested and overlap between threads; the
+        transaction is committed when the last one ends.
+
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.depth == 0:
+                self.con.execute('BEGIN')
+            self.depth = self.depth + 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.depth = self.depth - 1
+                if self.depth == 0:
+                    self.con.execute('COMMIT')
+
+    def put(self, eventcode, eventdict, replace=True):
+        '''
+        Store an event, replacing any event with the same code.
+
+        @param eventcode: string - event code
+        @param eventdict: dict - event data
+        @param replace: bool - False to keep an existing event instead
+        @author: dkennel
+        '''
+        ruleid, eventid = splitcode(eventcode)
+        data = sqlite3.Binary(cPickle.dumps(eventdict, 2))
+        if replace:
+            statement = 'INSERT OR REPLACE INTO events VALUES (?, ?, ?)'
+        else:
+            statement = 'INSERT OR IGNORE INTO events VALUES (?, ?, ?)'
+        with self.lock:
+            self.con.execute(statement, (ruleid, eventid, data))
+
+    def get(self, eventcode):
+        '''
+        Return the event data stored for the event code.
+
+        @param eventcode: string - event code
+        @return: dict
+        @raise KeyError: if there is no such event
+        @author: dkennel
+        '''
+        with self.lock:
+            row = self.con.execute('SELECT data FROM events WHERE '
+                                   'ruleid = ? AND eventid = ?',
+                                   splitcode(eventcode)).fetchone()
+        if row is None:
+            raise KeyError(eventcode)
+        return cPickle.loads(str(row[0]))
+
+    def delete(self, eventcode):
+        '''
+        Remove an event.
+
+        @param eventcode: string - event code
+        @raise KeyError: if there is no such event
+        @author: dkennel
+        '''
+        with self.lock:
+            cursor = self.con.execute('DELETE FROM events WHERE ruleid = ? '
+                                      'AND eventid = ?',
+                                      splitcode(eventcode))
+        if cursor.rowcount == 0:
+            raise KeyError(eventcode)
+
+    def findrule(self, ruleid):
+        '''
+        Return the codes of every event recorded for a rule, in order.
+
+        @param ruleid: string - four digit zero padded rule number
+        @return: list of strings
+        @author: dkennel
+        '''
+        with self.lock:
+            rows = self.con.execute('SELECT eventid FROM events WHERE '
+                                    'ruleid = ? ORDER BY eventid',
+                                    (ruleid,)).fetchall()
+        return [ruleid + row[0] for row in rows]
+
+    def keys(self):
+        '''
+        Return the codes of every event.
+
+        @return: list of strings
+        @author: dkennel
+        '''
+        with self.lock:
+            rows = self.con.execute('SELECT ruleid, eventid FROM events '
+                                    'ORDER BY ruleid, eventid').fetchall()
+        return [ruleid + eventid for ruleid, eventid in rows]
+
+    def __len__(self):
+        with self.lock:
+            return self.con.execute('SELECT COUNT(*) FROM '
+                                    'events').fetchone()[0]
+
+    def __contains__(self, eventcode):
+        try:
+            self.get(eventcode)
+        except KeyError:
+            return False
+        return True
+
+    def close(self):
+        '''
+        Close the database. Any batch still open is committed.
+
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.con is None:
+                return
+            if self.depth:
+                self.depth = 0
+                self.con.execute('COMMIT')
+            self.con.close()
+            self.con = None
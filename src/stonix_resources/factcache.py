@@ -0,0 +1,330 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Persistent cache of the facts Environment collects about the system. Facts
+come in groups (operating system, network, hardware) that are collected by
+probe functions. When a run starts, the groups that are missing or have
+expired are probed at the same time, one thread each. The results are kept
+in memory for the rest of the process and written to FACTFILE. A later run
+within the time to live of a group then starts without probing anything.
+
+A group may also carry a stamp, e.g. the modification times of the os
+release files. A cached group whose stamp changed is probed again whatever
+its age, so an os upgrade is seen on the next run.
+
+@author: dkennel
+'''
+import json
+import os
+import re
+import threading
+import time
+
+FACTDIR = '/var/db/stonix'
+FACTFILE = os.path.join(FACTDIR, 'facts.json')
+FACTVERSION = 1
+# Seconds each group of facts is trusted
+TTLS = {'os': 86400,
+        'hardware': 7 * 86400,
+        'network': 900}
+DEFAULTTTL = 3600
+# Files whose change means the os may have been upgraded
+RELEASEFILES = ['/etc/os-release', '/etc/lsb-release', '/etc/redhat-release',
+                '/etc/gentoo-release', '/etc/debian_version',
+                '/System/Library/CoreServices/SystemVersion.plist']
+DMIHANDLE = re.compile(r'^Handle 0x[0-9A-Fa-f]+, DMI type \d+')
+
+
+def osstamp():
+    '''
+    Return the stamp of the os group: the modification times of the os
+    release files present.
+
+    @return: list of [path, mtime]
+    @author: dkennel
+    '''
+    stamp = []
+    for path in RELEASEFILES:
+        try:
+            stamp.append([path, int(os.stat(path).st_mtime)])
+        except OSError:
+            continue
+    return stamp
+
+
+def encode(value):
+    '''
+    Turn the unicode strings json returns back into the plain strings the
+    probes produced.
+
+    @param value: value read from json
+    @return: the value with every unicode string utf-8 encoded
+    @author: dkennel
+    '''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return dict([(encode(key), encode(item)) for key, item in
+                     value.iteritems()])
+    return value
+
+
+def parsedmidecode(lines):
+    '''
+    Turn the output of dmidecode -t system -t chassis into a dictionary
+    of sections, e.g. 'System Information', each a dictionary of the fields
+    of the section. Where a section occurs more than once the last one wins,
+    as with the dmidecode python module loops this replaces.
+
+    @param lines: list of strings
+    @return: dict
+    @author: dkennel
+    '''
+    sections = {}
+    current = None
+    expectname = False
+    for line in lines:
+        line = line.rstrip('\n')
+        if DMIHANDLE.search(line):
+            expectname = True
+            current = None
+            continue
+        if expectname:
+            expectname = False
+            if line.strip():
+                current = {}
+                sections[line.strip()] = current
+            continue
+        if current is None or not line.startswith('\t') or \
+                line.startswith('\t\t') or ':' not in line:
+            continue
+        key, value = line.strip().split(':', 1)
+        current[key.strip()] = value.strip()
+    return sections
+
+
+def parseprofiler(lines):
+    '''
+    Turn the output of system_profiler SPHardwareDataType into a dictionary
+    of its fields.
+
+    @param lines: list of strings
+    @return: dict
+    @author: dkennel
+    '''
+    fields = {}
+    for line in lines:
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        if key.strip() and value.strip():
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+class FactCache(object):
+    '''
+    Facts about the system by group, collected by probes and persisted with
+    a time to live. Thread safe.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, path=FACTFILE, ttls=None):
+        '''
+        @param path: string - file used to persist facts, None for none
+        @param ttls: dict - seconds each group is trusted, default TTLS
+        '''
+        self.path = path
+        self.ttls = dict(TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.groups = {}
+        self.probes = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        '''
+        Read persisted facts. A missing, unreadable or outdated file is
+        ignored.
+
+        @return: bool - True if facts were loaded
+        @author: dkennel
+        '''
+        if self.path is None:
+            return False
+        try:
+            rhandle = open(self.path, 'r')
+            try:
+                data = encode(json.load(rhandle))
+            finally:
+                rhandle.close()
+            if data['version'] != FACTVERSION:
+                return False
+            groups = {}
+            for name, group in data['groups'].iteritems():
+                groups[name] = {'collected': float(group['collected']),
+                                     'stamp': group.get('stamp'),
+                                     'facts': group['facts']}
+        except (IOError, ValueError, KeyError, TypeError, AttributeError):
+            return False
+        with self.lock:
+            self.groups.update(groups)
+        return True
+
+    def save(self):
+        '''
+        Persist the facts. The file is readable by root only as it holds
+        serial numbers, and is replaced atomically. Failure to write is not
+        an error, the next run simply probes again.
+
+        @return: bool - True if the file was written
+        @author: dkennel
+        '''
+        if self.path is None:
+            return False
+        with self.lock:
+            data = json.dumps({'version': FACTVERSION,
+                               'groups': self.groups})
+        tmppath = self.path + '.tmp'
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0755)
+            handle = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                             0600)
+            whandle = os.fdopen(handle, 'w')
+            try:
+                whandle.write(data)
+            finally:
+                whandle.close()
+            os.rename(tmppath, self.path)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def isfresh(self, name, stamp=None):
+        '''
+        Return True if the group is cached, within its time to live and
+        carries the stamp given.
+
+        @param name: string - group name
+        @param stamp: json compatible value - current stamp of the group
+        @return: bool
+        @author: dkennel
+        '''
+        with self.lock:
+            group = self.groups.get(name)
+        if group is None:
+            return False
+        age = time.time() - group['collected']
+        if age < 0 or age > self.ttls.get(name, DEFAULTTTL):
+            return False
+        return group['stamp'] == stamp
+
+    def collect(self, probes, stamps=None, refresh=False):
+        '''
+        Return the facts of every group in probes. Groups that are not fresh,
+        or all of them with refresh, are probed concurrently and the cache
+        file is written if anything was probed. A probe that raises leaves
+        the cached facts of its group, if any, in place.
+
+        @param probes: dict - group name to a function returning a dict of
+            facts
+        @param stamps: dict - group name to the current stamp of the group
+        @param refresh: bool - probe every group whatever its age
+        @return: dict - group name to dict of facts
+        @author: dkennel
+        '''
+        stamps = stamps or {}
+        stale = [name for name in probes if refresh or
+                 not self.isfresh(name, stamps.get(name))]
+        results = {}
+        errors = {}
+
+        def run(name):
+            try:
+                results[name] = probes[name]()
+            except Exception, err:
+                errors[name] = err
+        threads = []
+        for name in stale:
+            thread = threading.Thread(target=run, args=(name,),
+                                      name='FactProbe-' + name)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        now = time.time()
+        with self.lock:
+            self.probes = self.probes + len(results)
+            for name, facts in results.iteritems():
+                self.groups[name] = {'collected': now,
+                                     'stamp': stamps.get(name),
+                                     'facts': facts}
+        if results:
+            self.save()
+        collected = {}
+        with self.lock:
+            for name in probes:
+                if name in self.groups:
+                    collected[name] = dict(self.groups[name]['facts'])
+                elif name in errors:
+                    raise errors[name]
+        return collected
+
+    def getprobes(self):
+        '''
+        Return the number of groups probed by this cache.
+
+        @return: int
+        @author: dkennel
+        '''
+        return self.probes
+
+
+CACHES = {}
+REGISTRYLOCK = threading.Lock()
+
+
+def getfactcache(path=FACTFILE):
+    '''
+    Return the process wide FactCache for the cache file, so that every
+    Environment in a process shares the facts probed by the first one.
+
+    @param path: string - cache file, None for an in memory cache
+    @return: FactCache
+    @author: dkennel
+    '''
+    with REGISTRYLOCK:
+        cache = CACHES.get(path)
+        if cache is None:
+            cache = FactCache(path)
+            CACHES[path] = cache
+        return cache
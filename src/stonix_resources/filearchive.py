@@ -0,0 +1,379 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Content addressed archive for the copies of files StateChgLogger keeps
+before altering or deleting them. The content of every archived version is
+stored once, as a blob named after its SHA-256 hash, however many paths or
+versions share it. An SQLite index lists the versions of each path in order,
+so the newest (or the original) version of a path is found without listing
+any directory.
+
+A new version is only added when the content differs from the newest one.
+The first version of a path, its original, is always kept; of the later
+versions only the newest few are, and blobs no longer used by any version
+are removed.
+
+Copies in the <path>.ovf[timestamp] layout of the previous archive are
+brought into the index the first time their path is archived or restored.
+
+@author: dkennel
+'''
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+SCHEMA = ['''CREATE TABLE IF NOT EXISTS versions (
+             path TEXT NOT NULL,
+             seq INTEGER NOT NULL,
+             hash TEXT NOT NULL,
+             compressed INTEGER NOT NULL,
+             mode INTEGER,
+             uid INTEGER,
+             gid INTEGER,
+             size INTEGER,
+             archived REAL,
+             PRIMARY KEY (path, seq))''',
+          '''CREATE INDEX IF NOT EXISTS versionhash ON versions(hash)''']
+# Versions kept per path besides the original
+KEEPVERSIONS = 5
+LEGACYSTAMP = re.compile(r'\.ovf(\d+(\.\d+)?)$')
+
+
+class FileArchive(object):
+    '''
+    Versioned, deduplicated store of file contents. Thread safe so that
+    rules run by the RuleExecutor may share it.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, root, compress=False, keep=KEEPVERSIONS, legacy=None):
+        '''
+        @param root: string - directory holding the blobs and the index
+        @param compress: bool - gzip compress new blobs
+        @param keep: int - versions kept per path besides the original
+        @param legacy: string - root of the previous .ovf archive, if any
+        '''
+        self.root = root
+        self.blobdir = os.path.join(root, 'blobs')
+        self.compress = compress
+        self.keep = keep
+        self.legacy = legacy
+        self.lock = threading.RLock()
+        if not os.path.isdir(self.blobdir):
+            os.makedirs(self.blobdir, 0700)
+        self.con = sqlite3.connect(os.path.join(root, 'index.sqlite'),
+                                   check_same_thread=False)
+        self.con.text_factory = str
+        for statement in SCHEMA:
+            self.con.execute(statement)
+        self.con.commit()
+
+    def blobpath(self, digest, compressed):
+        '''
+        Return the location of a blob.
+
+        @param digest: string - SHA-256 hex digest of the content
+        @param compressed: bool - whether the blob is gzip compressed
+        @return: string
+        @author: dkennel
+        '''
+        name = digest
+        if compressed:
+            name = name + '.gz'
+        return os.path.join(self.blobdir, digest[:2], name)
+
+    def __storeblob(self, source):
+        '''
+        Private method copying a file into the blob store, unless a blob
+        with the same content is there already.
+
+        @param source: string - file to store
+        @return: tuple - (digest, compressed)
+        @author: dkennel
+        '''
+        sha = hashlib.sha256()
+        handle, tmppath = tempfile.mkstemp(dir=self.blobdir)
+        try:
+            rawhandle = os.fdopen(handle, 'wb')
+            if self.compress:
+                whandle = gzip.GzipFile(fileobj=rawhandle, mode='wb')
+            else:
+                whandle = rawhandle
+            rhandle = open(source, 'rb')
+            try:
+                while True:
+                    chunk = rhandle.read(65536)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    whandle.write(chunk)
+            finally:
+                rhandle.close()
+                whandle.close()
+                rawhandle.close()
+            digest = sha.hexdigest()
+            for compressed in [self.compress, not self.compress]:
+                if os.path.exists(self.blobpath(digest, compressed)):
+                    os.remove(tmppath)
+                    return (digest, compressed)
+            destination = self.blobpath(digest, self.compress)
+            if not os.path.isdir(os.path.dirname(destination)):
+                os.makedirs(os.path.dirname(destination), 0700)
+            os.rename(tmppath, destination)
+        except:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+        return (digest, self.compress)
+
+    def __addversion(self, path, source, archived=None):
+        '''
+        Private method adding the content of source as the newest version of
+        path, unless it is the same as the newest version.
+
+        @param path: string - path the version belongs to
+        @param source: string - file holding the content
+        @param archived: float - time of archiving, default now
+        @return: tuple - the version, see getversions
+        @author: dkennel
+        '''
+        digest, compressed = self.__storeblob(source)
+        newest = self.getnewest(path)
+        if newest is not None and newest[1] == digest:
+            return newest
+        seq = 0
+        if newest is not None:
+            seq = newest[0] + 1
+        info = os.stat(source)
+        if archived is None:
+            archived = time.time()
+        version = (seq, digest, compressed, info.st_mode & 07777,
+                   info.st_uid, info.st_gid, info.st_size, archived)
+        self.con.execute('INSERT INTO versions VALUES '
+                         '(?, ?, ?, ?, ?, ?, ?, ?, ?)', (path,) + version)
+        self.con.commit()
+        self.prune(path)
+        return version
+
+    def archive(self, path):
+        '''
+        Archive the current content of a file.
+
+        @param path: string - full path of the file
+        @return: tuple - the version holding the content, None if the file
+            does not exist
+        @author: dkennel
+        '''
+        if not os.path.isfile(path):
+            return None
+        with self.lock:
+            self.importlegacy(path)
+            return self.__addversion(path, path)
+
+    def getversions(self, path):
+        '''
+        Return the versions of a path, oldest first. Each version is a tuple
+        of (seq, hash, compressed, mode, uid, gid, size, archived).
+
+        @param path: string - full path of the file
+        @return: list of tuples
+        @author: dkennel
+        '''
+        with self.lock:
+            return self.con.execute('SELECT seq, hash, compressed, mode, '
+                                    'uid, gid, size, archived FROM versions '
+                                    'WHERE path = ? ORDER BY seq',
+                                    (path,)).fetchall()
+
+    def getnewest(self, path):
+        '''
+        Return the newest version of a path.
+
+        @param path: string - full path of the file
+        @return: tuple or None, see getversions
+        @author: dkennel
+        '''
+        with self.lock:
+            return self.con.execute('SELECT seq, hash, compressed, mode, '
+                                    'uid, gid, size, archived FROM versions '
+                                    'WHERE path = ? ORDER BY seq DESC '
+                                    'LIMIT 1', (path,)).fetchone()
+
+    def getoriginal(self, path):
+        '''
+        Return the first version archived for a path.
+
+        @param path: string - full path of the file
+        @return: tuple or None, see getversions
+        @author: dkennel
+        '''
+        with self.lock:
+            return self.con.execute('SELECT seq, hash, compressed, mode, '
+                                    'uid, gid, size, archived FROM versions '
+                                    'WHERE path = ? ORDER BY seq LIMIT 1',
+                                    (path,)).fetchone()
+
+    def restore(self, path, destination=None, version=None):
+        '''
+        Write an archived version of a file, with its archived permissions
+        and ownership. The destination is replaced atomically.
+
+        @param path: string - full path of the archived file
+        @param destination: string - where to write it, default path
+        @param version: tuple - version to restore, default the newest
+        @return: bool - False if there is no such version
+        @author: dkennel
+        '''
+        if destination is None:
+            destination = path
+        with self.lock:
+            if version is None:
+                self.importlegacy(path)
+                version = self.getnewest(path)
+            if version is None:
+                return False
+        _, digest, compressed, mode, uid, gid, _, _ = version
+        blob = self.blobpath(digest, compressed)
+        if not os.path.exists(blob):
+            return False
+        if compressed:
+            rhandle = gzip.open(blob, 'rb')
+        else:
+            rhandle = open(blob, 'rb')
+        handle, tmppath = tempfile.mkstemp(dir=os.path.dirname(destination))
+        try:
+            whandle = os.fdopen(handle, 'wb')
+            try:
+                shutil.copyfileobj(rhandle, whandle)
+            finally:
+                whandle.close()
+                rhandle.close()
+            if mode is not None:
+                os.chmod(tmppath, mode)
+            if uid is not None:
+                try:
+                    os.chown(tmppath, uid, gid)
+                except OSError:
+                    # Not permitted when running unprivileged
+                    pass
+            os.rename(tmppath, destination)
+        except:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+        return True
+
+    def prune(self, path):
+        '''
+        Apply the retention policy to a path: the original and the newest
+        versions are kept, the rest are dropped along with any blob no
+        version uses any more.
+
+        @param path: string - full path of the file
+        @return: int - number of versions dropped
+        @author: dkennel
+        '''
+        with self.lock:
+            versions = self.getversions(path)
+            dropped = versions[1:-self.keep] if self.keep else versions[1:]
+            for version in dropped:
+                self.con.execute('DELETE FROM versions WHERE path = ? AND '
+                                 'seq = ?', (path, version[0]))
+            self.con.commit()
+            for digest in set([(version[1], version[2])
+                               for version in dropped]):
+                row = self.con.execute('SELECT COUNT(*) FROM versions WHERE '
+                                       'hash = ?', (digest[0],)).fetchone()
+                if row[0] == 0:
+                    try:
+                        os.remove(self.blobpath(*digest))
+                    except OSError:
+                        pass
+            return len(dropped)
+
+    def getlegacycopies(self, path):
+        '''
+        Return the copies of a path in the previous archive, oldest first.
+
+        @param path: string - full path of the file
+        @return: list of tuples - (archive time, copy path)
+        @author: dkennel
+        '''
+        if self.legacy is None:
+            return []
+        directory, filename = os.path.split(path)
+        legacydir = self.legacy + directory
+        # The .ovf copy is the original whatever its mtime
+        original = []
+        copy = os.path.join(legacydir, filename + '.ovf')
+        if os.path.isfile(copy):
+            original.append((os.stat(copy).st_mtime, copy))
+        try:
+            names = os.listdir(legacydir)
+        except OSError:
+            return original
+        later = []
+        for name in names:
+            match = LEGACYSTAMP.search(name)
+            if match is None or name != filename + match.group(0):
+                continue
+            later.append((float(match.group(1)),
+                          os.path.join(legacydir, name)))
+        return original + sorted(later)
+
+    def importlegacy(self, path):
+        '''
+        Bring the copies of a path in the previous archive into the index,
+        if the path has no versions yet. The copies are left in place.
+
+        @param path: string - full path of the file
+        @return: int - number of copies brought in
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.legacy is None or self.getnewest(path) is not None:
+                return 0
+            copies = self.getlegacycopies(path)
+            for archived, copy in copies:
+                self.__addversion(path, copy, archived)
+            return len(copies)
+
+    def close(self):
+        '''
+        Close the index.
+
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.con is not None:
+                self.con.close()
+                self.con = None
@@ -0,0 +1,208 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Run scoped cache of configuration file contents and of what rules parse out
+of them. Many rules read the same files (/etc/passwd, /etc/shadow,
+/etc/login.defs, /etc/sysctl.conf, sshd_config, the pam.d files...) through
+readFile, KVAConf and ConfFile. The first read of a file is kept, keyed by
+its path and the (inode, modification time, size) of the version read, and
+later reads of the same version are answered from memory.
+
+Callers get their own copy of the lines. Parse results (see getparsed) are
+shared between callers and must be treated as read only.
+
+A path is dropped from the cache when STONIX writes it: writeFile, a
+KVEditor commit or StateChgLogger.recordfilechange. Any other change is
+caught by the stamp. While a rule's fix or undo runs (see
+CommandCache.fixing) files are read from disk and nothing is cached, as
+with the command cache.
+
+@author: dkennel
+'''
+import os
+import threading
+from CommandHelper import getcommandcache
+
+# Larger files, e.g. logs, are not worth keeping
+MAXFILESIZE = 4 * 1024 * 1024
+
+
+def getstamp(path):
+    '''
+    Return what identifies the version of a file.
+
+    @param path: string - file path
+    @return: tuple - (inode, modification time, size) or None if missing
+    @author: dkennel
+    '''
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_ino, info.st_mtime, info.st_size)
+
+
+class FileCache(object):
+    '''
+    Cache of file lines and parse results by path and version. Thread safe
+    so that rules running under the RuleExecutor may share it.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, maxsize=MAXFILESIZE):
+        '''
+        @param maxsize: int - largest file cached, in bytes
+        '''
+        self.maxsize = maxsize
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def __getentry(self, path):
+        '''
+        Private method returning the cache entry for the current version of
+        the file, reading it if needed.
+
+        @param path: string - file path
+        @return: dict - stamp, lines (a tuple) and parsed
+        @raise IOError: the file can not be read
+        @author: dkennel
+        '''
+        path = os.path.abspath(path)
+        fixing = getcommandcache().isfixing()
+        if not fixing:
+            stamp = getstamp(path)
+            with self.lock:
+                entry = self.entries.get(path)
+                if entry is not None and entry['stamp'] == stamp:
+                    self.hits = self.hits + 1
+                    return entry
+                self.misses = self.misses + 1
+        rhandle = open(path, 'r')
+        try:
+            before = os.fstat(rhandle.fileno())
+            data = rhandle.read()
+            after = os.fstat(rhandle.fileno())
+        finally:
+            rhandle.close()
+        stamp = (after.st_ino, after.st_mtime, after.st_size)
+        entry = {'stamp': stamp,
+                 'lines': tuple(data.splitlines(True)),
+                 'parsed': {}}
+        # Files changing while read, and files whose size does not describe
+        # their content (/proc, /sys), are not cached.
+        if not fixing and len(data) == after.st_size <= self.maxsize and \
+                (before.st_mtime, before.st_size) == \
+                (after.st_mtime, after.st_size):
+            with self.lock:
+                self.entries[path] = entry
+        return entry
+
+    def read(self, path):
+        '''
+        Return the lines of a file and the version they belong to.
+
+        @param path: string - file path
+        @return: tuple - (stamp, list of lines with their newlines)
+        @raise IOError: the file can not be read
+        @author: dkennel
+        '''
+        entry = self.__getentry(path)
+        return (entry['stamp'], list(entry['lines']))
+
+    def getlines(self, path):
+        '''
+        Return the lines of a file.
+
+        @param path: string - file path
+        @return: list of lines with their newlines
+        @raise IOError: the file can not be read
+        @author: dkennel
+        '''
+        return list(self.__getentry(path)['lines'])
+
+    def getparsed(self, path, name, parser):
+        '''
+        Return the lines of a file and the result of parser for them. The
+        parse result is kept with the lines under name, so every caller
+        using the same name and the same version of the file shares one
+        parse. It must not be altered.
+
+        @param path: string - file path
+        @param name: string - identifies the parser and its settings
+        @param parser: function taking a list of lines
+        @return: tuple - (stamp, list of lines, parse result)
+        @raise IOError: the file can not be read
+        @author: dkennel
+        '''
+        entry = self.__getentry(path)
+        with self.lock:
+            if name in entry['parsed']:
+                return (entry['stamp'], list(entry['lines']),
+                        entry['parsed'][name])
+        parsed = parser(list(entry['lines']))
+        with self.lock:
+            parsed = entry['parsed'].setdefault(name, parsed)
+        return (entry['stamp'], list(entry['lines']), parsed)
+
+    def invalidate(self, path=None):
+        '''
+        Forget a file, or every file.
+
+        @param path: string - file path, None for all
+        @author: dkennel
+        '''
+        with self.lock:
+            if path is None:
+                if self.entries:
+                    self.invalidations = self.invalidations + 1
+                self.entries = {}
+            elif self.entries.pop(os.path.abspath(path), None) is not None:
+                self.invalidations = self.invalidations + 1
+
+    def getstats(self):
+        '''
+        Return the cache counters.
+
+        @return: tuple - (hits, misses, invalidations)
+        @author: dkennel
+        '''
+        return (self.hits, self.misses, self.invalidations)
+
+
+FILECACHE = FileCache()
+
+
+def getfilecache():
+    '''
+    Return the process wide FileCache.
+
+    @return: FileCache
+    @author: dkennel
+    '''
+    return FILECACHE
@@ -0,0 +1,456 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Filesystem scanner used by the FilePermissions rule to find world writable,
+SUID/SGID and unowned files. Each entry is examined with a single lstat (or
+the cached stat of a scandir entry when the scandir module is installed),
+mount points are detected by comparing st_dev with the root of the
+filesystem being walked and owner checks are answered from sets of the known
+uids and gids built once per scan. Every filesystem is walked in its own
+worker process and the hits are streamed back to the caller in batches.
+
+Each walk leaves a per filesystem index (directory -> mtime, ctime and the
+names worth revisiting) that lets the next walk skip listing directories
+that have not changed. See walkfilesystem for what an incremental walk can
+miss; callers are expected to force a full walk periodically.
+
+@author: dkennel
+'''
+import grp
+import marshal
+import multiprocessing
+import os
+import pwd
+import Queue
+import stat
+import traceback
+import urllib
+from logdispatcher import LogPriority
+
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+CATEGORIES = ['ww', 'suid', 'unowned']
+# Past this many hits in a category the system is in such a bad state that
+# the scan is abandoned and the admin is asked to check by hand.
+HITLIMIT = 25000
+BATCHSIZE = 500
+INDEXVERSION = 1
+
+
+class IdCache(object):
+    '''
+    Answers whether a uid or gid belongs to a known account or group. The
+    local databases are enumerated once; ids not found there are looked up
+    individually, since directory services may not enumerate, and the answer
+    is remembered.
+
+    @author: dkennel
+    '''
+
+    def __init__(self):
+        self.uids = set([entry.pw_uid for entry in pwd.getpwall()])
+        self.gids = set([entry.gr_gid for entry in grp.getgrall()])
+        self.baduids = set()
+        self.badgids = set()
+
+    def knownuid(self, uid):
+        '''
+        @param uid: int
+        @return: bool - True if the uid maps to an account
+        @author: dkennel
+        '''
+        if uid in self.uids:
+            return True
+        if uid in self.baduids:
+            return False
+        try:
+            pwd.getpwuid(uid)
+        except KeyError:
+            self.baduids.add(uid)
+            return False
+        self.uids.add(uid)
+        return True
+
+    def knowngid(self, gid):
+        '''
+        @param gid: int
+        @return: bool - True if the gid maps to a group
+        @author: dkennel
+        '''
+        if gid in self.gids:
+            return True
+        if gid in self.badgids:
+            return False
+        try:
+            grp.getgrgid(gid)
+        except KeyError:
+            self.badgids.add(gid)
+            return False
+        self.gids.add(gid)
+        return True
+
+
+def listentries(path):
+    '''
+    Return the entries of a directory with their lstat results. Entries that
+    vanish while being read are skipped.
+
+    @param path: string - directory to list
+    @return: list of (name, stat result) tuples
+    @author: dkennel
+    '''
+    entries = []
+    if scandir is not None:
+        for entry in scandir(path):
+            try:
+                entries.append((entry.name,
+                                entry.stat(follow_symlinks=False)))
+            except OSError:
+                continue
+        return entries
+    for name in os.listdir(path):
+        try:
+            entries.append((name, os.lstat(os.path.join(path, name))))
+        except OSError:
+            continue
+    return entries
+
+
+def classify(fstat, idcache):
+    '''
+    Return the categories a non directory entry belongs to.
+
+    @param fstat: stat result from lstat
+    @param idcache: IdCache
+    @return: list of category names
+    @author: dkennel
+    '''
+    mode = fstat.st_mode
+    hits = []
+    if mode & stat.S_IWOTH:
+        hits.append('ww')
+    if mode & (stat.S_ISUID | stat.S_ISGID):
+        hits.append('suid')
+    if not idcache.knownuid(fstat.st_uid) or \
+       not idcache.knowngid(fstat.st_gid):
+        hits.append('unowned')
+    return hits
+
+
+def walkfilesystem(top, idcache, emit, stopped=None, index=None):
+    '''
+    Walk the filesystem mounted at top without crossing into other
+    filesystems and call emit(category, path) for every hit. Symbolic links
+    are never followed or reported. Directories are only checked for world
+    write.
+
+    When the index of a previous walk is given, directories whose mtime and
+    ctime are unchanged are not listed again. Only their subdirectories and
+    the files that were hits last time are looked at (with lstat), so a mode
+    or owner change on a file that was not a hit before is only found by a
+    full walk (index=None).
+
+    @param top: string - mount point of the filesystem
+    @param idcache: IdCache
+    @param emit: callable taking category and path
+    @param stopped: optional callable, the walk ends when it returns True
+    @param index: dict - the index returned by a previous walk of top
+    @return: dict - the index for the next walk. Incomplete if stopped.
+    @author: dkennel
+    '''
+    if index is None:
+        index = {}
+    newindex = {}
+    try:
+        topstat = os.lstat(top)
+    except OSError:
+        return newindex
+    topdev = topstat.st_dev
+    pending = [(top, topstat)]
+    while pending:
+        if stopped is not None and stopped():
+            return newindex
+        root, rootstat = pending.pop()
+        known = index.get(root)
+        if known is not None and known[0] == rootstat.st_mtime and \
+           known[1] == rootstat.st_ctime:
+            entries = []
+            for name in known[2]:
+                try:
+                    entries.append((name, os.lstat(os.path.join(root, name))))
+                except OSError:
+                    continue
+        else:
+            try:
+                entries = listentries(root)
+            except OSError:
+                continue
+        # Names worth a look on the next incremental walk: subdirectories
+        # and files that were hits.
+        names = []
+        for name, fstat in entries:
+            mode = fstat.st_mode
+            if stat.S_ISLNK(mode):
+                continue
+            path = os.path.join(root, name)
+            if stat.S_ISDIR(mode):
+                if fstat.st_dev != topdev:
+                    # mount point of another filesystem
+                    continue
+                if mode & stat.S_IWOTH:
+                    emit('ww', path)
+                pending.append((path, fstat))
+                names.append(name)
+                continue
+            hits = classify(fstat, idcache)
+            if hits:
+                names.append(name)
+                for category in hits:
+                    emit(category, path)
+        newindex[root] = (rootstat.st_mtime, rootstat.st_ctime, names)
+    return newindex
+
+
+def indexpath(indexdir, top):
+    '''
+    Return the path of the index file for the filesystem mounted at top.
+
+    @param indexdir: string - directory holding the index files
+    @param top: string - mount point of the filesystem
+    @return: string
+    @author: dkennel
+    '''
+    return os.path.join(indexdir, urllib.quote(top, safe='') + '.idx')
+
+
+def loadindex(path, top):
+    '''
+    Read a filesystem index written by saveindex. An index that is missing,
+    unreadable, from another version or for a different filesystem than the
+    one now mounted at top is ignored.
+
+    @param path: string - index file
+    @param top: string - mount point of the filesystem
+    @return: dict or None
+    @author: dkennel
+    '''
+    try:
+        rhandle = open(path, 'rb')
+        try:
+            data = marshal.load(rhandle)
+        finally:
+            rhandle.close()
+        if data['version'] != INDEXVERSION or data['top'] != top or \
+           data['dev'] != os.lstat(top).st_dev:
+            return None
+        return data['dirs']
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        return None
+
+
+def saveindex(path, top, dirs):
+    '''
+    Atomically write the index of a completed walk of top.
+
+    @param path: string - index file
+    @param top: string - mount point of the filesystem
+    @param dirs: dict - index returned by walkfilesystem
+    @author: dkennel
+    '''
+    data = {'version': INDEXVERSION,
+            'top': top,
+            'dev': os.lstat(top).st_dev,
+            'dirs': dirs}
+    tmppath = path + '.tmp'
+    whandle = open(tmppath, 'wb')
+    try:
+        marshal.dump(data, whandle, 2)
+    finally:
+        whandle.close()
+    os.chmod(tmppath, 0600)
+    os.rename(tmppath, path)
+
+
+def scanworker(top, idcache, resultq, stopevent, indexfile=None,
+               full=True):
+    '''
+    Worker process main. Walks one filesystem and puts batches of hits on
+    the result queue followed by a done (or error) message.
+
+    @param top: string - mount point of the filesystem
+    @param idcache: IdCache
+    @param resultq: multiprocessing.Queue
+    @param stopevent: multiprocessing.Event, set when the scan is abandoned
+    @param indexfile: string - index file to use and update, if any
+    @param full: bool - ignore the existing index and walk everything
+    @author: dkennel
+    '''
+    batch = []
+
+    def emit(category, path):
+        batch.append((category, path))
+        if len(batch) >= BATCHSIZE:
+            resultq.put(('hits', top, list(batch)))
+            del batch[:]
+    try:
+        index = None
+        if indexfile is not None and not full:
+            index = loadindex(indexfile, top)
+        dirs = walkfilesystem(top, idcache, emit, stopevent.is_set, index)
+        if batch:
+            resultq.put(('hits', top, batch))
+        if indexfile is not None and not stopevent.is_set():
+            saveindex(indexfile, top, dirs)
+        resultq.put(('done', top, index is None))
+    except Exception:
+        resultq.put(('error', top, traceback.format_exc()))
+
+
+class FilesystemScanner(object):
+    '''
+    Walks a list of filesystems in parallel worker processes.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, logdispatcher, limit=HITLIMIT, maxworkers=None):
+        '''
+        @param logdispatcher: STONIX logdispatcher object
+        @param limit: int - hits per category after which the scan stops
+        @param maxworkers: int - filesystems walked at the same time,
+            defaults to the number of cpus
+        '''
+        self.logger = logdispatcher
+        self.limit = limit
+        if maxworkers is None:
+            try:
+                maxworkers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                maxworkers = 1
+        self.maxworkers = max(1, maxworkers)
+        self.counts = {}
+
+    def getcounts(self):
+        '''
+        Return the number of hits per category of the last scan.
+
+        @return: dict
+        @author: dkennel
+        '''
+        return self.counts
+
+    def scan(self, filesystems, sink, indexdir=None, full=True):
+        '''
+        Walk every filesystem and call sink(category, path) in the calling
+        process for each hit as results arrive.
+
+        @param filesystems: list of mount points
+        @param sink: callable taking category and path
+        @param indexdir: string - directory for the per filesystem indexes.
+            No index is used or kept if None.
+        @param full: bool - walk everything, ignoring existing indexes
+        @return: bool - True if a category exceeded the limit and the scan
+            was abandoned
+        @author: dkennel
+        '''
+        self.counts = dict([(category, 0) for category in CATEGORIES])
+        overrun = False
+        idcache = IdCache()
+        resultq = multiprocessing.Queue()
+        stopevent = multiprocessing.Event()
+        waiting = list(filesystems)
+        running = {}
+        try:
+            while waiting or running:
+                while waiting and len(running) < self.maxworkers and \
+                      not stopevent.is_set():
+                    top = waiting.pop(0)
+                    indexfile = None
+                    if indexdir is not None:
+                        indexfile = indexpath(indexdir, top)
+                    proc = multiprocessing.Process(target=scanworker,
+                                                   args=(top, idcache,
+                                                         resultq, stopevent,
+                                                         indexfile, full))
+                    proc.daemon = True
+                    proc.start()
+                    running[top] = proc
+                if not running:
+                    break
+                try:
+                    kind, top, data = resultq.get(True, 1)
+                except Queue.Empty:
+                    self.__reap(running)
+                    continue
+                if kind == 'hits':
+                    if overrun:
+                        continue
+                    for category, path in data:
+                        self.counts[category] = self.counts[category] + 1
+                        if self.counts[category] > self.limit:
+                            self.logger.log(LogPriority.DEBUG,
+                                            ['FilesystemScanner',
+                                             category + ' overflow!'])
+                            overrun = True
+                            stopevent.set()
+                            break
+                        sink(category, path)
+                    continue
+                if kind == 'error':
+                    self.logger.log(LogPriority.DEBUG,
+                                    ['FilesystemScanner',
+                                     'Walk of ' + top + ' failed: ' + data])
+                else:
+                    if data:
+                        walk = 'full'
+                    else:
+                        walk = 'incremental'
+                    self.logger.log(LogPriority.DEBUG,
+                                    ['FilesystemScanner',
+                                     'Finished ' + walk + ' walk of ' + top])
+                running.pop(top).join()
+        finally:
+            for proc in running.values():
+                proc.terminate()
+        return overrun
+
+    def __reap(self, running):
+        '''
+        Private method to drop workers that died without reporting back,
+        e.g. killed by the OOM killer, so the scan does not wait forever.
+
+        @param running: dict of mount point -> Process
+        @author: dkennel
+        '''
+        for top, proc in running.items():
+            if not proc.is_alive() and proc.exitcode != 0:
+                self.logger.log(LogPriority.DEBUG,
+                                ['FilesystemScanner',
+                                 'Worker for ' + top + ' exited with ' +
+                                 str(proc.exitcode)])
+                del running[top]
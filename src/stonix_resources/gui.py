@@ -841,6 +841,8 @@ class runThread(QThread):
         self.ruleidlist = []
         self.logger = logger
         self.stopflag = False
+        self.fullrun = ruleid == None
+        self.completed = 0
         if ruleid == None:
             self.rule_data = self.controller.getallrulesdata()
             for rnum in self.rule_data:
@@ -861,6 +863,10 @@ class runThread(QThread):
         """
         if self.stopflag:
             return
+        if self.fullrun and self.action in ['fix', 'report'] and \
+        self.controller.getjobs() > 1:
+            self.runparallel()
+            return
         total = len(self.ruleidlist)
         completed = 0
         for ruleid in self.ruleidlist:
@@ -894,3 +900,37 @@ class runThread(QThread):
             self.logger.log(LogPriority.DEBUG,
                             ['GUI.runThread.run',
                              'Sent tupdate signal: ' + str(sstatus)])
+
+    def runparallel(self):
+        """
+        Run all rules through the controller's full system methods so that
+        parallel safe rules share the controller's worker pool. The
+        controller calls back in rule order as each rule completes.
+
+        @author: dkennel
+        """
+        self.completed = 0
+        if self.action == 'fix':
+            self.controller.hardensystem(self.rulecomplete)
+        else:
+            self.controller.auditsystem(self.rulecomplete)
+
+    def rulecomplete(self, rule):
+        """
+        Callback used by runparallel to send the tupdate signal for each
+        completed rule and to pass a stop request on to the controller.
+
+        @param rule: the rule object that has completed
+        @author: dkennel
+        """
+        total = len(self.ruleidlist)
+        ruleid = rule.getrulenum()
+        self.completed = self.completed + 1
+        status = rule.getrulename() + ' ' + str(ruleid) + ' ' + \
+        str(rule.iscompliant()) + ' ' + str(self.completed) + ' ' + str(total)
+        self.emit(SIGNAL('tupdate(QString)'), status)
+        self.logger.log(LogPriority.DEBUG,
+                        ['GUI.runThread.rulecomplete',
+                         'Sent tupdate signal: ' + str(status)])
+        if self.stopflag:
+            self.controller.stoprun()
@@ -0,0 +1,424 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Home directory audit engine shared by the rules that look inside users' home
+directories (SecureHomeDir, ConfigureDotFiles, RemoveBadDotFiles and the KDE
+part of ConfigureScreenLocking). Each rule registers a HomeCheck saying
+which homes it wants, which entries of a home it is interested in and which
+paths below a home it needs. The first rule asking for its results
+triggers one pass over the union of the homes. The pass is run by a
+bounded pool of threads, and each home is stat'ed and listed once for all
+the registered checks. Home directories on NFS make each stat and listdir a
+network round trip, so the threads overlap them.
+
+A home that does not answer within the per home timeout (an automount
+whose server is down) is reported with the error 'timeout' and skipped.
+Its thread is abandoned and a new one takes its place in the pool.
+
+What a pass learnt about a home is kept until the CommandCache is next
+invalidated, so a check registered later only visits what is still
+missing. While a rule's fix or undo runs nothing is kept.
+
+@author: dkennel
+'''
+import os
+import stat
+import threading
+import time
+from accountdb import getaccountdb
+from CommandHelper import getcommandcache
+from logdispatcher import LogPriority
+
+WORKERS = 8
+# Seconds a home may take to answer before it is skipped
+HOMETIMEOUT = 15
+
+
+class Home(object):
+    '''
+    A home directory and the account owning it.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, path, user='', uid=None, gid=None):
+        '''
+        @param path: string - home directory
+        @param user: string - account name, empty if no account has it
+        @param uid: int or None
+        @param gid: int or None
+        '''
+        self.path = path
+        self.user = user
+        self.uid = uid
+        self.gid = gid
+
+    def __repr__(self):
+        return 'Home(%r, %r)' % (self.path, self.user)
+
+
+class HomeCheck(object):
+    '''
+    What one rule wants to know about home directories.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, name, homes=None, extra=(), match=None, paths=()):
+        '''
+        @param name: string - identifies the check, usually the rule name
+        @param homes: list of paths to visit, None for every account home
+        @param extra: list of paths to visit as well
+        @param match: function taking the name of an entry directly in a
+            home and returning True for the entries to stat, None if the
+            home is not to be listed
+        @param paths: list of paths relative to a home to lstat
+        '''
+        self.name = name
+        if homes is not None:
+            homes = list(homes)
+        self.homes = homes
+        self.extra = list(extra)
+        self.match = match
+        self.paths = list(paths)
+
+
+class HomeResult(object):
+    '''
+    What a check learnt about one home.
+
+    stat is the os.stat result of the home itself (None if it could not be
+    read). entries maps the matching entries of the home and paths maps the
+    relative paths asked for to their os.lstat results, None for paths that
+    do not exist. error is None, 'timeout' or the error that stopped the
+    visit.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, home, stat, entries, paths, error):
+        self.home = home
+        self.stat = stat
+        self.entries = entries
+        self.paths = paths
+        self.error = error
+
+
+def visithome(path, record, checks):
+    '''
+    Fill in what is still missing from the record of a home. The record
+    passed in is not changed.
+
+    @param path: string - home directory
+    @param record: dict - stat, error, names, matched and stats known so far
+    @param checks: list of HomeCheck wanting the home
+    @return: dict - the new record
+    @author: dkennel
+    '''
+    record = {'stat': record.get('stat'),
+              'error': record.get('error'),
+              'names': record.get('names'),
+              'matched': dict(record.get('matched', {})),
+              'stats': dict(record.get('stats', {})),
+              'visited': True}
+    matching = [check for check in checks if check.match is not None]
+    try:
+        if record['stat'] is None:
+            record['stat'] = os.stat(path)
+        if not stat.S_ISDIR(record['stat'].st_mode):
+            return record
+        if matching and record['names'] is None:
+            record['names'] = os.listdir(path)
+    except OSError, err:
+        record['error'] = err.strerror or str(err)
+        return record
+    wanted = []
+    for check in checks:
+        wanted.extend(check.paths)
+    for check in matching:
+        if check.name not in record['matched']:
+            record['matched'][check.name] = [name for name in
+                                             record['names']
+                                             if check.match(name)]
+        wanted.extend(record['matched'][check.name])
+    for relpath in wanted:
+        if relpath in record['stats']:
+            continue
+        try:
+            record['stats'][relpath] = os.lstat(os.path.join(path, relpath))
+        except OSError:
+            record['stats'][relpath] = None
+    return record
+
+
+class HomeAudit(object):
+    '''
+    Runs the registered HomeChecks over the home directories.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, logger=None, workers=WORKERS, timeout=HOMETIMEOUT):
+        '''
+        @param logger: STONIX logdispatcher object
+        @param workers: int - homes visited at the same time
+        @param timeout: int - seconds before a home is skipped
+        '''
+        self.logger = logger
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.checks = {}
+        self.records = {}
+        self.generation = None
+        self.visits = 0
+        self.timeouts = 0
+        self.lock = threading.RLock()
+
+    def log(self, message):
+        '''
+        Log a debug message if a logger is set.
+
+        @author: dkennel
+        '''
+        if self.logger is not None:
+            self.logger.log(LogPriority.DEBUG, ['HomeAudit', message])
+
+    def register(self, check):
+        '''
+        Add a check, replacing any check of the same name.
+
+        @param check: HomeCheck
+        @author: dkennel
+        '''
+        with self.lock:
+            self.checks[check.name] = check
+            # The entries matched for a check of that name may differ
+            for path, record in self.records.items():
+                if check.name in record.get('matched', {}):
+                    record = dict(record)
+                    record['matched'] = dict(record['matched'])
+                    del record['matched'][check.name]
+                    self.records[path] = record
+
+    def gethomes(self):
+        '''
+        Return the home directory of every local account, each path once.
+
+        @return: list of Home
+        @author: dkennel
+        '''
+        homes = []
+        seen = set()
+        for user in getaccountdb(self.logger).getusers():
+            path = user.home.strip()
+            if not path.startswith('/') or path in seen:
+                continue
+            seen.add(path)
+            homes.append(Home(path, user.name, user.getid('uid'),
+                              user.getid('gid')))
+        return homes
+
+    def __selecthomes(self, check, accounthomes, byPath):
+        '''
+        Private method returning the homes a check wants.
+
+        @return: list of Home
+        @author: dkennel
+        '''
+        if check.homes is None:
+            homes = list(accounthomes)
+        else:
+            homes = [byPath.get(path) or Home(path) for path in check.homes]
+        seen = set([home.path for home in homes])
+        for path in check.extra:
+            if path not in seen:
+                seen.add(path)
+                homes.append(byPath.get(path) or Home(path))
+        return homes
+
+    def __needsvisit(self, record, check):
+        '''
+        Private method deciding whether a record lacks something a check
+        needs.
+
+        @return: bool
+        @author: dkennel
+        '''
+        if not record.get('visited'):
+            return True
+        if record['error'] is not None or record['stat'] is None or \
+           not stat.S_ISDIR(record['stat'].st_mode):
+            return False
+        if check.match is not None and \
+           check.name not in record.get('matched', {}):
+            return True
+        for relpath in check.paths:
+            if relpath not in record['stats']:
+                return True
+        return False
+
+    def getresults(self, name):
+        '''
+        Return what the check registered under name learnt about each of
+        its homes, running a pass for every registered check if needed.
+
+        @param name: string - the name of a registered check
+        @return: list of HomeResult, in the order of the check's homes
+        @author: dkennel
+        '''
+        with self.lock:
+            cache = getcommandcache()
+            if cache.isfixing():
+                self.records = {}
+                self.generation = None
+            elif self.generation != cache.getgeneration():
+                self.records = {}
+                self.generation = cache.getgeneration()
+            checks = self.checks.values()
+            accounthomes = self.gethomes()
+            byPath = dict([(home.path, home) for home in accounthomes])
+            # Every registered check shares the pass
+            wanted = {}
+            for check in checks:
+                for home in self.__selecthomes(check, accounthomes, byPath):
+                    record = self.records.get(home.path, {})
+                    if self.__needsvisit(record, check):
+                        wanted.setdefault(home.path, []).append(check)
+            if wanted:
+                self.__visitall(wanted)
+            check = self.checks[name]
+            results = []
+            for home in self.__selecthomes(check, accounthomes, byPath):
+                record = self.records.get(home.path, {})
+                results.append(self.__result(home, record, check))
+            if cache.isfixing():
+                self.records = {}
+            return results
+
+    def __result(self, home, record, check):
+        '''
+        Private method building the HomeResult of a check from a record.
+
+        @return: HomeResult
+        @author: dkennel
+        '''
+        stats = record.get('stats', {})
+        entries = {}
+        for entry in record.get('matched', {}).get(check.name, []):
+            # Entries removed between the listdir and the lstat are dropped
+            if stats.get(entry) is not None:
+                entries[entry] = stats[entry]
+        paths = dict([(relpath, stats.get(relpath))
+                      for relpath in check.paths])
+        return HomeResult(home, record.get('stat'), entries, paths,
+                          record.get('error'))
+
+    def __visitall(self, wanted):
+        '''
+        Private method visiting homes with the thread pool. Homes taking
+        longer than the timeout are recorded as timed out.
+
+        @param wanted: dict - home path to the checks wanting it
+        @author: dkennel
+        '''
+        pending = sorted(wanted)
+        started = {}
+        active = set()
+        done = threading.Condition(self.lock)
+
+        def worker():
+            current = threading.current_thread()
+            while True:
+                with done:
+                    # Abandoned threads end once their home answers
+                    if not pending or current not in active:
+                        active.discard(current)
+                        done.notify_all()
+                        return
+                    path = pending.pop(0)
+                    started[path] = (time.time(), current)
+                    record = self.records.get(path, {})
+                record = visithome(path, record, wanted[path])
+                with done:
+                    if started.get(path, (None, None))[1] is current:
+                        del started[path]
+                        self.records[path] = record
+                        self.visits = self.visits + 1
+                    done.notify_all()
+
+        def startworker():
+            thread = threading.Thread(target=worker, name='HomeAudit')
+            thread.daemon = True
+            active.add(thread)
+            thread.start()
+
+        with done:
+            for _ in range(min(self.workers, len(pending))):
+                startworker()
+            while pending or started or active:
+                now = time.time()
+                for path, (since, thread) in started.items():
+                    if now - since >= self.timeout:
+                        del started[path]
+                        active.discard(thread)
+                        self.records[path] = {'stat': None,
+                                              'error': 'timeout',
+                                              'names': None,
+                                              'matched': {},
+                                              'stats': {},
+                                              'visited': True}
+                        self.timeouts = self.timeouts + 1
+                        self.log(path + ' did not answer within ' +
+                                 str(self.timeout) + ' seconds, skipped')
+                        if pending:
+                            startworker()
+                waits = [since + self.timeout - now
+                         for since, _ in started.values()]
+                done.wait(max(0.05, min(waits + [1.0])))
+
+    def getstats(self):
+        '''
+        Return the number of homes visited and of homes skipped.
+
+        @return: tuple - (visits, timeouts)
+        @author: dkennel
+        '''
+        return (self.visits, self.timeouts)
+
+
+HOMEAUDIT = HomeAudit()
+
+
+def gethomeaudit(logger=None):
+    '''
+    Return the process wide HomeAudit.
+
+    @param logger: STONIX logdispatcher object, used if none is set yet
+    @return: HomeAudit
+    @author: dkennel
+    '''
+    if logger is not None and HOMEAUDIT.logger is None:
+        HOMEAUDIT.logger = logger
+    return HOMEAUDIT
@@ -46,14 +46,18 @@ import logging.handlers
 import os.path
 import os
 import socket
-import inspect
+import sys
 import traceback
 import weakref
-import smtplib
-import subprocess
-import xml.etree.ElementTree as ET
+import gzip
+import re
+import threading
+import time
+import zlib
 import localize
 from shutil import move
+from errorreporter import ErrorReporter
+from reportuploader import ReportUploader
 
 
 class LogDispatcher (Observable):
@@ -67,6 +71,7 @@ class LogDispatcher (Observable):
 
     def __init__(self, environment):
         Observable.__init__(self)
+        self.rootlogger = logging.getLogger('')
         self.environment = environment
         self.debug = self.environment.getdebugmode()
         self.verbose = self.environment.getverbosemode()
@@ -79,6 +84,8 @@ class LogDispatcher (Observable):
             print 'LOGDISPATCHER: xml log path: ' + self.xmllog
         if os.path.isfile(self.xmllog):
             try:
+                # A run that did not exit cleanly leaves its report open
+                repairreport(self.xmllog)
                 if os.path.exists(self.xmllog + '.old'):
                     os.remove(self.xmllog + '.old')
                 move(self.xmllog, self.xmllog + '.old')
@@ -90,6 +97,7 @@ class LogDispatcher (Observable):
                 print traceback.format_exc()
                 print err
         self.xmlreport = xmlReport(self.xmllog, self.debug)
+        self.errorreporter = None
         self.metadataopen = False
         self.__initializelogs()
         self.last_message_received = ""
@@ -109,45 +117,36 @@ class LogDispatcher (Observable):
         """postreport()
 
         Sends the XML formatted stor report file to the server
-        responsible for gathering and processing them.
+        responsible for gathering and processing them. The report is
+        compressed into a spool first, together with any reports earlier
+        runs could not deliver, and stays there until the server has
+        acknowledged it.
 
         @author: dkennel
+        @change: 2016/10/18 dkennel - upload natively instead of with curl,
+            keep undelivered reports for the next run
         """
         if self.environment.geteuid() != 0:
             return
         self.xmlreport.closeReport()
         xmlreport = self.xmllog
-        resolvable = True
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((localize.REPORTSERVER, 80))
-            sock.close()
-        except (socket.gaierror, socket.timeout, socket.error):
-            resolvable = False
-        try:
-            if resolvable:
-                curlcommand = 'curl -k -s -G -F "file=@' + xmlreport + \
-                ';type=text/xml" https://' + localize.REPORTSERVER + \
-                '/stonix/results.php'
-                if self.debug:
-                    self.log(LogPriority.DEBUG,
-                             ['LogDispatcher.postreport',
-                              'Upload command: ' + curlcommand])
-                cmd = subprocess.Popen(curlcommand, shell=True, close_fds=True,
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE)
-                uploadstatus = cmd.stdout.read()
-                uploadstatus = uploadstatus + cmd.stderr.read()
-                if self.debug:
+            uploader = ReportUploader(localize.REPORTSERVER,
+                                      os.path.join(self.logpath,
+                                                   'stonix-reportspool'))
+            if os.path.exists(xmlreport):
+                spooled = uploader.enqueue(xmlreport)
+                if spooled is not None and not self.debug:
+                    os.remove(xmlreport)
+            remaining = uploader.drain()
+            if self.debug:
+                for error in uploader.errors:
                     self.log(LogPriority.DEBUG,
-                             ['LogDispatcher.postreport',
-                              'Upload status: ' + uploadstatus])
-            if self.debug and not resolvable:
+                             ['LogDispatcher.postreport', error])
                 self.log(LogPriority.DEBUG,
                          ['LogDispatcher.postreport',
-                          'Could not resolve upload host'])
-            if not self.debug and os.path.exists(xmlreport):
-                os.remove(xmlreport)
+                          'Uploaded %d reports, %d left for the next run'],
+                         uploader.uploaded, remaining)
 
         except (KeyboardInterrupt, SystemExit):
             # User initiated exit
@@ -158,7 +157,7 @@ class LogDispatcher (Observable):
             self.log(LogPriority.ERROR,
                      ['LogDispatcher.postreport', trace])
 
-    def log(self, priority, msg_data):
+    def log(self, priority, msg_data, *args):
         """
         Handles all writing of logger data to files. `msg_data` should be
         passed as an array of [tag, message_details] where tag is a
@@ -174,12 +173,33 @@ class LogDispatcher (Observable):
         errors should be sent to the "ERROR" facility. "CRITICAL" is reserved
         for events that stop the stonix program.
 
+        DEBUG and INFO messages below the configured level are discarded
+        before anything is formatted. Messages logged from loops should pass
+        their arguments separately so that they are only formatted when the
+        message is actually written, e.g.
+
+        self.logger.log(LogPriority.DEBUG, ['multifind', 'Found %s (%d)'],
+                        path, count)
+
         @param: enum priority
         @param: string msg_data
+        @param: args - optional values for % formatting of the message
+            detail
         @return: void
         @author scmcleni
         @author: dkennel
+        @change: 2016/10/18 dkennel level check before formatting, caller
+            taken from the calling frame instead of inspect.stack(), lazy
+            message arguments
         """
+        if priority in DISCARDABLE and not self.listeners and \
+           not self.rootlogger.isEnabledFor(LEVELS[priority]):
+            return
+        if args:
+            if isinstance(msg_data, list):
+                msg_data = [msg_data[0], str(msg_data[1]) % args]
+            else:
+                msg_data = msg_data % args
 
         entry = self.format_message_data(msg_data)
 
@@ -190,29 +210,21 @@ class LogDispatcher (Observable):
         else:
             # msg = 'none' + ':' + msg_data.strip()
             msg = msg_data.strip()
+        #####
+        # Use the calling frame to log the module and method/function that
+        # is being called. inspect.stack() is not used, it reads the source
+        # of every frame on the stack. Message to be in the format:
+        # DEBUG:<name_of_module>:<name of function>(<line number>): <message to print>
+        caller = sys._getframe(1)
+        modname = caller.f_globals.get('__name__')
         if self.debug:
-            #####
-            # Set up inspect to use stack variables to log file and
-            # method/function that is being called. Message to be in the
-            # format:
-            # DEBUG:<name_of_module>:<name of function>(<line number>): <message to print>
-            stack1 = inspect.stack()[1]
-            mod = inspect.getmodule(stack1[0])
-            if mod:
-                prefix = mod.__name__ + \
-                      ":" + stack1[3] + \
-                      "(" + str(stack1[2]) + "): "
-            else:
-                prefix = stack1[3] + \
-                      "(" + str(stack1[2]) + "): "
+            prefix = caller.f_code.co_name + \
+                "(" + str(caller.f_lineno) + "): "
         else:
-            stack1 = inspect.stack()[1]
-            mod = inspect.getmodule(stack1[0])
-            if mod:
-                prefix = mod.__name__ + \
-                      ":" + stack1[3] + ":"
-            else:
-                prefix = stack1[3] + ":"
+            prefix = caller.f_code.co_name + ":"
+        if modname:
+            prefix = modname + ":" + prefix
+        del caller
 
         if priority == LogPriority.INFO:
             logging.info('INFO:' + prefix + msg)
@@ -247,30 +259,28 @@ class LogDispatcher (Observable):
         """reporterr(errmsg)
 
         reporterr sends error messages generated by STONIX to the unixeffort
-        email address. Requires an error message string.
+        email address. Requires an error message string. The message is
+        queued to the ErrorReporter, which mails one digest of all errors
+        when the run ends, so this never waits for the mail relay.
 
         @param string: Error message
         @author: dkennel
+        @change: 2016/10/18 dkennel queue to the background ErrorReporter
         """
-
-        message = '''From: ''' + localize.STONIXERR + '''
-To: ''' + localize.STONIXDEVS + '''
-Subject: STONIX Error Report: ''' + prefix + '''
-
-'''
-        message = prefix + ' ' + message + 'Sent by: ' + \
-        self.environment.gethostname() + ' IP: ' \
-        + self.environment.getipaddress() + ' OS: ' + \
-        self.environment.getostype() + ': ' + \
-        str(self.environment.getosver()) + \
-        ' STONIX Ver: ' + str(self.environment.getstonixversion())
-        message = message + '\n' + errmsg
-        to = localize.STONIXDEVS + '\r\n'
-        frm = localize.STONIXERR + '\r\n'
-
-        server = smtplib.SMTP(localize.MAILRELAYSERVER)
-        server.sendmail(frm, to, message)
-        server.quit()
+        if self.errorreporter is None:
+            hostinfo = 'Sent by: ' + self.environment.gethostname() + \
+                ' IP: ' + self.environment.getipaddress() + ' OS: ' + \
+                self.environment.getostype() + ': ' + \
+                str(self.environment.getosver()) + ' STONIX Ver: ' + \
+                str(self.environment.getstonixversion())
+            spooldir = os.path.join(self.logpath, 'stonix-errorspool')
+            self.errorreporter = ErrorReporter(localize.STONIXERR,
+                                               localize.STONIXDEVS,
+                                               localize.MAILRELAYSERVER,
+                                               spooldir,
+                                               self.environment.gethostname(),
+                                               hostinfo)
+        self.errorreporter.submit(prefix, errmsg)
 
     def format_message_data(self, msg_data):
         """
@@ -460,8 +470,6 @@ Subject: STONIX Error Report: ''' + prefix + '''
                   self.environment.get_chassis_manfacturer()])
         self.log(LogPriority.WARNING,
                  ['UUID', self.environment.get_sys_uuid()])
-        self.log(LogPriority.WARNING,
-                 ['PropertyNumber', self.environment.get_property_number()])
         self.log(LogPriority.DEBUG,
                  ['ScriptPath', self.environment.get_script_path()])
         self.log(LogPriority.DEBUG,
@@ -477,6 +485,14 @@ Subject: STONIX Error Report: ''' + prefix + '''
         # --- End machine specific information
 
 
+# Priorities that are dropped when below the configured level. WARNING and
+# above are always processed, they also feed the xml report and the error
+# reports.
+DISCARDABLE = ["DEBUG", "INFO"]
+LEVELS = {"DEBUG": logging.DEBUG,
+          "INFO": logging.INFO}
+
+
 class MessageData:
     """
     Simple object for handling Message Data in a concrete fashion.
@@ -504,28 +520,132 @@ class LogPriority:
     CRITICAL = "CRITICAL"
 
 
+# Report entries are flushed and synced to disk after this many entries or
+# this many seconds, whichever comes first
+SYNCENTRIES = 50
+SYNCINTERVAL = 5
+XMLHEADER = "<?xml version='1.0' encoding='UTF-8'?>\n<run>\n"
+XMLFOOTER = '</run>\n'
+GZIPMAGIC = '\x1f\x8b'
+# Characters that may not appear in an XML 1.0 document
+if sys.maxunicode > 0xffff:
+    INVALIDXML = re.compile(u'[^\t\n\r\u0020-\ud7ff\ue000-\ufffd'
+                            u'\U00010000-\U0010ffff]')
+else:
+    INVALIDXML = re.compile(u'[^\t\n\r\u0020-\ufffd]')
+
+
+def escapeattr(value):
+    '''
+    Return value as UTF-8 text safe for use in a double quoted XML attribute.
+    Newlines are escaped too so that every report entry stays on one line.
+
+    @param value: string or unicode
+    @return: string
+    @author: dkennel
+    '''
+    if not isinstance(value, unicode):
+        value = str(value).decode('utf-8', 'replace')
+    value = INVALIDXML.sub(u'', value)
+    value = value.replace(u'&', u'&amp;').replace(u'<', u'&lt;')
+    value = value.replace(u'>', u'&gt;').replace(u'"', u'&quot;')
+    value = value.replace(u'\n', u'&#10;').replace(u'\r', u'&#13;')
+    value = value.replace(u'\t', u'&#09;')
+    return value.encode('utf-8')
+
+
+def repairreport(path):
+    '''
+    Close an xml report left unfinished by a run that did not exit cleanly,
+    so that it can still be read. Entries cut short by the crash are
+    dropped. Plain and gzip compressed reports are handled.
+
+    @param path: string - fully qualified path to the report file
+    @return: bool - True if the report had to be repaired
+    @author: dkennel
+    '''
+    try:
+        rhandle = open(path, 'rb')
+        try:
+            data = rhandle.read()
+        finally:
+            rhandle.close()
+        compressed = data.startswith(GZIPMAGIC)
+        if compressed:
+            # The gzip module refuses a stream without its trailer, a raw
+            # decompressor returns everything up to where it was cut off.
+            try:
+                data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data)
+            except zlib.error:
+                data = ''
+        if data.rstrip().endswith(XMLFOOTER.strip()):
+            return False
+        # The last piece is either empty or an entry cut short
+        lines = data.split('\n')[:-1]
+        if not ''.join(lines).startswith(XMLHEADER.replace('\n', '')):
+            lines = XMLHEADER.rstrip('\n').split('\n')
+        section = None
+        for line in lines:
+            if line in ['<metadata>', '<findings>']:
+                section = line[1:-1]
+            elif line in ['</metadata>', '</findings>']:
+                section = None
+        if section is not None:
+            lines.append('</' + section + '>')
+        lines.append(XMLFOOTER.strip())
+        tmppath = path + '.tmp'
+        if compressed:
+            whandle = gzip.open(tmppath, 'wb')
+        else:
+            whandle = open(tmppath, 'wb')
+        try:
+            whandle.write('\n'.join(lines) + '\n')
+        finally:
+            whandle.close()
+        os.rename(tmppath, path)
+    except (IOError, OSError):
+        return False
+    return True
+
+
 class xmlReport:
     '''
     Simple class to manage the STONIX XML report formatting.
 
+    The report is streamed to disk as entries are logged instead of being
+    built in memory, so memory use does not grow with the size of the
+    findings and a crash loses at most the entries logged since the last
+    sync (see repairreport). Metadata and findings logged in between each
+    other are written as consecutive metadata and findings sections of the
+    run element, which is read the same way by the report importer.
+
     @author: dkennel
+    @change: 2016/10/18 dkennel - stream entries to disk, optional gzip
     '''
-    def __init__(self, path, debug=False):
+    def __init__(self, path, debug=False, compress=False):
         '''
         xmlReport.__init__(path): The xmlReport constructor. Requires a string
         version of the fully qualified path to the file where the XML version
-        of the report will be written.
+        of the report will be written. The file is created when the first
+        entry is written or when the report is closed, whichever comes first.
 
         @param path: string - fully qualified path to the report file
         @param debug: Bool - whether or not to run in debug mode
+        @param compress: Bool - whether to gzip compress the report
         @author: dkennel
         '''
         self.path = path
         self.debug = debug
-        self.root = ET.Element('run')
-        self.meta = ET.SubElement(self.root, 'metadata')
-        self.findings = ET.SubElement(self.root, 'findings')
+        self.compress = compress
+        self.rawhandle = None
+        self.handle = None
+        self.section = None
+        self.entries = 0
+        self.unsynced = 0
+        self.lastsync = time.time()
+        self.failed = False
         self.closed = False
+        self.lock = threading.Lock()
 
     def __del__(self):
         """
@@ -540,6 +660,78 @@ class xmlReport:
             pass
             #
 
+    def __open(self):
+        '''
+        Private method to create the report file and write the opening of
+        the run element. Returns False if the report can not be written.
+
+        @return: bool
+        @author: dkennel
+        '''
+        if self.handle is not None:
+            return True
+        if self.failed or self.closed:
+            return False
+        try:
+            self.rawhandle = open(self.path, 'wb')
+            if self.compress:
+                self.handle = gzip.GzipFile(os.path.basename(self.path), 'wb',
+                                            9, self.rawhandle)
+            else:
+                self.handle = self.rawhandle
+            self.handle.write(XMLHEADER)
+        except (IOError, OSError), err:
+            self.failed = True
+            self.handle = None
+            if self.debug:
+                print 'xmlReport: Unable to open ' + self.path + ': ' + \
+                    str(err)
+            return False
+        return True
+
+    def __write(self, section, entry):
+        '''
+        Private method to stream one entry into the given section.
+
+        @param section: string - metadata or findings
+        @param entry: Formatted version of the log data.
+        @author: dkennel
+        '''
+        line = '<' + escapeattr(entry.Tag).replace(' ', '_') + ' val="' + \
+            escapeattr(entry.Detail) + '" />\n'
+        with self.lock:
+            if not self.__open():
+                return
+            try:
+                if self.section != section:
+                    if self.section is not None:
+                        self.handle.write('</' + self.section + '>\n')
+                    self.handle.write('<' + section + '>\n')
+                    self.section = section
+                self.handle.write(line)
+                self.entries = self.entries + 1
+                self.unsynced = self.unsynced + 1
+                if self.unsynced >= SYNCENTRIES or \
+                   time.time() - self.lastsync >= SYNCINTERVAL:
+                    self.__sync()
+            except (IOError, OSError), err:
+                if self.debug:
+                    print 'xmlReport: Error writing ' + self.path + ': ' + \
+                        str(err)
+
+    def __sync(self):
+        '''
+        Private method to push everything written so far to the disk.
+
+        @author: dkennel
+        '''
+        if self.compress:
+            self.handle.flush(zlib.Z_SYNC_FLUSH)
+        self.rawhandle.flush()
+        os.fsync(self.rawhandle.fileno())
+        self.unsynced = 0
+        self.lastsync = time.time()
+
     def writeMetadata(self, entry):
         '''
         xmlReport.writeMetadata(entry): The xmlReport method to add a metadata
@@ -549,7 +741,7 @@ class xmlReport:
         @param entry: Formatted version of the log data.
         @author: dkennel
         '''
-        ET.SubElement(self.meta, entry.Tag, val=entry.Detail)
+        self.__write('metadata', entry)
         if self.debug:
             print 'xmlReport.writeMetadata: Added entry ' + entry.Tag + \
             ' ' + entry.Detail
@@ -563,24 +755,44 @@ class xmlReport:
         @param entry: Formatted version of the log data.
         @author: dkennel
         '''
-        ET.SubElement(self.findings, entry.Tag, val=entry.Detail)
+        self.__write('findings', entry)
         if self.debug:
             print 'xmlReport.writeFinding: Added entry ' + entry.Tag + \
             ' ' + entry.Detail
 
     def closeReport(self):
         '''
-        xmlReport.closeReport(): This method will write the xmlReport to disk.
+        xmlReport.closeReport(): This method will finish the xmlReport on
+        disk. A report with no entries still gets empty metadata and findings
+        sections.
 
         @author: dkennel
         '''
         try:
-            if not self.closed:
-                ET.ElementTree(self.root).write(self.path)
-                self.closed = True
+            with self.lock:
+                if self.closed:
+                    return
+                if not self.__open():
+                    self.closed = True
+                    return
+                try:
+                    if self.entries == 0:
+                        self.handle.write('<metadata>\n</metadata>\n'
+                                          '<findings>\n</findings>\n')
+                    elif self.section is not None:
+                        self.handle.write('</' + self.section + '>\n')
+                    self.handle.write(XMLFOOTER)
+                    if self.compress:
+                        self.handle.close()
+                    self.rawhandle.flush()
+                    os.fsync(self.rawhandle.fileno())
+                finally:
+                    self.closed = True
+                    self.section = None
+                    self.rawhandle.close()
             if self.debug:
-                print 'xmlReport.closeReport: dumping the ElementTree: '
-                ET.dump(self.root)
+                print 'xmlReport.closeReport: wrote ' + str(self.entries) + \
+                    ' entries to ' + self.path
         except Exception, err:
             if self.debug:
                 print 'logdispatcher.xmlReport.closeReport: Error encountered processing xml'
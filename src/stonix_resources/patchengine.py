@@ -0,0 +1,287 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+In-process application of the unified diffs StateChgLogger stores when a
+rule changes a configuration file. The diffs run from the changed file back
+to the original, so applying one undoes the change.
+
+Hunks are located the way the patch utility does it: at the recorded line,
+then at the nearest place the hunk matches, then with up to FUZZ lines of
+context at either end ignored. A hunk that can not be placed that way is
+taken as already undone, and skipped, only when the lines it would leave are
+found exactly within SLACK lines of where it was expected. Other hunks that
+can not be placed are not applied and are returned as PatchConflict objects
+instead of failing the whole file.
+
+@author: dkennel
+'''
+import difflib
+import re
+
+FUZZ = 2
+# Lines an already undone hunk may have moved from where it was expected
+SLACK = 3
+HUNKHEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+NONEWLINE = '\\ No newline at end of file'
+
+
+class PatchError(Exception):
+    '''
+    Raised for a diff that can not be parsed.
+
+    @author: dkennel
+    '''
+    pass
+
+
+class PatchConflict(object):
+    '''
+    A hunk that could not be applied.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, path, eventid, hunk, line, reason, expected=None):
+        '''
+        @param path: string - file being patched
+        @param eventid: string - change event the diff belongs to
+        @param hunk: int - hunk number in the diff, from 1
+        @param line: int - line the hunk was expected at, from 1
+        @param reason: string - why it was not applied
+        @param expected: list of strings - lines the hunk expected to find
+        '''
+        self.path = path
+        self.eventid = eventid
+        self.hunk = hunk
+        self.line = line
+        self.reason = reason
+        self.expected = expected or []
+
+    def __str__(self):
+        return '%s: event %s hunk %d at line %d: %s' % \
+            (self.path, self.eventid, self.hunk, self.line, self.reason)
+
+    def __repr__(self):
+        return 'PatchConflict(%r, %r, %d, %d, %r)' % \
+            (self.path, self.eventid, self.hunk, self.line, self.reason)
+
+
+class Hunk(object):
+    '''
+    One hunk of a unified diff.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, number, oldstart, oldlength):
+        '''
+        @param number: int - position of the hunk in the diff, from 1
+        @param oldstart: int - first line in the file patched, from 1
+        @param oldlength: int - lines the hunk covers in the file patched
+        '''
+        self.number = number
+        self.oldlength = oldlength
+        # Index of the first line covered, 0 for an insertion at the top
+        if oldlength:
+            self.index = oldstart - 1
+        else:
+            self.index = oldstart
+        self.lines = []
+
+    def getlines(self, fuzz=0):
+        '''
+        Return the lines the hunk replaces and the lines it replaces them
+        with, leaving out up to fuzz context lines at either end.
+
+        @param fuzz: int - context lines that may be left out at each end
+        @return: tuple - (skipped leading lines, before, after)
+        @author: dkennel
+        '''
+        lines = self.lines
+        leading = 0
+        while leading < fuzz and leading < len(lines) and \
+                lines[leading][0] == ' ':
+            leading = leading + 1
+        trailing = 0
+        while trailing < fuzz and trailing < len(lines) - leading and \
+                lines[len(lines) - 1 - trailing][0] == ' ':
+            trailing = trailing + 1
+        lines = lines[leading:len(lines) - trailing]
+        before = [text for op, text in lines if op in ' -']
+        after = [text for op, text in lines if op in ' +']
+        return (leading, before, after)
+
+
+def parsepatch(patch):
+    '''
+    Parse a unified diff of one file.
+
+    @param patch: string - diff text
+    @return: list of Hunk
+    @raise PatchError: for malformed diffs
+    @author: dkennel
+    '''
+    hunks = []
+    hunk = None
+    oldleft = newleft = 0
+    for line in patch.splitlines(True):
+        if hunk is None or (oldleft <= 0 and newleft <= 0):
+            if line.startswith('---') or line.startswith('+++'):
+                continue
+            match = HUNKHEADER.match(line)
+            if match is not None:
+                oldlength = int(match.group(2) or '1')
+                hunk = Hunk(len(hunks) + 1, int(match.group(1)), oldlength)
+                hunks.append(hunk)
+                oldleft = oldlength
+                newleft = int(match.group(4) or '1')
+                continue
+        if line.rstrip('\n') == NONEWLINE:
+            if hunk is None or not hunk.lines:
+                raise PatchError('Misplaced end of file marker')
+            op, text = hunk.lines[-1]
+            hunk.lines[-1] = (op, text.rstrip('\n'))
+            continue
+        if hunk is None or (oldleft <= 0 and newleft <= 0):
+            if line.strip():
+                raise PatchError('Unexpected line in diff: ' + line.rstrip())
+            continue
+        op = line[0]
+        if op == ' ':
+            oldleft = oldleft - 1
+            newleft = newleft - 1
+        elif op == '-':
+            oldleft = oldleft - 1
+        elif op == '+':
+            newleft = newleft - 1
+        else:
+            raise PatchError('Bad line in hunk %d: %s' % (hunk.number,
+                                                          line.rstrip()))
+        hunk.lines.append((op, line[1:]))
+    if oldleft > 0 or newleft > 0:
+        raise PatchError('Diff ends in the middle of hunk %d' % len(hunks))
+    return hunks
+
+
+def makepatch(fromlines, tolines, fromfile, tofile):
+    '''
+    Return the unified diff turning fromlines into tolines. Unlike the
+    plain difflib output this marks a last line without a newline, so that
+    the diff can be applied again.
+
+    @param fromlines: list of strings - lines with their newlines
+    @param tolines: list of strings
+    @param fromfile: string - name for the --- header
+    @param tofile: string - name for the +++ header
+    @return: string
+    @author: dkennel
+    '''
+    output = []
+    for line in difflib.unified_diff(fromlines, tolines, fromfile=fromfile,
+                                     tofile=tofile):
+        output.append(line)
+        if line[:1] in ' -+' and not line.startswith('---') and \
+                not line.startswith('+++') and not line.endswith('\n'):
+            output.append('\n' + NONEWLINE + '\n')
+    return ''.join(output)
+
+
+def findhunk(lines, before, position, limit=None):
+    '''
+    Return where before occurs in lines, searching outward from position.
+
+    @param lines: list of strings - file content
+    @param before: list of strings - lines to find
+    @param position: int - index to start from
+    @param limit: int - furthest distance from position to look, None for
+        the whole file
+    @return: int or None
+    @author: dkennel
+    @change: 2016/10/18 dkennel - limit added
+    '''
+    length = len(before)
+    last = len(lines) - length
+    if last < 0:
+        return None
+    position = max(0, min(position, last))
+    if lines[position:position + length] == before:
+        return position
+    furthest = max(position, last - position)
+    if limit is not None:
+        furthest = min(furthest, limit)
+    for distance in xrange(1, furthest + 1):
+        for candidate in (position - distance, position + distance):
+            if 0 <= candidate <= last and \
+                    lines[candidate:candidate + length] == before:
+                return candidate
+    return None
+
+
+def applypatch(lines, hunks, path='', eventid='', fuzz=FUZZ):
+    '''
+    Apply parsed hunks to the lines of a file.
+
+    @param lines: list of strings - file content, lines with newlines
+    @param hunks: list of Hunk - see parsepatch
+    @param path: string - file name for conflicts
+    @param eventid: string - event id for conflicts
+    @param fuzz: int - context lines that may be ignored at each end
+    @return: tuple - (new lines, hunks applied, list of PatchConflict)
+    @author: dkennel
+    @change: 2016/10/18 dkennel - only take a hunk as undone after every fuzz
+        level failed and when its result is found close to the expected line
+    '''
+    lines = list(lines)
+    applied = 0
+    conflicts = []
+    offset = 0
+    for hunk in hunks:
+        expected = hunk.index + offset
+        placed = None
+        for level in range(fuzz + 1):
+            leading, before, after = hunk.getlines(level)
+            found = findhunk(lines, before, expected + leading)
+            if found is not None:
+                placed = (found, before, after)
+                break
+        if placed is None:
+            # Undone already, e.g. by an earlier interrupted undo. Searching
+            # the whole file would find repeated blocks elsewhere.
+            _, before, after = hunk.getlines()
+            if before != after and after:
+                found = findhunk(lines, after, expected, SLACK)
+                if found is not None:
+                    offset = found - hunk.index + len(after) - len(before)
+                    continue
+            conflicts.append(PatchConflict(path, eventid, hunk.number,
+                                           expected + 1,
+                                           'context not found',
+                                           hunk.getlines()[1]))
+            continue
+        found, before, after = placed
+        lines[found:found + len(before)] = after
+        offset = found - hunk.index - leading + len(after) - len(before)
+        applied = applied + 1
+    return (lines, applied, conflicts)
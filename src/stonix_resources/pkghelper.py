@@ -25,6 +25,7 @@ import re
 import yum,aptGet,portage,zypper,freebsd,solaris
 import traceback
 from logdispatcher import LogPriority
+from pkginventory import getinventory
 
 class Pkghelper(object):
         
@@ -46,6 +47,8 @@ class Pkghelper(object):
                              'freebsd':'freebsd','solaris':'solaris'}
         self.manager = self.determineMgr()
         self.detailedresults = ''
+        # Installed packages are read once per run and shared by all rules
+        self.inventory = getinventory(self.logger, self.manager)
         '''FOR YUM (RHEL,CENTOS,FEDORA)'''
         if self.manager is "yum":
             self.pckgr = yum.Yum(self.logger)
@@ -117,6 +120,7 @@ class Pkghelper(object):
         try:
             if self.enviro.geteuid() is 0:
                 if self.pckgr.installpackage(package):
+                    self.inventory.added(package)
                     return True
                 else:
                     return False
@@ -142,6 +146,7 @@ install command"
         try:
             if self.enviro.geteuid() == 0:
                 if self.pckgr.removepackage(package):
+                    self.inventory.removed(package)
                     return True
                 else:
                     return False
@@ -164,8 +169,16 @@ remove command"
             is to be checked. Must be recognizable to the underlying package 
             manager.
         @return bool :
-        @author Derek T Walker July 2012'''
+        @author Derek T Walker July 2012
+        @change: 2016/10/18 dkennel answered from the shared PackageInventory
+            where possible'''
         try:
+            installed = self.inventory.check(package)
+            if installed is not None:
+                self.logger.log(LogPriority.DEBUG,
+                                ["Pkghelper.check", package + " installed: " +
+                                 str(installed)])
+                return installed
             if self.pckgr.checkInstall(package):
                 return True
             else:
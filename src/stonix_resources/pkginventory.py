@@ -0,0 +1,264 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Installed package inventory shared by every Pkghelper in a run. The whole
+installed package set is read with a single rpm or dpkg-query call the first
+time a package is checked and later checks are answered from memory.
+
+Only the rpm (yum, zypper) and dpkg (apt-get) based package managers are
+inventoried. For the others, and for queries the inventory can not answer
+exactly (globs, several packages at once), check() returns None and the
+package manager's own checkInstall is used.
+
+@author: dkennel
+'''
+import os
+import re
+import threading
+import time
+from CommandHelper import CommandHelper
+from logdispatcher import LogPriority
+
+# Both tools expand the escapes themselves. They are passed literally as
+# CommandHelper strips whitespace from the ends of every argument.
+RPMQUERY = ['/bin/rpm', '-qa', '--qf',
+            r'%{NAME}\t%{VERSION}\t%{RELEASE}\t%{ARCH}\n']
+DPKGQUERY = ['/usr/bin/dpkg-query', '-W', '-f',
+             r'${Package}\t${Version}\t${Architecture}\t${Status}\n']
+QUERIES = {'yum': RPMQUERY,
+           'zypper': RPMQUERY,
+           'apt-get': DPKGQUERY}
+# Queries containing any of these are not plain package names
+UNSUPPORTED = re.compile(r'[\s*?\[\]]')
+
+
+def parserpm(lines):
+    '''
+    Turn the output of RPMQUERY into a dictionary mapping every form rpm -q
+    accepts (name, name.arch, name-version, name-version-release and
+    name-version-release.arch) to the package name.
+
+    @param lines: list of strings
+    @return: dict
+    @author: dkennel
+    '''
+    packages = {}
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) != 4 or not fields[0]:
+            continue
+        name, version, release, arch = fields
+        nvr = name + '-' + version + '-' + release
+        for key in [name, name + '-' + version, nvr]:
+            packages[key] = name
+        if arch and arch != '(none)':
+            packages[name + '.' + arch] = name
+            packages[nvr + '.' + arch] = name
+    return packages
+
+
+def parsedpkg(lines):
+    '''
+    Turn the output of DPKGQUERY into a dictionary mapping the name and
+    name:arch of every installed package to the package name. As with the
+    "ii" test of AptGet.checkInstall a package only counts as installed if it
+    is selected for install and fully installed.
+
+    @param lines: list of strings
+    @return: dict
+    @author: dkennel
+    '''
+    packages = {}
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) != 4 or not fields[0]:
+            continue
+        name, _, arch, status = fields
+        status = status.split()
+        if len(status) != 3 or status[0] != 'install' or \
+           status[2] != 'installed':
+            continue
+        packages[name] = name
+        if arch:
+            packages[name + ':' + arch] = name
+    return packages
+
+PARSERS = {'yum': parserpm,
+           'zypper': parserpm,
+           'apt-get': parsedpkg}
+
+
+class PackageInventory(object):
+    '''
+    In memory set of the installed packages for one package manager. Thread
+    safe so that rules running under the RuleExecutor may share it.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, logger, manager):
+        '''
+        @param logger: STONIX logdispatcher object
+        @param manager: string - Pkghelper.determineMgr() result
+        '''
+        self.logger = logger
+        self.manager = manager
+        self.packages = None
+        self.stale = False
+        self.unavailable = not self.issupported()
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def issupported(self):
+        '''
+        Return True if this package manager can be inventoried.
+
+        @return: bool
+        @author: dkennel
+        '''
+        return self.manager in QUERIES
+
+    def load(self):
+        '''
+        Read the installed package set. If the query fails any set already
+        held is kept and False is returned.
+
+        @return: bool
+        @author: dkennel
+        '''
+        if not self.issupported():
+            return False
+        query = QUERIES[self.manager]
+        start = time.time()
+        ch = CommandHelper(self.logger)
+        try:
+            if not os.path.exists(query[0]):
+                raise OSError(query[0] + ' not found')
+            ch.executeCommand(list(query))
+            if ch.getReturnCode() != 0:
+                raise OSError(ch.getErrorString())
+        except OSError, err:
+            self.logger.log(LogPriority.DEBUG,
+                            ['PackageInventory', 'Inventory query failed: ' +
+                             str(err)])
+            if self.packages is None:
+                # Do not try again on every check
+                self.unavailable = True
+            return False
+        self.packages = PARSERS[self.manager](ch.getOutput())
+        self.stale = False
+        self.loads = self.loads + 1
+        self.logger.log(LogPriority.DEBUG,
+                        ['PackageInventory', 'Loaded ' +
+                         str(len(set(self.packages.values()))) +
+                         ' installed packages in %.2fs' %
+                         (time.time() - start)])
+        return True
+
+    def check(self, package):
+        '''
+        Return True if the package is installed, False if it is not and
+        None if the inventory can not tell.
+
+        @param package: string - package name as given to Pkghelper.check
+        @return: bool or None
+        @author: dkennel
+        '''
+        package = package.strip()
+        if self.unavailable or not package or UNSUPPORTED.search(package):
+            return None
+        with self.lock:
+            if self.packages is None or self.stale:
+                # After a failed reload the set updated by added() and
+                # removed() is still the best answer there is.
+                self.stale = False
+                if not self.load() and self.unavailable:
+                    return None
+            return package in self.packages
+
+    def added(self, package):
+        '''
+        Record that package was installed. The package manager may have
+        pulled in dependencies too, so the inventory is read again before
+        the next check.
+
+        @param package: string - package name as given to Pkghelper.install
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.packages is None:
+                return
+            package = package.strip()
+            if not UNSUPPORTED.search(package):
+                self.packages[package] = package
+            self.stale = True
+
+    def removed(self, package):
+        '''
+        Record that package was removed. Packages depending on it may have
+        gone too, so the inventory is read again before the next check.
+
+        @param package: string - package name as given to Pkghelper.remove
+        @author: dkennel
+        '''
+        with self.lock:
+            if self.packages is None:
+                return
+            name = self.packages.get(package.strip())
+            if name is not None:
+                for key in [key for key, value in self.packages.iteritems()
+                            if value == name]:
+                    del self.packages[key]
+            self.stale = True
+
+    def getloads(self):
+        '''
+        Return the number of times the package set was read.
+
+        @return: int
+        @author: dkennel
+        '''
+        return self.loads
+
+
+INVENTORIES = {}
+REGISTRYLOCK = threading.Lock()
+
+
+def getinventory(logger, manager):
+    '''
+    Return the process wide PackageInventory for the package manager.
+
+    @param logger: STONIX logdispatcher object
+    @param manager: string - Pkghelper.determineMgr() result
+    @return: PackageInventory
+    @author: dkennel
+    '''
+    with REGISTRYLOCK:
+        inventory = INVENTORIES.get(manager)
+        if inventory is None:
+            inventory = PackageInventory(logger, manager)
+            INVENTORIES[manager] = inventory
+        return inventory
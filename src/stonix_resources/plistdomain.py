@@ -0,0 +1,541 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+In memory view of Mac OS X defaults domains for KVADefault. Each domain is
+read once, straight from its plist file when that is an XML plist and with a
+single defaults export otherwise, and every key is then answered from
+memory. Values are rendered the way defaults read prints them so that the
+regular expressions rules match against defaults output keep working.
+
+Writes are staged per domain and written with one atomic write per domain:
+defaults import where the defaults command exists (so that cfprefsd sees the
+change), otherwise the plist file is replaced. Inside batch() nothing is
+written until flush() is called or the outermost batch ends. Batches belong
+to the thread that opens them, so rules fixed in parallel do not hold back
+each other's writes. RuleKVEditor fixes its KVEditors in a batch and
+flushes it before afterfix(), so that all the changes a rule makes to a
+domain are written at once and before anything that reads them restarts.
+
+A domain is read again whenever the per run CommandCache is invalidated, as
+any command run during a fix may have changed it.
+
+@author: dkennel
+'''
+import datetime
+import os
+import pipes
+import plistlib
+import re
+import shlex
+import tempfile
+import threading
+from contextlib import contextmanager
+from CommandHelper import CommandHelper, getcommandcache
+from logdispatcher import LogPriority
+
+DEFAULTS = '/usr/bin/defaults'
+# Marks a key staged for deletion
+DELETE = object()
+# Characters of strings defaults read prints without quotes
+UNQUOTED = re.compile(r'^[A-Za-z0-9_$+/:.-]+$')
+
+
+def plistpath(domain):
+    '''
+    Return the plist file of a domain given as a path, or None for a domain
+    given by name.
+
+    @param domain: string - e.g. /Library/Preferences/com.apple.alf
+    @return: string or None
+    @author: dkennel
+    '''
+    if not domain.startswith('/'):
+        return None
+    if domain.endswith('.plist'):
+        return domain
+    return domain + '.plist'
+
+
+def quote(text):
+    '''
+    Return a string the way defaults read prints it inside an array or a
+    dictionary.
+
+    @param text: string
+    @return: string
+    @author: dkennel
+    '''
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    if UNQUOTED.match(text):
+        return text
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def formatvalue(value, level=0):
+    '''
+    Return a value the way defaults read prints it. As defaults does, a
+    dictionary or array inside a dictionary starts indented on the line of
+    its key.
+
+    @param value: plist value
+    @param level: int - nesting depth
+    @return: string, without the final newline
+    @author: dkennel
+    '''
+    indent = '    ' * level
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, long)):
+        return str(value)
+    if isinstance(value, float):
+        return '%.15g' % value
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S +0000')
+    if isinstance(value, plistlib.Data):
+        data = value.data.encode('hex')
+        return '<' + ' '.join([data[num:num + 8] for num in
+                               range(0, len(data), 8)]) + '>'
+    if isinstance(value, dict):
+        lines = ['{']
+        for key in sorted(value):
+            item = value[key]
+            if isinstance(item, (dict, list)):
+                item = indent + '    ' + formatvalue(item, level + 1)
+            else:
+                item = formatvalue(item, level + 1)
+            lines.append(indent + '    ' + quote(key) + ' = ' + item + ';')
+        lines.append(indent + '}')
+        return '\n'.join(lines)
+    if isinstance(value, list):
+        items = [indent + '    ' + formatvalue(item, level + 1)
+                 for item in value]
+        return '\n'.join(['('] + [',\n'.join(items)] * bool(items) +
+                         [indent + ')'])
+    if level:
+        return quote(value)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def formatdefaults(value):
+    '''
+    Return the output of defaults read for a key holding value.
+
+    @param value: plist value
+    @return: string
+    @author: dkennel
+    '''
+    return formatvalue(value) + '\n'
+
+
+def parsetyped(args):
+    '''
+    Private helper of parsewriteargs: parse one value from the front of
+    args, removing its arguments.
+
+    @param args: list of strings
+    @return: plist value
+    @author: dkennel
+    '''
+    flag = args.pop(0)
+    if flag.startswith('-') and not args:
+        raise ValueError('No value given for ' + flag)
+    if flag in ['-int', '-integer']:
+        return int(args.pop(0))
+    if flag == '-float':
+        return float(args.pop(0))
+    if flag in ['-bool', '-boolean']:
+        word = args.pop(0).lower()
+        if word in ['yes', 'true', '1']:
+            return True
+        if word in ['no', 'false', '0']:
+            return False
+        raise ValueError('Not a boolean: ' + word)
+    if flag == '-string':
+        return args.pop(0)
+    if flag.startswith('-'):
+        raise ValueError('Unsupported type: ' + flag)
+    return flag
+
+
+def parsewriteargs(argstring):
+    '''
+    Turn the arguments of a defaults write command after the key, e.g.
+    "-int 1" or "-array -string a -string b", into the value they write.
+    Plist literals and -array-add, -dict-add, -date and -data are not
+    supported.
+
+    @param argstring: string
+    @return: plist value
+    @raise ValueError: the arguments are not supported
+    @author: dkennel
+    '''
+    if re.search(r'[{}()]', argstring):
+        raise ValueError('Plist literals are not supported')
+    args = shlex.split(argstring)
+    if not args:
+        raise ValueError('No value given')
+    if args[0] == '-string':
+        # defaults writes everything after -string as one string
+        return ' '.join(args[1:])
+    if args[0] == '-array':
+        args.pop(0)
+        value = []
+        while args:
+            value.append(parsetyped(args))
+        return value
+    if args[0] == '-dict':
+        args.pop(0)
+        value = {}
+        while args:
+            key = args.pop(0)
+            if not args:
+                raise ValueError('Dictionary key without a value')
+            value[key] = parsetyped(args)
+        return value
+    value = parsetyped(args)
+    if args:
+        raise ValueError('Unexpected arguments: ' + ' '.join(args))
+    return value
+
+
+def writeargs(value):
+    '''
+    Return the arguments of a defaults write command writing value.
+
+    @param value: plist value
+    @return: list of strings
+    @author: dkennel
+    '''
+    if isinstance(value, bool):
+        return ['-bool', ['no', 'yes'][value]]
+    if isinstance(value, (int, long)):
+        return ['-int', str(value)]
+    if isinstance(value, float):
+        return ['-float', repr(value)]
+    if isinstance(value, basestring):
+        return ['-string', value]
+    return [plistlib.writePlistToString(value)]
+
+
+class PlistDomains(object):
+    '''
+    Shared, thread safe view of the defaults domains used in a run.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, logger=None, defaults=DEFAULTS):
+        '''
+        @param logger: STONIX logdispatcher object, None until a KVADefault
+            provides one
+        @param defaults: string - path of the defaults command
+        '''
+        self.logger = logger
+        self.defaults = defaults
+        self.domains = {}
+        # Staged changes and batch depth of each thread
+        self.local = threading.local()
+        self.reads = 0
+        self.writes = 0
+        self.lock = threading.RLock()
+
+    def log(self, priority, message):
+        '''
+        Log a message if a logger is set.
+
+        @author: dkennel
+        '''
+        if self.logger is not None:
+            self.logger.log(priority, ['PlistDomains', message])
+
+    def command(self, currenthost, *args):
+        '''
+        Return a defaults command line.
+
+        @param currenthost: bool - use the -currentHost domain
+        @param args: strings - the rest of the command
+        @return: list of strings
+        @author: dkennel
+        '''
+        cmd = [self.defaults]
+        if currenthost:
+            cmd.append('-currentHost')
+        return cmd + list(args)
+
+    def __getlocal(self):
+        '''
+        Private method returning the calling thread's staged changes and
+        batch depth.
+
+        @return: threading.local with pending and batchdepth
+        @author: dkennel
+        '''
+        if not hasattr(self.local, 'pending'):
+            self.local.pending = {}
+            self.local.batchdepth = 0
+        return self.local
+
+    def __read(self, domain, currenthost):
+        '''
+        Private method reading a domain.
+
+        @return: dict or None if it can not be read
+        @author: dkennel
+        '''
+        path = plistpath(domain)
+        if path is not None and not currenthost:
+            if not os.path.exists(path):
+                return {}
+            try:
+                values = plistlib.readPlist(path)
+                self.reads = self.reads + 1
+                return dict(values)
+            except Exception:
+                # Most likely a binary plist
+                pass
+        if not os.path.exists(self.defaults) or self.logger is None:
+            return None
+        ch = CommandHelper(self.logger)
+        try:
+            ch.executeCommand(self.command(currenthost, 'export', domain,
+                                           '-'), readonly=True)
+            if ch.getReturnCode() != 0:
+                raise OSError(ch.getErrorString())
+            values = plistlib.readPlistFromString(''.join(ch.getOutput()))
+        except Exception, err:
+            self.log(LogPriority.DEBUG, 'Reading ' + domain + ' failed: ' +
+                     str(err))
+            return None
+        self.reads = self.reads + 1
+        return dict(values)
+
+    def getdomain(self, domain, currenthost=False):
+        '''
+        Return the keys of a domain, including changes the calling thread
+        staged but did not write yet. The dictionary returned is a copy.
+
+        @param domain: string - domain name or path
+        @param currenthost: bool - the -currentHost domain
+        @return: dict or None if the domain can not be read natively
+        @author: dkennel
+        '''
+        name = (domain, currenthost)
+        generation = getcommandcache().getgeneration()
+        with self.lock:
+            entry = self.domains.get(name)
+            if entry is None or entry[0] != generation:
+                entry = (generation, self.__read(domain, currenthost))
+                self.domains[name] = entry
+            if entry[1] is None:
+                return None
+            values = dict(entry[1])
+            pending = self.__getlocal().pending
+            for key, value in pending.get(name, {}).iteritems():
+                if value is DELETE:
+                    values.pop(key, None)
+                else:
+                    values[key] = value
+            return values
+
+    def setvalues(self, domain, currenthost, values):
+        '''
+        Stage changes to a domain and write them unless the calling thread
+        has a batch open.
+
+        @param domain: string - domain name or path
+        @param currenthost: bool - the -currentHost domain
+        @param values: dict - key to new value or DELETE
+        @return: bool - False if the write failed
+        @author: dkennel
+        '''
+        local = self.__getlocal()
+        local.pending.setdefault((domain, currenthost), {}).update(values)
+        if local.batchdepth:
+            return True
+        return self.flush()
+
+    @contextmanager
+    def batch(self):
+        '''
+        Context manager deferring the calling thread's writes until flush()
+        is called or the outermost batch ends. Call flush() before leaving
+        the batch to learn whether the writes worked; failures when the
+        batch ends are only logged.
+
+        @author: dkennel
+        '''
+        local = self.__getlocal()
+        local.batchdepth = local.batchdepth + 1
+        try:
+            yield
+        finally:
+            local.batchdepth = local.batchdepth - 1
+            if not local.batchdepth:
+                self.flush()
+
+    def flush(self):
+        '''
+        Write every domain the calling thread staged changes to, each with
+        one write.
+
+        @return: bool - False if a write failed
+        @author: dkennel
+        '''
+        success = True
+        local = self.__getlocal()
+        with self.lock:
+            pending = local.pending
+            local.pending = {}
+            for (domain, currenthost), changes in pending.iteritems():
+                # Start from the domain as it is now
+                values = self.__read(domain, currenthost)
+                if values is None:
+                    values = {}
+                for key, value in changes.iteritems():
+                    if value is DELETE:
+                        values.pop(key, None)
+                    else:
+                        values[key] = value
+                if self.__write(domain, currenthost, values):
+                    self.domains[(domain, currenthost)] = \
+                        (getcommandcache().getgeneration(), values)
+                else:
+                    self.domains.pop((domain, currenthost), None)
+                    success = False
+        return success
+
+    def __write(self, domain, currenthost, values):
+        '''
+        Private method replacing a domain.
+
+        @return: bool
+        @author: dkennel
+        '''
+        path = plistpath(domain)
+        usedefaults = os.path.exists(self.defaults) and \
+            self.logger is not None
+        if not usedefaults and (path is None or currenthost):
+            self.log(LogPriority.ERROR, 'No way to write ' + domain)
+            return False
+        if usedefaults:
+            directory = None
+        else:
+            directory = os.path.dirname(path)
+        try:
+            handle, tmppath = tempfile.mkstemp(suffix='.plist',
+                                               dir=directory)
+            os.close(handle)
+            try:
+                plistlib.writePlist(values, tmppath)
+                if usedefaults:
+                    ch = CommandHelper(self.logger)
+                    ch.executeCommand(self.command(currenthost, 'import',
+                                                   domain, tmppath))
+                    if ch.getReturnCode() != 0:
+                        raise OSError(ch.getErrorString())
+                else:
+                    if os.path.exists(path):
+                        info = os.stat(path)
+                        os.chmod(tmppath, info.st_mode & 07777)
+                        os.chown(tmppath, info.st_uid, info.st_gid)
+                    else:
+                        os.chmod(tmppath, 0644)
+                    os.rename(tmppath, path)
+            finally:
+                if os.path.exists(tmppath):
+                    os.remove(tmppath)
+        except (IOError, OSError, TypeError), err:
+            self.log(LogPriority.ERROR, 'Writing ' + domain + ' failed: ' +
+                     str(err))
+            return False
+        self.writes = self.writes + 1
+        return True
+
+    def invalidate(self):
+        '''
+        Forget every domain read. Staged changes are kept.
+
+        @author: dkennel
+        '''
+        with self.lock:
+            self.domains = {}
+
+    def getstats(self):
+        '''
+        Return the number of domain reads and writes.
+
+        @return: tuple - (reads, writes)
+        @author: dkennel
+        '''
+        return (self.reads, self.writes)
+
+
+PLISTDOMAINS = PlistDomains()
+
+
+def getplistdomains(logger=None):
+    '''
+    Return the process wide PlistDomains.
+
+    @param logger: STONIX logdispatcher object, used if none is set yet
+    @return: PlistDomains
+    @author: dkennel
+    '''
+    if logger is not None and PLISTDOMAINS.logger is None:
+        PLISTDOMAINS.logger = logger
+    return PLISTDOMAINS
+
+
+def undocommand(domains, domain, currenthost, key, values):
+    '''
+    Return the defaults command restoring a key to its value in values.
+
+    @param domains: PlistDomains
+    @param domain: string - domain name or path
+    @param currenthost: bool - the -currentHost domain
+    @param key: string
+    @param values: dict - the domain before the change
+    @return: list of strings
+    @author: dkennel
+    '''
+    if key in values:
+        return domains.command(currenthost, 'write', domain, key,
+                               *writeargs(values[key]))
+    return domains.command(currenthost, 'delete', domain, key)
+
+
+def shellcommand(commands):
+    '''
+    Join several commands into one shell command string.
+
+    @param commands: list of lists of strings
+    @return: string
+    @author: dkennel
+    '''
+    return '; '.join([' '.join([pipes.quote(arg) for arg in cmd])
+                      for cmd in commands])
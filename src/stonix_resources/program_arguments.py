@@ -99,6 +99,14 @@ class ProgramArguments(object):
                           default=False,
                           help="List all installed rules that stonix will run on this platform.")
 
+        self.parser.add_option("-j", "--jobs", action="store", type="int",
+                          dest="jobs", default=1,
+                          help="Number of rules to run at the same time during a full fix or report run. Only rules marked as parallel safe are run concurrently.")
+
+        self.parser.add_option("--refreshfacts", action="store_true",
+                          dest="refreshfacts", default=False,
+                          help="Collect the system information (os, network, hardware) again instead of using the copy cached by earlier runs.")
+
         #####
         # The Self Update test will look to a development/test environment
         # to test Self Update rather than testing self update
@@ -124,6 +132,9 @@ class ProgramArguments(object):
         if self.opts.list and (self.opts.fix or self.opts.report or self.opts.rollback or self.opts.pcf or self.opts.update):
             self.parser.error('The -l --list option may not be used with the fix, report, rollback, update or GUI options')
 
+        if self.opts.jobs < 1:
+            self.parser.error('The -j --jobs option requires a number of jobs of 1 or more')
+
         if self.opts.debug:
             print "Selected options: "
             print self.opts
@@ -264,3 +275,20 @@ class ProgramArguments(object):
         @author: D. Kennel
         """
         return self.opts.list
+
+    def get_jobs(self):
+        """
+        Return the number of rules that may run at the same time.
+
+        @author: D. Kennel
+        """
+        return self.opts.jobs
+
+    def get_refreshfacts(self):
+        """
+        Return a bool for whether or not the cached system information
+        should be collected again.
+
+        @author: D. Kennel
+        """
+        return self.opts.refreshfacts
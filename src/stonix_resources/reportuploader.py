@@ -0,0 +1,273 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+Native upload of the XML run report to the report server. Reports are gzip
+compressed into a spool directory first and the spool is then drained over
+a single kept alive HTTPS connection, oldest report first. A report only
+leaves the spool once the server has acknowledged it, so reports from runs
+that could not reach the server are sent by the next run that can.
+
+The server side is LogImporter/results.php, which stores the uploaded "file"
+form field as is and answers "ok <path>" when it did.
+
+@author: dkennel
+'''
+import gzip
+import httplib
+import os
+import shutil
+import socket
+import ssl
+import time
+import uuid
+
+UPLOADPATH = '/stonix/results.php'
+# Reports kept for later delivery, older ones are dropped first
+MAXSPOOL = 20
+# Errors worth trying the same report again for
+RETRYERRORS = (httplib.HTTPException, socket.error, ssl.SSLError)
+# Errors that trying again will not fix
+FATALERRORS = (socket.gaierror, getattr(ssl, 'CertificateError', ValueError))
+
+
+class ReportUploader(object):
+    '''
+    Spool of compressed run reports and the client that delivers them.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, server, spooldir, port=443, path=UPLOADPATH,
+                 timeout=30, retries=3, backoff=1, cafile=None):
+        '''
+        @param server: string - report server host name
+        @param spooldir: string - directory holding reports not yet sent
+        @param port: int - HTTPS port of the report server
+        @param path: string - upload URL path
+        @param timeout: int - seconds to wait on the server per request
+        @param retries: int - attempts per report before giving up for
+            this run
+        @param backoff: int - seconds to wait after the first failed
+            attempt, doubled after each further one
+        @param cafile: string - certificates to verify the server against.
+            Like the curl -k upload this replaces, the server certificate
+            is not verified when this is None.
+        '''
+        self.server = server
+        self.spooldir = spooldir
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cafile = cafile
+        self.connection = None
+        self.uploaded = 0
+        self.errors = []
+
+    def enqueue(self, report):
+        '''
+        Compress a finished report into the spool. The report itself is
+        left in place.
+
+        @param report: string - path of the XML report
+        @return: string - path of the spooled copy, None on failure
+        @author: dkennel
+        '''
+        try:
+            if not os.path.isdir(self.spooldir):
+                os.makedirs(self.spooldir, 0700)
+            stamp = int(time.time() * 1000)
+            spooled = None
+            while spooled is None or os.path.exists(spooled):
+                spooled = os.path.join(self.spooldir, 'report-%d-%d.xml.gz' %
+                                       (stamp, os.getpid()))
+                stamp = stamp + 1
+            tmppath = spooled + '.tmp'
+            rhandle = open(report, 'rb')
+            try:
+                whandle = gzip.open(tmppath, 'wb')
+                try:
+                    shutil.copyfileobj(rhandle, whandle)
+                finally:
+                    whandle.close()
+            finally:
+                rhandle.close()
+            os.rename(tmppath, spooled)
+        except (IOError, OSError), err:
+            self.errors.append('Unable to spool ' + report + ': ' + str(err))
+            return None
+        return spooled
+
+    def getspooled(self):
+        '''
+        Return the spooled reports, oldest first.
+
+        @return: list of strings - full paths
+        @author: dkennel
+        '''
+        try:
+            names = sorted([name for name in os.listdir(self.spooldir)
+                            if name.startswith('report-') and
+                            name.endswith('.xml.gz')],
+                           key=lambda name: [int(part) for part in
+                                             name[7:-7].split('-')])
+        except (OSError, ValueError):
+            return []
+        return [os.path.join(self.spooldir, name) for name in names]
+
+    def drain(self):
+        '''
+        Upload every spooled report. Reports the server acknowledges are
+        removed from the spool. If the server can not be reached the
+        remaining reports are left for the next run.
+
+        @return: int - number of reports still spooled
+        @author: dkennel
+        '''
+        spooled = self.getspooled()
+        for stale in spooled[:-MAXSPOOL]:
+            self.__remove(stale)
+        spooled = spooled[-MAXSPOOL:]
+        remaining = len(spooled)
+        try:
+            for report in spooled:
+                sent = self.__upload(report)
+                if sent:
+                    self.__remove(report)
+                    self.uploaded = self.uploaded + 1
+                    remaining = remaining - 1
+                elif sent is None:
+                    # The server is not reachable
+                    break
+        finally:
+            self.close()
+        return remaining
+
+    def close(self):
+        '''
+        Close the connection to the report server.
+
+        @author: dkennel
+        '''
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except RETRYERRORS:
+                pass
+            self.connection = None
+
+    def __connect(self):
+        '''
+        Private method returning the kept alive connection, opening it if
+        needed.
+
+        @return: httplib.HTTPSConnection
+        @author: dkennel
+        '''
+        if self.connection is None:
+            kwargs = {}
+            if self.cafile is not None:
+                kwargs['context'] = ssl.create_default_context(
+                    cafile=self.cafile)
+            elif hasattr(ssl, '_create_unverified_context'):
+                kwargs['context'] = ssl._create_unverified_context()
+            self.connection = httplib.HTTPSConnection(self.server, self.port,
+                                                      timeout=self.timeout,
+                                                      **kwargs)
+        return self.connection
+
+    def __upload(self, report):
+        '''
+        Private method sending one report. Failures to talk to the server
+        are retried with exponential backoff; an answer from the server that
+        is not an acknowledgement is not.
+
+        @param report: string - path of the spooled report
+        @return: bool - True if the server acknowledged the report, False if
+            it did not and None if the server could not be reached
+        @author: dkennel
+        '''
+        try:
+            rhandle = open(report, 'rb')
+            try:
+                data = rhandle.read()
+            finally:
+                rhandle.close()
+        except IOError, err:
+            self.errors.append('Unable to read ' + report + ': ' + str(err))
+            return False
+        boundary = uuid.uuid4().hex
+        body = '\r\n'.join(['--' + boundary,
+                            'Content-Disposition: form-data; name="file"; '
+                            'filename="stonix-xmlreport.xml.gz"',
+                            'Content-Type: application/x-gzip',
+                            '',
+                            data,
+                            '--' + boundary + '--',
+                            ''])
+        headers = {'Content-Type': 'multipart/form-data; boundary=' +
+                   boundary,
+                   'Content-Length': str(len(body)),
+                   'Connection': 'keep-alive'}
+        delay = self.backoff
+        for attempt in range(self.retries):
+            if attempt:
+                time.sleep(delay)
+                delay = delay * 2
+            try:
+                connection = self.__connect()
+                connection.request('POST', self.path, body, headers)
+                response = connection.getresponse()
+                answer = response.read()
+                if response.getheader('connection', '').lower() == 'close':
+                    self.close()
+            except FATALERRORS, err:
+                self.errors.append('Upload of ' + report + ' failed: ' +
+                                   str(err))
+                self.close()
+                return None
+            except RETRYERRORS, err:
+                self.errors.append('Upload of ' + report + ' failed: ' +
+                                   str(err))
+                self.close()
+                continue
+            if response.status == 200 and answer.startswith('ok'):
+                return True
+            self.errors.append('Upload of ' + report + ' rejected: ' +
+                               str(response.status) + ' ' + answer.strip())
+            return False
+        return None
+
+    def __remove(self, path):
+        '''
+        Private method deleting a spooled report.
+
+        @author: dkennel
+        '''
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -43,6 +43,7 @@ Created on Aug 24, 2010
 from observable import Observable
 from configurationitem import ConfigurationItem
 from logdispatcher import LogPriority
+from applicability import getindex
 from types import *
 import os
 import re
@@ -58,6 +59,113 @@ from CommandHelper import CommandHelper
 import traceback
 
 
+def checkapplicable(applicable, environ):
+    """
+    Evaluate an applicability dictionary, as described in
+    Rule.isapplicable, against the platform described by the environment
+    object. This is the reference implementation; at runtime the compiled
+    and memoized evaluator in applicability.py is used instead and must
+    return the same answers.
+
+    @param applicable: dict - applicability dictionary
+    @param environ: STONIX environment object
+    @return: bool
+    @author: D. Kennel
+    """
+    # Shortcut if we are defaulting to true
+    try:
+        if 'os' not in applicable and 'family' not in applicable:
+            amidefault = applicable['default']
+            if amidefault == 'default':
+                return True
+    except KeyError:
+        pass
+
+    # Determine whether we are a blacklist or a whitelist, default to a
+    # blacklist
+    if 'type' in applicable:
+        listtype = applicable['type']
+    else:
+        listtype = 'black'
+    # Set the default return as appropriate to the list type
+    # FIXME check for valid input
+    assert listtype in ['white', 'black'], 'Invalid list type specified: %r' % listtype
+    if listtype == 'black':
+        applies = True
+    else:
+        applies = False
+
+    # get our data in local vars
+    myosfamily = environ.getosfamily()
+    myosversion = environ.getosver()
+    myostype = environ.getostype()
+
+    # Process the os family list
+    if 'family' in applicable:
+        if myosfamily in applicable['family']:
+            if listtype == 'black':
+                applies = False
+            else:
+                applies = True
+
+    # Process the OS list
+    if 'os' in applicable:
+        for ostype, osverlist in applicable['os'].iteritems():
+            if re.search(ostype, myostype):
+                # Process version and up
+                if '+' in osverlist:
+                    assert len(osverlist) is 2, "Wrong number of entries for a +"
+                    if osverlist[1] == '+':
+                        baseversion = osverlist[0]
+                    else:
+                        baseversion = osverlist[1]
+                    if LooseVersion(myosversion) >= LooseVersion(baseversion):
+                        if listtype == 'black':
+                            applies = False
+                        else:
+                            applies = True
+                # Process version and lower
+                elif '-' in osverlist:
+                    assert len(osverlist) is 2, "Wrong number of entries for a -"
+                    if osverlist[1] == '-':
+                        baseversion = osverlist[0]
+                    else:
+                        baseversion = osverlist[1]
+                    if LooseVersion(myosversion) <= LooseVersion(baseversion):
+                        if listtype == 'black':
+                            applies = False
+                        else:
+                            applies = True
+                # Process inclusive range
+                elif 'r' in osverlist:
+                    assert len(osverlist) is 3, "Wrong number of entries for a range"
+                    # Work on a copy, the caller's list must not be altered
+                    vertmp = list(osverlist)
+                    vertmp.remove('r')
+                    if LooseVersion(vertmp[0]) > LooseVersion(vertmp[1]):
+                        highver = vertmp[0]
+                        lowver = vertmp[1]
+                    elif LooseVersion(vertmp[0]) < LooseVersion(vertmp[1]):
+                        highver = vertmp[1]
+                        lowver = vertmp[0]
+                    else:
+                        raise ValueError('Range versions are the same')
+                    if LooseVersion(myosversion) <= LooseVersion(highver) \
+                    and LooseVersion(myosversion) >= LooseVersion(lowver):
+                        if listtype == 'black':
+                            applies = False
+                        else:
+                            applies = True
+                # Process explicit match
+                else:
+                    if myosversion in osverlist:
+                        if listtype == 'black':
+                            applies = False
+                        else:
+                            applies = True
+    return applies
+
+
 class Rule (Observable):
 
     """
@@ -89,6 +197,9 @@ LANL-stonix."""
         self.compliant = False
         self.rulesuccess = True
         self.databaserule = False
+        self.parallelsafe = False
+        self.parallelreport = False
+        self.touchedresources = []
         self.applicable = {'default': 'default'}
         self.revertable = False
         self.confitems = []
@@ -133,6 +244,8 @@ LANL-stonix."""
         self.rulesuccess will be updated if the rule does not succeed.
 
         @author D. Kennel & D. Walker
+        @change: 2016/10/18 dkennel revert all conf events of the rule in one
+            batch and report hunks that could not be reverted
         """
         # pass
         if not self.environ.geteuid() == 0:
@@ -149,6 +262,7 @@ LANL-stonix."""
                 self.formatDetailedResults("undo", None, self.detailedresults)
                 self.logdispatch.log(LogPriority.INFO, self.detailedresults)
                 return undosuccessful
+            filechanges = []
             for entry in eventlist:
                 try:
                     event = self.statechglogger.getchgevent(entry)
@@ -158,8 +272,8 @@ LANL-stonix."""
                         os.chown(event["filepath"], perms[0], perms[1])
                         
                     elif event["eventtype"] == "conf":
-                        self.statechglogger.revertfilechanges(event["filepath"], entry)
-                        
+                        filechanges.append((event["filepath"], entry))
+
                     elif event["eventtype"] == "comm":
                         ch = CommandHelper(self.logger)
                         command = event["command"]
@@ -181,6 +295,14 @@ to undo\n"
                 except(IndexError, KeyError):
                     self.detailedresults = "EventID " + entry + " not found"
                     self.logdispatch.log(LogPriority.DEBUG, self.detailedresults)
+            if filechanges:
+                conflicts = \
+                    self.statechglogger.revertfilechangeset(filechanges)
+                if conflicts:
+                    undosuccessful = False
+                    self.detailedresults += "Some changes could not be " + \
+                        "reverted:\n" + \
+                        "\n".join([str(conflict) for conflict in conflicts])
         except(KeyboardInterrupt, SystemExit):
             raise
         except Exception:
@@ -321,6 +443,46 @@ to undo\n"
         """
         return self.databaserule
 
+    def isparallelsafe(self):
+        """
+        Return true if the rule may be run at the same time as other rules
+        when stonix is run with more than one job. Rules returning true must
+        list every file and service they read or change in
+        self.touchedresources so that rules sharing a resource are never run
+        together. Rules that have not been reviewed for concurrent execution
+        should leave this False and will always be run on their own.
+
+        @return bool :
+        @author D. Kennel
+        """
+        return self.parallelsafe
+
+    def isparallelreport(self):
+        """
+        Return true if the rule's report may be run at the same time as other
+        rules during an audit, while its fix is still run on its own. For
+        rules whose report is read only but slow and whose fix has not been
+        reviewed for concurrent execution. Rules returning true must list
+        every file and service their report reads or changes in
+        self.touchedresources.
+
+        @return bool :
+        @author D. Kennel
+        """
+        return self.parallelsafe or self.parallelreport
+
+    def gettouchedresources(self):
+        """
+        Return the list of files and services this rule reads or changes.
+        Entries are free form strings; by convention files are listed by
+        full path and services as 'service:<name>'. This is only consulted
+        for rules that are parallel safe.
+
+        @return list :
+        @author D. Kennel
+        """
+        return self.touchedresources
+
     def isapplicable(self):
         """
         This method returns true if the rule applies to the platform on which
@@ -384,114 +546,13 @@ to undo\n"
         @return bool :
         @author D. Kennel
         @change: 2015/04/13 added this method to template class
+        @change: 2016/10/18 dkennel evaluate through the compiled, memoized
+            applicability index
         """
-        # return True
-        # Shortcut if we are defaulting to true
+        applies = getindex().evaluate(self.applicable, self.environ)
         self.logdispatch.log(LogPriority.DEBUG,
-                             'Check applicability for ' + self.rulename)
-        self.logdispatch.log(LogPriority.DEBUG,
-                             'Dictionary is: ' + str(self.applicable))
-        try:
-            if 'os' not in self.applicable and 'family' not in self.applicable:
-                amidefault = self.applicable['default']
-                if amidefault == 'default':
-                    self.logdispatch.log(LogPriority.DEBUG,
-                                         'Defaulting to True')
-                    return True
-        except KeyError:
-            pass
-
-        # Determine whether we are a blacklist or a whitelist, default to a
-        # blacklist
-        if 'type' in self.applicable:
-            listtype = self.applicable['type']
-        else:
-            listtype = 'black'
-        # Set the default return as appropriate to the list type
-        # FIXME check for valid input
-        assert listtype in ['white', 'black'], 'Invalid list type specified: %r' % listtype
-        if listtype == 'black':
-            applies = True
-        else:
-            applies = False
-
-        # get our data in local vars
-        myosfamily = self.environ.getosfamily()
-        myosversion = self.environ.getosver()
-        myostype = self.environ.getostype()
-
-        # Process the os family list
-        if 'family' in self.applicable:
-            if myosfamily in self.applicable['family']:
-                if listtype == 'black':
-                    applies = False
-                else:
-                    applies = True
-                self.logdispatch.log(LogPriority.DEBUG,
-                                     'Family match, applies: ' + str(applies))
-
-        # Process the OS list
-        if 'os' in self.applicable:
-            for ostype, osverlist in self.applicable['os'].iteritems():
-                if re.search(ostype, myostype):
-                    # Process version and up
-                    if '+' in osverlist:
-                        assert len(osverlist) is 2, "Wrong number of entries for a +"
-                        if osverlist[1] == '+':
-                            baseversion = osverlist[0]
-                        else:
-                            baseversion = osverlist[1]
-                        if LooseVersion(myosversion) >= LooseVersion(baseversion):
-                            if listtype == 'black':
-                                applies = False
-                            else:
-                                applies = True
-                            self.logdispatch.log(LogPriority.DEBUG,
-                                                 'Plus match, applies: ' + str(applies))
-                    # Process version and lower
-                    elif '-' in osverlist:
-                        assert len(osverlist) is 2, "Wrong number of entries for a -"
-                        if osverlist[1] == '-':
-                            baseversion = osverlist[0]
-                        else:
-                            baseversion = osverlist[1]
-                        if LooseVersion(myosversion) <= LooseVersion(baseversion):
-                            if listtype == 'black':
-                                applies = False
-                            else:
-                                applies = True
-                            self.logdispatch.log(LogPriority.DEBUG,
-                                                 'Minus match, applies: ' + str(applies))
-                    # Process inclusive range
-                    elif 'r' in osverlist:
-                        assert len(osverlist) is 3, "Wrong number of entries for a range"
-                        vertmp = osverlist
-                        vertmp.remove('r')
-                        if LooseVersion(vertmp[0]) > LooseVersion(vertmp[1]):
-                            highver = vertmp[0]
-                            lowver = vertmp[1]
-                        elif LooseVersion(vertmp[0]) < LooseVersion(vertmp[1]):
-                            highver = vertmp[1]
-                            lowver = vertmp[0]
-                        else:
-                            raise ValueError('Range versions are the same')
-                        if LooseVersion(myosversion) <= LooseVersion(highver) \
-                        and LooseVersion(myosversion) >= LooseVersion(lowver):
-                            if listtype == 'black':
-                                applies = False
-                            else:
-                                applies = True
-                            self.logdispatch.log(LogPriority.DEBUG,
-                                                 'Range match, applies: ' + str(applies))
-                    # Process explicit match
-                    else:
-                        if myosversion in osverlist:
-                            if listtype == 'black':
-                                applies = False
-                            else:
-                                applies = True
-                            self.logdispatch.log(LogPriority.DEBUG,
-                                                 'Version match, applies: ' + str(applies))
+                             [self.rulename, 'Applies: ' + str(applies) +
+                              ' Dictionary is: ' + str(self.applicable)])
         return applies
 
     def addresses(self):
@@ -33,6 +33,8 @@ This object is designed to automate rules using the KV Editor paradigm
 @change: 02/19/2014 ekkehard added beforefix and afterfix
 @change: 04/14/2014 ekkeahrd integrate currenthost option feature
 @change: 04/23/2014 ekkeahrd fixed statelogger only records if euid = 0
+@change: 2016/10/18 dkennel - defaults domain writes are batched per fix and
+    written before afterfix
 '''
 import traceback
 import types
@@ -40,6 +42,7 @@ from rule import Rule
 from KVEditorStonix import KVEditorStonix
 from logdispatcher import LogPriority
 from configurationitem import ConfigurationItem
+from plistdomain import getplistdomains
 
 
 class RuleKVEditor (Rule):
@@ -73,6 +76,7 @@ LANL-stonix."""
         self.kveditorName = ""
         self.kvindex = 0
         self.kvdictionary = {}
+        self.plistdomains = getplistdomains(logger)
 
 ###############################################################################
 
@@ -247,88 +251,100 @@ LANL-stonix."""
                                                      "----Begin"])
             fixsuccessful = self.beforefix()
             if fixsuccessful:
-                if not letcallersetdetailedresults:
-                    self.resultReset()
-                keys = sorted(self.kvdictionary.keys())
-                for key in keys:
-                    self.getKVEditor(key)
-                    if (self.kveditorName == ""):
-                        self.logdispatch.log(LogPriority.DEBUG,
-                                             [self.prefix(),
-                                             "no kveditorname is blank!"])
-                    elif not self.configurationItem == None and \
-                    self.configurationItem.getdatatype() == "bool" and \
-                    not (self.configurationItem.getcurrvalue()) and \
-                    self.kvdatafixalternate == {}:
-                        self.logdispatch.log(LogPriority.DEBUG,
-                                             [self.prefix(),
-                                              " Configuration Item is False!"])
-                        self.resultAppend(str(self.configurationItem.getkey()) + \
-                                          " was set to Disabled. No " + \
-                                          "action taken!!")
-                        success = True
-                    elif self.kvreportsuccessful  and \
-                    self.kvdatafixalternate == {}:
-                        self.logdispatch.log(LogPriority.DEBUG,
-                                             [self.prefix(),
-                                             "Compliant no action taken!"])
-                    elif (self.kvreportonly):
-                        self.logdispatch.log(LogPriority.DEBUG,
-                                             [self.prefix(),
-                                              self.kveditorName +
-                                             " is a report only kveditor"])
-                    else:
-                        success = True
-                        if (success and self.kveditorinitialized == False):
-                            success = self.kveditorinit()
+                # The defaults domain changes the KVEditors stage are
+                # written together, and before afterfix() restarts
+                # anything that reads them
+                with self.plistdomains.batch():
+                    if not letcallersetdetailedresults:
+                        self.resultReset()
+                    keys = sorted(self.kvdictionary.keys())
+                    for key in keys:
+                        self.getKVEditor(key)
+                        if (self.kveditorName == ""):
                             self.logdispatch.log(LogPriority.DEBUG,
                                                  [self.prefix(),
-                                                  "kveditorinit() = " + \
-                                                  str(success)])
-                        if success and not (self.kvdatafixalternate == {}) \
-                        and not (self.configurationItem.getcurrvalue()):
-                            success = self.kveditor.updatedata(self.kvdatafixalternate)
-                        if (success):
-                            success = self.kveditor.fix()
+                                                 "no kveditorname is blank!"])
+                        elif not self.configurationItem == None and \
+                        self.configurationItem.getdatatype() == "bool" and \
+                        not (self.configurationItem.getcurrvalue()) and \
+                        self.kvdatafixalternate == {}:
                             self.logdispatch.log(LogPriority.DEBUG,
                                                  [self.prefix(),
-                                                  "kveditor.fix() = " + \
-                                                  str(success)])
-                        if (success):
-# statlogger only works as root so on set eventid if root
-                            if self.environ.geteuid() == 0:
-                                self.kveditor.setEventID(self.kveventid)
-                                self.logdispatch.log(LogPriority.DEBUG,
-                                                     [self.prefix(),
-                                                      "environ.geteuid() " + \
-                                                      "is 0 so we are " + \
-                                                      "setting " + \
-                                                      "kveditor.setEventID(" + \
-                                                      str(self.kveventid) + \
-                                                      ")!"])
-                            success = self.kveditor.commit()
+                                                  " Configuration Item is False!"])
+                            self.resultAppend(str(self.configurationItem.getkey()) + \
+                                              " was set to Disabled. No " + \
+                                              "action taken!!")
+                            success = True
+                        elif self.kvreportsuccessful  and \
+                        self.kvdatafixalternate == {}:
                             self.logdispatch.log(LogPriority.DEBUG,
                                                  [self.prefix(),
-                                                  "kveditor.commit() = " + \
-                                                  str(success)])
-                        if not self.configurationItem == None and \
-                        self.configurationItem.getdatatype() == "bool" and \
-                        not (self.kvdatafixalternate == {}) \
-                        and not (self.configurationItem.getcurrvalue()):
-                            success = self.kveditor.updatedata(self.kvdata)
-                        if (success):
+                                                 "Compliant no action taken!"])
+                        elif (self.kvreportonly):
                             self.logdispatch.log(LogPriority.DEBUG,
                                                  [self.prefix(),
-                                                  "fix was successful!"])
-                            self.resultAppend(self.kveditorName + \
-                                              " fix was successful!")
+                                                  self.kveditorName +
+                                                 " is a report only kveditor"])
                         else:
-                            self.logdispatch.log(LogPriority.DEBUG,
+                            success = True
+                            if (success and self.kveditorinitialized == False):
+                                success = self.kveditorinit()
+                                self.logdispatch.log(LogPriority.DEBUG,
+                                                     [self.prefix(),
+                                                      "kveditorinit() = " + \
+                                                      str(success)])
+                            if success and not (self.kvdatafixalternate == {}) \
+                            and not (self.configurationItem.getcurrvalue()):
+                                success = self.kveditor.updatedata(self.kvdatafixalternate)
+                            if (success):
+                                success = self.kveditor.fix()
+                                self.logdispatch.log(LogPriority.DEBUG,
+                                                     [self.prefix(),
+                                                      "kveditor.fix() = " + \
+                                                      str(success)])
+                            if (success):
+# statlogger only works as root so on set eventid if root
+                                if self.environ.geteuid() == 0:
+                                    self.kveditor.setEventID(self.kveventid)
+                                    self.logdispatch.log(LogPriority.DEBUG,
+                                                         [self.prefix(),
+                                                          "environ.geteuid() " + \
+                                                          "is 0 so we are " + \
+                                                          "setting " + \
+                                                          "kveditor.setEventID(" + \
+                                                          str(self.kveventid) + \
+                                                          ")!"])
+                                success = self.kveditor.commit()
+                                self.logdispatch.log(LogPriority.DEBUG,
+                                                     [self.prefix(),
+                                                      "kveditor.commit() = " + \
+                                                      str(success)])
+                            if not self.configurationItem == None and \
+                            self.configurationItem.getdatatype() == "bool" and \
+                            not (self.kvdatafixalternate == {}) \
+                            and not (self.configurationItem.getcurrvalue()):
+                                success = self.kveditor.updatedata(self.kvdata)
+                            if (success):
+                                self.logdispatch.log(LogPriority.DEBUG,
+                                                     [self.prefix(),
+                                                      "fix was successful!"])
+                                self.resultAppend(self.kveditorName + \
+                                                  " fix was successful!")
+                            else:
+                                self.logdispatch.log(LogPriority.DEBUG,
+                                                 [self.prefix(),
+                                                  "Failed!"])
+                                self.resultAppend(self.kveditorName + \
+                                                  " fix failed!")
+                                fixsuccessful = False
+                    if not self.plistdomains.flush():
+                        self.logdispatch.log(LogPriority.DEBUG,
                                              [self.prefix(),
-                                              "Failed!"])
-                            self.resultAppend(self.kveditorName + \
-                                              " fix failed!")
-                            fixsuccessful = False
+                                              "Writing the defaults " +
+                                              "domains failed!"])
+                        self.resultAppend("Writing the defaults " +
+                                          "domains failed!")
+                        fixsuccessful = False
                 self.logdispatch.log(LogPriority.DEBUG, [self.prefix(),
                                                          str(fixsuccessful) + \
                                                          " ----End"])
@@ -0,0 +1,236 @@
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+The RuleExecutor runs rule methods on a pool of worker threads so that a full
+report or fix run is no longer the sum of every rule's latency. Rules that
+have not declared themselves parallel safe are always run on their own, and
+parallel safe rules that touch the same files or services are never run at
+the same time. In a report only run, rules that declared only their report
+parallel safe are run concurrently as well. Completed rules are handed back to the caller strictly in the
+order they were submitted so that progress and notify_check() updates reach
+the observers in order.
+
+@author: dkennel
+'''
+import Queue
+import threading
+import traceback
+from logdispatcher import LogPriority
+
+
+class RuleExecutor(object):
+    '''
+    Worker pool for running rules concurrently.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, logdispatcher, jobs=1):
+        '''
+        @param logdispatcher: STONIX logdispatcher object
+        @param jobs: int - maximum number of rules to run at the same time
+        '''
+        self.logger = logdispatcher
+        if type(jobs) is not int:
+            raise TypeError('Number of jobs must be an integer')
+        elif jobs < 1:
+            raise ValueError('Number of jobs must be a positive integer')
+        self.jobs = jobs
+        self.workq = None
+        self.doneq = None
+        self.workers = []
+        self.stopped = False
+        self.reportonly = False
+
+    def getjobs(self):
+        '''
+        Return the maximum number of rules that will run at the same time.
+
+        @return: int
+        @author: dkennel
+        '''
+        return self.jobs
+
+    def stop(self):
+        '''
+        Stop handing out rules. Rules that are already running are allowed to
+        finish and are still passed to the completed callback.
+
+        @author: dkennel
+        '''
+        self.stopped = True
+
+    def run(self, rules, action, completed, reportonly=False):
+        '''
+        Run action(rule) for every rule in the list on the worker pool and
+        call completed(rule) on the calling thread, in list order, as each
+        rule finishes.
+
+        @param rules: list of instantiated rule objects
+        @param action: callable taking a rule. Exceptions raised by the
+            action are logged and treated as a finished rule.
+        @param completed: callable taking a rule. Called in the caller's
+            thread in the same order as the rules list.
+        @param reportonly: bool - the action only runs reports, so rules
+            whose report is parallel safe may run concurrently
+        @author: dkennel
+        '''
+        total = len(rules)
+        if total == 0:
+            return
+        self.stopped = False
+        self.reportonly = reportonly
+        self.workq = Queue.Queue()
+        self.doneq = Queue.Queue()
+        self.__startworkers(min(self.jobs, total))
+        running = {}
+        finished = set()
+        dispatched = 0
+        delivered = 0
+        try:
+            while delivered < total:
+                while delivered < dispatched and delivered in finished:
+                    completed(rules[delivered])
+                    delivered = delivered + 1
+                # Hand out as many rules as the pool and the claims allow.
+                # Rules are dispatched in order so a rule that has to wait
+                # blocks the rules behind it, keeping runs deterministic.
+                while not self.stopped and dispatched < total and \
+                len(running) < self.jobs and \
+                self.__canstart(rules[dispatched], running):
+                    running[dispatched] = self.__getclaims(rules[dispatched])
+                    self.workq.put((dispatched, rules[dispatched], action))
+                    dispatched = dispatched + 1
+                if delivered >= total:
+                    break
+                if self.stopped and delivered >= dispatched:
+                    break
+                try:
+                    # A timeout keeps the controlling thread responsive to
+                    # KeyboardInterrupt while waiting on the workers.
+                    index = self.doneq.get(True, 0.5)
+                except Queue.Empty:
+                    continue
+                del running[index]
+                finished.add(index)
+        finally:
+            # Workers still running a rule, after an interrupt, are left
+            # to finish on their own
+            self.__stopworkers(not running)
+
+    def __canstart(self, rule, running):
+        '''
+        Private method to decide whether the rule may be started given the
+        claims of the rules that are already running.
+
+        @param rule: rule object waiting to be dispatched
+        @param running: dict of index -> claims for running rules
+        @return: bool
+        @author: dkennel
+        '''
+        if not running:
+            return True
+        claims = self.__getclaims(rule)
+        if claims is None:
+            return False
+        for held in running.values():
+            if held is None:
+                return False
+            if claims & held:
+                return False
+        return True
+
+    def __getclaims(self, rule):
+        '''
+        Private method returning the set of resources the rule touches or
+        None if the rule must run exclusively.
+
+        @param rule: rule object
+        @return: set or None
+        @author: dkennel
+        '''
+        try:
+            if self.reportonly:
+                safe = rule.isparallelreport()
+            else:
+                safe = rule.isparallelsafe()
+            if not safe:
+                return None
+            return set(rule.gettouchedresources())
+        except AttributeError:
+            return None
+
+    def __startworkers(self, count):
+        '''
+        Private method to start the worker threads.
+
+        @param count: int - number of workers to start
+        @author: dkennel
+        '''
+        self.workers = []
+        for _ in range(count):
+            worker = threading.Thread(target=self.__work,
+                                      args=(self.workq, self.doneq))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def __stopworkers(self, wait):
+        '''
+        Private method to tell the worker threads to exit once the queued
+        work is done.
+
+        @param wait: bool - wait for the workers to exit, so that no idle
+            worker is left running when the interpreter exits
+        @author: dkennel
+        '''
+        for _ in self.workers:
+            self.workq.put(None)
+        if wait:
+            for worker in self.workers:
+                worker.join()
+        self.workers = []
+
+    def __work(self, workq, doneq):
+        '''
+        Worker thread main loop.
+
+        @param workq: Queue of (index, rule, action) tuples to run
+        @param doneq: Queue that receives the index of each finished rule
+        @author: dkennel
+        '''
+        while True:
+            item = workq.get()
+            if item is None:
+                return
+            index, rule, action = item
+            try:
+                action(rule)
+            except Exception:
+                trace = traceback.format_exc()
+                self.logger.log(LogPriority.ERROR,
+                                [rule.getrulename(),
+                                 "RuleExecutor caught rule death: " + trace])
+            doneq.put(index)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+'''
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+Created on Oct 18, 2016
+
+The rule manifest records the rule number, rule name, applicability
+dictionary and root required flag of every rule module so that the
+controller can decide which rules apply to the current platform without
+importing and instantiating all of them. The manifest is generated at build
+time by running this module against the rules directory:
+
+    python stonix_resources/rulemanifest.py stonix_resources/rules
+
+The values are read from the literal assignments in each rule's __init__
+method using the ast module; the rule code is never executed. Rules whose
+values can not be determined statically (computed values, conditional
+assignments, overridden isapplicable methods) are marked as dynamic and are
+always imported so that the rule itself can decide.
+
+Applicability of the static entries is evaluated through the shared
+ApplicabilityIndex whose results are persisted next to the manifest, so a
+repeat run on the same platform does not evaluate any specs.
+
+@author: dkennel
+'''
+import ast
+import hashlib
+import json
+import os
+import sys
+from logdispatcher import LogPriority
+from applicability import CACHENAME, getindex, speckey
+
+MANIFESTNAME = 'rulemanifest.json'
+MANIFESTVERSION = 1
+RULEBASES = ['Rule', 'RuleKVEditor']
+DEFAULTAPPLICABLE = {'default': 'default'}
+
+
+def digestfile(path):
+    '''
+    Return the sha1 hex digest of the file at path. Used to detect rule
+    files that have changed since the manifest was built.
+
+    @param path: string - full path to the file
+    @return: string
+    @author: dkennel
+    '''
+    rhandle = open(path, 'rb')
+    try:
+        return hashlib.sha1(rhandle.read()).hexdigest()
+    finally:
+        rhandle.close()
+
+
+def scanrule(path):
+    '''
+    Build the manifest entry for the rule module at path without importing
+    it.
+
+    @param path: string - full path to the rule module
+    @return: dict - manifest entry. If the values could not be determined
+        statically the 'static' key will be False.
+    @author: dkennel
+    '''
+    module = os.path.basename(path)[:-3]
+    entry = {'module': module,
+             'digest': digestfile(path),
+             'rulenumber': None,
+             'rulename': None,
+             'applicable': None,
+             'rootrequired': None,
+             'static': False}
+    try:
+        rhandle = open(path, 'r')
+        try:
+            tree = ast.parse(rhandle.read(), path)
+        finally:
+            rhandle.close()
+    except SyntaxError:
+        return entry
+    ruleclass = None
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == module:
+            ruleclass = node
+    if ruleclass is None:
+        return entry
+    bases = [base.id for base in ruleclass.bases
+             if isinstance(base, ast.Name)]
+    if len(bases) != 1 or bases[0] not in RULEBASES:
+        return entry
+    init = None
+    for node in ruleclass.body:
+        if isinstance(node, ast.FunctionDef):
+            if node.name == 'isapplicable':
+                # The rule decides for itself, it has to be imported.
+                return entry
+            if node.name == '__init__':
+                init = node
+    if init is None:
+        return entry
+    found = {'applicable': DEFAULTAPPLICABLE, 'rootrequired': True}
+    wanted = ['rulenumber', 'rulename', 'applicable', 'rootrequired']
+    dynamic = False
+    # Only top level statements of __init__ are trusted. Anything assigned
+    # inside a branch or loop depends on runtime state.
+    for stmt in ast.walk(init):
+        if not isinstance(stmt, ast.Assign):
+            continue
+        for target in stmt.targets:
+            if not isinstance(target, ast.Attribute) or \
+               not isinstance(target.value, ast.Name) or \
+               target.value.id != 'self' or target.attr not in wanted:
+                continue
+            if stmt not in init.body:
+                dynamic = True
+                continue
+            try:
+                found[target.attr] = ast.literal_eval(stmt.value)
+            except ValueError:
+                dynamic = True
+    if dynamic or 'rulenumber' not in found or 'rulename' not in found:
+        return entry
+    entry.update(found)
+    entry['static'] = True
+    return entry
+
+
+def buildmanifest(rulespath):
+    '''
+    Scan every rule module in rulespath and return the manifest dictionary.
+
+    @param rulespath: string - path to the rules directory
+    @return: dict
+    @author: dkennel
+    '''
+    rules = {}
+    for rfile in sorted(os.listdir(rulespath)):
+        if not rfile.endswith('.py') or rfile == '__init__.py':
+            continue
+        entry = scanrule(os.path.join(rulespath, rfile))
+        rules[entry['module']] = entry
+    return {'version': MANIFESTVERSION, 'rules': rules}
+
+
+def writemanifest(rulespath, manifestpath=None):
+    '''
+    Generate the manifest for rulespath and write it to manifestpath, which
+    defaults to rulemanifest.json in the rules directory.
+
+    @param rulespath: string - path to the rules directory
+    @param manifestpath: string - where to write the manifest
+    @return: string - path of the written manifest
+    @author: dkennel
+    '''
+    if manifestpath is None:
+        manifestpath = os.path.join(rulespath, MANIFESTNAME)
+    manifest = buildmanifest(rulespath)
+    whandle = open(manifestpath, 'w')
+    try:
+        json.dump(manifest, whandle, indent=1, sort_keys=True)
+    finally:
+        whandle.close()
+    return manifestpath
+
+
+class RuleManifest(object):
+    '''
+    Runtime view of the rule manifest. Entries are taken from the generated
+    manifest when the rule file is unchanged and rescanned otherwise.
+
+    @author: dkennel
+    '''
+
+    def __init__(self, rulespath, logdispatcher):
+        '''
+        @param rulespath: string - path to the rules directory
+        @param logdispatcher: STONIX logdispatcher object
+        '''
+        self.rulespath = rulespath
+        self.logger = logdispatcher
+        self.entries = []
+        self.index = getindex()
+        self.load()
+        self.index.setcachepath(os.path.join(rulespath, CACHENAME))
+
+    def load(self):
+        '''
+        Read the generated manifest and validate it against the rule modules
+        present in the rules directory.
+
+        @author: dkennel
+        '''
+        manifestpath = os.path.join(self.rulespath, MANIFESTNAME)
+        known = {}
+        try:
+            rhandle = open(manifestpath, 'r')
+            try:
+                manifest = json.load(rhandle)
+            finally:
+                rhandle.close()
+            if manifest.get('version') == MANIFESTVERSION:
+                known = manifest['rules']
+        except (IOError, ValueError, KeyError, AttributeError):
+            self.logger.log(LogPriority.DEBUG,
+                            ['RuleManifest',
+                             'No usable manifest at ' + manifestpath])
+        self.entries = []
+        for rfile in sorted(os.listdir(self.rulespath)):
+            if not rfile.endswith('.py') or rfile == '__init__.py':
+                continue
+            module = rfile[:-3]
+            rpath = os.path.join(self.rulespath, rfile)
+            entry = known.get(module)
+            if entry is None or entry.get('digest') != digestfile(rpath):
+                self.logger.log(LogPriority.DEBUG,
+                                ['RuleManifest', 'Rescanning ' + module])
+                entry = scanrule(rpath)
+            if entry['static']:
+                entry['speckey'] = speckey(entry['applicable'])
+            self.entries.append(entry)
+
+    def getentries(self):
+        '''
+        Return the manifest entries for all rule modules, sorted by module
+        name.
+
+        @return: list of dicts
+        @author: dkennel
+        '''
+        return self.entries
+
+    def matchesname(self, entry, name):
+        '''
+        Return True if the entry may be the rule requested by name. Rules
+        whose name is not known statically always match.
+
+        @param entry: dict - manifest entry
+        @param name: string - rule name or module name
+        @return: bool
+        @author: dkennel
+        '''
+        if not entry['static']:
+            return True
+        return name in [entry['rulename'], entry['module']]
+
+    def isapplicable(self, entry, environ):
+        '''
+        Return False if the entry is known not to apply to this platform or
+        requires privileges we do not hold. Dynamic entries always return
+        True so that they are imported and can decide for themselves.
+
+        @param entry: dict - manifest entry
+        @param environ: STONIX environment object
+        @return: bool
+        @author: dkennel
+        '''
+        if not entry['static']:
+            return True
+        if entry['rootrequired'] and environ.geteuid() != 0:
+            return False
+        try:
+            return self.index.evaluate(entry['applicable'], environ,
+                                       entry['speckey'])
+        except (AssertionError, ValueError, TypeError, AttributeError):
+            return True
+
+    def savecache(self):
+        '''
+        Persist the applicability results gathered during this run next to
+        the manifest.
+
+        @return: bool - True if the results file was written
+        @author: dkennel
+        '''
+        saved = self.index.save()
+        hits, misses = self.index.getstats()
+        self.logger.log(LogPriority.DEBUG,
+                        ['RuleManifest', 'Applicability cache hits: ' +
+                         str(hits) + ' evaluations: ' + str(misses)])
+        return saved
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        RULESPATH = sys.argv[1]
+    else:
+        RULESPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'rules')
+    print 'Wrote ' + writemanifest(RULESPATH)
@@ -29,6 +29,8 @@ on a system must have unique UIDs.
 @change: 02/12/2014 ekkehard Implemented isapplicable
 @change: 08/05/2014 ekkehard added duplicate uid & gid check for OS X
 @change: 2015/04/14 dkennel updated to use new style isApplicable
+@change: 2016/10/18 dkennel find duplicates through the shared AccountDB
+    instead of scanning lists
 '''
 from __future__ import absolute_import
 import os
@@ -39,6 +41,7 @@ import traceback
 from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..CommandHelper import CommandHelper
+from ..accountdb import getaccountdb
 
 
 class CheckDuplicateIds(Rule):
@@ -70,6 +73,8 @@ class CheckDuplicateIds(Rule):
                            'family': ['linux', 'solaris', 'freebsd'],
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10']}}
         self.rootrequired = False
+        self.parallelsafe = True
+        self.touchedresources = ['/etc/passwd', '/etc/group']
         self.issuelist = []
 
     def report(self):
@@ -114,50 +119,31 @@ class CheckDuplicateIds(Rule):
             result = False
             nixcheckresult = self.nixcheck()
             oscheckresult = True
+            accounts = getaccountdb(self.logger)
 # Check for duplicate users
-            cmd = ["/usr/bin/dscl", ".", "list", "/users", "uid"]
-            self.commandhelper.executeCommand(cmd)
-            output = self.commandhelper.getOutput()
-            userlist = []
-            uidlist = []
-            for line in output:
-                linelist = line.split()
-                user = linelist[0]
-                uid = linelist[1]
-                if user not in userlist:
-                    userlist.append(user)
-                else:
-                    issue = "Duplicate User: '" + user + "' (UID = '" + uid + "')"
-                    self.issuelist.append(issue)
-                    oscheckresult = False
-                if uid not in uidlist:
-                    uidlist.append(uid)
-                else:
-                    issue = "Duplicate UID: '" + uid + "' (User = '" + user + "')"
-                    self.issuelist.append(issue)
-                    oscheckresult = False
+            users = accounts.getusers()
+            for user in users.getrepeats('name'):
+                issue = "Duplicate User: '" + user.name + "' (UID = '" + \
+                    user.uid + "')"
+                self.issuelist.append(issue)
+                oscheckresult = False
+            for user in users.getrepeats('uid'):
+                issue = "Duplicate UID: '" + user.uid + "' (User = '" + \
+                    user.name + "')"
+                self.issuelist.append(issue)
+                oscheckresult = False
 # Check for duplicate groups
-            cmd = ["/usr/bin/dscl", "." , "list", "/groups", "gid"]
-            self.commandhelper.executeCommand(cmd)
-            output = self.commandhelper.getOutput()
-            grouplist = []
-            gidlist = []
-            for line in output:
-                linelist = line.split()
-                group = linelist[0]
-                gid = linelist[1]
-                if group not in grouplist:
-                    grouplist.append(group)
-                else:
-                    issue = "Duplicate Group: '" + group + "' (GID = '" + gid + "')"
-                    self.issuelist.append(issue)
-                    oscheckresult = False
-                if gid not in gidlist:
-                    gidlist.append(gid)
-                else:
-                    issue = "Duplicate GID: '" + gid + "' (Group = '" + group + "')"
-                    self.issuelist.append(issue)
-                    oscheckresult = False
+            groups = accounts.getgroups()
+            for group in groups.getrepeats('name'):
+                issue = "Duplicate Group: '" + group.name + "' (GID = '" + \
+                    group.gid + "')"
+                self.issuelist.append(issue)
+                oscheckresult = False
+            for group in groups.getrepeats('gid'):
+                issue = "Duplicate GID: '" + group.gid + "' (Group = '" + \
+                    group.name + "')"
+                self.issuelist.append(issue)
+                oscheckresult = False
 
             if (nixcheckresult & oscheckresult):
                 result = True
@@ -185,47 +171,36 @@ class CheckDuplicateIds(Rule):
         """
         try:
             retval = True
-            filelist = ['/etc/passwd', '/etc/group']
-            for adb in filelist:
+            accounts = getaccountdb(self.logger)
+            filelist = [('/etc/passwd', 'passwd', 'uid'),
+                        ('/etc/group', 'group', 'gid')]
+            for adb, kind, idfield in filelist:
                 if os.path.exists(adb):
                     self.logger.log(LogPriority.DEBUG,
                                     ['CheckDuplicateIds.nixcheck',
                                      "Checking : " + adb])
-                    namelist = []
-                    idlist = []
-                    fdata = open(adb, 'r')
-                    for line in fdata:
-                        line = line.split(':')
-                        try:
-                            if len(line) > 2:
-                                self.logger.log(LogPriority.DEBUG,
-                                                ['CheckDuplicateIds.nixcheck',
-                                                 "Checking line: " + str(line)])
-                                name = line[0]
-                                uid = line[2]
-                                self.logger.log(LogPriority.DEBUG,
-                                                "Checking account: " + name + ' ' + uid)
-                                if name not in namelist:
-                                    namelist.append(name)
-                                else:
-                                    issue = "Duplicate Name: NAME('" + name + "'; UID('" + uid + "')"
-                                    self.issuelist.append(issue)
-                                    retval = False
-                                if uid not in idlist:
-                                    idlist.append(uid)
-                                else:
-                                    issue = "Duplicate UID: NAME('" + name + "'; UID('" + uid + "')"
-                                    self.issuelist.append(issue)
-                        except(IndexError):
-                            # Some systems have malformed lines in the
-                            # accounts db due to poor administration
-                            # practices. Go to the next record.
-                            continue
+                    table = accounts.gettable(adb, kind)
+                    # Some systems have malformed lines in the accounts db
+                    # due to poor administration practices. Lines without
+                    # an id are skipped.
+                    names = [entry for entry in table.getrepeats('name')
+                             if len(entry) > 2]
+                    ids = [entry for entry in table.getrepeats(idfield)
+                           if len(entry) > 2]
+                    for entry in names:
+                        issue = "Duplicate Name: NAME('" + entry[0] + \
+                            "'; UID('" + entry[2] + "')"
+                        self.issuelist.append(issue)
+                        retval = False
+                    for entry in ids:
+                        issue = "Duplicate UID: NAME('" + entry[0] + \
+                            "'; UID('" + entry[2] + "')"
+                        self.issuelist.append(issue)
                     self.logger.log(LogPriority.DEBUG,
-                                    "NAMELIST: " + str(namelist))
-                    self.logger.log(LogPriority.DEBUG,
-                                    "IDLIST: " + str(idlist))
-                    fdata.close()
+                                    ['CheckDuplicateIds.nixcheck',
+                                     "Checked %d entries, %d duplicate " %
+                                     (len(table), len(names)) +
+                                     "names, %d duplicate ids" % len(ids)])
             return retval
 
         except (KeyboardInterrupt, SystemExit):
@@ -67,6 +67,7 @@ class CheckRootPath(Rule):
 for user/world-writable entries, and if any are found then remove them from the 
 root $PATH.'''
         self.rootrequired = True
+        self.parallelsafe = True
         self.guidance = ['NSA RHEL 2.3.4.1, 2.3.4.1.1, 2.3.4.1.2']
         self.applicable = {'type': 'white',
                            'family': ['linux', 'solaris', 'freebsd'],
@@ -38,17 +38,34 @@ checked in fix method.
 @change: 2014/10/17 ekkehard OS X Yosemite 10.10 Update
 @change: 2015/04/14 dkennel updated for new isApplicable
 @change: 2015/04/30 Breen corrected mac implementation and separated mac and linux functionality
+@change: 2016/10/18 dkennel find the user's home directory through the shared
+    AccountDB
+@change: 2016/10/18 dkennel list and stat the dot files through the shared
+    home directory audit
 '''
 
 from __future__ import absolute_import
 import os
 import re
+import stat
 import traceback
-import pwd
 from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..stonixutilityfunctions import isWritable
 from ..CommandHelper import CommandHelper
+from ..accountdb import getaccountdb
+from ..homeaudit import HomeCheck, gethomeaudit
+
+
+def isdotfile(name):
+    '''
+    Return True for the names of dot files.
+
+    @param name: string - name of an entry in a home directory
+    @return: bool
+    @author: dkennel
+    '''
+    return name.startswith('.')
 
 
 class ConfigureDotFiles(Rule):
@@ -91,6 +108,11 @@ permission.'''
         self.applicable = {'type': 'white',
                            'family': ['linux', 'solaris', 'freebsd'],
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10']}}
+        self.dotstats = {}
+        self.homeaudit = gethomeaudit(self.logger)
+        self.homeaudit.register(HomeCheck(self.rulename,
+                                          homes=[self.environ.geteuidhome()],
+                                          match=isdotfile))
 
     def report(self):
         '''
@@ -118,8 +140,12 @@ permission.'''
                 dotfilelist = self.buildlinuxdotfilelist()
 
             for item in dotfilelist:
-                # is item world writable?
-                if isWritable(self.logger, item, 'other'):
+                # is item world writable? links are judged by their target
+                dotstat = self.dotstats.get(item)
+                if dotstat is None or stat.S_ISLNK(dotstat.st_mode):
+                    if isWritable(self.logger, item, 'other'):
+                        self.compliant = False
+                elif dotstat.st_mode & stat.S_IWOTH:
                     self.compliant = False
 
         except (KeyboardInterrupt, SystemExit):
@@ -146,24 +172,15 @@ permission.'''
 
         try:
 
-            f = open('/etc/passwd', 'r')
-            contentlines = f.readlines()
-            f.close()
-
-            for line in contentlines:
+            for user in getaccountdb(self.logger).getpasswd():
 
-                line = line.split(':')
+                if user.home and self.environ.geteuidhome() == user.home:
 
-                if line[5] and self.environ.geteuidhome() == str(line[5]):
+                    uid = user.getid('uid')
+                    if uid is not None and uid >= 500 and \
+                            not re.search('nfsnobody', user.name):
 
-                    line[2] = int(line[2])
-                    if line[2] >= 500 and not re.search('nfsnobody', line[0]):
-
-                        if os.path.exists(line[5]):
-                            filelist = os.listdir(line[5])
-                            for i in range(len(filelist)):
-                                if re.search('^\.', filelist[i]):
-                                    dotfilelist.append(line[5] + '/' + filelist[i])
+                        dotfilelist.extend(self.getdotfiles(user.home))
 
         except Exception:
             raise
@@ -183,36 +200,49 @@ permission.'''
 
         try:
 
-            cmd = ["/usr/bin/dscl", ".", "-list", "/Users"]
-            self.cmdhelper.executeCommand(cmd)
-            output = self.cmdhelper.getOutput()
-            error = self.cmdhelper.getError()
-            if error:
+            for user in getaccountdb(self.logger).getusers():
+                if not re.search('^_', user.name) and not re.search('^root', user.name):
+                    users.append(user)
+
+            if not users:
                 self.detailedresults += '\ncould not get a list of user home directories. returning empty list...'
                 return dotfilelist
 
-            if output:
-                for user in output:
-                    if not re.search('^_', user) and not re.search('^root', user):
-                        users.append(user.strip())
-
-            if users:
-                for user in users:
-                    currpwd = pwd.getpwnam(user)
-                    homedirs.append(currpwd[5])
+            for user in users:
+                homedirs.append(user.home)
 
             if homedirs:
                 for homedir in homedirs:
                     if self.environ.geteuidhome() == homedir:
-                        filelist = os.listdir(homedir)
-                        for i in range(len(filelist)):
-                            if re.search('^\.', filelist[i]):
-                                dotfilelist.append(homedir + '/' + filelist[i])
+                        dotfilelist.extend(self.getdotfiles(homedir))
 
         except Exception:
             raise
         return dotfilelist
 
+    def getdotfiles(self, homedir):
+        '''
+        Return the dot files of a home directory as found by the shared home
+        directory audit and remember their lstat results.
+
+        @param homedir: string - home directory of the current user
+        @return: list of strings - full paths
+        @author: dkennel
+        '''
+        dotfilelist = []
+        for result in self.homeaudit.getresults(self.rulename):
+            if result.home.path != homedir:
+                continue
+            if result.error is not None:
+                self.logger.log(LogPriority.DEBUG,
+                                'Could not list ' + homedir + ': ' +
+                                result.error)
+            for name in sorted(result.entries):
+                dotfile = homedir + '/' + name
+                dotfilelist.append(dotfile)
+                self.dotstats[dotfile] = result.entries[name]
+        return dotfilelist
+
     def fix(self):
         '''
         remove any world writable flags from any dot files in user's home
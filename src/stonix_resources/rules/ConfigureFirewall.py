@@ -32,7 +32,7 @@ dictionary
 from __future__ import absolute_import
 from ..ruleKVEditor import RuleKVEditor
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 
 
 class ConfigureFirewall(RuleKVEditor):
@@ -57,7 +57,7 @@ class ConfigureFirewall(RuleKVEditor):
         self.applicable = {'type': 'white',
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10']}}
         self.ch = CommandHelper(self.logdispatch)
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
         self.addKVEditor("FirewallOn",
                          "defaults",
                          "/Library/Preferences/com.apple.alf",
@@ -38,7 +38,7 @@ from ..configurationitem import ConfigurationItem
 from ..logdispatcher import LogPriority
 from ..filehelper import FileHelper
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..localize import KERB5
 
 
@@ -129,7 +129,7 @@ class ConfigureKerberos(RuleKVEditor):
                            "eventid": str(self.rulenumber).zfill(4) + \
                            "kerb5"}}
         self.ch = CommandHelper(self.logdispatch)
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
         self.fh = FileHelper(self.logdispatch, self.statechglogger)
         self.filepathToConfigure = []
         for filelabel, fileinfo in sorted(self.files.items()):
@@ -39,7 +39,7 @@ from ..stonixutilityfunctions import readFile, writeFile, checkPerms, setPerms
 from ..rule import Rule
 from ..pkghelper import Pkghelper
 from ..logdispatcher import LogPriority
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..CommandHelper import CommandHelper
 from ..localize import LOGSVR, LOGROTATE
 from subprocess import PIPE, Popen
@@ -91,7 +91,7 @@ class ConfigureLogging(Rule):
         self.logd = ""
         self.iditerator = 0
         self.daemon = ""
-        self.sh = ServiceHelper(self.environ, self.logger)
+        self.sh = getservicehelper(self.environ, self.logger)
         self.ch = CommandHelper(self.logger)
         self.logs = {"rsyslog": False,
                      "syslog": False}
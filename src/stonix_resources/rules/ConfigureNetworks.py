@@ -35,7 +35,7 @@ import traceback
 import re
 from ..ruleKVEditor import RuleKVEditor
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..logdispatcher import LogPriority
 
 
@@ -74,7 +74,7 @@ class ConfigureNetworks(RuleKVEditor):
         self.nsInitialized = False
         self.nsc = "/usr/sbin/networksetup"
         self.ch = CommandHelper(self.logdispatch)
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
         self.addKVEditor("DisableBluetoothUserInterface",
                          "defaults",
                          "/Library/Preferences/com.apple.Bluetooth",
@@ -31,6 +31,8 @@ Created on Jul 11, 2013
 @change: 2014-07-29 ekkehard refix OS X Mavericks issues
 @change: 2014/10/17 ekkehard OS X Yosemite 10.10 Update
 @change: 2015/04/14 dkennel update for new isApplicable
+@change: 2016/10/18 dkennel look for the users' kde files through the shared
+    home directory audit when running as root
 '''
 from __future__ import absolute_import
 from ..stonixutilityfunctions import iterate, checkPerms, setPerms
@@ -41,11 +43,17 @@ from ..pkghelper import Pkghelper
 from subprocess import PIPE, Popen
 from ..KVEditorStonix import KVEditorStonix
 from ..CommandHelper import CommandHelper
+from ..homeaudit import HomeCheck, gethomeaudit
 import os
+import stat
 import traceback
 import re
 from pwd import getpwnam
 
+KDEPATHS = ['.kde', '.kde/share', '.kde/share/config',
+            '.kde/share/config/kdesktoprc',
+            '.kde/share/config/kscreensaverrc']
+
 
 class ConfigureScreenLocking(RuleKVEditor):
 
@@ -166,6 +174,10 @@ class ConfigureScreenLocking(RuleKVEditor):
                                              "Timeout": "840"}}
             self.gnomeInst = True
             self.iditerator = 0
+            self.homeaudit = gethomeaudit(self.logger)
+            if self.environ.geteuid() == 0:
+                self.homeaudit.register(HomeCheck(self.rulename,
+                                                  paths=KDEPATHS))
 
     def report(self):
         '''
@@ -275,6 +287,8 @@ desired value after being run which is " + getcmds[cmd] + "\n"
                 self.logger.log(LogPriority.INFO, debug)
                 self.rulesuccess = False
                 return False
+            results = dict([(result.home.path, result) for result in
+                            self.homeaudit.getresults(self.rulename)])
             for line in contents:
                 compliant = True
                 temp = line.split(":")
@@ -284,32 +298,38 @@ desired value after being run which is " + getcmds[cmd] + "\n"
                             homebase = temp[5]
                             if not re.search("^/home/", homebase):
                                 continue
-                            homebase += '/.kde'
-                            if not os.path.exists(homebase):
+                            result = results.get(homebase)
+                            if result is not None and \
+                               result.error == "timeout":
+                                debug += "Skipped home directory which " + \
+                                    "did not answer: " + homebase + "\n"
+                                continue
+                            if not self.kdeExists(result, homebase,
+                                                  KDEPATHS[0]):
+                                compliant = False
+                            elif not self.kdeExists(result, homebase,
+                                                    KDEPATHS[1]):
+                                compliant = False
+                            elif not self.kdeExists(result, homebase,
+                                                    KDEPATHS[2]):
                                 compliant = False
                             else:
-                                homebase += '/share'
-                                if not os.path.exists(homebase):
-                                    compliant = False
-                                else:
-                                    homebase += '/config'
-                                    if not os.path.exists(homebase):
+                                if not self.kdeExists(result, homebase,
+                                                      KDEPATHS[3]):
+                                    kfile = os.path.join(homebase,
+                                                         KDEPATHS[4])
+                                    if not self.kdeExists(result, homebase,
+                                                          KDEPATHS[4]):
                                         compliant = False
                                     else:
-                                        kfile = homebase + '/kdesktoprc'
-                                        if not os.path.exists(kfile):
-                                            kfile = homebase + '/kscreensaverrc'
-                                            if not os.path.exists(kfile):
-                                                compliant = False
-                                            else:
-                                                uid = getpwnam(temp[0])[2]
-                                                gid = getpwnam(temp[0])[3]
-                                                if not checkPerms(kfile, 
-                                                        [uid, gid, 384], 
-                                                                  self.logger):
-                                                    compliant = False
-                                                if not self.searchFile(kfile):
-                                                    compliant = False
+                                        uid = getpwnam(temp[0])[2]
+                                        gid = getpwnam(temp[0])[3]
+                                        if not checkPerms(kfile,
+                                                          [uid, gid, 384],
+                                                          self.logger):
+                                            compliant = False
+                                        if not self.searchFile(kfile):
+                                            compliant = False
                             if not compliant:
                                 finalcompliant = False
                                 self.kdefix.append(temp[0])
@@ -326,6 +346,8 @@ directory, invalid form of /etc/passwd"
                     break
                 except Exception:
                     break
+            if debug:
+                self.logger.log(LogPriority.DEBUG, debug)
             if self.kdefix:
                 self.detailedresults += "The following users don't " + \
                 "have kde configured:\n"
@@ -405,6 +427,26 @@ directory, invalid form of /etc/passwd"
                     break
         return finalcompliant
 
+    def kdeExists(self, result, homebase, relpath):
+        '''
+        Return True if relpath exists below homebase, answered from the
+        shared home directory audit. Links are followed as os.path.exists
+        does.
+
+        @param result: HomeResult of homebase or None
+        @param homebase: string - home directory
+        @param relpath: string - one of KDEPATHS
+        @return: bool
+        @author: dkennel
+        '''
+        if result is not None and relpath in result.paths:
+            kstat = result.paths[relpath]
+            if kstat is None:
+                return False
+            if not stat.S_ISLNK(kstat.st_mode):
+                return True
+        return os.path.exists(os.path.join(homebase, relpath))
+
 ###############################################################################
 
     def fix(self):
@@ -42,7 +42,7 @@ import os
 import traceback
 from ..rule import Rule
 from ..logdispatcher import LogPriority
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..pkghelper import Pkghelper
 from ..KVEditorStonix import KVEditorStonix
 from ..stonixutilityfunctions import iterate, setPerms, checkPerms, resetsecon
@@ -80,7 +80,7 @@ class DisableBluetooth(Rule):
         self.ci = self.initCi(datatype, key, instructions, default)
         self.applicable = {'type': 'white',
                            'family': ['linux', 'freebsd']}
-        self.servicehelper = ServiceHelper(self.environ, self.logger)
+        self.servicehelper = getservicehelper(self.environ, self.logger)
         self.guidance = ["NSA(3.3.14)", "CCE 14948-4", "CCE 4377-8",
                          "CCE 4355-4"]
         self.driverdict = { "blacklist":["bluetooth", "btusb", "bcm203x", 
@@ -33,7 +33,7 @@ dictionary
 from __future__ import absolute_import
 from ..ruleKVEditor import RuleKVEditor
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..pkghelper import Pkghelper
 from ..stonixutilityfunctions import iterate
 from ..logdispatcher import LogPriority
@@ -73,7 +73,7 @@ dictionary
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10'],
                                   'Ubuntu': ['12.04', '+']}}
         self.ch = CommandHelper(self.logdispatch)
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
 
         # init CIs
         datatype = 'bool'
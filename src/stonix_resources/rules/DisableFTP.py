@@ -28,7 +28,7 @@ Created on Mar 4, 2015
 '''
 from __future__ import absolute_import
 from ..ruleKVEditor import RuleKVEditor
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from stonix_resources.logdispatcher import LogPriority
 
 
@@ -62,7 +62,7 @@ class DisableFTP(RuleKVEditor):
                          "present",
                          "",
                          "Disable FTP service")
-        self.sh = ServiceHelper(self.environ, self.logger)
+        self.sh = getservicehelper(self.environ, self.logger)
         self.setkvdefaultscurrenthost()  # default value is False
 
     def afterfix(self):
@@ -38,7 +38,7 @@ from ..logdispatcher import LogPriority
 from ..KVEditorStonix import KVEditorStonix
 from ..pkghelper import Pkghelper
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 import traceback
 import os
 import re
@@ -72,7 +72,7 @@ class DisableIPV6(Rule):
         self.created = False
         self.created2 = False
         self.editor1, self.editor2, self.editor3 = "", "", ""
-        self.sh = ServiceHelper(self.environ, self.logger)
+        self.sh = getservicehelper(self.environ, self.logger)
 
     def report(self):
         try:
@@ -42,7 +42,7 @@ from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..stonixutilityfunctions import iterate
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 
 
 class DisableRemoteAppleEvents(Rule):
@@ -104,7 +104,7 @@ class DisableRemoteAppleEvents(Rule):
 
         self.detailedresults = ''
         self.cmhelper = CommandHelper(self.logger)
-        self.svchelper = ServiceHelper(self.environ, self.logger)
+        self.svchelper = getservicehelper(self.environ, self.logger)
         self.compliant = False
         secure = True
         disabled = False
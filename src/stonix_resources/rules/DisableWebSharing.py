@@ -37,7 +37,7 @@ import traceback
 import os
 
 from ..rule import Rule
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..stonixutilityfunctions import iterate
 from ..logdispatcher import LogPriority
 from ..CommandHelper import CommandHelper
@@ -94,7 +94,7 @@ well-managed web server is recommended.
         self.compliant = False
 
         # init servicehelper object
-        self.svchelper = ServiceHelper(self.environ, self.logger)
+        self.svchelper = getservicehelper(self.environ, self.logger)
         self.cmhelper = CommandHelper(self.logger)
 
         if not os.path.exists(self.maclongname):
@@ -33,6 +33,12 @@ directories.
 systems. Added code to remove world write from files in the root users path.
 @change: 2015/04/13 dkennel changed to use new isApplicable method in template
 rule class
+@change: 2016/10/18 dkennel file system walk moved to fsscanner
+@change: 2016/10/18 dkennel incremental scans between full scans, reports
+compare sets instead of re-reading the databases
+@change: 2016/10/18 dkennel batched and cached rpm verification
+@change: 2016/10/18 dkennel rpm output parsing split out for the unit tests
+@change: 2016/10/18 dkennel report may run in parallel with other reports
 
 '''
 from __future__ import absolute_import
@@ -40,16 +46,65 @@ import os
 import traceback
 import subprocess
 import random
+import json
+import time
 import shutil
 import stat
 import re
-import pwd
-import grp
 
 from ..rule import Rule
 from ..stonixutilityfunctions import *
 from ..logdispatcher import LogPriority
 from ..localize import SITELOCALWWWDIRS
+from ..fsscanner import FilesystemScanner
+
+RPM = '/bin/rpm'
+# FILENAMES is an array, NAME etc. repeat for every element so each line
+# carries both the file and its package.
+RPMQUERYFORMAT = '[%{FILENAMES}\t%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}\n]'
+# e.g. ".M.......  c /etc/file" or "missing     /usr/bin/file"
+RPMVERIFYLINE = re.compile(r'^(\S+)\s+(?:[cdglr]\s+)?(/.*)$')
+
+
+def parserpmowners(output, wanted, owners=None):
+    '''
+    Add the paths of the output of rpm -qf --qf RPMQUERYFORMAT to a mapping
+    of path to the packages owning it.
+
+    @param output: string - rpm output
+    @param wanted: set of the paths asked for, other paths are ignored
+    @param owners: dict to add to, a new one if None
+    @return: dict of path -> set of package names
+    @author: dkennel
+    '''
+    if owners is None:
+        owners = {}
+    for line in output.splitlines():
+        try:
+            path, package = line.split('\t')
+        except ValueError:
+            # "file X is not owned by any package"
+            continue
+        if path in wanted:
+            owners.setdefault(path, set()).add(package)
+    return owners
+
+
+def parserpmverify(output):
+    '''
+    Return the files whose mode differs from the rpm database in the output
+    of rpm -V.
+
+    @param output: string - rpm output
+    @return: set of paths
+    @author: dkennel
+    '''
+    changed = set()
+    for line in output.splitlines():
+        match = RPMVERIFYLINE.match(line)
+        if match and 'M' in match.group(1):
+            changed.add(match.group(2))
+    return changed
 
 
 class FilePermissions(Rule):
@@ -105,9 +160,16 @@ for this system. Please note that this rule may take several minutes to run.'''
         self.wwdir = os.path.join(self.infodir, 'worldwritable')
         self.suiddir = os.path.join(self.infodir, 'suidfiles')
         self.noownerdir = os.path.join(self.infodir, 'no-owners')
-        for dbdir in [self.wwdir, self.suiddir, self.noownerdir]:
+        self.indexdir = os.path.join(self.infodir, 'fsindex')
+        self.fullscanstamp = os.path.join(self.indexdir, 'last-full-scan')
+        for dbdir in [self.wwdir, self.suiddir, self.noownerdir,
+                      self.indexdir]:
             if not os.path.exists(dbdir) and self.environ.geteuid() == 0:
                 os.makedirs(dbdir, 448)
+        # The report only reads the file systems and writes its databases
+        self.parallelreport = True
+        self.touchedresources = [self.wwdir, self.suiddir, self.noownerdir,
+                                 self.indexdir]
         self.wwdbfile = os.path.join(self.wwdir, 'wwfiles.db')
         self.wworigin = os.path.join(self.wwdir, 'wwfiles-at-install.db')
         self.wwlast = os.path.join(self.wwdir, 'wwfiles-previous.db')
@@ -118,6 +180,11 @@ for this system. Please note that this rule may take several minutes to run.'''
         self.noorigin = os.path.join(self.noownerdir,
                                      'no-owners-at-install.db')
         self.nolast = os.path.join(self.noownerdir, 'no-owners-previous.db')
+        self.rpmcachefile = os.path.join(self.suiddir, 'rpmverify.cache')
+        self.rpmcache = None
+        self.rpmcachedirty = False
+        self.rpmcacheage = 86400
+        self.rpmchunk = 500
         datatype = 'bool'
         key = 'setsticky'
         instructions = '''If set to yes or true the WorldWritables rule will attempt to
@@ -143,12 +210,24 @@ users path are very dangerous.'''
         ww_default = True
         self.fixww = self.initCi(ww_datatype, ww_key, ww_instructions,
                                  ww_default)
+        fs_datatype = 'int'
+        fs_key = 'fullscaninterval'
+        fs_instructions = '''Between full scans the FilePermissions rule only
+lists directories that changed since the previous scan. Files that were not
+found before and whose mode or owner changed without their directory changing
+are only detected by a full scan. FULLSCANINTERVAL is the number of days
+between full scans. Set it to 0 to always perform a full scan. Removing
+/var/local/info/fsindex/last-full-scan forces a full scan on the next run.'''
+        fs_default = 7
+        self.fullscaninterval = self.initCi(fs_datatype, fs_key,
+                                            fs_instructions, fs_default)
         self.hasrunalready = False
         self.wwresults = ''
         self.suidresults = ''
         self.unownedresults = ''
         self.firstrun = False
         self.findoverrun = False
+        self.scanresults = None
         random.seed()
 
     def processconfig(self):
@@ -187,32 +266,92 @@ users path are very dangerous.'''
                              self.detailedresults])
         return fslist
 
+    def needfullscan(self):
+        '''
+        Private method to decide whether this run must walk every directory
+        rather than only those that changed since the last scan.
+
+        @return: bool
+        @author: dkennel
+        '''
+        interval = self.fullscaninterval.getcurrvalue()
+        if self.firstrun or interval <= 0:
+            return True
+        try:
+            lastfull = os.stat(self.fullscanstamp).st_mtime
+        except OSError:
+            return True
+        return time.time() - lastfull >= interval * 86400
+
+    def readdb(self, dbfile):
+        '''
+        Private method returning the set of paths held in one of the
+        newline separated databases. A missing database is empty.
+
+        @param dbfile: string - path to the database
+        @return: set
+        @author: dkennel
+        '''
+        return set(self.readdblist(dbfile))
+
+    def readdblist(self, dbfile):
+        '''
+        Private method returning the paths held in one of the newline
+        separated databases, in order. A missing database is empty.
+
+        @param dbfile: string - path to the database
+        @return: list
+        @author: dkennel
+        '''
+        try:
+            rhandle = open(dbfile, 'r')
+        except IOError:
+            return []
+        try:
+            return [line.strip() for line in rhandle if line.strip()]
+        finally:
+            rhandle.close()
+
+    def getcurrent(self, category, dbfile):
+        '''
+        Private method returning the paths found by this run's scan, falling
+        back to the database if the scan results are not in memory.
+
+        @param category: string - ww, suid or unowned
+        @param dbfile: string - database holding the category
+        @return: list
+        @author: dkennel
+        '''
+        if self.scanresults is not None:
+            return self.scanresults[category]
+        return self.readdblist(dbfile)
+
     def multifind(self):
         '''
-        Private method that runs the find command on the file system to create
-        lists of world writable, suid/sgid, and unowned files. The invocation
-        of the find shell command is a bit complex to do all of this in one
-        shot.
+        Private method that walks the local file systems to create lists of
+        world writable, suid/sgid, and unowned files. Each file system is
+        walked by its own worker process (see FilesystemScanner) and the hits
+        are written to the databases as they arrive. Unless a full scan is due
+        only directories that changed since the last scan are listed.
 
         @author: dkennel
+        @change: 2016/10/18 dkennel replaced os.walk with the parallel
+            FilesystemScanner
         '''
 
         try:
             dbsets = {'ww':
                       {'last': self.wwlast,
                        'db': self.wwdbfile,
-                       'orig': self.wworigin,
-                       'results': []},
+                       'orig': self.wworigin},
                       'suid':
                       {'last': self.suidlast,
                        'db': self.suiddbfile,
-                       'orig': self.suidorigin,
-                       'results': []},
+                       'orig': self.suidorigin},
                       'unowned':
                       {'last': self.nolast,
                        'db': self.nodbfile,
-                       'orig': self.noorigin,
-                       'results': []}
+                       'orig': self.noorigin}
                       }
             for set in dbsets:
                 if os.path.exists(dbsets[set]['last']):
@@ -225,134 +364,46 @@ users path are very dangerous.'''
                 if os.path.exists(dbsets[set]['db']):
                     os.rename(dbsets[set]['db'], dbsets[set]['last'])
 
-            fslist = self.getfilesystems()
-            for filesystem in fslist:
+            filesystems = []
+            for filesystem in self.getfilesystems():
                 if filesystem in self.bypassfs.getcurrvalue():
                     self.logger.log(LogPriority.DEBUG,
                                     ['FilePermissions.multifind',
                                      'Skipping Filesystem: ' + str(filesystem)])
                     continue
-                self.logger.log(LogPriority.DEBUG,
-                                ['FilePermissions.multifind',
-                                 'Walking Filesystem: ' + str(filesystem)])
-                if self.findoverrun:
-                        break
-                for root, dirs, files in os.walk(filesystem):
-                    # check the number of hits we have if we've got 30,000
-                    # hits then this FS is so bad we don't want to continue
-                    try:
-                        if len(dbsets['ww']['results']) > 25000:
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                            'WW overflow!'])
-                            self.findoverrun = True
-                    except TypeError:
-                        pass
-                    try:
-                        if len(dbsets['suid']['results']) > 25000:
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                            'SUID overflow!'])
-                            self.findoverrun = True
-                    except TypeError:
-                        pass
-                    try:
-                        if len(dbsets['unowned']['results']) > 25000:
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                            'Unowned overflow!'])
-                            self.findoverrun = True
-                    except TypeError:
-                        pass
-
-                    if self.findoverrun:
-                        break
-
-                    # This wacky looking snippet filters out directories that
-                    # are actually file system mount points
-                    dirs[:] = [dirname for dirname in dirs if not
-                               os.path.ismount(os.path.join(root, dirname))]
-                    for dirname in dirs:
-                        path = os.path.join(root, dirname)
-                        try:
-                            mode = os.stat(path)
-                        except OSError:
-                            continue
-                        worldwrite = mode.st_mode & stat.S_IWOTH
-                        # sticky = mode.st_mode & stat.S_ISVTX
-                        if worldwrite:
-                            dbsets['ww']['results'].append(path)
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                             'Found WW Dir: ' + str(path)])
-                    for name in files:
-                        try:
-                            if len(dbsets['ww']['results']) > 25000:
-                                self.logger.log(LogPriority.DEBUG,
-                                                ['FilePermissions.multifind',
-                                                'WW overflow!'])
-                                self.findoverrun = True
-                        except TypeError:
-                            pass
-                        try:
-                            if len(dbsets['suid']['results']) > 25000:
-                                self.logger.log(LogPriority.DEBUG,
-                                                ['FilePermissions.multifind',
-                                                'SUID overflow!'])
-                                self.findoverrun = True
-                        except TypeError:
-                            pass
-                        try:
-                            if len(dbsets['unowned']['results']) > 25000:
-                                self.logger.log(LogPriority.DEBUG,
-                                                ['FilePermissions.multifind',
-                                                'Unowned overflow!'])
-                                self.findoverrun = True
-                        except TypeError:
-                            pass
-
-                        if self.findoverrun:
-                            break
-
-                        fpath = os.path.join(root, name)
-                        if os.path.islink(fpath):
-                            continue
-                        try:
-                            fmode = os.stat(fpath)
-                        except OSError:
-                            continue
-                        worldwrite = fmode.st_mode & stat.S_IWOTH
-                        if worldwrite:
-                            dbsets['ww']['results'].append(fpath)
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                             'Found WW File: ' + str(fpath)])
-                        suid = fmode.st_mode & stat.S_ISUID
-                        sgid = fmode.st_mode & stat.S_ISGID
-                        if suid or sgid:
-                            dbsets['suid']['results'].append(fpath)
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                             'Found SUID File: ' + str(fpath)])
-                        try:
-                            uname = pwd.getpwuid(fmode.st_uid)[0]
-                        except KeyError:
-                            dbsets['unowned']['results'].append(fpath)
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                             'Found unowned File: ' + str(fpath)])
-                        try:
-                            gname = grp.getgrgid(fmode.st_gid)[0]
-                        except KeyError:
-                            dbsets['unowned']['results'].append(fpath)
-                            self.logger.log(LogPriority.DEBUG,
-                                            ['FilePermissions.multifind',
-                                             'Found unowned File, bad group: ' + str(fpath)])
+                filesystems.append(filesystem)
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.multifind',
+                             'Walking Filesystems: ' + str(filesystems)])
+            full = self.needfullscan()
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.multifind',
+                             'Full scan: ' + str(full)])
+            self.scanresults = {}
+            for myset in dbsets:
+                dbsets[myset]['handle'] = open(dbsets[myset]['db'], 'w')
+                self.scanresults[myset] = []
+
+            def sink(category, path):
+                # Databases are newline separated without a trailing newline
+                if self.scanresults[category]:
+                    dbsets[category]['handle'].write('\n')
+                dbsets[category]['handle'].write(path)
+                self.scanresults[category].append(path)
+            try:
+                scanner = FilesystemScanner(self.logger)
+                if scanner.scan(filesystems, sink, self.indexdir, full):
+                    self.findoverrun = True
+                elif full:
+                    open(self.fullscanstamp, 'w').close()
+                    os.utime(self.fullscanstamp, None)
+            finally:
+                for myset in dbsets:
+                    dbsets[myset]['handle'].close()
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.multifind',
+                             'Hits: ' + str(scanner.getcounts())])
             for myset in dbsets:
-                data = '\n'.join(dbsets[myset]['results'])
-                whandle = open(dbsets[myset]['db'], 'w')
-                whandle.write(data)
-                whandle.close()
                 if not os.path.exists(dbsets[myset]['orig']):
                     shutil.copy(dbsets[myset]['db'], dbsets[myset]['orig'])
 
@@ -394,30 +445,21 @@ users path are very dangerous.'''
                   '/private/var/tmp', '/Library/Caches']
         for pathelement in SITELOCALWWWDIRS:
             wwlist.append(pathelement)
-        try:
-            lastrun = open(self.wwdbfile, 'r').readlines()
-        except(IOError):
-            lastrun = []
+        lastrun = self.getcurrent('ww', self.wwdbfile)
         self.logger.log(LogPriority.DEBUG,
                         ['WorldWritables.report',
-                         'lastrun: ' + str(lastrun)])
-        prevrun = []
-        if os.path.exists(self.wwlast):
-            prevrun = open(self.wwlast, 'r').readlines()
-        firstrun = []
-        if os.path.exists(self.wworigin):
-            firstrun = open(self.wworigin, 'r').readlines()
+                         'lastrun: ' + str(len(lastrun)) + ' entries'])
+        prevrun = self.readdb(self.wwlast)
+        firstrun = self.readdb(self.wworigin)
+        wwlist = set(wwlist)
         newfilessincelast = []
         newfilessinceorigin = []
         notsticky = []
         notknown = []
-        # Important! lines coming from the files will have newlines unless
-        # they are stripped.
-        for wwfile in lastrun:
-            wwpath = wwfile.strip()
-            if wwfile not in prevrun:
+        for wwpath in lastrun:
+            if wwpath not in prevrun:
                 newfilessincelast.append(wwpath)
-            if wwfile not in firstrun:
+            if wwpath not in firstrun:
                 newfilessinceorigin.append(wwpath)
             try:
                 mode = os.stat(wwpath)[stat.ST_MODE]
@@ -750,31 +792,23 @@ find / -xdev -type f \( -perm -0002 -a ! -perm -1000 \) -print'''
                     '/usr/bin/ping6',
                     '/usr/bin/mount']
         compliant = False
-        try:
-            lastrun = open(self.suiddbfile, 'r').readlines()
-        except(IOError):
-            # Probably first run and the db doesn't exist yet.
-            lastrun = []
-        prevrun = []
-        if os.path.exists(self.suidlast):
-            prevrun = open(self.suidlast, 'r').readlines()
-        firstrun = []
-        if os.path.exists(self.suidorigin):
-            firstrun = open(self.suidorigin, 'r').readlines()
+        suidlist = set(suidlist)
+        lastrun = self.getcurrent('suid', self.suiddbfile)
+        prevrun = self.readdb(self.suidlast)
+        firstrun = self.readdb(self.suidorigin)
         newfilessincelast = []
         newfilessinceorigin = []
         notknown = []
         wrongmode = []
-        # Important! lines coming from the files will have newlines unless
-        # they are stripped.
-        for suidfile in lastrun:
-            suidpath = suidfile.strip()
-            if suidfile not in prevrun:
+        rpmchkvals = self.rpmcheckall(lastrun)
+        for suidpath in lastrun:
+            if suidpath not in prevrun:
                 newfilessincelast.append(suidpath)
-            if suidfile not in firstrun:
+            if suidpath not in firstrun:
                 newfilessinceorigin.append(suidpath)
-            rpmchkval = self.rpmcheck(suidfile)
-            if rpmchkval > 3:
+            rpmchkval = rpmchkvals[suidpath]
+            # Anything rpm does not vouch for: unowned, no rpm or no answer
+            if rpmchkval >= 3:
                 if suidpath not in suidlist:
                     notknown.append(suidpath)
             if rpmchkval == 0:
@@ -863,26 +897,16 @@ find / -xdev \( -perm -04000 -o -perm -02000 \) -print
         @author: dkennel
         '''
         compliant = False
-        try:
-            lastrun = open(self.nodbfile, 'r').readlines()
-        except(IOError):
-            lastrun = []
-        prevrun = []
-        if os.path.exists(self.nolast):
-            prevrun = open(self.nolast, 'r').readlines()
-        firstrun = []
-        if os.path.exists(self.noorigin):
-            firstrun = open(self.noorigin, 'r').readlines()
+        lastrun = self.getcurrent('unowned', self.nodbfile)
+        prevrun = self.readdb(self.nolast)
+        firstrun = self.readdb(self.noorigin)
         newfilessincelast = []
         newfilessinceorigin = []
-        # Important! lines coming from the files will have newlines unless
-        # they are stripped.
-        for suidfile in lastrun:
-            suidpath = suidfile.strip()
-            if suidfile not in prevrun:
-                newfilessincelast.append(suidpath)
-            if suidfile not in firstrun:
-                newfilessinceorigin.append(suidpath)
+        for nopath in lastrun:
+            if nopath not in prevrun:
+                newfilessincelast.append(nopath)
+            if nopath not in firstrun:
+                newfilessinceorigin.append(nopath)
         strnewfilessincelast = ''
         if len(newfilessincelast) > 15:
             strnewfilessincelast = str(len(newfilessincelast))
@@ -952,37 +976,172 @@ find / -xdev \( -nouser -o -nogroup \) -print
         @author: dkennel
         '''
         path = path.strip()
-        if not os.path.exists('/bin/rpm'):
-            return 4
-        cmd = '/bin/rpm -Vf ' + path
+        return self.rpmcheckall([path])[path]
+
+    def rpmcheckall(self, paths):
+        '''
+        Private method returning the rpmcheck result for every path in one
+        pass. The owning packages of all paths are resolved with one query
+        per self.rpmchunk paths and each owning package is verified only
+        once. Package verify results are cached, see loadrpmcache.
+
+        @param paths: list of paths
+        @return: dict of path -> int, see rpmcheck for the values
+        @author: dkennel
+        '''
+        results = {}
+        if not os.path.exists(RPM):
+            for path in paths:
+                results[path] = 4
+            return results
         try:
-            proc = subprocess.Popen(cmd, shell=True, close_fds=True,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE)
-            output = proc.stdout.readlines()
-            errout = proc.stderr.readlines()
-            self.logger.log(LogPriority.DEBUG,
-                            ['AuditSUID.rpmcheck',
-                             'rpm -Vf Results: ' + str(output) + str(errout)])
-            if len(output) == 0:
-                for line in errout:
-                    if re.search('No such file or directory', line):
-                        return 3
-                return 5
-            for line in output:
-                if re.search('M', line):
-                    return 0
-            return 1
+            owners = self.rpmowners(paths)
         except (KeyboardInterrupt, SystemExit):
             # User initiated exit
             raise
-
         except Exception:
-            self.detailedresults = traceback.format_exc()
-            self.logger.log(LogPriority.ERROR,
-                        ['AuditSUID.rpmcheck',
-                         self.detailedresults])
-            return 5
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.rpmcheckall',
+                             traceback.format_exc()])
+            for path in paths:
+                results[path] = 5
+            return results
+        self.loadrpmcache()
+        for path in paths:
+            if path not in owners:
+                results[path] = 3
+                continue
+            results[path] = 1
+            for package in owners[path]:
+                changed = self.rpmverify(package)
+                if changed is None:
+                    results[path] = 5
+                    break
+                if path in changed:
+                    results[path] = 0
+                    break
+        self.saverpmcache()
+        return results
+
+    def rpmowners(self, paths):
+        '''
+        Private method mapping each path to the packages that own it.
+        Paths that do not exist or are not owned are left out.
+
+        @param paths: list of paths
+        @return: dict of path -> set of package names
+        @author: dkennel
+        '''
+        wanted = set(paths)
+        owners = {}
+        for start in range(0, len(paths), self.rpmchunk):
+            cmd = [RPM, '-qf', '--qf', RPMQUERYFORMAT, '--'] + \
+                paths[start:start + self.rpmchunk]
+            output, _ = self.rpmquery(cmd)
+            parserpmowners(output, wanted, owners)
+        return owners
+
+    def rpmquery(self, cmd):
+        '''
+        Private method running an rpm command.
+
+        @param cmd: list - command and arguments
+        @return: tuple - (stdout, stderr)
+        @author: dkennel
+        '''
+        proc = subprocess.Popen(cmd, close_fds=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        return proc.communicate()
+
+    def rpmverify(self, package):
+        '''
+        Private method returning the set of files of the package whose mode
+        differs from the rpm database, as reported by rpm -V. Results are
+        cached per package.
+
+        @param package: string - package name
+        @return: set of paths or None if the package could not be verified
+        @author: dkennel
+        '''
+        if package in self.rpmcache['packages']:
+            return set(self.rpmcache['packages'][package])
+        try:
+            output, errout = self.rpmquery([RPM, '-V', '--nodeps', package])
+        except OSError:
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.rpmverify',
+                             traceback.format_exc()])
+            return None
+        if errout:
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.rpmverify',
+                             package + ': ' + errout])
+        changed = parserpmverify(output)
+        self.rpmcache['packages'][package] = sorted(changed)
+        self.rpmcachedirty = True
+        return changed
+
+    def getrpmdbstamp(self):
+        '''
+        Private method returning the modification time of the rpm database,
+        which changes whenever a package is installed, updated or removed.
+
+        @return: float or None
+        @author: dkennel
+        '''
+        for dbfile in ['/var/lib/rpm/Packages', '/var/lib/rpm']:
+            try:
+                return os.stat(dbfile).st_mtime
+            except OSError:
+                continue
+        return None
+
+    def loadrpmcache(self):
+        '''
+        Private method to load the package verify cache. The cache is
+        discarded when the rpm database has changed since it was written or
+        it is older than self.rpmcacheage seconds, so that a chmod of a
+        packaged file is noticed by the next day's run.
+
+        @author: dkennel
+        '''
+        stamp = self.getrpmdbstamp()
+        if self.rpmcache is not None and self.rpmcache['rpmdb'] == stamp:
+            return
+        self.rpmcache = {'rpmdb': stamp, 'created': time.time(),
+                         'packages': {}}
+        self.rpmcachedirty = False
+        try:
+            rhandle = open(self.rpmcachefile, 'r')
+            try:
+                cache = json.load(rhandle)
+            finally:
+                rhandle.close()
+            if cache['rpmdb'] == stamp and \
+               0 <= time.time() - cache['created'] < self.rpmcacheage:
+                self.rpmcache = cache
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+
+    def saverpmcache(self):
+        '''
+        Private method to write the package verify cache if it changed.
+
+        @author: dkennel
+        '''
+        if not self.rpmcachedirty or self.environ.geteuid() != 0:
+            return
+        try:
+            whandle = open(self.rpmcachefile, 'w')
+            try:
+                json.dump(self.rpmcache, whandle)
+            finally:
+                whandle.close()
+            self.rpmcachedirty = False
+        except IOError:
+            self.logger.log(LogPriority.DEBUG,
+                            ['FilePermissions.saverpmcache',
+                             traceback.format_exc()])
 
     def report(self):
         '''
@@ -39,7 +39,7 @@ from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..InstallingHelper import InstallingHelper
 from ..configurationitem import ConfigurationItem
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..stonixutilityfunctions import has_connection_to_server
 from ..CommandHelper import CommandHelper
 from ..filehelper import FileHelper
@@ -123,7 +123,7 @@ class InstallCasperSuite(Rule):
                                             fileinfo["group"]
                                             )
 # Set up service helper instance
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
         self.services = {"com.jamfsoftware.jamf.agent":
                          "/Library/LaunchAgents/com.jamfsoftware.jamf.agent.plist"
                          }
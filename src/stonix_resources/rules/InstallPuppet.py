@@ -52,7 +52,7 @@ from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..InstallingHelper import InstallingHelper
 from ..configurationitem import ConfigurationItem
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..stonixutilityfunctions import set_no_proxy, \
                                      has_connection_to_server
 from ..CommandHelper import CommandHelper
@@ -97,7 +97,7 @@ class InstallPuppet(Rule):
 # Set up CommandHelper instance
         self.ch = CommandHelper(self.logdispatch)
 # Set up service helper instance
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
         self.service = {"/Library/LaunchDaemons/gov.lanl.puppetd.plist":
                         "gov.lanl.puppetd"}
 # Set up FileHelper instance
@@ -165,7 +165,7 @@ class InstallPuppet(Rule):
 # puppet certname
         self.certname = self.getCertName()
 # Initialize the service helper
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
 
     def report(self):
         '''
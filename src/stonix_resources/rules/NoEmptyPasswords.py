@@ -27,6 +27,8 @@ Created on Oct 29, 2012
 @change: 04/18/2014 dkennel Replaced old-style CI invocation.
 @change: 2014/10/17 ekkehard OS X Yosemite 10.10 Update
 @change: 2015/04/16 dkennel updated for new isApplicable
+@change: 2016/10/18 dkennel look accounts up in the shared AccountDB instead
+    of scanning the shadow file once per user
 '''
 
 from __future__ import absolute_import
@@ -35,6 +37,7 @@ from ..stonixutilityfunctions import getUserGroupName
 from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..pkghelper import Pkghelper
+from ..accountdb import getaccountdb
 from subprocess import call
 import os
 import traceback
@@ -92,23 +95,24 @@ class NoEmptyPasswords(Rule):
                 self.shadow = "/etc/master.passwd"
                 self.passwd = "/etc/passwd"
             compliant = True
+            accounts = getaccountdb(self.logger)
             if not os.path.exists(self.passwd):
                 self.detailedresults += "This system doesn't contain an \
 /etc/passwd file\n"
                 compliant = False
             else:
-                contents = readFile(self.passwd, self.logger)
-                if not contents:
+                passwd = accounts.gettable(self.passwd, "passwd")
+                if not len(passwd):
                     self.detailedresults += "This system contains an \
 /etc/passwd file but it's blank\n"
                     compliant = False
                 else:
                     try:
-                        for line in contents:
-                            if re.search(":", line):
-                                line = line.split(":")
-                                if int(line[2]) >= 500:
-                                    self.users.append(line[0])
+                        for entry in passwd:
+                            if len(entry) > 1:
+                                if entry[2].isdigit() and \
+                                        int(entry[2]) >= 500:
+                                    self.users.append(entry[0])
                     except IndexError:
                         self.detailedresults += traceback.format_exc() + "\n"
                         self.detailedresults += "Index out of range\n"
@@ -120,30 +124,22 @@ class NoEmptyPasswords(Rule):
             if not self.users:
                 self.detailedresults += "There are no local accounts on this \
 system that need to be checked for empty passwords\n"
-            contents = readFile(self.shadow, self.logger)
-            if not contents:
+            if self.shadow == "/etc/shadow":
+                shadow = accounts.gettable(self.shadow, "shadow")
+            else:
+                shadow = accounts.gettable(self.shadow, "master.passwd")
+            if not len(shadow):
                 self.detailedresults += "Your system contains an \
 /etc/shadow file or /etc/master.passwd file but it's blank\n"
                 compliant = False
             else:
-                try:
-                    for user in self.users:
-                        for line in contents:
-                            if re.search(":", line):
-                                line = line.split(":")
-                                if line[0] == user:
-                                    # if line[1].isdigit():
-                                    #    compliant = False
-                                    # elif line[1].strip() == "":
-                                    if line[1].strip() == "":
-                                        if line[0] not in self.empty:
-                                            self.empty.append(line[0])
-                                            compliant = False
-                                            break
-                except IndexError:
-                    self.detailedresults += traceback.format_exc() + "\n"
-                    self.detailedresults += "Index out of range\n"
-                    compliant = False
+                for user in self.users:
+                    for entry in shadow.lookup("name", user):
+                        if len(entry) > 1 and entry[1].strip() == "":
+                            if entry[0] not in self.empty:
+                                self.empty.append(entry[0])
+                                compliant = False
+                                break
             if self.ph:
                 if self.ph.manager == "apt-get":
                     retval = getUserGroupName("/etc/shadow")
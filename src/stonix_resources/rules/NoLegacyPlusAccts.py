@@ -29,6 +29,7 @@ Created on Aug 21, 2012
 @change: 04/18/2014 dkennel Replaced old-style CI invocation
 @change: 2014/10/17 ekkehard OS X Yosemite 10.10 Update
 @change: 2015/04/16 dkennel updated for new isApplicable
+@change: 2016/10/18 dkennel report from the shared AccountDB tables
 '''
 from __future__ import absolute_import
 from ..rule import Rule
@@ -36,6 +37,7 @@ from ..logdispatcher import LogPriority
 from ..stonixutilityfunctions import iterate, readFile, writeFile, checkPerms
 from ..stonixutilityfunctions import setPerms, resetsecon, getUserGroupName
 from ..pkghelper import Pkghelper
+from ..accountdb import getaccountdb
 import os, re, pwd, grp, traceback #grp is a valid python package
 
 
@@ -98,15 +100,21 @@ class NoLegacyPlusAccts(Rule):
                             "/etc/passwd",
                             "/etc/group",
                             "/etc/grp"]
+            kinds = {"master.passwd": "master.passwd",
+                     "shadow": "shadow",
+                     "passwd": "passwd",
+                     "group": "group",
+                     "grp": "group"}
+            accounts = getaccountdb(self.logger)
             counter = 0
             for fileItem in filelist:
                 if os.path.exists(fileItem):
-                    contents = readFile(fileItem, self.logger)
-                    for line in contents:
-                        if re.search("^\+", line.strip()):
-                            self.badfiles.append(fileItem)
-                            counter += 1
-                            compliant = False
+                    kind = kinds[os.path.basename(fileItem)]
+                    table = accounts.gettable(fileItem, kind)
+                    for _ in table.getplusentries():
+                        self.badfiles.append(fileItem)
+                        counter += 1
+                        compliant = False
             self.detailedresults += "Found " + str(counter) + \
 " plus accounts\n"
             if compliant:
@@ -32,6 +32,8 @@ Created on Jun 17, 2013
 @note: May need to be passed to Ekkehard or Roy for Mac portion
 @note: No OS X Implementation blacklisted darwin
 @change: 2015/04/16 dkennel updated for new isApplicable
+@change: 2016/10/18 dkennel chkShadow takes the shadow entries and uids from
+    the shared AccountDB instead of running id for every entry
 '''
 from __future__ import absolute_import
 from ..stonixutilityfunctions import iterate, writeFile, readFile, resetsecon, getUserGroupName
@@ -41,8 +43,8 @@ from ..logdispatcher import LogPriority
 from ..KVEditorStonix import KVEditorStonix
 from ..CommandHelper import CommandHelper
 from ..pkghelper import Pkghelper
+from ..accountdb import getaccountdb
 from time import strftime
-from subprocess import Popen, PIPE
 import traceback
 import re
 import os
@@ -233,33 +235,21 @@ class PasswordExpiration(Rule):
             elif not checkPerms(self.shadowfile, [0, 0, 256], self.logger) and \
                 not checkPerms(self.shadowfile, [0, 0, 0], self.logger):
                 compliant = False
-            contents = readFile(self.shadowfile, self.logger)
+            accounts = getaccountdb(self.logger)
+            users = accounts.getusers()
             if self.environ.getosfamily() == "solaris" or \
                 self.environ.getosfamily() == "linux":
-                if self.environ.getosfamily() == "linux":
-                    whichid = "/usr/bin/id"
-                elif self.environ.getosfamily() == "solaris":
-                    whichid = "/usr/xpg4/bin/id"
-                for line in contents:
+                for entry in accounts.gettable(self.shadowfile, "shadow"):
                     badacct = False
                     debug = ""
-                    if re.search("^\#", line) or re.match("^\s*$", line):
-                        continue
-                    if re.search(":", line):
-                        field = line.split(":")
-                        cmd = [whichid, "-u", field[0]]
-                        self.ch.executeCommand(cmd)
-                        output = self.ch.getOutputString().strip()
-                        error = self.ch.getError()
-                        if error:
-                            continue
-                        if output:
-                            if output.isdigit():
-                                uid = int(output)
-                            else:
-                                uid = 100
-                        else:
+                    if len(entry) > 1:
+                        field = list(entry)
+                        user = users.get("name", field[0])
+                        if user is None:
                             continue
+                        uid = user.getid("uid")
+                        if uid is None:
+                            uid = 100
                         try:
                             if uid >= 500 and not re.search(self.lockedpwds, field[1]):
                                 for i in [3, 4, 5, 6]:
@@ -301,20 +291,13 @@ class PasswordExpiration(Rule):
                     if badacct:
                         self.fixusers.append(field[0])
             if self.environ.getosfamily() == 'freebsd':
-                for line in contents:
+                for entry in accounts.gettable(self.shadowfile,
+                                               "master.passwd"):
                     debug = ""
-                    if re.search("^\#", line) or re.match('^\s*$', line):
-                        continue
-                    if re.search(':', line):
-                        field = line.split(':')
-                        message = Popen(['/usr/bin/id', '-u', field[0]],
-                                           stderr=PIPE, stdout=PIPE, shell=False)
-                        uid = message.stdout.readline()
-                        uid = uid.strip()
-                        message.stdout.close()
-                        if uid.isdigit():
-                            uid = int(uid)
-                        else:
+                    if len(entry) > 1:
+                        field = list(entry)
+                        uid = entry.getid("uid")
+                        if uid is None:
                             uid = 100
                         try:
                             if uid >= 500 and not re.search(self.lockedpwds, field[1]):
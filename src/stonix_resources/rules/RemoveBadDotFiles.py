@@ -28,17 +28,26 @@ Created on Jul 13, 2012
 @change: 02/13/2014 ekkehard Implemented isapplicable
 @change: 04/18/2014 dkennel Replace old-style CI invocation
 @change: 2015/04/16 dkennel upate for new isApplicable
+@change: 2016/10/18 dkennel take the home directories from the shared
+    AccountDB. A non root run now checks the user's home directory rather
+    than each character of its path.
+@change: 2016/10/18 dkennel report from the shared home directory audit
 '''
 from __future__ import absolute_import
 
 import pwd
 import os
+import stat
 import traceback
 
 from ..rule import Rule
 from ..logdispatcher import LogPriority
+from ..accountdb import getaccountdb
+from ..homeaudit import HomeCheck, gethomeaudit
 from ..stonixutilityfunctions import *
 
+BADFILES = ['.netrc', '.shosts', '.rhosts']
+
 
 class RemoveBadDotFiles(Rule):
     '''
@@ -83,16 +92,20 @@ class RemoveBadDotFiles(Rule):
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10']}}
         self.homelist = ['/', '/root']
         try:
-            mypwd = pwd.getpwall()
-            for user in mypwd:
-                home = user[5]
-                if home not in self.homelist:
+            known = set(self.homelist)
+            for user in getaccountdb(self.logger).getusers():
+                home = user.home
+                if home and home not in known:
+                    known.add(home)
                     self.homelist.append(home)
             if self.environ.geteuid() != 0:
                 pwdsingle = pwd.getpwuid(self.environ.geteuid())
-                self.homelist = pwdsingle[5]
+                self.homelist = [pwdsingle[5]]
         except(IndexError, OSError):
             pass
+        self.homeaudit = gethomeaudit(self.logger)
+        self.homeaudit.register(HomeCheck(self.rulename, homes=self.homelist,
+                                          paths=BADFILES))
 
     def report(self):
         """
@@ -106,24 +119,21 @@ class RemoveBadDotFiles(Rule):
             compliant = True
             self.detailedresults = ""
             myresults = "Bad dot files were detected: "
-            badfiles = ['.netrc', '.shosts', '.rhosts']
 
-            for home in self.homelist:
-                badpaths = []
-                for badfile in badfiles:
-                    badpaths.append(os.path.join(home, badfile))
-                try:
-                    for badpath in badpaths:
-                        if os.path.islink(badpath) and \
-                        os.path.realpath(badpath) == '/dev/null':
+            # Unreadable homes (NFS mounted homes when running as root)
+            # come back without stats and are passed over
+            for result in self.homeaudit.getresults(self.rulename):
+                for badfile in BADFILES:
+                    badstat = result.paths.get(badfile)
+                    if badstat is None:
+                        continue
+                    badpath = os.path.join(result.home.path, badfile)
+                    if stat.S_ISLNK(badstat.st_mode):
+                        if os.path.realpath(badpath) == '/dev/null' or \
+                           not os.path.exists(badpath):
                             continue
-                        elif os.path.exists(badpath):
-                            compliant = False
-                            myresults = myresults + " " + badpath
-                except OSError:
-                    # we expect failures on NFS mounted homes when running
-                    # as root
-                    pass
+                    compliant = False
+                    myresults = myresults + " " + badpath
             if compliant:
                 self.detailedresults = 'No bad dot files were detected'
             else:
@@ -154,11 +164,10 @@ class RemoveBadDotFiles(Rule):
                                        self.detailedresults)
             self.logdispatch.log(LogPriority.INFO, self.detailedresults)
             return self.rulesuccess
-        badfiles = ['.netrc', '.shosts', '.rhosts']
         try:
             for home in self.homelist:
                 badpaths = []
-                for badfile in badfiles:
+                for badfile in BADFILES:
                     badpaths.append(os.path.join(home, badfile))
                 try:
                     for badpath in badpaths:
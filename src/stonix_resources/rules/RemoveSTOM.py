@@ -35,7 +35,7 @@ from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..filehelper import FileHelper
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 
 
 class RemoveSTOM(Rule):
@@ -127,7 +127,7 @@ class RemoveSTOM(Rule):
                                             fileinfo["group"]
                                             )
         self.ch = CommandHelper(self.logdispatch)
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
 
 ###############################################################################
 
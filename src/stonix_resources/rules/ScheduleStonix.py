@@ -41,7 +41,7 @@ from __future__ import absolute_import
 from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..stonixutilityfunctions import readFile
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..pkghelper import Pkghelper
 
 import random
@@ -77,7 +77,7 @@ and once in a user context per day"
         self.applicable = {'type': 'white',
                            'family': ['linux', 'solaris', 'freebsd'],
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10']}}
-        self.svchelper = ServiceHelper(self.environ, self.logger)
+        self.svchelper = getservicehelper(self.environ, self.logger)
 
         # possible locations where the root cron tab may be located
         # (system-dependent)
@@ -49,7 +49,7 @@ import re
 
 from ..rule import Rule
 from ..logdispatcher import LogPriority
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..pkghelper import Pkghelper
 from ..KVEditorStonix import KVEditorStonix
 from ..localize import PRINTBROWSESUBNET
@@ -362,7 +362,7 @@ DisablePrintBrowsing to True.'
         self.detailedresults = ""
 
         # init helper objects
-        self.svchelper = ServiceHelper(self.environ, self.logger)
+        self.svchelper = getservicehelper(self.environ, self.logger)
         self.pkghelper = Pkghelper(self.logger, self.environ)
 
         try:
@@ -29,6 +29,10 @@ Created on May 20, 2013
 @change: 04/21/2014 dkennel Updated CI invocation
 @change: 2014/10/17 ekkehard OS X Yosemite 10.10 Update
 @change: 2015/04/17 dkennel updated for new isApplicable
+@change: 2016/10/18 dkennel take users and home directories from the shared
+    AccountDB and list the home base directory once
+@change: 2016/10/18 dkennel stat the home directories through the shared
+    home directory audit, skipping homes that do not answer
 '''
 from __future__ import absolute_import
 from ..stonixutilityfunctions import iterate, readFile
@@ -36,6 +40,8 @@ from ..rule import Rule
 from ..configurationitem import ConfigurationItem
 from ..logdispatcher import LogPriority
 from ..CommandHelper import CommandHelper
+from ..accountdb import getaccountdb
+from ..homeaudit import HomeCheck, gethomeaudit
 import traceback
 import os
 import stat
@@ -68,6 +74,8 @@ False.'''
 
         self.iditerator = 0
         self.cmdhelper = CommandHelper(self.logger)
+        self.homeaudit = gethomeaudit(self.logger)
+        self.homeaudit.register(HomeCheck(self.rulename))
 
 ###############################################################################
 
@@ -105,34 +113,33 @@ False.'''
         templist = []
         compliant = True
         if self.environ.geteuid() == 0:
-            cmd = ["/usr/bin/dscl", ".", "-list", "/Users"]
-            if not self.cmdhelper.executeCommand(cmd):
-                debug += "Unable to run the /usr/bin/dscl command\n"
-                self.logger.log(LogPriority.DEBUG, debug)
-                return False
-            output = self.cmdhelper.getOutput()
-            error = self.cmdhelper.getError()
-            if output:
-                for item in output:
-                    if not re.search("^_", item) and \
-                                                  not re.search("^root", item):
-                        users.append(item.strip())
-            elif error:
+            for entry in getaccountdb(self.logger).getusers():
+                if not re.search("^_", entry.name) and \
+                                            not re.search("^root", entry.name):
+                    users.append(entry)
+            if not users:
                 debug += "There was an error in getting users on system\n"
                 self.logger.log(LogPriority.DEBUG, debug)
                 return False
             if users:
                 grpvals = ("7", "2", "3", "6")
+                results = self.getaudit()
                 for user in users:
                     templist = []
-                    currpwd = pwd.getpwnam(user)
                     try:
-                        homedir = currpwd[5]
-                        if not os.path.exists(homedir):
+                        homedir = user.home
+                        if not homedir:
+                            raise IndexError(user.name)
+                        result = results.get(homedir)
+                        if result is None or result.stat is None:
+                            if result is not None and \
+                               result.error == "timeout":
+                                debug += "Skipped home directory which " + \
+                                    "did not answer: " + homedir + "\n"
                             continue
                         try:
                             #get info about user's directory
-                            statdata = os.stat(homedir)
+                            statdata = result.stat
 
                             #permission returns in integer format
                             mode = stat.S_IMODE(statdata.st_mode)
@@ -165,7 +172,7 @@ False.'''
                     except IndexError:
                         compliant = False
                         debug += "Not enough information to obtain home \
-directory for user: " + user + "\n"
+directory for user: " + user.name + "\n"
         else:
             currpwd = pwd.getpwuid(self.environ.geteuid())
             try:
@@ -235,8 +242,8 @@ either group writeable or world readable:\n" + str(badhomes) + "\n"
         else:
             homebase = "/home/"
         #read in /etc/passwd
-        contents = readFile("/etc/passwd", self.logger)
-        if not contents:
+        contents = getaccountdb(self.logger).getpasswd()
+        if not len(contents):
             self.detailedresults += "the /etc/passwd file is blank.  This \
 rule cannot be run at all.\n"
             self.formatDetailedResults("report", False, self.detailedresults)
@@ -261,14 +268,16 @@ rule cannot be run at all.\n"
             #add home directories found in /etc/passwd
             if not uidmin:
                 uidmin = 100
-            for line in contents:
-                if re.search("^#", line) or re.match("^\s*$", line):
-                    continue
-                if re.search(":", line):
-                    temp = line.split(":")
+            known = set()
+            for temp in contents:
+                line = ":".join(temp)
+                if len(temp) > 1:
                     try:
                         if re.search("/", temp[5]):
-                            if int(temp[2]) >= uidmin and int(temp[2]) != 65534:
+                            uid = temp.getid("uid")
+                            if uid is not None and uid >= uidmin and \
+                                    uid != 65534 and temp[5] not in known:
+                                known.add(temp[5])
                                 self.homedirs.append(temp[5])
                         else:
                             debug = "the /etc/passwd file is not in the \
@@ -280,11 +289,13 @@ correct format as of the line: " + line + "\n"
 
             #add home directories found
             output = os.listdir(homebase)
+            homenames = set(output)
             for item in output:
                 if item == "lost+found":
                     continue
                 home = homebase + item
-                if home not in self.homedirs:
+                if home not in known:
+                    known.add(home)
                     self.homedirs.append(home)
 
             #clean up self.homedirs to not contain any of the root dirs
@@ -297,14 +308,23 @@ correct format as of the line: " + line + "\n"
                     elif re.search("^" + item2, item):
                         remove.append(item)
                         break
-            for item in remove:
-                self.homedirs.remove(item)
+            remove = set(remove)
+            self.homedirs = [item for item in self.homedirs
+                             if item not in remove]
 
             #let's look at the home directories we found
             if self.homedirs:
+                self.homeaudit.register(HomeCheck(self.rulename,
+                                                  homes=self.homedirs))
+                results = self.getaudit()
                 for home in self.homedirs:
                     user = ""
-                    if not os.path.exists(home):
+                    result = results[home]
+                    if result.error == "timeout":
+                        debug += "Skipped home directory which did not " + \
+                            "answer: " + home + "\n"
+                        continue
+                    if result.stat is None:
                         compliant = False
                         debug += "This home directory doesn't exist: " + home + "\n"
                         continue
@@ -322,47 +342,43 @@ correct format as of the line: " + line + "\n"
                         debug += traceback.format_exc() + "\n"
                         debug += "Index out of range on line: " + line + "\n"
                         continue
-                    output = os.listdir(homebase)
-                    for directory in output:
-                        templist = []
-                        #we found the current user's home directory
-                        if (user == directory):
-                            try:
-                                #get info about user's directory
-                                statdata = os.stat(homebase + directory)
-
-                                #permission returns in integer format
-                                mode = stat.S_IMODE(statdata.st_mode)
-                                
-                                #convert permission to octal format
-                                octval = oct(mode)
-                                
-                                #remove leading 0
-                                octval = re.sub("^0", "", octval)
-                                
-                                #split numeric integer value of permissions
-                                #into separate numbers
-                                perms = list(octval)
-                                
-                                
-                                grpval = perms[1]
-                                world = perms[2]
-                                #if the group value equals any of the 
-                                #following numbers, it is group writeable
-                                if grpval in grpvals:
-                                    templist.append("gw")
-                                    compliant = False
-                                if world != "0":
-                                    templist.append("wr")
-                                    compliant = False
-                                if templist:
-                                    self.wrong[home] = templist
-                                    break
-                            except IndexError:
+                    templist = []
+                    #we found the current user's home directory
+                    if user in homenames:
+                        try:
+                            #get info about user's directory
+                            statdata = result.stat
+
+                            #permission returns in integer format
+                            mode = stat.S_IMODE(statdata.st_mode)
+                            
+                            #convert permission to octal format
+                            octval = oct(mode)
+                            
+                            #remove leading 0
+                            octval = re.sub("^0", "", octval)
+                            
+                            #split numeric integer value of permissions
+                            #into separate numbers
+                            perms = list(octval)
+                            
+                            
+                            grpval = perms[1]
+                            world = perms[2]
+                            #if the group value equals any of the 
+                            #following numbers, it is group writeable
+                            if grpval in grpvals:
+                                templist.append("gw")
+                                compliant = False
+                            if world != "0":
+                                templist.append("wr")
                                 compliant = False
-                                debug += traceback.format_exc() + "\n"
-                                debug += "Index out of range on line: " + line + "\n"
-                                break
+                            if templist:
+                                self.wrong[home] = templist
+                        except IndexError:
+                            compliant = False
+                            debug += traceback.format_exc() + "\n"
+                            debug += "Index out of range on line: " + line + "\n"
                                 
         else:
             user = os.getlogin()
@@ -412,6 +428,18 @@ correct format as of the line: " + line + "\n"
             self.logger.log(LogPriority.DEBUG, debug)
         return compliant
     
+###############################################################################
+
+    def getaudit(self):
+        '''
+        Return the shared home directory audit results of this rule.
+
+        @return: dict - home directory to HomeResult
+        @author: dkennel
+        '''
+        return dict([(result.home.path, result) for result in
+                     self.homeaudit.getresults(self.rulename)])
+
 ###############################################################################
 
     def fix(self):
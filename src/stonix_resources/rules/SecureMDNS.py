@@ -49,7 +49,7 @@ import traceback
 import ConfigParser
 import types
 from ..logdispatcher import LogPriority
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..rule import Rule
 from ..stonixutilityfunctions import iterate
 from ..KVEditorStonix import KVEditorStonix
@@ -100,7 +100,7 @@ the avahi service in order to secure it.'''
         self.ch = CommandHelper(self.logger)
 
 # init helper classes
-        self.sh = ServiceHelper(self.environ, self.logger)
+        self.sh = getservicehelper(self.environ, self.logger)
 
         if self.environ.getostype() == "Mac OS X":
             self.plb = "/usr/libexec/PlistBuddy"
@@ -34,7 +34,7 @@ from __future__ import absolute_import
 import re
 from ..ruleKVEditor import RuleKVEditor
 from ..CommandHelper import CommandHelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..localize import APPLEMAILDOMAINFORMATCHING
 
 
@@ -60,7 +60,7 @@ class SecureMailClient(RuleKVEditor):
         self.applicable = {'type': 'white',
                            'os': {'Mac OS X': ['10.9', 'r', '10.10.10']}}
         self.ch = CommandHelper(self.logdispatch)
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
         self.addKVEditor("DisableAppleMailURLLoading",
                          "defaults",
                          "~/Library/Preferences/com.apple.mail.plist",
@@ -34,7 +34,7 @@ from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..KVEditorStonix import KVEditorStonix
 from ..pkghelper import Pkghelper
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 import traceback
 import os
 
@@ -70,7 +70,7 @@ class SecureNFS(Rule):
             if self.environ.getosfamily() == "linux":
                 self.ph = Pkghelper(self.logger, self.environ)
 
-            self.sh = ServiceHelper(self.environ, self.logger)
+            self.sh = getservicehelper(self.environ, self.logger)
             if self.environ.getostype() == "Mac OS X":
                 nfsfile = "/etc/nfs.conf"
                 data1 = {"nfs.lockd.port": "",
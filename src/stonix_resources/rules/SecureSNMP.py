@@ -44,7 +44,7 @@ import traceback
 from ..rule import Rule
 from ..logdispatcher import LogPriority
 from ..stonixutilityfunctions import getOctalPerms
-from ..ServiceHelper import ServiceHelper
+from ..ServiceHelper import getservicehelper
 from ..CommandHelper import CommandHelper
 from ..pkghelper import Pkghelper
 from ..KVEditorStonix import KVEditorStonix
@@ -125,7 +125,7 @@ possible. Configure SNMP if necessary.'''
 
         # defaults
         secure = True
-        self.svchelper = ServiceHelper(self.environ, self.logger)
+        self.svchelper = getservicehelper(self.environ, self.logger)
         self.detailedresults = ""
 
         try:
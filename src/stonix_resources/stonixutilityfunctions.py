@@ -60,6 +60,8 @@ from environment import Environment
 from subprocess import call, Popen, PIPE, STDOUT
 import urllib2
 from logdispatcher import LogPriority
+from CommandHelper import getcommandcache
+from filecache import getfilecache
 # from twisted.python.procutils import which
 
 # =========================================================================== #
@@ -1027,18 +1029,15 @@ def readFile(filepath, logger):
     @author: dwalker
     @param filepath: string
     @param logger: logger object
-    @return: list  '''
-    contents = []
+    @return: list
+    @change: 2016/10/18 dkennel - read through the run's file cache'''
     try:
-        f = open(filepath, 'r')
+        contents = getfilecache().getlines(filepath)
     except IOError:
         detailedresults = "unable to open the specified file"
         detailedresults += traceback.format_exc()
         logger.log(LogPriority.DEBUG, detailedresults)
         return []
-    for line in f:
-        contents.append(line)
-    f.close()
     return contents
 ###############################################################################
 
@@ -1066,6 +1065,10 @@ def writeFile(tmpfile, contents, logger):
         logger.log(LogPriority.DEBUG, debug)
         return False
     w.close()
+    # Cached command results and file contents may describe the file as it
+    # was.
+    getcommandcache().invalidate()
+    getfilecache().invalidate(tmpfile)
     return True
 ###############################################################################
 
@@ -24,15 +24,17 @@
 class LogDispatcher(object):
     """
     A Mock object to take the place of the log dispatcher for 
-    testing purposes.
+    testing purposes. Logged messages are kept in self.messages.
     @author: Roy Nielsen
+    @change: 2016/10/18 dkennel - environment optional, messages kept, used
+        by the zzzTestFramework tests in place of their own stubs
     """
 
-    def __init__(self, environment):
+    def __init__(self, environment=None):
         """
         Initialization class
         """
-        pass
+        self.messages = []
 
     def closereports(self):
         """
@@ -44,5 +46,5 @@ class LogDispatcher(object):
         """
         Skeleton for the log method
         """
-        pass
+        self.messages.append((priority, msg_data))
 
@@ -100,7 +100,7 @@ class Yum(object):
         @author'''
         try:
             found = False
-            self.ch.executeCommand(self.rpm + package)
+            self.ch.executeCommand(self.rpm + package, readonly=True)
             output = self.ch.getOutputString()
             #for redhat systems only
             if self.ch.getReturnCode() == 0:
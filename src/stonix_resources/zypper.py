@@ -134,7 +134,7 @@ class Zypper(object):
 
         try:
             installed = False
-            self.ch.executeCommand(self.searchi + package)
+            self.ch.executeCommand(self.searchi + package, readonly=True)
             if self.ch.getReturnCode() == 0:
                 output = self.ch.getOutput()
                 outputStr = self.ch.getOutputString()
@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+from CommandHelper import CommandHelper, getcommandcache
+from testing.logdispatcher_mock import LogDispatcher
+
+
+class zzzTestFrameworkCommandHelper(unittest.TestCase):
+
+    def setUp(self):
+        self.ch = CommandHelper(LogDispatcher())
+        self.cache = getcommandcache()
+        self.cache.invalidate()
+        self.tmpdir = tempfile.mkdtemp()
+        self.counter = os.path.join(self.tmpdir, 'counter')
+        # Each real execution appends a line, so the line count tells how
+        # many times the command actually ran.
+        self.command = 'echo x >> ' + self.counter + '; wc -l < ' + \
+            self.counter
+
+    def tearDown(self):
+        self.cache.invalidate()
+        shutil.rmtree(self.tmpdir)
+
+    def testReadonlyCached(self):
+        hits, misses, _ = self.cache.getstats()
+        self.failUnless(self.ch.executeCommand(self.command, readonly=True))
+        self.failUnlessEqual(self.ch.getOutputString().strip(), '1')
+        self.failUnless(self.ch.executeCommand(self.command, readonly=True))
+        self.failUnlessEqual(self.ch.getOutputString().strip(), '1')
+        self.failUnlessEqual(self.ch.getReturnCode(), 0)
+        self.failUnlessEqual(self.cache.getstats()[:2],
+                             (hits + 1, misses + 1))
+
+    def testNotReadonlyNotCached(self):
+        self.ch.executeCommand(self.command)
+        self.ch.executeCommand(self.command)
+        self.failUnlessEqual(self.ch.getOutputString().strip(), '2')
+
+    def testFixInvalidates(self):
+        self.ch.executeCommand(self.command, readonly=True)
+        with self.cache.fixing():
+            # Nothing is served from the cache while a fix runs
+            self.ch.executeCommand(self.command, readonly=True)
+            self.failUnlessEqual(self.ch.getOutputString().strip(), '2')
+        self.ch.executeCommand(self.command, readonly=True)
+        self.failUnlessEqual(self.ch.getOutputString().strip(), '3')
+
+    def testEnvironmentInKey(self):
+        self.ch.executeCommand(self.command, readonly=True)
+        os.environ['STONIXCACHETEST'] = '1'
+        try:
+            self.ch.executeCommand(self.command, readonly=True)
+        finally:
+            del os.environ['STONIXCACHETEST']
+        self.failUnlessEqual(self.ch.getOutputString().strip(), '2')
+
+    def testWriteFileInvalidates(self):
+        from stonixutilityfunctions import writeFile
+        self.ch.executeCommand(self.command, readonly=True)
+        writeFile(os.path.join(self.tmpdir, 'file'), 'contents\n',
+                  LogDispatcher())
+        self.ch.executeCommand(self.command, readonly=True)
+        self.failUnlessEqual(self.ch.getOutputString().strip(), '2')
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -26,10 +26,19 @@ Created on Jun 13, 2013
 ###############################################################################
 
 @author: dwalker
+@change: 2016/10/18 dkennel - tests of the KVAConf index, with a benchmark
+    validating 200 keys against a 5000 line sysctl style file
 '''
 import KVEditorStonix
 import KVEditor
+import os
+import re
+import shutil
+import tempfile
+import time
 import unittest
+from KVAConf import KVAConf
+from testing.logdispatcher_mock import LogDispatcher
 class zzzTestFrameworkKVAConf(unittest.TestCase):
 
     def setUp(self):
@@ -67,6 +76,159 @@ class zzzTestFrameworkKVAConf(unittest.TestCase):
         self.failUnlessEqual(self.editor.fix(),True,
                               "Update Failed")
         
+
+
+def linescan(contents, key, value):
+    '''
+    The validation of an openeq file before the index, kept as the baseline
+    of the benchmark.
+    '''
+    found = False
+    for line in contents:
+        if re.match('^#', line) or re.match(r'^\s*$', line):
+            continue
+        elif re.search("=", line):
+            temp = line.split("=")
+            if re.match("^" + key + "$", temp[0].strip()):
+                if temp[1].strip() == value:
+                    found = True
+                    continue
+                else:
+                    found = False
+                    break
+    return found
+
+
+class zzzTestFrameworkKVAConfIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'sysctl.conf')
+        self.tmppath = self.path + '.tmp'
+        self.logger = LogDispatcher()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content):
+        whandle = open(self.path, 'w')
+        whandle.write(content)
+        whandle.close()
+
+    def editor(self, data, intent='present', configType='openeq'):
+        return KVEditorStonix.KVEditorStonix(None, self.logger, 'conf',
+                                             self.path, self.tmppath, data,
+                                             intent, configType)
+
+    def testIndex(self):
+        self.write('# kernel settings\n'
+                   'net.ipv4.ip_forward = 0\n'
+                   '\n'
+                   '#kernel.sysrq = 1\n'
+                   'kernel.sysrq = 0\n'
+                   'net.ipv4.ip_forward = 1\n')
+        conf = KVAConf(self.path, self.tmppath, 'present', 'openeq',
+                       self.logger)
+        self.failUnlessEqual(conf.index.keys(),
+                             ['net.ipv4.ip_forward', 'kernel.sysrq'])
+        self.failUnlessEqual(conf.index['net.ipv4.ip_forward'],
+                             [(1, '0'), (5, '1')])
+        self.failUnless(conf.validate('kernel.sysrq', '0'))
+        # Every occurrence must have the value
+        self.failIf(conf.validate('net.ipv4.ip_forward', '0'))
+        # A dot in a key is not a wildcard
+        self.failIf(conf.validate('kernel_sysrq', '0'))
+        conf.setIntent('notpresent')
+        self.failUnless(conf.validate('kernel.sysrq', '0'))
+        self.failIf(conf.validate('kernel.panic', '0'))
+
+    def testValidateOnce(self):
+        self.write('kernel.sysrq = 0\n')
+        editor = self.editor({'kernel.sysrq': '1', 'kernel.panic': '0'})
+        calls = []
+        validate = editor.editor.validate
+
+        def counted(key, val):
+            calls.append(key)
+            return validate(key, val)
+        editor.editor.validate = counted
+        self.failIf(editor.report())
+        self.failUnlessEqual(sorted(calls), ['kernel.panic', 'kernel.sysrq'])
+        self.failUnlessEqual(editor.fixables, {'kernel.sysrq': '1',
+                                               'kernel.panic': '0'})
+
+    def testUpdateCommit(self):
+        self.write('# comment\n'
+                   'kernel.sysrq = 1\n'
+                   'kernel.panic = 5\n'
+                   'kernel.sysrq = 1\n'
+                   'fs.suid_dumpable = 1\n')
+        editor = self.editor({'kernel.sysrq': '0'})
+        self.failIf(editor.report())
+        editor.setIntent('notpresent')
+        editor.setData({'fs.suid_dumpable': '1'})
+        self.failIf(editor.report())
+        self.failUnless(editor.fix())
+        self.failUnless(editor.editor.commit())
+        self.failUnless(editor.editor.commit())
+        self.failUnlessEqual(open(self.tmppath).read(),
+                             '# comment\n'
+                             'kernel.panic = 5\n'
+                             '\n#The following lines were added by stonix\n'
+                             'kernel.sysrq = 0\n')
+        os.rename(self.tmppath, self.path)
+        editor = self.editor({'kernel.sysrq': '0', 'kernel.panic': '5'})
+        self.failUnless(editor.report())
+
+    def testSpace(self):
+        self.write('blacklist bluetooth\n'
+                   'blacklist hisax\n'
+                   'options snd index=0 model=auto\n'
+                   'install usb-storage /bin/true\n')
+        editor = self.editor({'blacklist': ['bluetooth', 'rivafb']},
+                             configType='space')
+        self.failIf(editor.report())
+        self.failUnlessEqual(editor.fixables, {'blacklist': ['rivafb']})
+        editor.setIntent('notpresent')
+        editor.setData({'blacklist': ['hisax']})
+        self.failIf(editor.report())
+        self.failUnless(editor.fix())
+        self.failUnless(editor.editor.commit())
+        self.failUnlessEqual(open(self.tmppath).read(),
+                             'blacklist bluetooth\n'
+                             'options snd index=0 model=auto\n'
+                             'install usb-storage /bin/true\n'
+                             '\n#The following lines were added by stonix\n'
+                             'blacklist rivafb\n')
+
+    def testBenchmark(self):
+        lines = ['# sysctl settings generated for the benchmark\n']
+        for num in range(1, 5000):
+            if num % 10 == 0:
+                lines.append('# setting %d\n' % num)
+            else:
+                lines.append('net.bench.key%d = %d\n' % (num, num % 2))
+        self.write(''.join(lines))
+        data = {}
+        for num in range(1, 5000, 25)[:200]:
+            data['net.bench.key%d' % num] = '1'
+        start = time.time()
+        editor = self.editor(data)
+        editor.report()
+        indexed = time.time() - start
+        contents = open(self.path).readlines()
+        start = time.time()
+        expected = {}
+        for key, value in data.iteritems():
+            # validateConf called the validation twice per key
+            linescan(contents, key, value)
+            if not linescan(contents, key, value):
+                expected[key] = value
+        scanned = time.time() - start
+        self.failUnlessEqual(editor.fixables, expected)
+        print '\n%d keys against %d lines: line scans %.4fs, index %.4fs' % \
+            (len(data), len(lines), scanned, indexed)
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
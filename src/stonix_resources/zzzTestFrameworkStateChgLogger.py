@@ -93,11 +93,11 @@ key4 = True
         self.mktestfiles()
         eventid = '9999001'
         patchpath = '/usr/share/stonix/diffdir/etc/stonixtest.conf.patch-' + eventid
-        archivepath = '/usr/share/stonix/archive/etc/stonixtest.conf.ovf'
         self.failUnless(self.testobj.recordfilechange(self.srcfile,
                                                       self.dstfile, eventid))
         self.failUnless(os.path.exists(patchpath), 'Patch not created')
-        self.failUnless(os.path.exists(archivepath), 'Archive not created')
+        self.failUnless(self.testobj.filearchive.getnewest(self.srcfile),
+                        'Archive not created')
         shutil.copyfile(self.dstfile, self.srcfile)
         self.testobj.revertfilechanges(self.srcfile, eventid)
         rhandle = open(self.srcfile)
@@ -105,19 +105,44 @@ key4 = True
         self.failUnless(data == self.srcconf,
                         'Conf mismatch in' + self.srcfile)
 
+    def testRevertFileChangeSet(self):
+        self.mktestfiles()
+        original = self.srcconf
+        stages = [original.replace('lemon', 'yellow'),
+                  original.replace('lemon', 'yellow') + 'key4 = True\n']
+        changes = []
+        for num, content in enumerate(stages):
+            eventid = '999900' + str(num + 2)
+            whandle = open(self.dstfile, 'w')
+            whandle.write(content)
+            whandle.close()
+            self.failUnless(self.testobj.recordfilechange(self.srcfile,
+                                                          self.dstfile,
+                                                          eventid))
+            shutil.copyfile(self.dstfile, self.srcfile)
+            changes.append((self.srcfile, eventid))
+        os.chmod(self.srcfile, 0640)
+        changes.append((self.srcfile, '9999099'))
+        conflicts = self.testobj.revertfilechangeset(changes)
+        self.failUnlessEqual(len(conflicts), 1)
+        self.failUnlessEqual(conflicts[0].eventid, '9999099')
+        self.failUnlessEqual(open(self.srcfile).read(), original)
+        self.failUnlessEqual(os.stat(self.srcfile).st_mode & 0777, 0640)
+
     def testRevertFileDelete(self):
         self.mktestfiles()
         eventid = '9999005'
-        archivepath = '/usr/share/stonix/archive/etc/stonixtest.conf.ovf'
-        if os.path.exists(archivepath):
-            os.remove(archivepath)
         self.failUnless(self.testobj.recordfiledelete(self.srcfile, eventid))
         shutil.copyfile(self.dstfile, self.srcfile)
         self.failUnless(self.testobj.recordfiledelete(self.srcfile, eventid))
         self.failUnless(self.testobj.recordfiledelete(self.srcfile, eventid))
-        self.failUnless(os.path.exists(archivepath), 'Archive not created')
+        self.failUnless(self.testobj.filearchive.getnewest(self.srcfile),
+                        'Archive not created')
         os.remove(self.srcfile)
         self.failUnless(self.testobj.revertfiledelete(self.srcfile))
+        # The newest version is the one restored
+        self.failUnlessEqual(open(self.srcfile).read(),
+                             open(self.dstfile).read())
 
     def testEventStoreDelete(self):
         mytype = 'perm'
@@ -0,0 +1,182 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+
+The benchmark test builds a 100000 account passwd file with a few duplicate
+names and uids. It prints the time taken by the snapshot to find every
+duplicate and to look up each shadow entry's account. For comparison it
+also prints the time of the old list scan on 10000 of those accounts; the
+list scan is quadratic and would take far longer on all of them.
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from accountdb import AccountDB, parseaccounts, parsedscl
+from CommandHelper import getcommandcache
+
+PASSWD = '''root:x:0:0:root:/root:/bin/bash
+# a comment
+
+daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin
+alice:x:500:500:Alice:/home/alice:/bin/bash
+bob:x:501:501::/home/bob:/bin/bash
+toor:x:0:0:root:/root:/bin/bash
+alice:x:502:502:Alice again:/home/alice2:/bin/bash
+broken
++::::::
+'''
+
+
+class zzzTestFrameworkaccountdb(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'passwd')
+        self.write(PASSWD)
+        self.accounts = AccountDB(dscl=os.path.join(self.tmpdir, 'nodscl'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content, path=None):
+        whandle = open(path or self.path, 'w')
+        whandle.write(content)
+        whandle.close()
+
+    def testParse(self):
+        table = self.accounts.gettable(self.path, 'passwd')
+        self.failUnlessEqual(len(table), 8)
+        root = table.get('name', 'root')
+        self.failUnlessEqual((root.uid, root.home, root.shell),
+                             ('0', '/root', '/bin/bash'))
+        self.failUnlessEqual(root.getid('uid'), 0)
+        self.failUnlessEqual(table.get('uid', 501).name, 'bob')
+        # Short lines keep their fields as they are
+        broken = table.get('name', 'broken')
+        self.failUnlessEqual(len(broken), 1)
+        self.failUnlessEqual(broken.home, '')
+        self.failUnless(broken.getid('uid') is None)
+        self.failUnless(table.get('name', 'carol') is None)
+        self.failUnlessEqual(table.lookup('name', 'carol'), [])
+
+    def testDuplicates(self):
+        table = self.accounts.gettable(self.path, 'passwd')
+        self.failUnlessEqual(table.getduplicates('name').keys(), ['alice'])
+        self.failUnlessEqual([entry.name for entry in
+                              table.getduplicates('uid')['0']],
+                             ['root', 'toor'])
+        self.failUnlessEqual([entry.home for entry in
+                              table.getrepeats('name')], ['/home/alice2'])
+        self.failUnlessEqual([entry.name for entry in table.getrepeats('uid')
+                              if len(entry) > 2], ['toor'])
+        self.failUnlessEqual(len(table.getplusentries()), 1)
+
+    def testShadow(self):
+        shadow = parseaccounts(['alice::16000:7:180:28:7::\n',
+                                'bob:!:16000:0:99999:7:::\n'], 'shadow')
+        self.failUnlessEqual(shadow.get('name', 'alice').passwd, '')
+        self.failUnlessEqual(shadow.get('name', 'bob').maxage, '99999')
+        self.failUnlessEqual(shadow.get('name', 'bob').flag, '')
+
+    def testShared(self):
+        first = self.accounts.gettable(self.path, 'passwd')
+        self.failUnless(self.accounts.gettable(self.path, 'passwd') is first)
+        self.failUnlessEqual(self.accounts.getparses(), 1)
+        # A changed file is parsed again
+        self.write(PASSWD + 'carol:x:503:503::/home/carol:/bin/sh\n')
+        os.utime(self.path, (1, 1))
+        self.failUnlessEqual(self.accounts.gettable(self.path,
+                                                    'passwd').get(
+            'name', 'carol').uid, '503')
+        self.failUnlessEqual(self.accounts.getparses(), 2)
+        # Nothing is kept while a fix runs
+        with getcommandcache().fixing():
+            self.accounts.gettable(self.path, 'passwd')
+            self.accounts.gettable(self.path, 'passwd')
+        self.failUnlessEqual(self.accounts.getparses(), 4)
+
+    def testMissing(self):
+        table = self.accounts.gettable(os.path.join(self.tmpdir, 'group'),
+                                       'group')
+        self.failUnlessEqual(len(table), 0)
+        self.failUnlessEqual(table.getduplicates('gid'), {})
+
+    def testNoDirectoryService(self):
+        self.failIf(self.accounts.usesdirectory())
+
+    def testParseDscl(self):
+        self.failUnlessEqual(parsedscl(['_amavisd     83\n', 'alice  501\n',
+                                        'nohome\n', '\n']),
+                             [('_amavisd', '83'), ('alice', '501'),
+                              ('nohome', '')])
+
+    def testBenchmark(self):
+        lines = []
+        for num in range(100000):
+            lines.append('user%d:x:%d:%d::/home/user%d:/bin/bash\n' %
+                         (num, 1000 + num, 1000 + num, num))
+        for num in range(0, 100000, 10000):
+            lines.append('user%d:x:%d:100::/home/dup%d:/bin/bash\n' %
+                         (num, 500000 + num, num))
+            lines.append('dup%d:x:%d:100::/home/dup%d:/bin/bash\n' %
+                         (num, 1000 + num, num))
+        self.write(''.join(lines))
+        shadowpath = os.path.join(self.tmpdir, 'shadow')
+        self.write(''.join(['user%d::16000:7:180:28:7::\n' % num
+                            for num in range(100000)]), shadowpath)
+        start = time.time()
+        passwd = self.accounts.gettable(self.path, 'passwd')
+        shadow = self.accounts.gettable(shadowpath, 'shadow')
+        names = passwd.getrepeats('name')
+        uids = passwd.getrepeats('uid')
+        found = 0
+        for entry in shadow:
+            if passwd.get('name', entry.name) is not None:
+                found = found + 1
+        snapshot = time.time() - start
+        self.failUnlessEqual((len(names), len(uids), found),
+                             (10, 10, 100000))
+        start = time.time()
+        namelist = []
+        idlist = []
+        for line in lines[:10000]:
+            fields = line.split(':')
+            if fields[0] not in namelist:
+                namelist.append(fields[0])
+            if fields[2] not in idlist:
+                idlist.append(fields[2])
+        listscan = time.time() - start
+        print '\nsnapshot of 100000 accounts: %.4fs, ' \
+            'list scan of 10000 accounts: %.4fs' % (snapshot, listscan)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
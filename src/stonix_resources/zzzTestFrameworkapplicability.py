@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+The benchmark test evaluates the applicability dictionaries of every rule in
+the rules directory against a matrix of platforms with the reference
+evaluator, the compiled evaluator and the memoized index and prints the
+timings.
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from applicability import ApplicabilityIndex, CompiledSpec, speckey
+from rule import checkapplicable
+from rulemanifest import buildmanifest
+
+PLATFORMS = [('linux', 'Red Hat Enterprise Linux Server', '6.5'),
+             ('linux', 'Red Hat Enterprise Linux Workstation', '7.2'),
+             ('linux', 'CentOS Linux', '7.2.1511'),
+             ('linux', 'Fedora', '23'),
+             ('linux', 'Ubuntu', '14.04'),
+             ('linux', 'Ubuntu', '16.04'),
+             ('linux', 'Debian', '8.5'),
+             ('linux', 'openSUSE', '13.2'),
+             ('darwin', 'Mac OS X', '10.9.5'),
+             ('darwin', 'Mac OS X', '10.10.5'),
+             ('darwin', 'Mac OS X', '10.11.6'),
+             ('darwin', 'Mac OS X', '10.12'),
+             ('solaris', 'Solaris', '5.11'),
+             ('freebsd', 'FreeBSD', '10.3')]
+
+EXTRASPECS = [{'default': 'default'},
+              {'type': 'white', 'family': ['linux', 'solaris']},
+              {'type': 'black', 'family': ['darwin']},
+              {'type': 'white', 'os': {'Mac OS X': ['10.9', 'r', '10.11.6']}},
+              {'type': 'white', 'os': {'Mac OS X': ['10.11.6', 'r', '10.9']}},
+              {'type': 'black', 'os': {'Mac OS X': ['10.10.5', '-']}},
+              {'type': 'white', 'os': {'Ubuntu': ['+', '14.04'],
+                                       'Red Hat': ['6.5', '7.2']}},
+              {'type': 'white', 'family': ['linux'],
+               'os': {'Mac OS X': ['10.10', '+']}},
+              {'type': 'white', 'os': {'Mac OS X': ['10.10', '10.11', '+']}},
+              {'type': 'white', 'os': {'Mac OS X': ['10.10', 'r', '10.10']}}]
+
+
+class FakeEnvironment(object):
+
+    def __init__(self, family, ostype, osver):
+        self.family = family
+        self.ostype = ostype
+        self.osver = osver
+
+    def getosfamily(self):
+        return self.family
+
+    def getostype(self):
+        return self.ostype
+
+    def getosver(self):
+        return self.osver
+
+
+def outcome(func, *args):
+    '''
+    Return the result of func or the type of exception it raised.
+    '''
+    try:
+        return func(*args)
+    except Exception, err:
+        return type(err)
+
+
+class zzzTestFrameworkapplicability(unittest.TestCase):
+
+    def setUp(self):
+        rulespath = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'rules')
+        manifest = buildmanifest(rulespath)
+        self.specs = [entry['applicable'] for entry in
+                      manifest['rules'].values() if entry['static']]
+        self.specs.extend(EXTRASPECS)
+        self.environs = [FakeEnvironment(*platform)
+                         for platform in PLATFORMS]
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testMatchesReference(self):
+        index = ApplicabilityIndex()
+        for spec in self.specs:
+            for environ in self.environs:
+                expected = outcome(checkapplicable, spec, environ)
+                compiled = outcome(CompiledSpec(spec).evaluate,
+                                   environ.getosfamily(),
+                                   environ.getostype(), environ.getosver())
+                memoized = outcome(index.evaluate, spec, environ)
+                message = str(spec) + ' on ' + str(PLATFORMS[
+                    self.environs.index(environ)])
+                self.failUnlessEqual(expected, compiled, message)
+                self.failUnlessEqual(expected, memoized, message)
+
+    def testMemoized(self):
+        index = ApplicabilityIndex()
+        spec = {'type': 'white', 'family': ['linux']}
+        for _ in range(3):
+            self.failUnless(index.evaluate(spec, self.environs[0]))
+        # Same spec with a different insertion order shares the result
+        self.failUnless(index.evaluate({'family': ['linux'],
+                                        'type': 'white'}, self.environs[0]))
+        self.failUnlessEqual(index.getstats(), (3, 1))
+        # A rule altering its dictionary must not get the stale answer
+        spec['family'] = ['darwin']
+        self.failIf(index.evaluate(spec, self.environs[0]))
+
+    def testPersistence(self):
+        cachepath = os.path.join(self.tmpdir, 'applicability.json')
+        index = ApplicabilityIndex(cachepath)
+        for spec in self.specs:
+            index.evaluate(spec, self.environs[0])
+        self.failUnless(index.save())
+        self.failIf(index.save(), 'Unchanged results written again')
+        reloaded = ApplicabilityIndex(cachepath)
+        for spec in self.specs:
+            self.failUnlessEqual(reloaded.evaluate(spec, self.environs[0]),
+                                 index.evaluate(spec, self.environs[0]))
+        self.failUnlessEqual(reloaded.getstats()[1], 0)
+
+    def testCorruptCacheIgnored(self):
+        cachepath = os.path.join(self.tmpdir, 'applicability.json')
+        whandle = open(cachepath, 'w')
+        whandle.write('{not json')
+        whandle.close()
+        index = ApplicabilityIndex(cachepath)
+        self.failUnless(index.evaluate({'default': 'default'},
+                                       self.environs[0]))
+
+    def testBenchmark(self):
+        pairs = [(spec, environ) for spec in self.specs
+                 for environ in self.environs]
+        start = time.time()
+        for spec, environ in pairs:
+            outcome(checkapplicable, spec, environ)
+        reference = time.time() - start
+        start = time.time()
+        for spec, environ in pairs:
+            outcome(CompiledSpec(spec).evaluate, environ.getosfamily(),
+                    environ.getostype(), environ.getosver())
+        compiled = time.time() - start
+        index = ApplicabilityIndex()
+        for spec, environ in pairs:
+            outcome(index.evaluate, spec, environ)
+        start = time.time()
+        for spec, environ in pairs:
+            outcome(index.evaluate, spec, environ)
+        memoized = time.time() - start
+        keyed = [(spec, environ, speckey(spec)) for spec, environ in pairs]
+        start = time.time()
+        for spec, environ, key in keyed:
+            outcome(index.evaluate, spec, environ, key)
+        precomputed = time.time() - start
+        print '\n%d specs x %d platforms: reference %.4fs, ' \
+            'compile and evaluate %.4fs, memoized %.4fs, ' \
+            'memoized with manifest key %.4fs' % \
+            (len(self.specs), len(self.environs), reference, compiled,
+             memoized, precomputed)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,178 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+The tests deliver to a local SMTP stand-in (smtpd) on a free port.
+
+@author: dkennel
+'''
+import unittest
+import asyncore
+import os
+import shutil
+import smtpd
+import socket
+import tempfile
+import threading
+import time
+from errorreporter import ErrorReporter
+
+
+class SMTPStandIn(smtpd.SMTPServer):
+    '''
+    Local SMTP server recording what it receives.
+    '''
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.messages = []
+        self.connections = 0
+        self.refuse = None
+
+    def handle_accept(self):
+        self.connections = self.connections + 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if self.refuse is not None and self.refuse in data:
+            return '554 Message refused'
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+def freeport():
+    '''
+    Return a port nothing is listening on.
+    '''
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class zzzTestFrameworkerrorreporter(unittest.TestCase):
+
+    def setUp(self):
+        self.spooldir = os.path.join(tempfile.mkdtemp(), 'spool')
+        self.server = SMTPStandIn()
+        self.loop = threading.Thread(target=asyncore.loop,
+                                     kwargs={'timeout': 0.05})
+        self.loop.daemon = True
+        self.loop.start()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(os.path.dirname(self.spooldir))
+
+    def getreporter(self, port):
+        return ErrorReporter('stonix@localhost', 'devs@localhost',
+                             '127.0.0.1', self.spooldir, 'testhost',
+                             'Sent by: testhost', port, 5)
+
+    def testDigest(self):
+        reporter = self.getreporter(self.server.port)
+        for _ in range(50):
+            reporter.submit('rule:fix(10)', 'same failure')
+        reporter.submit('rule:report(20)', 'other failure')
+        self.failUnless(reporter.close())
+        self.failUnlessEqual(len(self.server.messages), 1)
+        self.failUnlessEqual(self.server.connections, 1)
+        data = self.server.messages[0][2]
+        self.failUnless('2 distinct errors, 51 in total' in data, data)
+        self.failUnless('rule:fix(10) (50 times' in data, data)
+        self.failUnlessEqual(data.count('same failure'), 1)
+        self.failUnlessEqual(reporter.getspooled(), [])
+
+    def testNonBlocking(self):
+        # A relay that accepts connections but never answers
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(1)
+        try:
+            reporter = self.getreporter(silent.getsockname()[1])
+            start = time.time()
+            for num in range(1000):
+                reporter.submit('rule:fix', 'failure %d' % num)
+            self.failUnless(time.time() - start < 1)
+            self.failIf(reporter.close(1))
+        finally:
+            silent.close()
+
+    def testSpoolAndRetry(self):
+        reporter = self.getreporter(freeport())
+        reporter.submit('rule:fix', 'relay down')
+        self.failIf(reporter.close())
+        self.failUnlessEqual(len(reporter.getspooled()), 1)
+        self.failUnlessEqual(self.server.messages, [])
+        # The next run with errors delivers both digests on one connection
+        time.sleep(1)
+        reporter = self.getreporter(self.server.port)
+        reporter.submit('rule:fix', 'relay back')
+        self.failUnless(reporter.close())
+        self.failUnlessEqual(len(self.server.messages), 2)
+        self.failUnlessEqual(self.server.connections, 1)
+        self.failUnless('relay down' in self.server.messages[0][2])
+        self.failUnless('relay back' in self.server.messages[1][2])
+
+    def testEncoding(self):
+        reporter = self.getreporter(self.server.port)
+        reporter.submit('rule:fix', 'utf-8 caf\xc3\xa9')
+        reporter.submit('rule:fix', 'latin-1 caf\xe9')
+        reporter.submit(u'rule:report', u'unicode \u2603')
+        self.failUnless(reporter.close())
+        data = self.server.messages[0][2]
+        self.failUnless('charset=utf-8' in data, data)
+        self.failUnless('utf-8 caf\xc3\xa9' in data, data)
+        self.failUnless('latin-1 caf\xef\xbf\xbd' in data, data)
+        self.failUnless('unicode \xe2\x98\x83' in data, data)
+        self.failUnlessEqual(reporter.getspooled(), [])
+
+    def testRefusedDigest(self):
+        reporter = self.getreporter(freeport())
+        reporter.submit('rule:fix', 'poison')
+        self.failIf(reporter.close())
+        time.sleep(1)
+        # A digest the relay refuses must not block the ones after it
+        self.server.refuse = 'poison'
+        reporter = self.getreporter(self.server.port)
+        reporter.submit('rule:fix', 'fine')
+        self.failUnless(reporter.close())
+        self.failUnlessEqual(len(self.server.messages), 1)
+        self.failUnless('fine' in self.server.messages[0][2])
+        failed = [name for name in os.listdir(self.spooldir)
+                  if name.startswith('failed-')]
+        self.failUnlessEqual(len(failed), 1)
+
+    def testNoErrorsNoMail(self):
+        reporter = self.getreporter(self.server.port)
+        self.failUnless(reporter.close())
+        self.failUnlessEqual(self.server.connections, 0)
+        self.failIf(os.path.exists(self.spooldir))
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+The benchmark test records 100000 events for 1000 rules and prints the time
+taken to record them and to find one rule's events, next to the same with
+the shelve event log previously used.
+
+@author: dkennel
+'''
+import unittest
+import os
+import shelve
+import shutil
+import sqlite3
+import tempfile
+import time
+from eventstore import EventStore
+
+
+class zzzTestFrameworkeventstore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'eventlog.sqlite')
+        self.store = EventStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def committed(self):
+        con = sqlite3.connect(self.path)
+        try:
+            return con.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+        finally:
+            con.close()
+
+    def testStoreFetch(self):
+        event = {'eventtype': 'perm', 'startstate': [0, 0, 420],
+                 'endstate': (0, 0, 416)}
+        self.store.put('0052001', event)
+        self.failUnlessEqual(self.store.get('0052001'), event)
+        event['startstate'] = [0, 0, 384]
+        self.store.put('0052001', event)
+        self.failUnlessEqual(self.store.get('0052001'), event)
+        self.failUnlessEqual(len(self.store), 1)
+        self.failUnlessRaises(KeyError, self.store.get, '0052002')
+
+    def testDelete(self):
+        self.store.put('0052001', {})
+        self.store.delete('0052001')
+        self.failIf('0052001' in self.store)
+        self.failUnlessRaises(KeyError, self.store.delete, '0052001')
+
+    def testFindRule(self):
+        for code in ['0052003', '0052001', '0053001', '0005201', '005',
+                     '0052conf1']:
+            self.store.put(code, {'eventtype': 'conf'})
+        self.failUnlessEqual(self.store.findrule('0052'),
+                             ['0052001', '0052003', '0052conf1'])
+        self.failUnlessEqual(self.store.findrule('005'), ['005'])
+        self.failUnlessEqual(self.store.findrule('0054'), [])
+
+    def testBatch(self):
+        self.store.put('0052001', {})
+        self.failUnlessEqual(self.committed(), 1)
+        with self.store.batch():
+            self.store.put('0052002', {})
+            with self.store.batch():
+                self.store.put('0052003', {})
+            # Only the outermost batch commits
+            self.failUnlessEqual(self.committed(), 1)
+            self.failUnlessEqual(len(self.store), 3)
+        self.failUnlessEqual(self.committed(), 3)
+
+    def testCommittedOnException(self):
+        try:
+            with self.store.batch():
+                self.store.put('0052001', {})
+                raise ValueError
+        except ValueError:
+            pass
+        # Events for changes already made must not be lost with the rule
+        self.failUnlessEqual(self.committed(), 1)
+
+    def testMigrate(self):
+        self.store.close()
+        os.remove(self.path)
+        shelfpath = os.path.join(self.tmpdir, 'eventlog')
+        shelf = shelve.open(shelfpath, 'c', None, True)
+        shelf['0052001'] = {'eventtype': 'perm', 'startstate': '0,0,420',
+                            'endstate': '0,0,416'}
+        shelf['0044001'] = {'eventtype': 'conf', 'filepath': '/etc/x'}
+        shelf.close()
+        self.store = EventStore(self.path, shelfpath)
+        self.failUnlessEqual(self.store.migrated, 2)
+        self.failUnlessEqual(self.store.get('0044001')['filepath'], '/etc/x')
+        self.store.delete('0044001')
+        self.store.close()
+        # Only migrated once, deleted events do not come back
+        self.store = EventStore(self.path, shelfpath)
+        self.failUnlessEqual(self.store.migrated, 0)
+        self.failUnlessEqual(self.store.keys(), ['0052001'])
+
+    def testNoShelf(self):
+        self.store.close()
+        self.store = EventStore(self.path, os.path.join(self.tmpdir, 'none'))
+        self.failUnlessEqual(self.store.migrated, 0)
+
+    def testBenchmark(self):
+        count = 100000
+        rules = 1000
+        event = {'eventtype': 'conf', 'startstate': 'key = value',
+                 'endstate': 'key = other value', 'filepath': '/etc/x.conf'}
+        codes = [str(num % rules).zfill(4) + str(num / rules).zfill(3)
+                 for num in xrange(count)]
+        start = time.time()
+        for rule in range(rules):
+            with self.store.batch():
+                for code in codes[rule::rules]:
+                    self.store.put(code, event)
+        stored = time.time() - start
+        start = time.time()
+        for rule in range(0, rules, 10):
+            found = self.store.findrule(str(rule).zfill(4))
+        lookup = (time.time() - start) / (rules / 10)
+        self.failUnlessEqual(len(found), count / rules)
+        shelf = shelve.open(os.path.join(self.tmpdir, 'eventlog'), 'c')
+        start = time.time()
+        for code in codes:
+            shelf[code] = event
+        shelf.sync()
+        shelfstored = time.time() - start
+        start = time.time()
+        found = [key for key in shelf.keys() if key[0:4] == '0990']
+        shelflookup = time.time() - start
+        shelf.close()
+        self.failUnlessEqual(len(found), count / rules)
+        print '\n%d events: record %.2fs, find a rule %.5fs; shelve ' \
+            'without writeback: record %.2fs, find a rule %.5fs' % \
+            (count, stored, lookup, shelfstored, shelflookup)
+
+if __name__ == "__main__":
+    unittest.main()
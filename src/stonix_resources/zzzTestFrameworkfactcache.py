@@ -0,0 +1,183 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from factcache import FactCache, parsedmidecode, parseprofiler
+
+DMIDECODE = '''# dmidecode 3.0
+Getting SMBIOS data from sysfs.
+SMBIOS 2.7 present.
+
+Handle 0x0001, DMI type 1, 27 bytes
+System Information
+\tManufacturer: Dell Inc.
+\tProduct Name: Latitude E7450
+\tSerial Number: 5XK2Y12
+\tUUID: 4C4C4544-0058-4B10-8032-B5C04F593132
+\tWake-up Type: Power Switch
+
+Handle 0x0003, DMI type 3, 22 bytes
+Chassis Information
+\tManufacturer: Dell Inc.
+\tType: Laptop
+\tLock: Not Present
+\tSerial Number: 5XK2Y12
+\tAsset Tag: 00012345
+\tContained Elements: 0
+
+Handle 0x0020, DMI type 32, 20 bytes
+System Boot Information
+\tStatus: No errors detected
+'''
+
+PROFILER = '''Hardware:
+
+    Hardware Overview:
+
+      Model Name: MacBook Pro
+      Model Identifier: MacBookPro11,5
+      Processor Speed: 2.5 GHz
+      Serial Number (system): C02Q1234G8WP
+      Hardware UUID: 564D2A86-1D3C-4A0E-A6E8-0F2F7E6B0A11
+'''
+
+
+class zzzTestFrameworkfactcache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'db', 'facts.json')
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def probe(self, name, facts, delay=0):
+        def run():
+            with self.lock:
+                self.calls.append(name)
+            time.sleep(delay)
+            return facts
+        return run
+
+    def probes(self, delay=0):
+        return {'os': self.probe('os', {'osversion': '7.2'}, delay),
+                'network': self.probe('network', {'ipaddress': '10.0.0.1'},
+                                      delay),
+                'hardware': self.probe('hardware', {'uuid': 'abc'}, delay)}
+
+    def testParseDmidecode(self):
+        sections = parsedmidecode(DMIDECODE.splitlines(True))
+        self.failUnlessEqual(sections['System Information']['UUID'],
+                             '4C4C4544-0058-4B10-8032-B5C04F593132')
+        self.failUnlessEqual(sections['Chassis Information']['Asset Tag'],
+                             '00012345')
+        self.failUnlessEqual(sections['Chassis Information']['Type'],
+                             'Laptop')
+        self.failIf('SMBIOS 2.7 present.' in sections)
+
+    def testParseProfiler(self):
+        fields = parseprofiler(PROFILER.splitlines(True))
+        self.failUnlessEqual(fields['Serial Number (system)'], 'C02Q1234G8WP')
+        self.failUnlessEqual(fields['Hardware UUID'],
+                             '564D2A86-1D3C-4A0E-A6E8-0F2F7E6B0A11')
+        self.failIf('Hardware' in fields)
+
+    def testConcurrent(self):
+        cache = FactCache(self.path)
+        start = time.time()
+        facts = cache.collect(self.probes(0.3))
+        elapsed = time.time() - start
+        self.failUnless(elapsed < 0.8, 'Probes ran one after another')
+        self.failUnlessEqual(facts['os'], {'osversion': '7.2'})
+        self.failUnlessEqual(sorted(self.calls),
+                             ['hardware', 'network', 'os'])
+
+    def testPersisted(self):
+        FactCache(self.path).collect(self.probes())
+        self.failUnlessEqual(os.stat(self.path).st_mode & 0777, 0600)
+        self.calls = []
+        cache = FactCache(self.path)
+        facts = cache.collect(self.probes())
+        self.failIf(self.calls, 'Fresh facts probed again')
+        self.failUnlessEqual(facts['hardware'], {'uuid': 'abc'})
+        self.failUnless(isinstance(facts['hardware']['uuid'], str))
+        self.failUnlessEqual(cache.getprobes(), 0)
+
+    def testExpired(self):
+        FactCache(self.path).collect(self.probes())
+        self.calls = []
+        FactCache(self.path, {'network': -1}).collect(self.probes())
+        self.failUnlessEqual(self.calls, ['network'])
+
+    def testStampChanged(self):
+        FactCache(self.path).collect(self.probes(), {'os': [['a', 1]]})
+        self.calls = []
+        FactCache(self.path).collect(self.probes(), {'os': [['a', 1]]})
+        self.failIf(self.calls)
+        FactCache(self.path).collect(self.probes(), {'os': [['a', 2]]})
+        self.failUnlessEqual(self.calls, ['os'])
+
+    def testRefresh(self):
+        cache = FactCache(self.path)
+        cache.collect(self.probes())
+        self.calls = []
+        cache.collect(self.probes(), refresh=True)
+        self.failUnlessEqual(len(self.calls), 3)
+
+    def testFailedProbe(self):
+        def broken():
+            raise OSError('probe failed')
+        FactCache(self.path).collect(self.probes())
+        probes = self.probes()
+        probes['network'] = broken
+        facts = FactCache(self.path).collect(probes, refresh=True)
+        self.failUnlessEqual(facts['network'], {'ipaddress': '10.0.0.1'})
+        os.remove(self.path)
+        self.failUnlessRaises(OSError, FactCache(self.path).collect, probes)
+
+    def testCorruptFileIgnored(self):
+        os.makedirs(os.path.dirname(self.path))
+        whandle = open(self.path, 'w')
+        whandle.write('{not json')
+        whandle.close()
+        cache = FactCache(self.path)
+        cache.collect(self.probes())
+        self.failUnlessEqual(len(self.calls), 3)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
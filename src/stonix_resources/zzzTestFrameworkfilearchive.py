@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+from filearchive import FileArchive
+
+
+class zzzTestFrameworkfilearchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'filearchive')
+        self.legacy = os.path.join(self.tmpdir, 'archive')
+        self.etc = os.path.join(self.tmpdir, 'etc')
+        os.mkdir(self.etc)
+        self.path = os.path.join(self.etc, 'test.conf')
+        self.archive = FileArchive(self.root, legacy=self.legacy)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content, path=None):
+        whandle = open(path or self.path, 'w')
+        whandle.write(content)
+        whandle.close()
+
+    def read(self, path=None):
+        return open(path or self.path).read()
+
+    def blobs(self):
+        found = []
+        for _, _, filenames in os.walk(os.path.join(self.root, 'blobs')):
+            found.extend(filenames)
+        return found
+
+    def testDeduplicated(self):
+        self.write('key = value\n')
+        first = self.archive.archive(self.path)
+        self.failUnlessEqual(self.archive.archive(self.path), first)
+        other = os.path.join(self.etc, 'other.conf')
+        self.write('key = value\n', other)
+        self.archive.archive(other)
+        self.failUnlessEqual(len(self.archive.getversions(self.path)), 1)
+        self.failUnlessEqual(len(self.blobs()), 1)
+        self.failUnlessEqual(self.archive.archive(
+            os.path.join(self.etc, 'missing')), None)
+
+    def testRestore(self):
+        self.write('original\n')
+        os.chmod(self.path, 0640)
+        self.archive.archive(self.path)
+        self.write('changed\n')
+        os.chmod(self.path, 0600)
+        self.archive.archive(self.path)
+        os.remove(self.path)
+        self.failUnless(self.archive.restore(self.path))
+        self.failUnlessEqual(self.read(), 'changed\n')
+        self.failUnlessEqual(os.stat(self.path).st_mode & 0777, 0600)
+        self.failUnless(self.archive.restore(
+            self.path, version=self.archive.getoriginal(self.path)))
+        self.failUnlessEqual(self.read(), 'original\n')
+        self.failUnlessEqual(os.stat(self.path).st_mode & 0777, 0640)
+        self.failIf(self.archive.restore(os.path.join(self.etc, 'missing')))
+
+    def testCompressed(self):
+        self.write('plain\n')
+        self.archive.archive(self.path)
+        self.archive.close()
+        self.archive = FileArchive(self.root, compress=True)
+        other = os.path.join(self.etc, 'other.conf')
+        # Same content reuses the uncompressed blob
+        self.write('plain\n', other)
+        self.archive.archive(other)
+        self.write('compressed\n' * 100)
+        self.archive.archive(self.path)
+        blobs = self.blobs()
+        self.failUnlessEqual(len(blobs), 2)
+        self.failUnlessEqual(len([blob for blob in blobs
+                                  if blob.endswith('.gz')]), 1)
+        os.remove(self.path)
+        self.archive.restore(self.path)
+        self.failUnlessEqual(self.read(), 'compressed\n' * 100)
+        self.archive.restore(other, self.path)
+        self.failUnlessEqual(self.read(), 'plain\n')
+
+    def testRetention(self):
+        self.archive.keep = 2
+        for num in range(6):
+            self.write('version %d\n' % num)
+            self.archive.archive(self.path)
+        versions = self.archive.getversions(self.path)
+        self.failUnlessEqual([version[0] for version in versions], [0, 4, 5])
+        self.failUnlessEqual(len(self.blobs()), 3)
+        self.archive.restore(self.path,
+                             version=self.archive.getoriginal(self.path))
+        self.failUnlessEqual(self.read(), 'version 0\n')
+
+    def testRetentionSharedBlob(self):
+        self.archive.keep = 1
+        for content in ['a\n', 'b\n', 'a\n', 'c\n']:
+            self.write(content)
+            self.archive.archive(self.path)
+        # The original's blob stays although a pruned version used it too
+        self.failUnlessEqual(len(self.blobs()), 2)
+        self.archive.restore(self.path,
+                             version=self.archive.getoriginal(self.path))
+        self.failUnlessEqual(self.read(), 'a\n')
+
+    def testLegacy(self):
+        legacydir = self.legacy + self.etc
+        os.makedirs(legacydir)
+        self.write('first\n', os.path.join(legacydir, 'test.conf.ovf'))
+        self.write('third\n', os.path.join(legacydir,
+                                           'test.conf.ovf1400000002.5'))
+        self.write('second\n', os.path.join(legacydir,
+                                            'test.conf.ovf1400000001.25'))
+        self.write('not ours\n', os.path.join(legacydir,
+                                              'test.conf.bak.ovf1400000003'))
+        self.failUnless(self.archive.restore(self.path))
+        self.failUnlessEqual(self.read(), 'third\n')
+        self.failUnlessEqual(len(self.archive.getversions(self.path)), 3)
+        self.archive.restore(self.path,
+                             version=self.archive.getoriginal(self.path))
+        self.failUnlessEqual(self.read(), 'first\n')
+        # Archiving again only adds a version
+        self.write('fourth\n')
+        self.archive.archive(self.path)
+        self.failUnlessEqual(len(self.archive.getversions(self.path)), 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+from CommandHelper import getcommandcache
+from filecache import FileCache, getfilecache
+from KVAConf import KVAConf
+from conffile import ConfFile
+from stonixutilityfunctions import readFile, writeFile
+from testing.logdispatcher_mock import LogDispatcher
+
+
+class zzzTestFrameworkfilecache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'login.defs')
+        self.write('PASS_MAX_DAYS 60\nPASS_MIN_DAYS 1\n')
+        self.cache = FileCache()
+        self.logger = LogDispatcher()
+
+    def tearDown(self):
+        getfilecache().invalidate()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content, path=None):
+        whandle = open(path or self.path, 'w')
+        whandle.write(content)
+        whandle.close()
+
+    def testCached(self):
+        first = self.cache.getlines(self.path)
+        first.append('altered by the caller\n')
+        self.failUnlessEqual(self.cache.getlines(self.path),
+                             ['PASS_MAX_DAYS 60\n', 'PASS_MIN_DAYS 1\n'])
+        self.failUnlessEqual(self.cache.getstats(), (1, 1, 0))
+
+    def testChangedFile(self):
+        self.cache.getlines(self.path)
+        self.write('PASS_MAX_DAYS 90\n')
+        self.failUnlessEqual(self.cache.getlines(self.path),
+                             ['PASS_MAX_DAYS 90\n'])
+        os.remove(self.path)
+        self.failUnlessRaises(IOError, self.cache.getlines, self.path)
+
+    def testParsedShared(self):
+        calls = []
+
+        def parser(lines):
+            calls.append(1)
+            return dict([line.split() for line in lines])
+        _, lines, parsed = self.cache.getparsed(self.path, 'space', parser)
+        _, _, again = self.cache.getparsed(self.path, 'space', parser)
+        self.failUnless(parsed is again)
+        self.failUnlessEqual(len(calls), 1)
+        self.failUnlessEqual(parsed['PASS_MIN_DAYS'], '1')
+        self.failUnlessEqual(len(lines), 2)
+
+    def testNotCached(self):
+        # The size of /proc files does not describe their content
+        if os.path.exists('/proc/self/status'):
+            self.failUnless(self.cache.getlines('/proc/self/status'))
+            self.failIf(self.cache.entries)
+        with getcommandcache().fixing():
+            self.cache.getlines(self.path)
+        self.failIf(self.cache.entries)
+
+    def testWriteInvalidates(self):
+        self.failUnlessEqual(readFile(self.path, self.logger),
+                             ['PASS_MAX_DAYS 60\n', 'PASS_MIN_DAYS 1\n'])
+        before = getfilecache().getstats()[2]
+        self.failUnless(writeFile(self.path, 'PASS_MAX_DAYS 60\n',
+                                  self.logger))
+        self.failUnlessEqual(getfilecache().getstats()[2], before + 1)
+        self.failUnlessEqual(readFile(self.path, self.logger),
+                             ['PASS_MAX_DAYS 60\n'])
+
+    def testSharedReaders(self):
+        first = KVAConf(self.path, self.path + '.tmp', 'present', 'space',
+                        self.logger)
+        second = KVAConf(self.path, self.path + '.tmp', 'present', 'space',
+                         self.logger)
+        self.failUnless(first.index is second.index)
+        other = KVAConf(self.path, self.path + '.tmp', 'present', 'openeq',
+                        self.logger)
+        self.failIf(other.index is first.index)
+        self.failUnless(second.validate('PASS_MAX_DAYS', '60'))
+        self.failUnless(first.update({'PASS_MAX_DAYS': '90'}, {}))
+        # The update does not alter what the other reader sees
+        self.failUnless(second.validate('PASS_MAX_DAYS', '60'))
+        self.failUnless(first.commit())
+        conf = ConfFile(self.path, self.path + '.tmp', 'space',
+                        {'PASS_MAX_DAYS': '60'}, None, self.logger)
+        self.failUnless(conf.audit())
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
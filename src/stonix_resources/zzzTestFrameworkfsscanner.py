@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+from fsscanner import IdCache, walkfilesystem, FilesystemScanner, \
+    indexpath, loadindex
+from testing.logdispatcher_mock import LogDispatcher
+
+
+class zzzTestFrameworkfsscanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tops = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        top = self.tops[0]
+        os.makedirs(os.path.join(top, 'sub', 'deeper'))
+        self.wwdir = os.path.join(top, 'sub', 'wwdir')
+        os.mkdir(self.wwdir)
+        os.chmod(self.wwdir, 0777)
+        self.wwfile = self.touch(os.path.join(top, 'sub', 'deeper', 'ww'),
+                                 0666)
+        self.suidfile = self.touch(os.path.join(top, 'suid'), 04755)
+        self.plain = self.touch(os.path.join(top, 'plain'), 0644)
+        os.symlink(self.wwdir, os.path.join(top, 'link'))
+        self.other = self.touch(os.path.join(self.tops[1], 'ww'), 0646)
+
+    def tearDown(self):
+        for top in self.tops:
+            shutil.rmtree(top)
+
+    def touch(self, path, mode):
+        open(path, 'w').close()
+        os.chmod(path, mode)
+        return path
+
+    def collect(self, tops, indexdir=None, full=True, **kwargs):
+        hits = []
+        scanner = FilesystemScanner(LogDispatcher(), **kwargs)
+        overrun = scanner.scan(tops, lambda cat, path:
+                               hits.append((cat, path)), indexdir, full)
+        return overrun, sorted(hits), scanner
+
+    def testWalk(self):
+        hits = []
+        walkfilesystem(self.tops[0], IdCache(),
+                       lambda cat, path: hits.append((cat, path)))
+        self.failUnlessEqual(sorted(hits),
+                             sorted([('ww', self.wwdir),
+                                     ('ww', self.wwfile),
+                                     ('suid', self.suidfile)]))
+
+    def testUnowned(self):
+        if os.geteuid() != 0:
+            return
+        unused = 1
+        idcache = IdCache()
+        while idcache.knownuid(unused):
+            unused = unused + 1
+        os.chown(self.plain, unused, -1)
+        hits = []
+        walkfilesystem(self.tops[0], idcache,
+                       lambda cat, path: hits.append((cat, path)))
+        self.failUnless(('unowned', self.plain) in hits)
+
+    def testParallelScan(self):
+        overrun, hits, scanner = self.collect(self.tops, maxworkers=2)
+        self.failIf(overrun)
+        self.failUnless(('ww', self.other) in hits)
+        self.failUnlessEqual(len(hits), 4)
+        self.failUnlessEqual(scanner.getcounts()['ww'], 3)
+
+    def testIncremental(self):
+        hits = []
+        emit = lambda cat, path: hits.append((cat, path))
+        index = walkfilesystem(self.tops[0], IdCache(), emit)
+        # Fixed hit in an unchanged directory drops out, a new file in a
+        # changed directory is found, a chmod in an unchanged directory is
+        # only found by a full walk.
+        os.chmod(self.suidfile, 0755)
+        newfile = self.touch(os.path.join(self.wwdir, 'new'), 0666)
+        os.chmod(self.plain, 0666)
+        hits = []
+        walkfilesystem(self.tops[0], IdCache(), emit, index=index)
+        self.failUnlessEqual(sorted(hits),
+                             sorted([('ww', self.wwdir),
+                                     ('ww', self.wwfile),
+                                     ('ww', newfile)]))
+        hits = []
+        walkfilesystem(self.tops[0], IdCache(), emit)
+        self.failUnless(('ww', self.plain) in hits)
+
+    def testIndexPersisted(self):
+        indexdir = tempfile.mkdtemp()
+        try:
+            self.collect(self.tops, indexdir=indexdir)
+            index = loadindex(indexpath(indexdir, self.tops[0]),
+                              self.tops[0])
+            self.failUnless(self.tops[0] in index)
+            self.failUnless(loadindex(indexpath(indexdir, self.tops[0]),
+                                      self.tops[1]) is None)
+            newfile = self.touch(os.path.join(self.tops[1], 'new'), 0666)
+            _, hits, _ = self.collect(self.tops, indexdir=indexdir,
+                                      full=False)
+            self.failUnless(('ww', newfile) in hits)
+            self.failUnless(('ww', self.wwfile) in hits)
+        finally:
+            shutil.rmtree(indexdir)
+
+    def testOverrun(self):
+        overrun, hits, _ = self.collect(self.tops, limit=1, maxworkers=1)
+        self.failUnless(overrun)
+        self.failUnless(len([hit for hit in hits if hit[0] == 'ww']) <= 1)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from CommandHelper import getcommandcache
+from homeaudit import HomeAudit, HomeCheck
+
+
+def isdotfile(name):
+    return name.startswith('.')
+
+
+class zzzTestFrameworkhomeaudit(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.homes = []
+        for num in range(5):
+            home = os.path.join(self.tmpdir, 'user%d' % num)
+            os.mkdir(home)
+            for name in ['.bashrc', '.profile', 'notes.txt']:
+                open(os.path.join(home, name), 'w').close()
+            self.homes.append(home)
+        open(os.path.join(self.homes[0], '.netrc'), 'w').close()
+        os.chmod(self.homes[1], 0777)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testResults(self):
+        audit = HomeAudit()
+        missing = os.path.join(self.tmpdir, 'nobody')
+        audit.register(HomeCheck('dot', homes=self.homes, extra=[missing],
+                                 match=isdotfile))
+        audit.register(HomeCheck('bad', homes=self.homes,
+                                 paths=['.netrc', '.rhosts']))
+        results = audit.getresults('dot')
+        self.failUnlessEqual([result.home.path for result in results],
+                             self.homes + [missing])
+        self.failUnlessEqual(sorted(results[0].entries),
+                             ['.bashrc', '.netrc', '.profile'])
+        self.failUnlessEqual(results[1].stat.st_mode & 0777, 0777)
+        self.failUnless(results[-1].stat is None)
+        self.failUnless(results[-1].error)
+        bad = audit.getresults('bad')
+        self.failIf(bad[0].paths['.netrc'] is None)
+        self.failUnless(bad[0].paths['.rhosts'] is None)
+        self.failUnless(bad[1].paths['.netrc'] is None)
+        self.failUnlessEqual(bad[0].entries, {})
+
+    def testSharedPass(self):
+        audit = HomeAudit()
+        audit.register(HomeCheck('dot', homes=self.homes, match=isdotfile))
+        audit.register(HomeCheck('bad', homes=self.homes[:2],
+                                 paths=['.netrc']))
+        audit.getresults('dot')
+        self.failUnlessEqual(audit.getstats(), (5, 0))
+        audit.getresults('bad')
+        self.failUnlessEqual(audit.getstats(), (5, 0))
+        # A check registered later only visits for what is missing
+        audit.register(HomeCheck('kde', homes=self.homes[:1],
+                                 paths=['.kde']))
+        audit.getresults('kde')
+        self.failUnlessEqual(audit.getstats(), (6, 0))
+
+    def testInvalidate(self):
+        audit = HomeAudit()
+        audit.register(HomeCheck('bad', homes=self.homes, paths=['.rhosts']))
+        self.failUnless(audit.getresults('bad')[2].paths['.rhosts'] is None)
+        open(os.path.join(self.homes[2], '.rhosts'), 'w').close()
+        self.failUnless(audit.getresults('bad')[2].paths['.rhosts'] is None)
+        getcommandcache().invalidate()
+        self.failIf(audit.getresults('bad')[2].paths['.rhosts'] is None)
+
+    def testTimeout(self):
+        audit = HomeAudit(workers=2, timeout=1)
+        hung = threading.Event()
+        stuck = os.path.basename(self.homes[3])
+
+        def match(name):
+            # Only the stuck home holds its own name as an entry
+            if name == stuck + '.lock':
+                hung.wait(30)
+            return isdotfile(name)
+        open(os.path.join(self.homes[3], stuck + '.lock'), 'w').close()
+        audit.register(HomeCheck('dot', homes=self.homes, match=match))
+        start = time.time()
+        try:
+            results = audit.getresults('dot')
+        finally:
+            hung.set()
+            for thread in threading.enumerate():
+                if thread.name == 'HomeAudit':
+                    thread.join(5)
+        self.failUnless(time.time() - start < 10)
+        self.failUnlessEqual(results[3].error, 'timeout')
+        self.failUnlessEqual(results[3].entries, {})
+        for num in [0, 1, 2, 4]:
+            self.failUnless(results[num].error is None)
+            self.failUnless('.bashrc' in results[num].entries)
+        self.failUnlessEqual(audit.getstats(), (4, 1))
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
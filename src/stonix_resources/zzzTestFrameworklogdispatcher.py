@@ -29,11 +29,44 @@ Created on Sep 21, 2011
 @author: scmcleni
 '''
 import unittest
+import gzip
+import inspect
+import logging
+import os
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
 import logdispatcher
-from logdispatcher import LogDispatcher, LogPriority
+from logdispatcher import LogDispatcher, LogPriority, MessageData, \
+    repairreport, xmlReport
 import environment
 
 
+def makeentry(tag, detail):
+    entry = MessageData()
+    entry.Tag = tag
+    entry.Detail = detail
+    return entry
+
+
+def parsereport(tree):
+    '''
+    Same reading of the report as LogImporter/stonixImporter.py
+    ReportParser.parsereport, which can not be imported without MySQLdb.
+    '''
+    repdict = {}
+    findings = {}
+    for child in tree.getroot():
+        if child.tag == 'metadata':
+            for grandchild in child:
+                repdict[grandchild.tag] = grandchild.attrib['val']
+        if child.tag == 'findings':
+            for grandchild in child:
+                findings[grandchild.tag] = grandchild.attrib['val']
+    return [repdict, findings]
+
+
 class zzzTestFrameworklogdispatcher(unittest.TestCase):
 
     def setUp(self):
@@ -52,5 +85,156 @@ class zzzTestFrameworklogdispatcher(unittest.TestCase):
         except:
             self.fail("Failed to write ERROR to log file")
 
+    def testLazyArguments(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        root = logging.getLogger('')
+        root.addHandler(handler)
+        oldlevel = root.level
+        root.setLevel(logging.DEBUG)
+        try:
+            self.logger.log(self.priority.DEBUG, ['Tag', 'count %d of %s'],
+                            3, 'five')
+        finally:
+            root.removeHandler(handler)
+            root.setLevel(oldlevel)
+        message = records[-1].getMessage()
+        self.failUnless(message.startswith('DEBUG:' + __name__ +
+                                           ':testLazyArguments('), message)
+        self.failUnless(message.endswith('Tag:count 3 of five'), message)
+
+    def testDiscardedNotFormatted(self):
+        root = logging.getLogger('')
+        oldlevel = root.level
+        root.setLevel(logging.WARNING)
+        try:
+            # A bad format would raise if the message were formatted
+            self.logger.log(self.priority.DEBUG, 'unformattable %d', 'x')
+        finally:
+            root.setLevel(oldlevel)
+
+    def testBenchmark(self):
+        count = 20000
+        root = logging.getLogger('')
+        oldlevel = root.level
+        root.setLevel(logging.WARNING)
+        try:
+            start = time.time()
+            for num in xrange(count):
+                self.logger.log(self.priority.DEBUG,
+                                ['Benchmark', 'message %d'], num)
+            discarded = count / (time.time() - start)
+        finally:
+            root.setLevel(oldlevel)
+        # What every call used to pay before doing anything else
+        start = time.time()
+        for num in xrange(count / 20):
+            stack1 = inspect.stack()[1]
+            inspect.getmodule(stack1[0])
+        introspection = (count / 20) / (time.time() - start)
+        print '\nDiscarded DEBUG messages: %d/s, previous caller ' \
+            'introspection alone: %d/s' % (discarded, introspection)
+
+class zzzTestFrameworkxmlReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'stonix-xmlreport.xml')
+        self.syncentries = logdispatcher.SYNCENTRIES
+
+    def tearDown(self):
+        logdispatcher.SYNCENTRIES = self.syncentries
+        shutil.rmtree(self.tmpdir)
+
+    def writerun(self, report):
+        report.writeMetadata(makeentry('Hostname', 'host.example.com'))
+        report.writeMetadata(makeentry('OS', 'Red Hat 7.2'))
+        report.writeFinding(makeentry('SecureSSH', 'SecureSSH is compliant'))
+        report.writeFinding(makeentry('MinimizeServices',
+                                      'Non compliant: a & b < c > "d"\n' +
+                                      'second line\tand\x01 more'))
+        report.writeMetadata(makeentry('RuleCount', '2'))
+
+    def checkrun(self, tree):
+        metadata, findings = parsereport(tree)
+        self.failUnlessEqual(metadata, {'Hostname': 'host.example.com',
+                                        'OS': 'Red Hat 7.2',
+                                        'RuleCount': '2'})
+        self.failUnlessEqual(findings['SecureSSH'], 'SecureSSH is compliant')
+        self.failUnlessEqual(findings['MinimizeServices'],
+                             'Non compliant: a & b < c > "d"\n' +
+                             'second line\tand more')
+
+    def testStreamed(self):
+        logdispatcher.SYNCENTRIES = 1
+        report = xmlReport(self.path)
+        self.failIf(os.path.exists(self.path))
+        self.writerun(report)
+        # Everything logged so far is on disk before the report is closed
+        self.failUnless('RuleCount' in open(self.path).read())
+        report.closeReport()
+        self.checkrun(ET.parse(self.path))
+        # Closing twice must not damage the report
+        report.closeReport()
+        self.checkrun(ET.parse(self.path))
+
+    def testEmptyReport(self):
+        report = xmlReport(self.path)
+        report.closeReport()
+        metadata, findings = parsereport(ET.parse(self.path))
+        self.failUnlessEqual((metadata, findings), ({}, {}))
+        root = ET.parse(self.path).getroot()
+        self.failUnlessEqual([child.tag for child in root],
+                             ['metadata', 'findings'])
+
+    def testNonAscii(self):
+        report = xmlReport(self.path)
+        report.writeFinding(makeentry('Rule', 'caf\xc3\xa9 \xff'))
+        report.writeFinding(makeentry('Other', u'caf\xe9'))
+        report.closeReport()
+        findings = parsereport(ET.parse(self.path))[1]
+        self.failUnlessEqual(findings['Rule'], u'caf\xe9 \ufffd')
+        self.failUnlessEqual(findings['Other'], u'caf\xe9')
+
+    def testCompressed(self):
+        report = xmlReport(self.path, compress=True)
+        self.writerun(report)
+        report.closeReport()
+        self.failUnlessEqual(open(self.path, 'rb').read(2), '\x1f\x8b')
+        self.checkrun(ET.parse(gzip.open(self.path)))
+
+    def crash(self, compress):
+        logdispatcher.SYNCENTRIES = 1
+        report = xmlReport(self.path, compress=compress)
+        self.writerun(report)
+        # Leave the report the way a killed process would
+        report.rawhandle.close()
+        report.closed = True
+        return report
+
+    def testRepair(self):
+        self.crash(False)
+        self.failUnlessRaises(ET.ParseError, ET.parse, self.path)
+        self.failUnless(repairreport(self.path))
+        self.checkrun(ET.parse(self.path))
+        self.failIf(repairreport(self.path))
+
+    def testRepairCompressed(self):
+        self.crash(True)
+        self.failUnless(repairreport(self.path))
+        self.checkrun(ET.parse(gzip.open(self.path)))
+
+    def testRepairTruncated(self):
+        self.crash(False)
+        data = open(self.path).read()
+        whandle = open(self.path, 'w')
+        whandle.write(data[:data.index('RuleCount') + 5])
+        whandle.close()
+        self.failUnless(repairreport(self.path))
+        metadata, findings = parsereport(ET.parse(self.path))
+        self.failIf('RuleCount' in metadata)
+        self.failUnlessEqual(len(findings), 2)
+
 if __name__ == "__main__":
     unittest.main()
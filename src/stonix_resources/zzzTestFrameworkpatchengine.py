@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+
+@author: dkennel
+'''
+import unittest
+from patchengine import applypatch, makepatch, parsepatch, PatchError
+
+ORIGINAL = ['# test configuration\n'] + \
+    ['key%d = value%d\n' % (num, num) for num in range(1, 41)]
+# Shares that differ only in their first two lines, so that a hunk in one
+# of them matches any other once its first context line is left out
+SHARES = []
+for share in range(1, 7):
+    SHARES.extend(['[share%d]\n' % share, 'path = /srv/%d\n' % share,
+                   'comment = share\n', 'browseable = yes\n',
+                   'read only = yes\n', 'guest ok = no\n',
+                   'create mask = 0644\n', 'directory mask = 0755\n',
+                   'valid users = @staff\n', 'writable = no\n'])
+
+
+def revert(lines, patch, fuzz=2):
+    return applypatch(lines, parsepatch(patch), 'test.conf', '0001', fuzz)
+
+
+class zzzTestFrameworkpatchengine(unittest.TestCase):
+
+    def setUp(self):
+        self.changed = list(ORIGINAL)
+        self.changed[5] = 'key5 = changed\n'
+        self.changed[30:32] = ['key30 = changed\n', 'key40b = added\n']
+        self.changed.append('key41 = True\n')
+        self.patch = makepatch(self.changed, ORIGINAL, 'new', 'old')
+
+    def testRoundTrip(self):
+        lines, applied, conflicts = revert(self.changed, self.patch)
+        self.failUnlessEqual(lines, ORIGINAL)
+        self.failUnlessEqual(applied, 3)
+        self.failIf(conflicts)
+
+    def testOffset(self):
+        # Lines added above the changes by an administrator are kept
+        edited = ['# local\n', '# edits\n'] + self.changed
+        lines, _, conflicts = revert(edited, self.patch)
+        self.failIf(conflicts)
+        self.failUnlessEqual(lines, ['# local\n', '# edits\n'] + ORIGINAL)
+
+    def testFuzz(self):
+        edited = list(self.changed)
+        edited[3] = 'key3 = edited\n'
+        lines, _, conflicts = revert(edited, self.patch, 0)
+        self.failUnlessEqual(len(conflicts), 1)
+        lines, _, conflicts = revert(edited, self.patch)
+        self.failIf(conflicts)
+        expected = list(ORIGINAL)
+        expected[3] = 'key3 = edited\n'
+        self.failUnlessEqual(lines, expected)
+
+    def testConflict(self):
+        edited = list(self.changed)
+        edited[5] = 'key5 = edited again\n'
+        lines, applied, conflicts = revert(edited, self.patch)
+        self.failUnlessEqual(applied, 2)
+        self.failUnlessEqual(len(conflicts), 1)
+        conflict = conflicts[0]
+        self.failUnlessEqual((conflict.path, conflict.eventid, conflict.hunk),
+                             ('test.conf', '0001', 1))
+        self.failUnless('key5 = changed\n' in conflict.expected)
+        self.failUnless('test.conf' in str(conflict))
+        # The hunks that could be applied were
+        self.failUnlessEqual(lines[30], ORIGINAL[30])
+        self.failUnlessEqual(lines[5], 'key5 = edited again\n')
+
+    def testAlreadyApplied(self):
+        lines, applied, conflicts = revert(ORIGINAL, self.patch)
+        self.failUnlessEqual(lines, ORIGINAL)
+        self.failUnlessEqual(applied, 0)
+        self.failIf(conflicts)
+
+    def testAlreadyUndoneRepeated(self):
+        changed = list(SHARES)
+        changed[25] = 'guest ok = yes\n'
+        patch = makepatch(changed, SHARES, 'new', 'old')
+        # An edit next to the change blocks the hunk at every fuzz level.
+        # The unchanged stanzas around it hold the undone lines but do not
+        # make the hunk count as undone.
+        edited = list(changed)
+        edited[24] = 'read only = no\n'
+        lines, applied, conflicts = revert(edited, patch)
+        self.failUnlessEqual(lines, edited)
+        self.failUnlessEqual(applied, 0)
+        self.failUnlessEqual(len(conflicts), 1)
+        # An edit at the end of the context is fuzzed over
+        edited = list(changed)
+        edited[22] = 'comment = edited\n'
+        lines, applied, conflicts = revert(edited, patch)
+        self.failIf(conflicts)
+        self.failUnlessEqual(applied, 1)
+        expected = list(SHARES)
+        expected[22] = 'comment = edited\n'
+        self.failUnlessEqual(lines, expected)
+        # Undone where it was expected, or a few lines away
+        lines, applied, conflicts = revert(SHARES, patch)
+        self.failUnlessEqual((lines, applied, conflicts), (SHARES, 0, []))
+        moved = ['# local\n', '# edits\n'] + SHARES
+        lines, applied, conflicts = revert(moved, patch)
+        self.failUnlessEqual((lines, applied, conflicts), (moved, 0, []))
+
+    def testNoNewlineAtEnd(self):
+        changed = ['one\n', 'two\n', 'three']
+        original = ['one\n', 'two\n', 'three\n', 'four']
+        patch = makepatch(changed, original, 'new', 'old')
+        self.failUnless('No newline at end of file' in patch)
+        lines, _, conflicts = revert(changed, patch)
+        self.failIf(conflicts)
+        self.failUnlessEqual(lines, original)
+
+    def testBadPatch(self):
+        self.failUnlessRaises(PatchError, parsepatch,
+                              '--- a\n+++ b\n@@ -1,3 +1,3 @@\n one\n')
+
+    def testSeveralEvents(self):
+        # Each change is recorded against the result of the one before and
+        # they are reverted newest first on the same lines.
+        stages = [ORIGINAL, list(ORIGINAL), None]
+        stages[1][10] = 'key10 = first\n'
+        stages[2] = list(stages[1])
+        stages[2][10] = 'key10 = second\n'
+        stages[2].insert(0, '# managed\n')
+        patches = [makepatch(stages[num + 1], stages[num], 'new', 'old')
+                   for num in range(2)]
+        lines = stages[2]
+        for patch in reversed(patches):
+            lines, _, conflicts = revert(lines, patch)
+            self.failIf(conflicts)
+        self.failUnlessEqual(lines, ORIGINAL)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
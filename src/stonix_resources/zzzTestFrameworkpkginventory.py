@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import os
+import pkginventory
+from pkginventory import PackageInventory, parsedpkg, parserpm
+from testing.logdispatcher_mock import LogDispatcher
+
+RPMOUTPUT = ['bash\t4.1.2\t48.el6\tx86_64\n',
+             'gpg-pubkey\tc105b9de\t4e0fd3a3\t(none)\n',
+             'glibc\t2.12\t1.192.el6\ti686\n',
+             'glibc\t2.12\t1.192.el6\tx86_64\n']
+
+DPKGOUTPUT = ['bash\t4.3-14ubuntu1\tamd64\tinstall ok installed\n',
+              'ntp\t1:4.2.8p4\tamd64\tdeinstall ok config-files\n',
+              'vlock\t2.2.2-5\tamd64\thold ok installed\n',
+              'libc6\t2.23-0ubuntu3\ti386\tinstall ok installed\n']
+
+
+class zzzTestFrameworkpkginventory(unittest.TestCase):
+
+    def getinventory(self, manager, output):
+        inventory = PackageInventory(LogDispatcher(), manager)
+        inventory.packages = pkginventory.PARSERS[manager](output)
+        return inventory
+
+    def testParseRpm(self):
+        packages = parserpm(RPMOUTPUT)
+        for query in ['bash', 'bash-4.1.2', 'bash-4.1.2-48.el6',
+                      'bash.x86_64', 'bash-4.1.2-48.el6.x86_64', 'glibc.i686',
+                      'gpg-pubkey']:
+            self.failUnless(query in packages, query)
+        self.failIf('gpg-pubkey.(none)' in packages)
+        self.failIf('bash.i686' in packages)
+
+    def testParseDpkg(self):
+        packages = parsedpkg(DPKGOUTPUT)
+        self.failUnless('bash' in packages)
+        self.failUnless('libc6:i386' in packages)
+        # Removed with configuration left behind or held is not "ii"
+        self.failIf('ntp' in packages)
+        self.failIf('vlock' in packages)
+
+    def testCheck(self):
+        inventory = self.getinventory('yum', RPMOUTPUT)
+        self.failUnless(inventory.check('bash'))
+        self.failUnless(inventory.check(' glibc '))
+        self.failIf(inventory.check('aide'))
+        # Globs and lists are left to the package manager
+        self.failUnlessEqual(inventory.check('glib*'), None)
+        self.failUnlessEqual(inventory.check('bash glibc'), None)
+
+    def testUnsupported(self):
+        inventory = PackageInventory(LogDispatcher(), 'portage')
+        self.failIf(inventory.issupported())
+        self.failUnlessEqual(inventory.check('bash'), None)
+        self.failUnlessEqual(inventory.getloads(), 0)
+
+    def testInstallRemove(self):
+        inventory = self.getinventory('yum', RPMOUTPUT)
+        # Make the reload fail so that the in memory updates are used
+        pkginventory.QUERIES['yum'] = ['/nonexistent/rpm']
+        try:
+            inventory.added('aide')
+            self.failUnless(inventory.check('aide'))
+            inventory.removed('glibc')
+            self.failIf(inventory.check('glibc'))
+            self.failIf(inventory.check('glibc.i686'))
+            self.failUnless(inventory.check('bash'))
+        finally:
+            pkginventory.QUERIES['yum'] = pkginventory.RPMQUERY
+
+    def testShared(self):
+        first = pkginventory.getinventory(LogDispatcher(), 'apt-get')
+        second = pkginventory.getinventory(LogDispatcher(), 'apt-get')
+        self.failUnless(first is second)
+
+    def testLoadDpkg(self):
+        if not os.path.exists(pkginventory.DPKGQUERY[0]):
+            return
+        inventory = PackageInventory(LogDispatcher(), 'apt-get')
+        self.failUnless(inventory.check('dpkg'))
+        self.failIf(inventory.check('no-such-package-stonix'))
+        self.failUnlessEqual(inventory.getloads(), 1)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,289 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+
+The tests run KVADefault through KVEditorStonix against fixture plist files
+so that they work where there is no defaults command.
+
+@author: dkennel
+'''
+import unittest
+import os
+import plistlib
+import shutil
+import tempfile
+import threading
+from KVEditorStonix import KVEditorStonix
+from plistdomain import DELETE, PlistDomains, formatdefaults, \
+    getplistdomains, parsewriteargs, shellcommand
+from ruleKVEditor import RuleKVEditor
+from testing.logdispatcher_mock import LogDispatcher
+
+
+class FakeStateChgLogger(object):
+
+    def __init__(self):
+        self.events = {}
+
+    def recordchgevent(self, eventid, event):
+        self.events[eventid] = event
+
+
+class FakeConfig(object):
+
+    def getconfvalue(self, rulename, key):
+        raise KeyError(key)
+
+    def getusercomment(self, rulename, key):
+        raise KeyError(key)
+
+
+class FakeEnvironment(object):
+
+    def geteuid(self):
+        return 1000
+
+
+class IdleTimeRule(RuleKVEditor):
+    '''
+    Sets idleTime and records what afterfix finds in the plist file.
+    '''
+
+    def __init__(self, domain, logger):
+        RuleKVEditor.__init__(self, FakeConfig(), FakeEnvironment(), logger,
+                              FakeStateChgLogger())
+        self.rulenumber = 999
+        self.rulename = 'IdleTimeRule'
+        self.domain = domain
+        self.seen = []
+        self.addKVEditor('IdleTime', 'defaults', domain, '',
+                         {'idleTime': ['^300\n', '-int 300']}, 'present', '',
+                         'Set the idle time.', None, False, {})
+
+    def afterfix(self):
+        self.seen.append(plistlib.readPlist(self.domain +
+                                            '.plist')['idleTime'])
+        return True
+
+
+class zzzTestFrameworkplistdomain(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.domain = os.path.join(self.tmpdir, 'com.apple.screensaver')
+        self.path = self.domain + '.plist'
+        plistlib.writePlist({'askForPassword': 0,
+                             'askForPasswordDelay': 5.0,
+                             'idleTime': 600,
+                             'moduleName': 'Flurry',
+                             'enabled': True,
+                             'hosts': ['alpha', 'beta gamma'],
+                             'empty': []}, self.path)
+        self.logger = LogDispatcher()
+        self.stchlgr = FakeStateChgLogger()
+        self.domains = getplistdomains(self.logger)
+        self.domains.invalidate()
+        self.defaults = self.domains.defaults
+        self.reads, self.writes = self.domains.getstats()
+
+    def tearDown(self):
+        self.domains.defaults = self.defaults
+        self.domains.invalidate()
+        shutil.rmtree(self.tmpdir)
+
+    def editor(self, data, eventid='0001'):
+        kve = KVEditorStonix(self.stchlgr, self.logger, 'defaults',
+                             self.domain, '', data)
+        kve.editor.currentHost = False
+        kve.setEventID(eventid)
+        return kve
+
+    def testFormat(self):
+        self.failUnlessEqual(formatdefaults(True), '1\n')
+        self.failUnlessEqual(formatdefaults(600), '600\n')
+        self.failUnlessEqual(formatdefaults(0.5), '0.5\n')
+        self.failUnlessEqual(formatdefaults('Flurry'), 'Flurry\n')
+        self.failUnlessEqual(formatdefaults([]), '(\n)\n')
+        self.failUnlessEqual(formatdefaults(['alpha', 'beta gamma']),
+                             '(\n    alpha,\n    "beta gamma"\n)\n')
+        self.failUnlessEqual(formatdefaults({'b': 1, 'a': {'c': 'x y'}}),
+                             '{\n    a =     {\n        c = "x y";\n' +
+                             '    };\n    b = 1;\n}\n')
+
+    def testWriteArgs(self):
+        self.failUnlessEqual(parsewriteargs('-int 1'), 1)
+        self.failUnlessEqual(parsewriteargs('-bool yes'), True)
+        self.failUnlessEqual(parsewriteargs('-float 0.5'), 0.5)
+        self.failUnlessEqual(parsewriteargs('-string "Disable All"'),
+                             'Disable All')
+        self.failUnlessEqual(parsewriteargs('plain'), 'plain')
+        self.failUnlessEqual(parsewriteargs('-array -string a -int 2'),
+                             ['a', 2])
+        self.failUnlessEqual(parsewriteargs('-dict on -bool no'),
+                             {'on': False})
+        for args in ['-array-add a', '-date 2016-10-18', '-int',
+                     '\'{"key1" = 1;}\'', '-int 1 2']:
+            self.failUnlessRaises(ValueError, parsewriteargs, args)
+
+    def testValidate(self):
+        self.failUnless(self.editor({'askForPasswordDelay':
+                                     ['5', '-int 5']}).report())
+        self.failIf(self.editor({'askForPassword':
+                                 ['1', '-int 1']}).report())
+        self.failUnless(self.editor({'missing': ['1', None]}).report())
+        # As with defaults read a key that should not exist is compliant
+        # if its value matches
+        self.failUnless(self.editor({'idleTime': ['600', None]}).report())
+        self.failIf(self.editor({'idleTime': ['^1\n', None]}).report())
+        self.failIf(self.editor({'missing': ['1', '-int 1']}).report())
+        # IGNORECASE is not a flag CommandHelper.findInOutput applies
+        self.failIf(self.editor({'hosts': ['BETA GAMMA', None,
+                                           'IGNORECASE']}).report())
+        self.failUnless(self.editor({'empty': ['\\(\n\\)\n',
+                                               '-array']}).report())
+        # Every key is checked, not just the first
+        self.failIf(self.editor({'idleTime': ['600', '-int 600'],
+                                 'moduleName': ['Computer Name',
+                                                '-string Flurry']}).report())
+        self.failUnlessEqual(self.domains.getstats()[0] - self.reads, 1)
+
+    def testFix(self):
+        kve = self.editor({'askForPassword': ['1', '-int 1']})
+        self.failIf(kve.report())
+        self.failUnless(kve.fix())
+        self.failUnless(kve.commit())
+        self.failUnlessEqual(plistlib.readPlist(self.path)['askForPassword'],
+                             1)
+        self.failUnless(self.editor({'askForPassword':
+                                     ['1', '-int 1']}).report())
+        event = self.stchlgr.events['0001']
+        self.failUnlessEqual(event['eventtype'], 'comm')
+        self.failUnlessEqual(event['command'][1:],
+                             ['write', self.domain, 'askForPassword',
+                              '-int', '0'])
+        kve = self.editor({'idleTime': ['^1\n', None],
+                           'moduleName': ['Random', '-string Random']},
+                          '0002')
+        self.failUnless(kve.fix())
+        self.failUnless(kve.commit())
+        values = plistlib.readPlist(self.path)
+        self.failIf('idleTime' in values)
+        self.failUnlessEqual(values['moduleName'], 'Random')
+        self.failUnlessEqual(self.stchlgr.events['0002']['eventtype'],
+                             'commandstring')
+
+    def testNothingToFix(self):
+        kve = self.editor({'idleTime': ['600', '-int 600']})
+        self.failUnless(kve.fix())
+        self.failUnless(kve.commit())
+        self.failUnlessEqual(self.stchlgr.events, {})
+        self.failUnlessEqual(self.domains.getstats()[1], self.writes)
+
+    def testUnsupportedFallsBack(self):
+        kve = self.editor({'askForPassword': ['1', '-array-add 1']})
+        self.failUnless(kve.editor.updateNative() is None)
+
+    def testBatch(self):
+        with self.domains.batch():
+            for num, key in enumerate(['askForPassword', 'idleTime',
+                                       'moduleName']):
+                kve = self.editor({key: ['^7\n', '-int 7']}, str(num))
+                self.failUnless(kve.fix())
+                self.failUnless(kve.commit())
+                # Staged changes are seen before they are written
+                self.failUnless(kve.report())
+            self.failUnlessEqual(plistlib.readPlist(self.path)['idleTime'],
+                                 600)
+        values = plistlib.readPlist(self.path)
+        self.failUnlessEqual([values['askForPassword'], values['idleTime'],
+                              values['moduleName']], [7, 7, 7])
+        self.failUnlessEqual(self.domains.getstats()[1] - self.writes, 1)
+
+    def testBatchPerThread(self):
+        # A batch another thread has open does not hold back writes
+        opened = threading.Event()
+        done = threading.Event()
+
+        def other():
+            with self.domains.batch():
+                opened.set()
+                done.wait(10)
+        thread = threading.Thread(target=other)
+        thread.start()
+        try:
+            opened.wait(10)
+            self.failUnless(self.domains.setvalues(self.domain, False,
+                                                   {'idleTime': 5}))
+            self.failUnlessEqual(
+                plistlib.readPlist(self.path)['idleTime'], 5)
+        finally:
+            done.set()
+            thread.join()
+
+    def testRuleWritesBeforeAfterfix(self):
+        rule = IdleTimeRule(self.domain, self.logger)
+        self.failIf(rule.report())
+        self.failUnless(rule.fix())
+        self.failUnlessEqual(rule.seen, [300])
+        self.failUnless(rule.report())
+
+    def testRuleWriteFailureFailsFix(self):
+        # A defaults command that fails every import
+        self.domains.defaults = os.path.join(self.tmpdir, 'defaults')
+        handle = open(self.domains.defaults, 'w')
+        handle.write('#!/bin/sh\nexit 1\n')
+        handle.close()
+        os.chmod(self.domains.defaults, 0755)
+        rule = IdleTimeRule(self.domain, self.logger)
+        self.failIf(rule.report())
+        self.failIf(rule.fix())
+        self.failIf(rule.seen)
+        self.failUnless('domains failed' in rule.detailedresults)
+        self.failUnlessEqual(plistlib.readPlist(self.path)['idleTime'], 600)
+
+    def testKeepsMode(self):
+        os.chmod(self.path, 0600)
+        domains = PlistDomains(self.logger, os.path.join(self.tmpdir,
+                                                         'nodefaults'))
+        self.failUnless(domains.setvalues(self.domain, False,
+                                          {'askForPassword': DELETE}))
+        self.failUnlessEqual(os.stat(self.path).st_mode & 0777, 0600)
+        self.failIf('askForPassword' in plistlib.readPlist(self.path))
+        # A domain given by name can not be written without defaults
+        self.failIf(domains.setvalues('com.apple.screensaver', False,
+                                      {'idleTime': 1}))
+
+    def testShellCommand(self):
+        self.failUnlessEqual(shellcommand([['defaults', 'write', 'a b',
+                                            'k', '-int', '1'],
+                                           ['defaults', 'delete', 'a', 'k']]),
+                             "defaults write 'a b' k -int 1; " +
+                             "defaults delete a k")
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
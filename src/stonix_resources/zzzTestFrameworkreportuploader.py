@@ -0,0 +1,245 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+The tests upload to a local HTTPS stand-in for LogImporter/results.php on a
+free port, using a self signed certificate made with the openssl command.
+
+@author: dkennel
+'''
+import unittest
+import BaseHTTPServer
+import cgi
+import gzip
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from StringIO import StringIO
+from logdispatcher import MessageData, xmlReport
+from reportuploader import ReportUploader
+
+
+class UploadHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Answers like results.php and checks that the upload is a readable
+    compressed report.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.server.connections = self.server.connections + 1
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length']))
+        if self.server.drop > 0:
+            # Hang up without answering
+            self.server.drop = self.server.drop - 1
+            self.close_connection = 1
+            return
+        form = cgi.FieldStorage(fp=StringIO(body), headers=self.headers,
+                                environ={'REQUEST_METHOD': 'POST'})
+        try:
+            data = gzip.GzipFile(fileobj=StringIO(form['file'].value)).read()
+            root = ET.fromstring(data)
+            metadata = dict([(entry.tag, entry.attrib['val']) for section
+                             in root.findall('metadata') for entry in
+                             section])
+        except Exception:
+            metadata = None
+        if metadata is None or self.server.reject:
+            answer = '4\n'
+        else:
+            self.server.uploads.append(metadata)
+            answer = 'ok results/127.0.0.1-%d.xml\n' % len(self.server.uploads)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, *args):
+        pass
+
+
+class UploadStandIn(BaseHTTPServer.HTTPServer):
+    '''
+    Local HTTPS report server recording what it receives.
+    '''
+
+    def __init__(self, certfile):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           UploadHandler)
+        self.socket = ssl.wrap_socket(self.socket, certfile=certfile,
+                                      server_side=True)
+        self.port = self.socket.getsockname()[1]
+        self.uploads = []
+        self.connections = 0
+        self.drop = 0
+        self.reject = False
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up on kept alive connections are expected
+        pass
+
+
+class zzzTestFrameworkreportuploader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.certdir = tempfile.mkdtemp()
+        cls.certfile = os.path.join(cls.certdir, 'localhost.pem')
+        try:
+            subprocess.check_call(['openssl', 'req', '-x509', '-nodes',
+                                   '-newkey', 'rsa:2048', '-days', '1',
+                                   '-subj', '/CN=localhost',
+                                   '-keyout', cls.certfile,
+                                   '-out', cls.certfile],
+                                  stdout=open(os.devnull, 'w'),
+                                  stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            cls.certfile = None
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.certdir)
+
+    def setUp(self):
+        if self.certfile is None:
+            self.skipTest('openssl is not available')
+        self.tmpdir = tempfile.mkdtemp()
+        self.spooldir = os.path.join(self.tmpdir, 'spool')
+        self.server = UploadStandIn(self.certfile)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def makereport(self, hostname):
+        path = os.path.join(self.tmpdir, 'stonix-xmlreport.xml')
+        report = xmlReport(path)
+        entry = MessageData()
+        entry.Tag = 'Hostname'
+        entry.Detail = hostname
+        report.writeMetadata(entry)
+        report.closeReport()
+        return path
+
+    def getuploader(self, **kwargs):
+        kwargs.setdefault('cafile', self.certfile)
+        kwargs.setdefault('backoff', 0.1)
+        return ReportUploader('localhost', self.spooldir,
+                              port=self.server.port, **kwargs)
+
+    def testUpload(self):
+        uploader = self.getuploader()
+        report = self.makereport('host1')
+        self.failUnless(uploader.enqueue(report))
+        self.failUnless(os.path.exists(report))
+        self.failUnlessEqual(uploader.drain(), 0, uploader.errors)
+        self.failUnlessEqual(self.server.uploads, [{'Hostname': 'host1'}])
+        self.failUnlessEqual(uploader.getspooled(), [])
+
+    def testUnverified(self):
+        # Without a cafile the certificate is not checked, like curl -k
+        uploader = self.getuploader(cafile=None)
+        uploader.enqueue(self.makereport('host1'))
+        self.failUnlessEqual(uploader.drain(), 0, uploader.errors)
+
+    def testConnectionReused(self):
+        uploader = self.getuploader()
+        for num in range(5):
+            uploader.enqueue(self.makereport('host%d' % num))
+        self.failUnlessEqual(uploader.drain(), 0, uploader.errors)
+        self.failUnlessEqual(self.server.uploads,
+                             [{'Hostname': 'host%d' % num}
+                              for num in range(5)])
+        self.failUnlessEqual(self.server.connections, 1)
+
+    def testBackoff(self):
+        self.server.drop = 2
+        uploader = self.getuploader()
+        uploader.enqueue(self.makereport('host1'))
+        start = time.time()
+        self.failUnlessEqual(uploader.drain(), 0, uploader.errors)
+        self.failUnless(time.time() - start >= 0.3)
+        self.failUnlessEqual(len(uploader.errors), 2)
+        self.failUnlessEqual(len(self.server.uploads), 1)
+
+    def testSpooledForNextRun(self):
+        self.server.drop = 3
+        uploader = self.getuploader()
+        uploader.enqueue(self.makereport('host1'))
+        uploader.enqueue(self.makereport('host2'))
+        # Out of retries on the first report, the second is not tried
+        self.failUnlessEqual(uploader.drain(), 2)
+        self.failUnlessEqual(self.server.uploads, [])
+        uploader = self.getuploader()
+        uploader.enqueue(self.makereport('host3'))
+        self.failUnlessEqual(uploader.drain(), 0, uploader.errors)
+        self.failUnlessEqual(self.server.uploads,
+                             [{'Hostname': 'host1'}, {'Hostname': 'host2'},
+                              {'Hostname': 'host3'}])
+
+    def testRejected(self):
+        self.server.reject = True
+        uploader = self.getuploader()
+        uploader.enqueue(self.makereport('host1'))
+        uploader.enqueue(self.makereport('host2'))
+        self.failUnlessEqual(uploader.drain(), 2)
+        # An answer is not retried but the next report is still tried
+        self.failUnlessEqual(len(uploader.errors), 2)
+        self.failUnless('rejected' in uploader.errors[0])
+
+    def testUnresolvable(self):
+        uploader = ReportUploader('report.invalid', self.spooldir,
+                                  backoff=5)
+        uploader.enqueue(self.makereport('host1'))
+        start = time.time()
+        self.failUnlessEqual(uploader.drain(), 1)
+        self.failUnless(time.time() - start < 5)
+
+    def testBadCertificate(self):
+        uploader = ReportUploader('127.0.0.1', self.spooldir,
+                                  port=self.server.port, backoff=5,
+                                  cafile=self.certfile)
+        uploader.enqueue(self.makereport('host1'))
+        start = time.time()
+        self.failUnlessEqual(uploader.drain(), 1)
+        self.failUnless(time.time() - start < 5)
+        self.failUnlessEqual(self.server.uploads, [])
+
+if __name__ == "__main__":
+    unittest.main()
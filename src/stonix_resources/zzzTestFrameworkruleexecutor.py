@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import time
+from ruleexecutor import RuleExecutor
+from testing.logdispatcher_mock import LogDispatcher
+
+
+class FakeRule(object):
+    '''
+    Minimal stand in for a rule that records when it ran.
+    '''
+
+    def __init__(self, num, parallelsafe, resources, delay=0.1,
+                 parallelreport=False):
+        self.rulenumber = num
+        self.parallelsafe = parallelsafe
+        self.parallelreport = parallelreport
+        self.touchedresources = resources
+        self.delay = delay
+        self.start = None
+        self.end = None
+
+    def getrulenum(self):
+        return self.rulenumber
+
+    def getrulename(self):
+        return 'FakeRule' + str(self.rulenumber)
+
+    def isparallelsafe(self):
+        return self.parallelsafe
+
+    def isparallelreport(self):
+        return self.parallelsafe or self.parallelreport
+
+    def gettouchedresources(self):
+        return self.touchedresources
+
+    def report(self):
+        self.start = time.time()
+        time.sleep(self.delay)
+        self.end = time.time()
+
+
+def overlaps(first, second):
+    return first.start < second.end and second.start < first.end
+
+
+class zzzTestFrameworkruleexecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = LogDispatcher()
+        self.order = []
+
+    def tearDown(self):
+        pass
+
+    def completed(self, rule):
+        self.order.append(rule.getrulenum())
+
+    def testInvalidJobs(self):
+        self.assertRaises(ValueError, RuleExecutor, self.logger, 0)
+        self.assertRaises(TypeError, RuleExecutor, self.logger, '2')
+
+    def testOrderedCompletion(self):
+        # Later rules finish first but must be delivered in order
+        rules = [FakeRule(1, True, [], 0.3), FakeRule(2, True, [], 0.2),
+                 FakeRule(3, True, [], 0.1), FakeRule(4, True, [], 0.0)]
+        executor = RuleExecutor(self.logger, 4)
+        executor.run(rules, lambda rule: rule.report(), self.completed)
+        self.failUnlessEqual(self.order, [1, 2, 3, 4])
+        self.failUnless(overlaps(rules[0], rules[3]),
+                        'Parallel safe rules did not run concurrently')
+
+    def testConflictingResourcesSerialized(self):
+        rules = [FakeRule(1, True, ['/etc/passwd']),
+                 FakeRule(2, True, ['/etc/passwd', '/etc/group']),
+                 FakeRule(3, True, ['/etc/fstab'])]
+        executor = RuleExecutor(self.logger, 3)
+        executor.run(rules, lambda rule: rule.report(), self.completed)
+        self.failIf(overlaps(rules[0], rules[1]),
+                    'Rules sharing a resource ran concurrently')
+        self.failUnlessEqual(self.order, [1, 2, 3])
+
+    def testUnsafeRuleRunsAlone(self):
+        rules = [FakeRule(1, True, []), FakeRule(2, False, []),
+                 FakeRule(3, True, [])]
+        executor = RuleExecutor(self.logger, 3)
+        executor.run(rules, lambda rule: rule.report(), self.completed)
+        self.failIf(overlaps(rules[0], rules[1]))
+        self.failIf(overlaps(rules[1], rules[2]))
+        self.failUnlessEqual(self.order, [1, 2, 3])
+
+    def testParallelReport(self):
+        # Only the report of rule 2 may run concurrently
+        rules = [FakeRule(1, True, []),
+                 FakeRule(2, False, ['/var/local/info'],
+                          parallelreport=True),
+                 FakeRule(3, True, [])]
+        executor = RuleExecutor(self.logger, 3)
+        executor.run(rules, lambda rule: rule.report(), self.completed)
+        self.failIf(overlaps(rules[0], rules[1]))
+        self.failIf(overlaps(rules[1], rules[2]))
+        executor.run(rules, lambda rule: rule.report(), self.completed,
+                     reportonly=True)
+        self.failUnless(overlaps(rules[0], rules[1]))
+        self.failUnless(overlaps(rules[1], rules[2]))
+        self.failUnlessEqual(self.order, [1, 2, 3, 1, 2, 3])
+
+    def testRuleDeathIsContained(self):
+        def action(rule):
+            if rule.getrulenum() == 2:
+                raise RuntimeError('rule death')
+            rule.report()
+        rules = [FakeRule(1, True, [], 0), FakeRule(2, True, [], 0),
+                 FakeRule(3, True, [], 0)]
+        executor = RuleExecutor(self.logger, 2)
+        executor.run(rules, action, self.completed)
+        self.failUnlessEqual(self.order, [1, 2, 3])
+        self.failUnlessEqual(len(self.logger.messages), 1)
+
+    def testStop(self):
+        rules = [FakeRule(1, False, [], 0), FakeRule(2, False, [], 0),
+                 FakeRule(3, False, [], 0)]
+        executor = RuleExecutor(self.logger, 2)
+
+        def completed(rule):
+            self.completed(rule)
+            executor.stop()
+        executor.run(rules, lambda rule: rule.report(), completed)
+        self.failUnlessEqual(self.order, [1])
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import os
+import shutil
+import tempfile
+import rulemanifest
+from testing.logdispatcher_mock import LogDispatcher
+
+STATICRULE = '''
+from ..rule import Rule
+
+
+class StaticRule(Rule):
+
+    def __init__(self, config, environ, logger, statechglogger):
+        Rule.__init__(self, config, environ, logger, statechglogger)
+        self.rulenumber = 9001
+        self.rulename = 'StaticRuleName'
+        self.rootrequired = False
+        self.applicable = {'type': 'white', 'family': ['linux']}
+'''
+
+DYNAMICRULE = '''
+from ..rule import Rule
+
+
+class DynamicRule(Rule):
+
+    def __init__(self, config, environ, logger, statechglogger):
+        Rule.__init__(self, config, environ, logger, statechglogger)
+        self.rulenumber = 9002
+        self.rulename = 'DynamicRule'
+        if environ.getosfamily() == 'linux':
+            self.applicable = {'type': 'white', 'family': ['linux']}
+'''
+
+OVERRIDERULE = '''
+from ..rule import Rule
+
+
+class OverrideRule(Rule):
+
+    def __init__(self, config, environ, logger, statechglogger):
+        Rule.__init__(self, config, environ, logger, statechglogger)
+        self.rulenumber = 9003
+        self.rulename = 'OverrideRule'
+
+    def isapplicable(self):
+        return False
+'''
+
+
+class FakeEnvironment(object):
+
+    def __init__(self, family, ostype, osver, euid=0):
+        self.family = family
+        self.ostype = ostype
+        self.osver = osver
+        self.euid = euid
+
+    def getosfamily(self):
+        return self.family
+
+    def getostype(self):
+        return self.ostype
+
+    def getosver(self):
+        return self.osver
+
+    def geteuid(self):
+        return self.euid
+
+
+class zzzTestFrameworkrulemanifest(unittest.TestCase):
+
+    def setUp(self):
+        self.rulesdir = tempfile.mkdtemp()
+        for name, source in [('StaticRule', STATICRULE),
+                             ('DynamicRule', DYNAMICRULE),
+                             ('OverrideRule', OVERRIDERULE),
+                             ('__init__', '')]:
+            self.writerule(name, source)
+        self.linux = FakeEnvironment('linux', 'Red Hat Enterprise Linux',
+                                     '6.5')
+        self.mac = FakeEnvironment('darwin', 'Mac OS X', '10.10.5')
+
+    def tearDown(self):
+        shutil.rmtree(self.rulesdir)
+
+    def writerule(self, name, source):
+        whandle = open(os.path.join(self.rulesdir, name + '.py'), 'w')
+        whandle.write(source)
+        whandle.close()
+
+    def getentry(self, manifest, module):
+        for entry in manifest.getentries():
+            if entry['module'] == module:
+                return entry
+        return None
+
+    def testScanStatic(self):
+        entry = rulemanifest.scanrule(os.path.join(self.rulesdir,
+                                                   'StaticRule.py'))
+        self.failUnless(entry['static'])
+        self.failUnlessEqual(entry['rulenumber'], 9001)
+        self.failUnlessEqual(entry['rulename'], 'StaticRuleName')
+        self.failUnlessEqual(entry['rootrequired'], False)
+
+    def testScanDynamic(self):
+        for module in ['DynamicRule', 'OverrideRule']:
+            entry = rulemanifest.scanrule(os.path.join(self.rulesdir,
+                                                       module + '.py'))
+            self.failIf(entry['static'], module + ' should be dynamic')
+
+    def testApplicability(self):
+        rulemanifest.writemanifest(self.rulesdir)
+        manifest = rulemanifest.RuleManifest(self.rulesdir, LogDispatcher())
+        self.failUnlessEqual(len(manifest.getentries()), 3)
+        static = self.getentry(manifest, 'StaticRule')
+        dynamic = self.getentry(manifest, 'DynamicRule')
+        self.failUnless(manifest.isapplicable(static, self.linux))
+        self.failIf(manifest.isapplicable(static, self.mac))
+        # Dynamic rules must always be imported so they can decide
+        self.failUnless(manifest.isapplicable(dynamic, self.mac))
+
+    def testMatchesName(self):
+        manifest = rulemanifest.RuleManifest(self.rulesdir, LogDispatcher())
+        static = self.getentry(manifest, 'StaticRule')
+        dynamic = self.getentry(manifest, 'DynamicRule')
+        self.failUnless(manifest.matchesname(static, 'StaticRuleName'))
+        self.failUnless(manifest.matchesname(static, 'StaticRule'))
+        self.failIf(manifest.matchesname(static, 'SomethingElse'))
+        self.failUnless(manifest.matchesname(dynamic, 'SomethingElse'))
+
+    def testStaleEntryRescanned(self):
+        rulemanifest.writemanifest(self.rulesdir)
+        self.writerule('StaticRule',
+                       STATICRULE.replace("['linux']", "['darwin']"))
+        manifest = rulemanifest.RuleManifest(self.rulesdir, LogDispatcher())
+        static = self.getentry(manifest, 'StaticRule')
+        self.failUnless(manifest.isapplicable(static, self.mac))
+        self.failIf(manifest.isapplicable(static, self.linux))
+
+    def testRootRequired(self):
+        self.writerule('StaticRule',
+                       STATICRULE.replace('self.rootrequired = False',
+                                          'self.rootrequired = True'))
+        manifest = rulemanifest.RuleManifest(self.rulesdir, LogDispatcher())
+        static = self.getentry(manifest, 'StaticRule')
+        user = FakeEnvironment('linux', 'Red Hat Enterprise Linux', '6.5',
+                               500)
+        self.failUnless(manifest.isapplicable(static, self.linux))
+        self.failIf(manifest.isapplicable(static, user))
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+'''
+Created on Oct 18, 2016
+
+###############################################################################
+#                                                                             #
+# Copyright 2015.  Los Alamos National Security, LLC. This material was       #
+# produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos    #
+# National Laboratory (LANL), which is operated by Los Alamos National        #
+# Security, LLC for the U.S. Department of Energy. The U.S. Government has    #
+# rights to use, reproduce, and distribute this software.  NEITHER THE        #
+# GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY,        #
+# EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  #
+# If software is modified to produce derivative works, such modified software #
+# should be clearly marked, so as not to confuse it with the version          #
+# available from LANL.                                                        #
+#                                                                             #
+# Additionally, this program is free software; you can redistribute it and/or #
+# modify it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation; either version 2 of the License, or (at your  #
+# option) any later version. Accordingly, this program is distributed in the  #
+# hope that it will be useful, but WITHOUT ANY WARRANTY; without even the     #
+# implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    #
+# See the GNU General Public License for more details.                        #
+#                                                                             #
+###############################################################################
+
+@author: dkennel
+'''
+import unittest
+import threading
+import ServiceHelper
+from CommandHelper import getcommandcache
+from testing.logdispatcher_mock import LogDispatcher
+
+
+class FakeEnvironment(object):
+
+    def getinstallmode(self):
+        return False
+
+
+class FakeBackend(object):
+    '''
+    Backend that counts how often it is asked about single services.
+    '''
+
+    def __init__(self, states, default=(None, None)):
+        self.states = states
+        self.default = default
+        self.snapshots = 0
+        self.audits = 0
+        self.runchecks = 0
+        self.enabled = []
+
+    def snapshot(self):
+        self.snapshots = self.snapshots + 1
+        return (dict(self.states), self.default)
+
+    def auditservice(self, service):
+        self.audits = self.audits + 1
+        return service in self.enabled
+
+    def isrunning(self, service):
+        self.runchecks = self.runchecks + 1
+        return False
+
+    def enableservice(self, service):
+        self.enabled.append(service)
+        self.states[service] = (True, True)
+        return True
+
+    def disableservice(self, service):
+        return True
+
+    def reloadservice(self, service):
+        return True
+
+
+class zzzTestFrameworkservicesnapshot(unittest.TestCase):
+
+    def setUp(self):
+        ServiceHelper.invalidatesnapshots()
+        self.backend = FakeBackend({'sshd': (True, True),
+                                    'cups': (False, False),
+                                    'legacy': (True, None)})
+        self.helper = self.gethelper(self.backend)
+
+    def gethelper(self, backend, secondary=None):
+        helper = ServiceHelper.ServiceHelper.__new__(
+            ServiceHelper.ServiceHelper)
+        helper.environ = FakeEnvironment()
+        helper.logdispatcher = LogDispatcher()
+        helper.lock = threading.RLock()
+        helper.ishybrid = secondary is not None
+        helper.isdualparameterservice = False
+        helper.svchelper = backend
+        helper.secondary = secondary
+        helper.service = ""
+        helper.servicename = ""
+        return helper
+
+    def testAnsweredFromSnapshot(self):
+        for _ in range(3):
+            self.failUnless(self.helper.auditservice('sshd'))
+            self.failUnless(self.helper.isrunning('sshd'))
+            self.failIf(self.helper.auditservice('cups'))
+            self.failIf(self.helper.isrunning('cups'))
+        self.failUnlessEqual(self.backend.snapshots, 1)
+        self.failUnlessEqual(self.backend.audits, 0)
+        self.failUnlessEqual(self.backend.runchecks, 0)
+
+    def testUnknownAskedDirectly(self):
+        self.failUnless(self.helper.auditservice('legacy'))
+        self.failIf(self.helper.isrunning('legacy'))
+        self.failIf(self.helper.auditservice('notlisted'))
+        self.failUnlessEqual(self.backend.runchecks, 1)
+        self.failUnlessEqual(self.backend.audits, 1)
+
+    def testSharedBetweenHelpers(self):
+        self.helper.auditservice('sshd')
+        other = self.gethelper(self.backend)
+        other.auditservice('cups')
+        self.failUnlessEqual(self.backend.snapshots, 1)
+
+    def testEnableInvalidates(self):
+        self.failIf(self.helper.auditservice('cups'))
+        self.failUnless(self.helper.enableservice('cups'))
+        self.failUnless(self.helper.auditservice('cups'))
+        self.failUnlessEqual(self.backend.snapshots, 2)
+
+    def testNotUsedDuringFix(self):
+        self.helper.auditservice('sshd')
+        with getcommandcache().fixing():
+            self.helper.auditservice('sshd')
+            self.failUnlessEqual(self.backend.audits, 1)
+        # The fix may have changed anything, a new snapshot is taken
+        self.helper.auditservice('sshd')
+        self.failUnlessEqual(self.backend.snapshots, 2)
+
+    def testHybridStates(self):
+        secondary = FakeBackend({'cups': (True, None)}, (False, None))
+        secondary.__class__ = type('FakeSecondary', (FakeBackend,), {})
+        helper = self.gethelper(self.backend, secondary)
+        states = helper.getservicestates()
+        self.failUnlessEqual(states['cups'], (True, None))
+        self.failUnlessEqual(states['sshd'], (True, True))
+        self.failUnless(helper.auditservice('cups'))
+
+    def testSharedHelper(self):
+        environ = FakeEnvironment()
+        try:
+            helper = ServiceHelper.getservicehelper(environ, LogDispatcher())
+        except RuntimeError:
+            # No service manager on this system
+            return
+        detected = ServiceHelper.DETECTED
+        self.failUnless(helper is
+                        ServiceHelper.getservicehelper(environ,
+                                                       LogDispatcher()))
+        other = ServiceHelper.getservicehelper(FakeEnvironment(),
+                                               LogDispatcher())
+        self.failIf(helper is other)
+        # Detection is not repeated
+        self.failUnless(ServiceHelper.DETECTED is detected)
+
+    def testConcurrentUse(self):
+        errors = []
+
+        def worker(service, expected):
+            try:
+                for _ in range(200):
+                    if self.helper.auditservice(service) != expected:
+                        errors.append(service)
+            except Exception, err:
+                errors.append(err)
+        threads = [threading.Thread(target=worker, args=args)
+                   for args in [('sshd', True), ('cups', False),
+                                ('legacy', True)]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.failUnlessEqual(errors, [])
+        self.failUnlessEqual(self.backend.snapshots, 1)
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -26,13 +26,38 @@ This is a Unit Test for Rule ConfigureAppleSoftwareUpdate
 
 @author: ekkehard j. koch
 @change: 03/18/2013 Original Implementation
+@change: 2016/10/18 dkennel tests of the batched rpm verification
 '''
 from __future__ import absolute_import
 import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
 from stonix_resources.RuleTestTemplate import RuleTest
 from stonix_resources.CommandHelper import CommandHelper
 from stonix_resources.logdispatcher import LogPriority
-from stonix_resources.rules.FilePermissions import FilePermissions
+from stonix_resources.rules import FilePermissions as filepermissions
+from stonix_resources.rules.FilePermissions import FilePermissions, \
+    parserpmowners, parserpmverify
+
+RPMQFOUTPUT = '''/usr/bin/passwd\tpasswd-0.77-4.el6.x86_64
+file /usr/local/bin/tool is not owned by any package
+/usr/bin/sudo\tsudo-1.8.6p3-24.el6.x86_64
+/usr/lib/libc.so\tglibc-2.12-1.192.el6.x86_64
+/usr/lib/libc.so\tglibc-2.12-1.192.el6.i686
+/usr/bin/unrelated\tpasswd-0.77-4.el6.x86_64
+'''
+
+RPMVOUTPUT = {'passwd-0.77-4.el6.x86_64': '''.M.......    /usr/bin/passwd
+S.5....T.  c /etc/pam.d/passwd
+''',
+              'sudo-1.8.6p3-24.el6.x86_64': '''missing     /usr/bin/sudo
+......G..  d /usr/share/doc/sudo
+''',
+              'glibc-2.12-1.192.el6.x86_64': '',
+              'glibc-2.12-1.192.el6.i686': ''}
 
 
 class zzzTestRuleFilePermissions(RuleTest):
@@ -105,6 +130,127 @@ class zzzTestRuleFilePermissions(RuleTest):
         success = True
         return success
 
+
+class zzzTestRuleFilePermissionsRpm(RuleTest):
+    '''
+    Feeds canned rpm -qf and rpm -V output through the rpm verification
+    parsers and cache of FilePermissions.
+    '''
+
+    def setUp(self):
+        RuleTest.setUp(self)
+        self.rule = FilePermissions(self.config,
+                                    self.environ,
+                                    self.logdispatch,
+                                    self.statechglogger)
+        self.tmpdir = tempfile.mkdtemp()
+        self.savedrpm = filepermissions.RPM
+        filepermissions.RPM = os.path.join(self.tmpdir, 'rpm')
+        open(filepermissions.RPM, 'w').close()
+        self.rule.rpmcachefile = os.path.join(self.tmpdir, 'rpmverify.cache')
+        self.rule.rpmquery = self.rpmquery
+        self.rule.getrpmdbstamp = lambda: self.stamp
+        self.stamp = 1000.0
+        self.queries = []
+
+    def tearDown(self):
+        filepermissions.RPM = self.savedrpm
+        shutil.rmtree(self.tmpdir)
+
+    def rpmquery(self, cmd):
+        self.queries.append(cmd)
+        if cmd[1] == '-qf':
+            return RPMQFOUTPUT, ''
+        return RPMVOUTPUT[cmd[-1]], ''
+
+    def getverified(self):
+        return [cmd[-1] for cmd in self.queries if cmd[1] == '-V']
+
+    def testParseOwners(self):
+        owners = parserpmowners(RPMQFOUTPUT, set(['/usr/bin/passwd',
+                                                  '/usr/lib/libc.so',
+                                                  '/usr/local/bin/tool']))
+        self.failUnlessEqual(sorted(owners), ['/usr/bin/passwd',
+                                              '/usr/lib/libc.so'])
+        self.failUnlessEqual(len(owners['/usr/lib/libc.so']), 2)
+
+    def testParseVerify(self):
+        changed = parserpmverify(RPMVOUTPUT['passwd-0.77-4.el6.x86_64'] +
+                                 RPMVOUTPUT['sudo-1.8.6p3-24.el6.x86_64'] +
+                                 '.M...UG..  c /etc/sudoers\n')
+        self.failUnlessEqual(changed, set(['/usr/bin/passwd',
+                                           '/etc/sudoers']))
+
+    def testCheckAll(self):
+        paths = ['/usr/bin/passwd', '/usr/bin/sudo', '/usr/lib/libc.so',
+                 '/usr/local/bin/tool']
+        results = self.rule.rpmcheckall(paths)
+        self.failUnlessEqual(results, {'/usr/bin/passwd': 0,
+                                       '/usr/bin/sudo': 1,
+                                       '/usr/lib/libc.so': 1,
+                                       '/usr/local/bin/tool': 3})
+        self.failUnlessEqual(sorted(self.getverified()),
+                             sorted(RPMVOUTPUT))
+        self.failUnlessEqual(self.rule.rpmcheck('/usr/bin/passwd'), 0)
+        self.failUnlessEqual(len(self.getverified()), 4,
+                             'Cached package verified again')
+
+    def testSuidReport(self):
+        # Unowned, unowned but listed, clean and mode changed SUID files
+        self.rule.scanresults = {'suid': ['/usr/local/bin/tool',
+                                          '/usr/bin/ping',
+                                          '/usr/bin/sudo',
+                                          '/usr/bin/passwd']}
+        self.rule.suidlast = os.path.join(self.tmpdir, 'suidlast')
+        self.rule.suidorigin = os.path.join(self.tmpdir, 'suidorigin')
+        for path in [self.rule.suidlast, self.rule.suidorigin]:
+            whandle = open(path, 'w')
+            whandle.write('\n'.join(self.rule.scanresults['suid']) + '\n')
+            whandle.close()
+        self.failIf(self.rule.suidreport())
+        lines = [line.strip() for line in
+                 self.rule.suidresults.splitlines()]
+        self.failUnless('SUID files not known by STONIX: ' +
+                        '/usr/local/bin/tool' in lines, lines)
+        self.failUnless('SUID files where current mode does not match ' +
+                        'the package dbase: /usr/bin/passwd' in lines, lines)
+
+    def testNoRpm(self):
+        os.remove(filepermissions.RPM)
+        self.failUnlessEqual(self.rule.rpmcheck('/usr/bin/passwd'), 4)
+        self.failUnlessEqual(self.queries, [])
+
+    def testCacheInvalidation(self):
+        self.rule.rpmcheckall(['/usr/bin/passwd'])
+        self.failUnlessEqual(len(self.getverified()), 1)
+        # A package install or update changes the rpm database
+        self.stamp = 2000.0
+        self.rule.rpmcheckall(['/usr/bin/passwd'])
+        self.failUnlessEqual(len(self.getverified()), 2)
+
+    def testCachePersisted(self):
+        if self.environ.geteuid() != 0:
+            return
+        self.rule.rpmcheckall(['/usr/bin/passwd'])
+        rule = FilePermissions(self.config, self.environ, self.logdispatch,
+                               self.statechglogger)
+        rule.rpmcachefile = self.rule.rpmcachefile
+        rule.rpmquery = self.rpmquery
+        rule.getrpmdbstamp = lambda: self.stamp
+        self.failUnlessEqual(rule.rpmcheck('/usr/bin/passwd'), 0)
+        self.failUnlessEqual(len(self.getverified()), 1)
+        # A day old cache is not used, a chmod must be noticed eventually
+        rhandle = open(rule.rpmcachefile, 'r')
+        cache = json.load(rhandle)
+        rhandle.close()
+        cache['created'] = time.time() - rule.rpmcacheage - 1
+        whandle = open(rule.rpmcachefile, 'w')
+        json.dump(cache, whandle)
+        whandle.close()
+        rule.rpmcache = None
+        rule.rpmcheck('/usr/bin/passwd')
+        self.failUnlessEqual(len(self.getverified()), 2)
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
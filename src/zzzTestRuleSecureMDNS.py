@@ -32,7 +32,7 @@ import unittest
 from stonix_resources.RuleTestTemplate import RuleTest
 from stonix_resources.CommandHelper import CommandHelper
 from stonix_resources.logdispatcher import LogPriority
-from stonix_resources.ServiceHelper import ServiceHelper
+from stonix_resources.ServiceHelper import getservicehelper
 from stonix_resources.rules.SecureMDNS import SecureMDNS
 
 
@@ -50,7 +50,7 @@ class zzzTestRuleSecureMDNS(RuleTest):
         self.dc = "/usr/bin/defaults"
         self.lc = "/bin/launchctl"
         self.plb = "/usr/libexec/PlistBuddy"
-        self.sh = ServiceHelper(self.environ, self.logdispatch)
+        self.sh = getservicehelper(self.environ, self.logdispatch)
 
     def tearDown(self):
         pass